@@ -0,0 +1,33 @@
+"""
+Общие фикстуры тестов GromFitBot
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Модули бота импортируются как в src/main.py: core.*, modules.*
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'src'))
+
+from core.database import Database
+
+@pytest.fixture
+def db(tmp_path):
+    """Пустая база данных во временной директории"""
+    return Database(str(tmp_path / 'users.db'))
+
+@pytest.fixture
+def make_user(db):
+    """Создание зарегистрированного пользователя"""
+    def factory(telegram_id: int, **fields) -> int:
+        user_data = {
+            'telegram_id': telegram_id,
+            'registration_number': f"GF{telegram_id}",
+            'nickname': f"user{telegram_id}"
+        }
+        user_data.update(fields)
+        assert db.create_user(user_data)
+        return telegram_id
+
+    return factory
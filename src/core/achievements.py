@@ -0,0 +1,161 @@
+"""
+Движок достижений GromFitBot
+Достижения описаны декларативно: событие-триггер, счетчик и порог. Правила
+индексированы по событию, поэтому на каждое событие проверяются только
+подписанные на него правила - по инкрементальным счетчикам в БД, без пересчета
+истории. Новые достижения и награды записываются одной транзакцией
+"""
+
+import logging
+from collections import defaultdict
+from functools import partial
+from typing import Optional, Dict, List, Any, Callable, Tuple, NamedTuple
+
+from core.database import Database
+from core.events import (
+    events, USER_REGISTERED, WORKOUT_SAVED, BONUS_CLAIMED,
+    REFERRAL_ADDED, DUEL_WON, PURCHASE, ACHIEVEMENT_UNLOCKED
+)
+
+logger = logging.getLogger(__name__)
+
+class AchievementRule(NamedTuple):
+    """Правило достижения: выдается, когда счетчик достигает порога"""
+    achievement_id: str
+    trigger: str
+    counter: str
+    threshold: float
+    title: str
+    description: str
+    icon: str = '🏆'
+    category: str = 'general'
+    reward_tokens: float = 0.0
+    reward_diamonds: float = 0.0
+
+# Каталог достижений
+ACHIEVEMENT_RULES = (
+    # Регистрация
+    AchievementRule('welcome_to_gromfit', USER_REGISTERED, 'registrations', 1,
+                    'Добро пожаловать в GromFit!', 'Вы успешно зарегистрировались в системе',
+                    '👋', 'registration', 5.0),
+    AchievementRule('first_steps', USER_REGISTERED, 'registrations', 1,
+                    'Первые шаги', 'Завершили процесс регистрации',
+                    '🚶', 'progress', 10.0),
+
+    # Тренировки
+    AchievementRule('first_workout', WORKOUT_SAVED, 'workouts', 1,
+                    'Первая тренировка', 'Записали первую тренировку', '💪', 'trainings', 10.0),
+    AchievementRule('workouts_10', WORKOUT_SAVED, 'workouts', 10,
+                    'Втянулся', 'Записали 10 тренировок', '🏋️', 'trainings', 50.0),
+    AchievementRule('workouts_50', WORKOUT_SAVED, 'workouts', 50,
+                    'Постоянство', 'Записали 50 тренировок', '🔥', 'trainings', 200.0),
+    AchievementRule('workouts_100', WORKOUT_SAVED, 'workouts', 100,
+                    'Железная воля', 'Записали 100 тренировок', '🦾', 'trainings', 500.0, 5.0),
+    AchievementRule('volume_10t', WORKOUT_SAVED, 'workout_volume', 10_000,
+                    'Десять тонн', 'Подняли суммарно 10 тонн', '📦', 'trainings', 50.0),
+    AchievementRule('volume_100t', WORKOUT_SAVED, 'workout_volume', 100_000,
+                    'Сто тонн', 'Подняли суммарно 100 тонн', '🏗️', 'trainings', 300.0, 3.0),
+
+    # Ежедневные бонусы
+    AchievementRule('bonus_days_10', BONUS_CLAIMED, 'bonus_days', 10,
+                    'Заглядываю каждый день', 'Получили 10 ежедневных бонусов', '🎁', 'bonus', 20.0),
+    AchievementRule('bonus_streak_7', BONUS_CLAIMED, 'bonus_streak', 7,
+                    'Неделя без пропусков', 'Серия ежедневных бонусов 7 дней', '📅', 'bonus', 30.0),
+    AchievementRule('bonus_streak_30', BONUS_CLAIMED, 'bonus_streak', 30,
+                    'Месяц без пропусков', 'Серия ежедневных бонусов 30 дней', '🗓️', 'bonus', 150.0, 1.0),
+
+    # Рефералы
+    AchievementRule('first_referral', REFERRAL_ADDED, 'referrals', 1,
+                    'Первый друг', 'Пригласили первого реферала', '🤝', 'referrals', 10.0),
+    AchievementRule('referral_10', REFERRAL_ADDED, 'referrals', 10,
+                    '10 рефералов', 'Пригласили 10 рефералов', '👥', 'referrals', 100.0),
+    AchievementRule('referral_50', REFERRAL_ADDED, 'referrals', 50,
+                    '50 рефералов', 'Пригласили 50 рефералов', '🌟', 'referrals', 500.0),
+    AchievementRule('referral_100', REFERRAL_ADDED, 'referrals', 100,
+                    '100 рефералов', 'Пригласили 100 рефералов', '👑', 'referrals', 1000.0),
+
+    # Дуэли
+    AchievementRule('first_duel_win', DUEL_WON, 'duel_wins', 1,
+                    'Первая победа', 'Выиграли первую дуэль', '⚔️', 'duels', 20.0),
+    AchievementRule('duel_wins_10', DUEL_WON, 'duel_wins', 10,
+                    'Дуэлянт', 'Выиграли 10 дуэлей', '🥇', 'duels', 150.0, 1.0),
+
+    # Магазин
+    AchievementRule('first_purchase', PURCHASE, 'purchases', 1,
+                    'Первая покупка', 'Совершили первую покупку в магазине', '🛍️', 'shop', 5.0),
+    AchievementRule('purchases_10', PURCHASE, 'purchases', 10,
+                    'Постоянный покупатель', 'Совершили 10 покупок', '🛒', 'shop', 50.0)
+)
+
+# Приращения счетчиков-сумм и новые значения счетчиков-максимумов по событию
+CounterUpdate = Tuple[Dict[str, float], Dict[str, float]]
+
+EVENT_COUNTERS: Dict[str, Callable[..., CounterUpdate]] = {
+    USER_REGISTERED: lambda **payload: ({'registrations': 1}, {}),
+    WORKOUT_SAVED: lambda workout_log=None, **payload: (
+        {'workouts': 1, 'workout_volume': workout_log.total_volume if workout_log else 0}, {}
+    ),
+    BONUS_CLAIMED: lambda daily_streak=0, **payload: ({'bonus_days': 1}, {'bonus_streak': daily_streak}),
+    REFERRAL_ADDED: lambda **payload: ({'referrals': 1}, {}),
+    DUEL_WON: lambda **payload: ({'duel_wins': 1}, {}),
+    PURCHASE: lambda total_tokens=0, **payload: ({'purchases': 1, 'tokens_spent': total_tokens}, {})
+}
+
+class AchievementEngine:
+    """Проверка правил достижений по событиям"""
+
+    def __init__(self, rules=ACHIEVEMENT_RULES, db: Optional[Database] = None):
+        self.db = db
+        self._by_trigger: Dict[str, List[AchievementRule]] = defaultdict(list)
+        for rule in rules:
+            self._by_trigger[rule.trigger].append(rule)
+
+    def bind(self, db: Database) -> None:
+        """Подключение к базе данных бота"""
+        self.db = db
+
+    def _get_db(self) -> Database:
+        """База данных, подключенная через bind()"""
+        if self.db is None:
+            raise RuntimeError("Движок достижений не подключен к базе данных")
+        return self.db
+
+    def rules_for(self, trigger: str) -> List[AchievementRule]:
+        """Правила, подписанные на событие"""
+        return list(self._by_trigger.get(trigger, []))
+
+    def subscribe(self, bus=events) -> None:
+        """Подписка на все события-триггеры каталога"""
+        for trigger in EVENT_COUNTERS:
+            bus.subscribe(trigger, partial(self.handle_event, trigger))
+
+    def handle_event(self, trigger: str, user_id: int, db: Optional[Database] = None,
+                     **payload: Any) -> List[Dict[str, Any]]:
+        """
+        Обновление счетчиков события и выдача достигнутых достижений
+
+        Args:
+            db: БД, опубликовавшая событие (иначе - подключенная через bind)
+
+        Returns:
+            Список новых достижений
+        """
+        increments, maxima = EVENT_COUNTERS[trigger](**payload)
+
+        if db is None:
+            db = self._get_db()
+        unlocked = db.apply_achievement_counters(
+            user_id,
+            {counter: value for counter, value in increments.items() if value},
+            {counter: value for counter, value in maxima.items() if value},
+            [rule._asdict() for rule in self._by_trigger.get(trigger, [])]
+        )
+
+        for achievement in unlocked:
+            events.publish(ACHIEVEMENT_UNLOCKED, user_id=user_id, achievement=achievement, db=db)
+
+        return unlocked
+
+# Общий движок достижений
+achievement_engine = AchievementEngine()
+achievement_engine.subscribe()
@@ -5,26 +5,44 @@
 
 import asyncio
 import logging
+import sys
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 
-from aiogram import Bot, Dispatcher, Router, F
+from aiogram import Bot
 from aiogram.filters import CommandStart, Command
-from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove
+from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove, ReplyKeyboardMarkup
 from aiogram.exceptions import TelegramAPIError
 
 from core.config import Config
 from core.database import Database
 from modules.keyboards.main_keyboards import MainKeyboards
 from core.message_manager import MessageManager
+from core.scheduler import message_scheduler
+from core.executor import LaneDispatcher, UpdateExecutor
+from core.idempotency import CallbackIdempotencyMiddleware
+from core.render_cache import render_cache
+from core.session import BotAPISession
+from core.fsm_storage import SQLiteStorage
+from core.pending_referrals import pending_referrals
+from core.leaderboards import leaderboards
+from core.achievements import achievement_engine
+from core.events import events, REFERRAL_ADDED
+from core.progression import progress_snapshots, format_experience
+from core.dispatch_router import DispatchRouter
+from core.lazy_router import LazyRouter
+from core.profiler import startup_profiler
 
-# Импорт всех модулей
-from modules.auth.registration import router as auth_router
-from modules.profile.handlers import router as profile_router
-from modules.referrals.handlers import router as referrals_router
-from modules.shop.handlers import router as shop_router
-from modules.bonus.handlers import router as bonus_router
-from modules.auth.registration import start_registration
+# Модули бота загружаются по требованию (порядок важен для обработки обновлений)
+MODULES = {
+    'auth': 'modules.auth.registration',
+    'profile': 'modules.profile.handlers',
+    'referrals': 'modules.referrals.handlers',
+    'shop': 'modules.shop.handlers',
+    'bonus': 'modules.bonus.handlers',
+    'workouts': 'modules.workouts.handlers',
+    'stats': 'modules.stats',
+}
 
 # Настройка логирования
 logging.basicConfig(
@@ -44,15 +62,57 @@ class GromFitBot:
     def __init__(self):
         """Полная инициализация бота"""
         self.config = Config()
-        self.bot = Bot(token=self.config.BOT_TOKEN)
-        self.dp = Dispatcher()
+        if self.config.PROFILE_STARTUP:
+            startup_profiler.enable_memory()
+        
+        self.bot = Bot(
+            token=self.config.BOT_TOKEN,
+            session=BotAPISession(
+                proxy=self.config.API_PROXY,
+                limit=self.config.API_POOL_SIZE,
+                limit_per_host=self.config.API_POOL_PER_HOST,
+                keepalive_timeout=self.config.API_KEEPALIVE,
+                dns_cache_ttl=self.config.API_DNS_TTL,
+                timeout=self.config.API_TIMEOUT,
+                method_timeouts=self.config.API_METHOD_TIMEOUTS
+            )
+        )
+        
+        # Обновления одного пользователя - по порядку, разных - параллельно
+        self.executor = UpdateExecutor(
+            lanes=self.config.UPDATE_LANES,
+            max_in_flight=self.config.UPDATE_MAX_IN_FLIGHT
+        )
         self.db = Database(self.config.DB_PATH)
         
+        # Состояния FSM (регистрация) - в SQLite, общие для всех процессов бота
+        self.fsm_storage = SQLiteStorage(
+            self.db,
+            state_ttl=self.config.FSM_STATE_TTL,
+            cache_size=self.config.FSM_CACHE_SIZE,
+            cache_ttl=self.config.FSM_CACHE_TTL,
+            sweep_interval=self.config.FSM_SWEEP_INTERVAL
+        )
+        self.dp = LaneDispatcher(storage=self.fsm_storage, executor=self.executor)
+        
+        # Реферальные переходы до завершения регистрации
+        pending_referrals.bind(self.db, ttl=self.config.PENDING_REFERRAL_TTL)
+        leaderboards.bind(self.db, refresh_interval=self.config.LEADERBOARD_REFRESH_INTERVAL)
+        achievement_engine.bind(self.db)
+        progress_snapshots.bind(self.db)
+        
         # Инициализируем менеджер сообщений
         self.message_manager = MessageManager(self.bot)
         
         # Основной роутер для общих команд
-        self.common_router = Router()
+        self.common_router = DispatchRouter()
+        
+        # Роутеры модулей: модуль импортируется при первом обновлении или прогреве
+        self.module_routers: Dict[str, LazyRouter] = {
+            name: LazyRouter(path, on_load=self._init_module)
+            for name, path in MODULES.items()
+        }
+        self._warmup_task: Optional[asyncio.Task] = None
         
         # Хранилище состояний пользователей (для навигации)
         self.user_states: Dict[int, Dict[str, Any]] = {}
@@ -68,81 +128,88 @@ class GromFitBot:
         
         # Инициализация модулей
         self._init_modules()
+        
+        startup_profiler.mark('bot_ready')
     
     def _register_routers(self):
         """Регистрация всех роутеров системы"""
         logger.info("Регистрация роутеров...")
         
+        # Защита от повторных нажатий кнопок покупки, бонуса и вывода
+        self.dp.callback_query.outer_middleware(
+            CallbackIdempotencyMiddleware(ttl=self.config.CALLBACK_DEDUP_TTL)
+        )
+        
+        # Время до первого обработанного обновления
+        self.dp.update.outer_middleware(startup_profiler.first_response_middleware)
+        
         # Порядок важен: общий роутер должен быть первым
         self.dp.include_router(self.common_router)
-        self.dp.include_router(auth_router)
-        self.dp.include_router(profile_router)
-        self.dp.include_router(referrals_router)
-        self.dp.include_router(shop_router)
-        self.dp.include_router(bonus_router)
+        for module_router in self.module_routers.values():
+            self.dp.include_router(module_router)
         
-        logger.info(f"Зарегистрировано роутеров: 6")
+        logger.info(f"Зарегистрировано роутеров: {1 + len(self.module_routers)}")
     
     def _register_common_handlers(self):
         """Регистрация общих обработчиков кнопок и сообщений"""
         
         # ==================== ОБРАБОТЧИКИ КНОПОК ГЛАВНОГО МЕНЮ ====================
         
-        @self.common_router.message(F.text == "🏠 Главное меню")
+        @self.common_router.text("🏠 Главное меню")
         async def handle_main_menu_button(message: Message):
             """Обработчик кнопки 'Главное меню' из любого места"""
             logger.info(f"Кнопка 'Главное меню' от пользователя {message.from_user.id}")
             await self._show_main_menu(message)
         
-        @self.common_router.message(F.text == "📝 Записать результат")
+        @self.common_router.text("📝 Записать результат")
         async def handle_record_result(message: Message):
-            """Обработчик кнопки 'Записать результат' - только сообщение"""
+            """Обработчик кнопки 'Записать результат' - формат записи тренировки"""
             logger.info(f"Кнопка 'Записать результат' от пользователя {message.from_user.id}")
             await self._handle_record_result(message)
         
-        @self.common_router.message(F.text == "🛒 Магазин")
+        @self.common_router.text("🛒 Магазин")
         async def handle_shop_button(message: Message):
             """Обработчик кнопки 'Магазин' из нижнего меню"""
             logger.info(f"Кнопка 'Магазин' от пользователя {message.from_user.id}")
             await self._redirect_to_module(message, "shop")
         
-        @self.common_router.message(F.text == "👤 Профиль")
+        @self.common_router.text("👤 Профиль")
         async def handle_profile_button(message: Message):
             """Обработчик кнопки 'Профиль' из нижнего меню"""
             logger.info(f"Кнопка 'Профиль' от пользователя {message.from_user.id}")
             await self._redirect_to_module(message, "profile")
         
-        @self.common_router.message(F.text == "📊 Статистика")
+        @self.common_router.text("📊 Статистика")
         async def handle_statistics_button(message: Message):
             """Обработчик кнопки 'Статистика'"""
             logger.info(f"Кнопка 'Статистика' от пользователя {message.from_user.id}")
             await self._handle_statistics(message)
         
-        @self.common_router.message(F.text == "🤼 Дуэли")
+        @self.common_router.text("🤼 Дуэли")
         async def handle_duels_button(message: Message):
             """Обработчик кнопки 'Дуэли'"""
             logger.info(f"Кнопка 'Дуэли' от пользователя {message.from_user.id}")
             await self._handle_duels(message)
         
-        @self.common_router.message(F.text == "🎯 Достижения")
+        @self.common_router.text("🎯 Достижения")
         async def handle_achievements_button(message: Message):
             """Обработчик кнопки 'Достижения'"""
             logger.info(f"Кнопка 'Достижения' от пользователя {message.from_user.id}")
             await self._handle_achievements(message)
         
-        @self.common_router.message(F.text == "📈 Топы")
+        @self.common_router.text("📈 Топы")
         async def handle_tops_button(message: Message):
             """Обработчик кнопки 'Топы'"""
             logger.info(f"Кнопка 'Топы' от пользователя {message.from_user.id}")
             await self._handle_tops(message)
         
-        @self.common_router.message(F.text == "🤝 Рефералы")
+        @self.common_router.text("🤝 Рефералы")
         async def handle_referrals_button(message: Message):
             """Обработчик кнопки 'Рефералы'"""
             logger.info(f"Кнопка 'Рефералы' от пользователя {message.from_user.id}")
             await self._redirect_to_module(message, "referrals")
         
-        @self.common_router.message(F.text == "🎁 Бонусы")
+        @self.common_router.text("🎁 Бонусы")
         async def handle_bonuses_button(message: Message):
             """Обработчик кнопки 'Бонусы'"""
             logger.info(f"Кнопка 'Бонусы' от пользователя {message.from_user.id}")
@@ -150,7 +217,7 @@ class GromFitBot:
         
         # ==================== ОБРАБОТЧИКИ CALLBACK-ЗАПРОСОВ ====================
         
-        @self.common_router.callback_query(F.data == "back_to_main")
+        @self.common_router.callback("back_to_main")
         async def handle_back_to_main_callback(callback: CallbackQuery):
             """Обработчик callback 'Назад в главное меню'"""
             logger.info(f"Callback 'back_to_main' от пользователя {callback.from_user.id}")
@@ -158,12 +225,12 @@ class GromFitBot:
         
         # ==================== ОБРАБОТЧИКИ ТЕКСТОВЫХ КОМАНД ====================
         
-        @self.common_router.message(F.text == "/menu")
+        @self.common_router.text("/menu")
         async def handle_menu_command(message: Message):
             """Обработчик команды /menu"""
             await self._show_main_menu(message)
         
-        @self.common_router.message(F.text == "/help")
+        @self.common_router.text("/help")
         async def handle_help_command(message: Message):
             """Обработчик команды /help"""
             await self._show_help(message)
@@ -190,25 +257,39 @@ class GromFitBot:
             await message.answer("🏓 Pong! Бот работает.")
     
     def _init_modules(self):
-        """Инициализация всех модулей с менеджером сообщений"""
-        try:
-            # Импортируем функции инициализации из модулей
-            from modules.referrals.handlers import init_message_manager as init_ref
-            from modules.profile.handlers import init_message_manager as init_prof
-            from modules.shop.handlers import init_message_manager as init_shop
-            from modules.bonus.handlers import init_message_manager as init_bonus
-            
-            # Инициализируем менеджер сообщений в каждом модуле
-            init_ref(self.bot)
-            init_prof(self.bot)
-            init_shop(self.bot)
-            init_bonus(self.bot)
-            
-            logger.info("Модули инициализированы с менеджером сообщений")
-        except ImportError as e:
-            logger.error(f"Ошибка импорта при инициализации модулей: {e}")
-        except Exception as e:
-            logger.error(f"Ошибка инициализации модулей: {e}")
+        """Инициализация модулей: сразу или отложенно (LAZY_MODULES)"""
+        if self.config.LAZY_MODULES:
+            logger.info("Модули будут загружены по первому обращению или прогревом")
+            return
+        
+        for name, module_router in self.module_routers.items():
+            try:
+                module_router.load_sync()
+            except Exception as e:
+                logger.error(f"Ошибка инициализации модуля {name}: {e}")
+        
+        logger.info("Модули инициализированы с менеджером сообщений")
+        startup_profiler.log_report()
+    
+    def _init_module(self, module):
+        """Инициализация загруженного модуля с менеджером сообщений"""
+        init_message_manager = getattr(module, 'init_message_manager', None)
+        if init_message_manager:
+            init_message_manager(self.bot)
+    
+    async def _warmup_modules(self):
+        """Фоновая загрузка модулей после запуска"""
+        await asyncio.sleep(self.config.MODULE_WARMUP_DELAY)
+        
+        for name, module_router in self.module_routers.items():
+            try:
+                await module_router.load()
+            except Exception as e:
+                logger.error(f"Ошибка прогрева модуля {name}: {e}")
+        
+        startup_profiler.mark('modules_loaded')
+        startup_profiler.log_report()
+        startup_profiler.stop_memory()
     
     async def _handle_start_command(self, message: Message):
         """Полная обработка команды /start"""
@@ -234,13 +315,9 @@ class GromFitBot:
             self.db.update_user_last_active(user_id)
             
             # Обрабатываем реферальную ссылку (если есть и пользователь новый)
-            if referral_id and not user.get('referrer_id'):
-                self.db.update_user_field(user_id, 'referrer_id', referral_id)
-                referrer = self.db.get_user(referral_id)
-                if referrer:
-                    # Обновляем счетчик рефералов у реферера
-                    new_count = referrer.get('referrals_count', 0) + 1
-                    self.db.update_user_field(referral_id, 'referrals_count', new_count)
+            if referral_id and not user.get('referrer_id') and self.db.get_user(referral_id):
+                if self.db.add_referral(referral_id, user_id):
+                    events.publish(REFERRAL_ADDED, user_id=referral_id, referred_id=user_id)
                     logger.info(f"Реферер {referral_id} получил нового реферала {user_id}")
             
             # Показываем главное меню
@@ -249,10 +326,12 @@ class GromFitBot:
             # Пользователь не зарегистрирован - запускаем регистрацию
             logger.info(f"Пользователь {user_id} не зарегистрирован, запуск регистрации")
             
-            # Сохраняем referral_id в состоянии пользователя для использования при регистрации
-            if referral_id:
-                self.user_states[user_id] = {'referral_id': referral_id}
+            # Сохраняем реферера до завершения регистрации (только существующего)
+            if referral_id and self.db.get_user(referral_id):
+                pending_referrals.put(user_id, referral_id)
             
+            await self.module_routers['auth'].load()
+            from modules.auth.registration import start_registration
             await start_registration(message)
     
     async def _show_main_menu(self, message: Message):
@@ -270,19 +349,13 @@ class GromFitBot:
             )
             return
         
-        # Формируем текст главного меню
-        menu_text = (
-            f"🏠 <b>Главное меню</b>\n\n"
-            f"Приветствуем, <b>{user['nickname']}</b>!\n"
-            f"<i>ID: {user['registration_number']}</i>\n\n"
-            f"💎 <b>Баланс:</b> {user.get('balance_tokens', 0):.0f} токенов\n"
-            f"📊 <b>Уровень:</b> {user.get('level', 1)}\n"
-            f"🤝 <b>Рефералов:</b> {user.get('referrals_count', 0)}\n\n"
-            f"Выберите раздел:"
-        )
+        # Текст главного меню перестраивается только при изменении данных пользователя
+        user_version = self.db.get_user_version(user_id)
+        rendered = render_cache.get('main_menu', user_id, user_version)
+        if rendered is None:
+            rendered = render_cache.put('main_menu', user_id, user_version, *self._render_main_menu(user))
         
-        # Получаем клавиатуру главного меню
-        main_keyboard = MainKeyboards.get_main_menu()
+        menu_text, main_keyboard = rendered
         
         # Заменяем сообщение главным меню
         await self.message_manager.replace_message(
@@ -293,33 +366,23 @@ class GromFitBot:
         
         logger.info(f"Главное меню показано пользователю {user_id}")
     
-    async def _handle_record_result(self, message: Message):
-        """Обработка кнопки 'Записать результат' - ТОЛЬКО сообщение"""
-        user_id = message.from_user.id
-        user = self.db.get_user(user_id)
-        
-        if not user:
-            await self.message_manager.replace_message(
-                message,
-                "❌ <b>Вы не зарегистрированы</b>\n\n"
-                "Используйте команду /start для регистрации."
-            )
-            return
-        
-        # ТОЛЬКО сообщение, БЕЗ главного меню
-        await self.message_manager.replace_message(
-            message,
-            "📝 <b>Запись результата тренировки</b>\n\n"
-            "🚧 <b>Эта функция находится в активной разработке</b>\n\n"
-            "Скоро вы сможете:\n"
-            "• Записывать свои тренировки\n"
-            "• Участвовать в спортивных дуэлях\n"
-            "• Бросать вызовы друзьям\n"
-            "• Зарабатывать токены за достижения\n\n"
-            "<i>Следите за обновлениями!</i>"
+    def _render_main_menu(self, user: Dict[str, Any]) -> Tuple[str, ReplyKeyboardMarkup]:
+        """Формирование текста и клавиатуры главного меню"""
+        menu_text = (
+            f"🏠 <b>Главное меню</b>\n\n"
+            f"Приветствуем, <b>{user['nickname']}</b>!\n"
+            f"<i>ID: {user['registration_number']}</i>\n\n"
+            f"💎 <b>Баланс:</b> {user.get('balance_tokens', 0):.0f} токенов\n"
+            f"📊 <b>Уровень:</b> {user.get('level', 1)}\n"
+            f"🤝 <b>Рефералов:</b> {user.get('referrals_count', 0)}\n\n"
+            f"Выберите раздел:"
         )
         
-        logger.info(f"Пользователь {user_id} запросил запись результата")
+        return menu_text, MainKeyboards.get_main_menu()
+    
+    async def _handle_record_result(self, message: Message):
+        """Обработка кнопки 'Записать результат' - подсказка модуля тренировок"""
+        await self._redirect_to_module(message, "workouts")
     
     async def _redirect_to_module(self, message: Message, module_name: str):
         """Перенаправление в указанный модуль"""
@@ -341,6 +404,9 @@ class GromFitBot:
         
         # В зависимости от модуля вызываем соответствующий обработчик
         try:
+            if module_name in self.module_routers:
+                await self.module_routers[module_name].load()
+            
             if module_name == "profile":
                 from modules.profile.handlers import handle_profile
                 await handle_profile(message)
@@ -353,6 +419,9 @@ class GromFitBot:
             elif module_name == "bonus":
                 from modules.bonus.handlers import handle_bonus
                 await handle_bonus(message)
+            elif module_name == "workouts":
+                from modules.workouts.handlers import handle_record_result
+                await handle_record_result(message)
             else:
                 await self.message_manager.replace_message(
                     message,
@@ -384,6 +453,8 @@ class GromFitBot:
             )
             return
         
+        progress = progress_snapshots.get(user)['level']
+        
         # Формируем статистику
         stats_text = (
             f"📊 <b>Ваша статистика</b>\n\n"
@@ -393,8 +464,8 @@ class GromFitBot:
             f"• Побед: <b>{user.get('duels_won', 0)}</b>\n"
             f"• Поражений: <b>{user.get('total_duels', 0) - user.get('duels_won', 0)}</b>\n\n"
             f"<b>Прогресс:</b>\n"
-            f"• Уровень: <b>{user.get('level', 1)}</b>\n"
-            f"• Опыт: <b>{user.get('experience', 0)}/1000</b>\n"
+            f"• Уровень: <b>{progress.level}</b>\n"
+            f"• Опыт: <b>{format_experience(progress)}</b>\n"
             f"• Очков: <b>{user.get('total_points', 0)}</b>\n\n"
             f"<b>Достижения:</b>\n"
             f"• Получено: <b>{user.get('achievements_count', 0)}/200</b>\n"
@@ -477,6 +548,8 @@ class GromFitBot:
         for i, user in enumerate(top_trainings, 1):
             tops_text += f"{i}. {user['nickname']} - {user['total_trainings']} тренировок\n"
         
+        tops_text += self._render_volume_tops(message.from_user.id)
+        
         tops_text += "\n<i>Соревнуйтесь и попадайте в топы!</i>"
         
         await self.message_manager.replace_message(
@@ -485,6 +558,39 @@ class GromFitBot:
             MainKeyboards.get_navigation_keyboard("tops")
         )
     
+    def _render_volume_tops(self, user_id: int) -> str:
+        """Рейтинг по поднятому объему: регион пользователя, его места и регионы"""
+        standing = leaderboards.rank(user_id)
+        region = standing['region'] or (self.db.get_user(user_id) or {}).get('region')
+        top_region = leaderboards.top(region, limit=5) if region else []
+        regions = leaderboards.regions_summary(limit=3)
+        
+        nicknames = self.db.get_nicknames(
+            [uid for uid, _ in top_region] + [item['leader_id'] for item in regions]
+        )
+        
+        text = f"\n<b>🏋️ По объему - {region or 'ваш регион'}:</b>\n"
+        if not top_region:
+            text += "Пока никто не записал тренировок\n"
+        for i, (uid, score) in enumerate(top_region, 1):
+            text += f"{i}. {nicknames.get(uid, uid)} - {score / 1000:.1f} т\n"
+        
+        if standing['regional_rank']:
+            text += (
+                f"<i>Ваше место: {standing['regional_rank']} из {standing['regional_total']} в регионе, "
+                f"{standing['global_rank']} из {standing['global_total']} в общем рейтинге</i>\n"
+            )
+        
+        if regions:
+            text += "\n<b>📍 Регионы:</b>\n"
+            for i, item in enumerate(regions, 1):
+                text += (
+                    f"{i}. {item['region']} - {item['total_score'] / 1000:.1f} т, "
+                    f"{item['participants']} чел. (лидер: {nicknames.get(item['leader_id'], item['leader_id'])})\n"
+                )
+        
+        return text
+    
     async def _handle_back_to_main_callback(self, callback: CallbackQuery):
         """Обработчик callback 'Назад в главное меню'"""
         user_id = callback.from_user.id
@@ -567,13 +673,33 @@ class GromFitBot:
         logger.info("✅ Все проверки пройдены успешно")
         logger.info("🚀 Бот запускается...")
         
+        # Запуск планировщика отложенных действий с сообщениями
+        message_scheduler.start(self.bot, self.db)
+        self.executor.start()
+        self.fsm_storage.start()
+        
+        # Остальные модули загружаются в фоне, не задерживая первые ответы
+        if self.config.LAZY_MODULES and self.config.MODULE_WARMUP_DELAY >= 0:
+            self._warmup_task = asyncio.create_task(self._warmup_modules())
+        startup_profiler.mark('bot_started')
+        
         try:
-            # Запуск polling
-            await self.dp.start_polling(
-                self.bot,
-                allowed_updates=self.dp.resolve_used_update_types(),
-                handle_signals=True
-            )
+            if self.config.BOT_MODE == 'webhook':
+                # Запуск сервера вебхука
+                from core.webhook import WebhookServer
+                
+                webhook_server = WebhookServer(self.bot, self.dp, self.config)
+                await webhook_server.run(allowed_updates=self.dp.resolve_used_update_types())
+            else:
+                # Запуск polling: получение ждет только свободного слота исполнителя
+                await self.bot.delete_webhook()
+                await self.dp.start_polling(
+                    self.bot,
+                    allowed_updates=self.dp.resolve_used_update_types(),
+                    handle_as_tasks=False,
+                    handle_signals=True,
+                    close_bot_session=False
+                )
         except KeyboardInterrupt:
             logger.info("🛑 Бот остановлен пользователем (Ctrl+C)")
         except Exception as e:
@@ -581,6 +707,17 @@ class GromFitBot:
             raise
         finally:
             # Завершение работы
+            if self._warmup_task:
+                self._warmup_task.cancel()
+            await self.executor.stop()
+            await message_scheduler.stop()
+            
+            # Пул отрисовки графиков есть, только если модуль статистики загружался
+            charts = sys.modules.get('modules.stats.charts')
+            if charts is not None:
+                charts.chart_renderer.shutdown()
+            
+            self.bot.session.log_metrics()
             await self.bot.session.close()
             logger.info("✅ Сессия бота закрыта")
 
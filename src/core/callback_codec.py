@@ -0,0 +1,133 @@
+"""
+Компактный кодек callback_data GromFitBot
+Данные кнопки - это маркер и base64 от байта действия и целых полей в формате
+varint, что укладывается в лимит Telegram в 64 байта. Действия
+регистрируются с номером и именами полей, при разборе получается
+именованный кортеж полей
+"""
+
+import base64
+import binascii
+from collections import namedtuple
+from typing import Optional, Dict, Tuple, Any
+
+# Первый символ закодированных данных (не встречается в строковых callback-ах)
+CALLBACK_MARKER = "~"
+
+# Ограничение Telegram на размер callback_data
+MAX_CALLBACK_BYTES = 64
+
+def _pack_varint(value: int, out: bytearray) -> None:
+    """Запись неотрицательного целого в формате varint (LEB128)"""
+    if value < 0:
+        raise ValueError(f"Отрицательное значение в callback_data: {value}")
+
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _unpack_varints(raw: bytes, offset: int) -> list:
+    """Чтение всех целых varint начиная со смещения"""
+    values = []
+    value = shift = 0
+
+    for byte in raw[offset:]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+
+    if shift:
+        raise ValueError("Оборванное значение varint")
+
+    return values
+
+class CallbackAction:
+    """Зарегистрированное действие: номер, имя и типизированные поля"""
+
+    def __init__(self, action_id: int, name: str, fields: Tuple[str, ...], protected: bool = False):
+        self.id = action_id
+        self.name = name
+        self.fields = fields
+        # Действие с побочными эффектами - повторные нажатия не выполняются заново
+        self.protected = protected
+        self.payload_type = namedtuple(f"{name.title().replace('_', '')}Payload", fields)
+
+    def pack(self, *args: int, **kwargs: int) -> str:
+        """Кодирование данных кнопки"""
+        payload = self.payload_type(*args, **kwargs)
+
+        raw = bytearray((self.id,))
+        for value in payload:
+            _pack_varint(int(value), raw)
+
+        data = CALLBACK_MARKER + base64.urlsafe_b64encode(bytes(raw)).rstrip(b"=").decode("ascii")
+        if len(data) > MAX_CALLBACK_BYTES:
+            raise ValueError(f"callback_data действия {self.name} длиннее {MAX_CALLBACK_BYTES} байт")
+
+        return data
+
+    def __repr__(self) -> str:
+        return f"CallbackAction({self.id}, {self.name!r}, {self.fields!r})"
+
+class CallbackCodec:
+    """Реестр действий и разбор закодированных callback_data"""
+
+    def __init__(self):
+        self._actions: Dict[int, CallbackAction] = {}
+
+    def register(self, action_id: int, name: str, fields: Tuple[str, ...] = (),
+                 protected: bool = False) -> CallbackAction:
+        """Регистрация действия (номер 0-255, уникальный)"""
+        if not 0 <= action_id <= 0xFF:
+            raise ValueError(f"Номер действия вне диапазона 0-255: {action_id}")
+        if action_id in self._actions:
+            raise ValueError(f"Действие {action_id} уже зарегистрировано: {self._actions[action_id].name}")
+
+        action = CallbackAction(action_id, name, tuple(fields), protected)
+        self._actions[action_id] = action
+        return action
+
+    @staticmethod
+    def _b64decode(encoded: str) -> bytes:
+        return base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+
+    def peek(self, data: Optional[str]) -> Optional[CallbackAction]:
+        """Действие закодированных данных без разбора полей"""
+        if not data or data[0] != CALLBACK_MARKER or len(data) < 3:
+            return None
+
+        try:
+            # Первые 2 символа base64 содержат байт действия целиком
+            action_id = self._b64decode(data[1:3])[0]
+        except (binascii.Error, ValueError, IndexError):
+            return None
+
+        return self._actions.get(action_id)
+
+    def decode(self, data: Optional[str]) -> Optional[Tuple[CallbackAction, Any]]:
+        """Разбор данных кнопки: (действие, именованный кортеж полей) или None"""
+        action = self.peek(data)
+        if action is None:
+            return None
+
+        try:
+            values = _unpack_varints(self._b64decode(data[1:]), 1)
+        except (binascii.Error, ValueError):
+            return None
+
+        if len(values) != len(action.fields):
+            return None
+
+        return action, action.payload_type(*values)
+
+    def is_protected(self, data: Optional[str]) -> bool:
+        """Требует ли действие защиты от повторного выполнения"""
+        action = self.peek(data)
+        return action is not None and action.protected
+
+# Общий реестр действий
+callback_codec = CallbackCodec()
@@ -4,6 +4,7 @@
 """
 
 import os
+import re
 import sys
 from pathlib import Path
 from dotenv import load_dotenv
@@ -35,6 +36,45 @@ class Config:
         self.WEB_PORT = int(os.getenv('WEB_PORT', '8080'))
         self.WEB_SECRET = os.getenv('WEB_SECRET', '')
         
+        # Режим получения обновлений: polling или webhook
+        self.BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+        self.WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+        self.WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+        
+        # Параллельная обработка обновлений: число дорожек и лимит одновременно принятых
+        self.UPDATE_LANES = int(os.getenv('UPDATE_LANES', '20'))
+        self.UPDATE_MAX_IN_FLIGHT = int(os.getenv('UPDATE_MAX_IN_FLIGHT', '1000'))
+        
+        # Время (сек), в течение которого повторное нажатие кнопки не выполняется заново
+        self.CALLBACK_DEDUP_TTL = float(os.getenv('CALLBACK_DEDUP_TTL', '5'))
+        
+        # HTTP-сессия Bot API: пул соединений, keep-alive, кэш DNS, таймауты и прокси
+        self.API_POOL_SIZE = int(os.getenv('API_POOL_SIZE', '100'))
+        self.API_POOL_PER_HOST = int(os.getenv('API_POOL_PER_HOST', '100'))
+        self.API_KEEPALIVE = float(os.getenv('API_KEEPALIVE', '30'))
+        self.API_DNS_TTL = int(os.getenv('API_DNS_TTL', '300'))
+        self.API_TIMEOUT = float(os.getenv('API_TIMEOUT', '60'))
+        self.API_METHOD_TIMEOUTS = self._parse_method_timeouts(os.getenv('API_METHOD_TIMEOUTS', ''))
+        self.API_PROXY = os.getenv('API_PROXY', '')
+        
+        # Состояния FSM: время жизни брошенного состояния, размер и свежесть кэша, период очистки (сек)
+        self.FSM_STATE_TTL = float(os.getenv('FSM_STATE_TTL', '86400'))
+        self.FSM_CACHE_SIZE = int(os.getenv('FSM_CACHE_SIZE', '10000'))
+        self.FSM_CACHE_TTL = float(os.getenv('FSM_CACHE_TTL', '2'))
+        self.FSM_SWEEP_INTERVAL = float(os.getenv('FSM_SWEEP_INTERVAL', '600'))
+        
+        # Время (сек), в течение которого реферальный переход ждет завершения регистрации
+        self.PENDING_REFERRAL_TTL = float(os.getenv('PENDING_REFERRAL_TTL', '86400'))
+        
+        # Период (сек) перечитывания региональных рейтингов из БД (записи других процессов)
+        self.LEADERBOARD_REFRESH_INTERVAL = float(os.getenv('LEADERBOARD_REFRESH_INTERVAL', '60'))
+        
+        # Загрузка модулей: по первому обновлению и фоновым прогревом через MODULE_WARMUP_DELAY сек
+        # (отрицательная задержка - без прогрева); PROFILE_STARTUP - замер памяти импорта модулей
+        self.LAZY_MODULES = os.getenv('LAZY_MODULES', 'True').lower() == 'true'
+        self.MODULE_WARMUP_DELAY = float(os.getenv('MODULE_WARMUP_DELAY', '1'))
+        self.PROFILE_STARTUP = os.getenv('PROFILE_STARTUP', 'False').lower() == 'true'
+        
         # Настройки S3 (для бэкапов)
         self.S3_ENDPOINT = os.getenv('S3_ENDPOINT', '')
         self.S3_ACCESS_KEY = os.getenv('S3_ACCESS_KEY', '')
@@ -125,6 +165,22 @@ class Config:
         
         return [region.strip() for region in regions_str.split(',') if region.strip()]
     
+    def _parse_method_timeouts(self, timeouts_str: str) -> dict:
+        """Парсинг таймаутов методов Bot API (sendPhoto=120,sendDocument=120)"""
+        timeouts = {}
+        
+        for item in timeouts_str.split(','):
+            if not item.strip():
+                continue
+        
+            try:
+                method, value = item.split('=', 1)
+                timeouts[method.strip()] = float(value)
+            except ValueError:
+                logger.warning(f"Неверный формат API_METHOD_TIMEOUTS: {item}")
+        
+        return timeouts
+    
     def validate(self) -> bool:
         """Валидация конфигурации"""
         errors = []
@@ -135,6 +191,18 @@ class Config:
         elif not self.BOT_TOKEN.startswith('8') or ':' not in self.BOT_TOKEN:
             errors.append("Неверный формат BOT_TOKEN")
         
+        # Проверка режима работы
+        if self.BOT_MODE not in ('polling', 'webhook'):
+            errors.append(f"Неизвестный BOT_MODE: {self.BOT_MODE}")
+        elif self.BOT_MODE == 'webhook':
+            if not self.WEBHOOK_URL:
+                errors.append("WEBHOOK_URL не установлен для режима webhook")
+            # Без секрета любой, кто знает URL, может присылать поддельные обновления
+            if not self.WEB_SECRET:
+                errors.append("WEB_SECRET не установлен для режима webhook")
+            elif not re.fullmatch(r'[A-Za-z0-9_-]{1,256}', self.WEB_SECRET):
+                errors.append("WEB_SECRET может содержать только A-Z, a-z, 0-9, _ и - (до 256 символов)")
+        
         # Проверка пути к БД
         if not self.DB_PATH:
             errors.append("DB_PATH не установлен")
@@ -238,6 +306,7 @@ class Config:
             f"  DB_PATH: {self.DB_PATH}\n"
             f"  ADMIN_IDS: {self.ADMIN_IDS}\n"
             f"  DEBUG_MODE: {self.DEBUG_MODE}\n"
+            f"  BOT_MODE: {self.BOT_MODE}\n"
             f"  START_TOKENS: {self.START_TOKENS}\n"
             f"  REFERRAL_BONUS: {self.REFERRAL_BONUS}\n"
             f"  ALLOWED_REGIONS: {self.ALLOWED_REGIONS[:3]}...\n"
@@ -5,21 +5,40 @@
 
 import sqlite3
 import logging
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from typing import Optional, Dict, List, Any, Tuple, Union
 from pathlib import Path
 import json
 
+from core.events import events, DUEL_WON, LEVEL_UP
+from core.progression import level_for, XP_REWARDS
+from core.ledger import (
+    Leg, TOKENS, DIAMONDS, BALANCE_COLUMNS, WALLET, OPENING, REWARDS, SHOP, DUELS,
+    CHECKPOINT_INTERVAL, credit, debit, counterparty_for, is_balanced
+)
+
 logger = logging.getLogger(__name__)
 
+# Бонус рефереру за приглашенного пользователя
+REFERRAL_BONUS = 10.0
+
 class Database:
     """Полный класс для работы с базой данных SQLite"""
     
+    # Версии данных пользователей (общие для всех экземпляров): растут при каждой записи
+    _user_versions: Dict[int, int] = {}
+    
     def __init__(self, db_path: str = "data/users.db"):
         self.db_path = Path(db_path)
         self._ensure_database()
         self._create_tables()
         self._create_indexes()
+        self._backfill_exercise_totals()
+        self._backfill_bonus_history()
+        self._backfill_ledger()
+        self._backfill_referral_closure()
+        self._backfill_referral_activity()
+        self._seed_achievement_counters()
         logger.info(f"База данных инициализирована: {self.db_path}")
     
     def _ensure_database(self):
@@ -80,7 +99,33 @@ class Database:
             )
             """,
             
-            # Таблица транзакций
+            # Таблица замыкания реферального графа: все пары (предок, потомок) с глубиной;
+            # bonus - начисленный предку бонус за этого реферала
+            """
+            CREATE TABLE IF NOT EXISTS referral_closure (
+                ancestor_id INTEGER NOT NULL,
+                descendant_id INTEGER NOT NULL,
+                depth INTEGER NOT NULL,
+                bonus REAL DEFAULT 0,
+                PRIMARY KEY (ancestor_id, descendant_id),
+                FOREIGN KEY (ancestor_id) REFERENCES users(telegram_id),
+                FOREIGN KEY (descendant_id) REFERENCES users(telegram_id)
+            )
+            """,
+            
+            # Таблица активности рефералов: сколько прямых рефералов последний раз
+            # заходили в бота в этот день (каждый реферал - ровно в одной строке)
+            """
+            CREATE TABLE IF NOT EXISTS referral_activity (
+                referrer_id INTEGER NOT NULL,
+                day DATE NOT NULL,
+                active_count INTEGER DEFAULT 0,
+                PRIMARY KEY (referrer_id, day),
+                FOREIGN KEY (referrer_id) REFERENCES users(telegram_id)
+            )
+            """,
+            
+            # Таблица транзакций (история до перехода на двойную запись, перенесена в ledger_*)
             """
             CREATE TABLE IF NOT EXISTS transactions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -94,6 +139,58 @@ class Database:
             )
             """,
             
+            # Счета двойной записи: кошельки пользователей (owner_id - Telegram ID,
+            # code 'wallet') и системные счета (owner_id 0); balance - текущий баланс
+            """
+            CREATE TABLE IF NOT EXISTS ledger_accounts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                owner_id INTEGER NOT NULL DEFAULT 0,
+                code TEXT NOT NULL,
+                currency TEXT NOT NULL,
+                balance REAL DEFAULT 0,
+                credited REAL DEFAULT 0,
+                debited REAL DEFAULT 0,
+                entries_count INTEGER DEFAULT 0,
+                UNIQUE (owner_id, code, currency)
+            )
+            """,
+            
+            # Проводки (только добавляются, не изменяются)
+            """
+            CREATE TABLE IF NOT EXISTS ledger_postings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                posting_type TEXT NOT NULL,
+                description TEXT,
+                metadata TEXT DEFAULT '{}',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            
+            # Записи проводок по счетам с балансом счета после записи
+            """
+            CREATE TABLE IF NOT EXISTS ledger_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                posting_id INTEGER NOT NULL,
+                account_id INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                balance_after REAL NOT NULL,
+                FOREIGN KEY (posting_id) REFERENCES ledger_postings(id),
+                FOREIGN KEY (account_id) REFERENCES ledger_accounts(id)
+            )
+            """,
+            
+            # Контрольные точки балансов (после каждой CHECKPOINT_INTERVAL-й записи счета)
+            """
+            CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+                account_id INTEGER NOT NULL,
+                entry_id INTEGER NOT NULL,
+                balance REAL NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (account_id, entry_id),
+                FOREIGN KEY (account_id) REFERENCES ledger_accounts(id)
+            )
+            """,
+            
             # Таблица достижений
             """
             CREATE TABLE IF NOT EXISTS achievements (
@@ -113,6 +210,17 @@ class Database:
             )
             """,
             
+            # Таблица счетчиков достижений (тренировки, дни бонусов, рефералы и т.д.)
+            """
+            CREATE TABLE IF NOT EXISTS achievement_counters (
+                user_id INTEGER NOT NULL,
+                counter TEXT NOT NULL,
+                value REAL DEFAULT 0,
+                PRIMARY KEY (user_id, counter),
+                FOREIGN KEY (user_id) REFERENCES users(telegram_id)
+            )
+            """,
+            
             # Таблица товаров магазина
             """
             CREATE TABLE IF NOT EXISTS shop_items (
@@ -163,6 +271,96 @@ class Database:
             )
             """,
             
+            # Каталог упражнений (канонические названия)
+            """
+            CREATE TABLE IF NOT EXISTS exercises (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                normalized TEXT UNIQUE NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            
+            # Таблица упражнений тренировок
+            """
+            CREATE TABLE IF NOT EXISTS workout_exercises (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                training_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                exercise_id INTEGER NOT NULL,
+                weight REAL DEFAULT 0,
+                sets INTEGER DEFAULT 0,
+                reps INTEGER DEFAULT 0,
+                duration_seconds INTEGER DEFAULT 0,
+                volume REAL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (training_id) REFERENCES trainings(id),
+                FOREIGN KEY (exercise_id) REFERENCES exercises(id),
+                FOREIGN KEY (user_id) REFERENCES users(telegram_id)
+            )
+            """,
+            
+            # Таблица личных рекордов по упражнениям
+            """
+            CREATE TABLE IF NOT EXISTS personal_records (
+                user_id INTEGER NOT NULL,
+                exercise_id INTEGER NOT NULL,
+                max_weight REAL DEFAULT 0,
+                best_set_volume REAL DEFAULT 0,
+                best_e1rm REAL DEFAULT 0,
+                total_volume REAL DEFAULT 0,
+                total_duration INTEGER DEFAULT 0,
+                sessions INTEGER DEFAULT 0,
+                last_date TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, exercise_id),
+                FOREIGN KEY (exercise_id) REFERENCES exercises(id),
+                FOREIGN KEY (user_id) REFERENCES users(telegram_id)
+            )
+            """,
+            
+            # Таблица региональных рейтингов (очки - поднятый объем, кг)
+            """
+            CREATE TABLE IF NOT EXISTS region_standings (
+                user_id INTEGER PRIMARY KEY,
+                region TEXT NOT NULL,
+                score REAL DEFAULT 0,
+                trainings INTEGER DEFAULT 0,
+                updated_at TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(telegram_id)
+            )
+            """,
+            
+            # Таблица серий ежедневных бонусов (одна строка на непрерывную серию дней)
+            """
+            CREATE TABLE IF NOT EXISTS bonus_streaks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                start_date DATE NOT NULL,
+                end_date DATE NOT NULL,
+                length INTEGER DEFAULT 1,
+                total_bonus REAL DEFAULT 0,
+                FOREIGN KEY (user_id) REFERENCES users(telegram_id)
+            )
+            """,
+            
+            # Таблица ежедневных бонусов по месяцам
+            """
+            CREATE TABLE IF NOT EXISTS bonus_monthly (
+                user_id INTEGER NOT NULL,
+                month TEXT NOT NULL,
+                count INTEGER DEFAULT 0,
+                total REAL DEFAULT 0,
+                max_bonus REAL,
+                max_bonus_date DATE,
+                min_bonus REAL,
+                min_bonus_date DATE,
+                PRIMARY KEY (user_id, month),
+                FOREIGN KEY (user_id) REFERENCES users(telegram_id)
+            )
+            """,
+            
             # Таблица дуэлей
             """
             CREATE TABLE IF NOT EXISTS duels (
@@ -200,6 +398,35 @@ class Database:
                 metadata TEXT DEFAULT '{}',
                 FOREIGN KEY (user_id) REFERENCES users(telegram_id)
             )
+            """,
+            
+            # Таблица отложенных удалений сообщений
+            """
+            CREATE TABLE IF NOT EXISTS scheduled_deletions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                delete_at REAL NOT NULL
+            )
+            """,
+            
+            # Таблица состояний FSM (общая для всех процессов бота)
+            """
+            CREATE TABLE IF NOT EXISTS fsm_states (
+                storage_key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL DEFAULT '{}',
+                updated_at REAL NOT NULL
+            )
+            """,
+            
+            # Таблица реферальных переходов незарегистрированных пользователей
+            """
+            CREATE TABLE IF NOT EXISTS pending_referrals (
+                telegram_id INTEGER PRIMARY KEY,
+                referrer_id INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )
             """
         ]
         
@@ -220,16 +447,31 @@ class Database:
             "CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)",
             "CREATE INDEX IF NOT EXISTS idx_users_registration_number ON users(registration_number)",
             "CREATE INDEX IF NOT EXISTS idx_users_referrer_id ON users(referrer_id)",
+            "CREATE INDEX IF NOT EXISTS idx_users_referrer_last_active ON users(referrer_id, last_active)",
             "CREATE INDEX IF NOT EXISTS idx_referral_connections_referrer ON referral_connections(referrer_id)",
             "CREATE INDEX IF NOT EXISTS idx_referral_connections_referred ON referral_connections(referred_id)",
+            "CREATE INDEX IF NOT EXISTS idx_referral_closure_ancestor_depth ON referral_closure(ancestor_id, depth, bonus)",
+            "CREATE INDEX IF NOT EXISTS idx_referral_closure_descendant ON referral_closure(descendant_id, depth)",
             "CREATE INDEX IF NOT EXISTS idx_transactions_user_id ON transactions(user_id)",
             "CREATE INDEX IF NOT EXISTS idx_transactions_created_at ON transactions(created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_ledger_entries_account ON ledger_entries(account_id, id)",
+            "CREATE INDEX IF NOT EXISTS idx_ledger_entries_posting ON ledger_entries(posting_id)",
             "CREATE INDEX IF NOT EXISTS idx_achievements_user_id ON achievements(user_id)",
+            "CREATE INDEX IF NOT EXISTS idx_achievements_user_achievement ON achievements(user_id, achievement_id)",
             "CREATE INDEX IF NOT EXISTS idx_shop_items_category ON shop_items(category)",
             "CREATE INDEX IF NOT EXISTS idx_purchases_user_id ON purchases(user_id)",
             "CREATE INDEX IF NOT EXISTS idx_trainings_user_date ON trainings(user_id, training_date)",
+            "CREATE INDEX IF NOT EXISTS idx_workout_exercises_training ON workout_exercises(training_id)",
+            "CREATE INDEX IF NOT EXISTS idx_workout_exercises_user_exercise ON workout_exercises(user_id, exercise_id)",
+            "CREATE INDEX IF NOT EXISTS idx_region_standings_region_score ON region_standings(region, score DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_region_standings_score ON region_standings(score DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_bonus_streaks_user_end ON bonus_streaks(user_id, end_date)",
+            "CREATE INDEX IF NOT EXISTS idx_bonus_streaks_user_length ON bonus_streaks(user_id, length DESC)",
             "CREATE INDEX IF NOT EXISTS idx_duels_status ON duels(status)",
-            "CREATE INDEX IF NOT EXISTS idx_notifications_user_read ON notifications(user_id, is_read)"
+            "CREATE INDEX IF NOT EXISTS idx_notifications_user_read ON notifications(user_id, is_read)",
+            "CREATE INDEX IF NOT EXISTS idx_scheduled_deletions_delete_at ON scheduled_deletions(delete_at)",
+            "CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states(updated_at)",
+            "CREATE INDEX IF NOT EXISTS idx_pending_referrals_created_at ON pending_referrals(created_at)"
         ]
         
         with self._get_connection() as conn:
@@ -263,6 +505,15 @@ class Database:
     
     # ==================== ОСНОВНЫЕ МЕТОДЫ РАБОТЫ С ПОЛЬЗОВАТЕЛЯМИ ====================
     
+    def get_user_version(self, telegram_id: int) -> int:
+        """Текущая версия данных пользователя (для кэширования отображений)"""
+        return self._user_versions.get(telegram_id, 0)
+    
+    def _bump_user_version(self, *telegram_ids: int) -> None:
+        """Увеличение версии данных пользователей после записи"""
+        for telegram_id in telegram_ids:
+            self._user_versions[telegram_id] = self._user_versions.get(telegram_id, 0) + 1
+    
     def get_user(self, telegram_id: int) -> Optional[Dict[str, Any]]:
         """Получение пользователя по Telegram ID"""
         try:
@@ -298,7 +549,12 @@ class Database:
             return None
     
     def create_user(self, user_data: Dict[str, Any]) -> bool:
-        """Создание нового пользователя"""
+        """
+        Создание нового пользователя
+        
+        Поле referrer_id сохраняется, только если реферальная связь создана,
+        поэтому по нему после создания видно, засчитано ли приглашение
+        """
         required_fields = ['telegram_id', 'registration_number', 'nickname']
         
         if not all(field in user_data for field in required_fields):
@@ -321,28 +577,25 @@ class Database:
                 
                 sql = f"INSERT INTO users ({', '.join(fields)}) VALUES ({', '.join(placeholders)})"
                 cursor.execute(sql, values)
+                self._open_ledger_accounts(cursor, user_data['telegram_id'], 'Стартовый баланс')
                 
-                # Если есть referrer_id, создаем реферальную связь
+                # Если есть referrer_id, создаем реферальную связь и начисляем бонус рефереру
+                ancestors = []
                 referrer_id = user_data.get('referrer_id')
                 if referrer_id:
-                    referral_data = {
-                        'referrer_id': referrer_id,
-                        'referred_id': user_data['telegram_id']
-                    }
-                    self.create_referral_connection(referral_data)
-                    
-                    # Начисляем бонус рефереру
-                    self.add_transaction(
-                        user_id=referrer_id,
-                        transaction_type='referral_bonus',
-                        amount=10.00,
-                        description=f'Бонус за приглашение пользователя {user_data["nickname"]}'
+                    ancestors = self._add_referral_edge(
+                        cursor, referrer_id, user_data['telegram_id'], REFERRAL_BONUS,
+                        f'Бонус за приглашение пользователя {user_data["nickname"]}'
                     )
-                    
-                    # Обновляем баланс реферера
-                    self.update_user_balance(referrer_id, 10.00)
+                    # Связь не создана (например, реферера нет) - реферер не сохраняется
+                    if not ancestors:
+                        cursor.execute(
+                            "UPDATE users SET referrer_id = NULL WHERE telegram_id = ?",
+                            (user_data['telegram_id'],)
+                        )
                 
                 conn.commit()
+                self._bump_user_version(user_data['telegram_id'], *ancestors)
                 logger.info(f"Создан пользователь: {user_data['nickname']} (ID: {user_data['telegram_id']})")
                 return True
                 
@@ -361,6 +614,10 @@ class Database:
         if not update_data:
             return False
         
+        if set(update_data) & set(BALANCE_COLUMNS.values()):
+            logger.error(f"Баланс пользователя {telegram_id} меняется только проводками (Database.post)")
+            return False
+        
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
@@ -378,7 +635,15 @@ class Database:
                 sql = f"UPDATE users SET {', '.join(set_clauses)} WHERE telegram_id = ?"
                 cursor.execute(sql, values)
                 
+                # Смена региона переносит пользователя в рейтинг нового региона
+                if 'region' in update_data:
+                    cursor.execute(
+                        "UPDATE region_standings SET region = ? WHERE user_id = ?",
+                        (update_data['region'], telegram_id)
+                    )
+                
                 conn.commit()
+                self._bump_user_version(telegram_id)
                 logger.debug(f"Обновлен пользователь {telegram_id}: {list(update_data.keys())}")
                 return True
                 
@@ -390,30 +655,44 @@ class Database:
         """Обновление одного поля пользователя"""
         return self.update_user(telegram_id, {field: value})
     
-    def update_user_balance(self, telegram_id: int, amount_change: float) -> bool:
-        """Обновление баланса токенов пользователя"""
+    def update_user_last_active(self, telegram_id: int) -> bool:
+        """Обновление времени последней активности (и дня активности у реферера)"""
+        now = datetime.now().isoformat()
+        
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Используем атомарное обновление
                 cursor.execute(
-                    "UPDATE users SET balance_tokens = balance_tokens + ? WHERE telegram_id = ?",
-                    (amount_change, telegram_id)
+                    "SELECT last_active, referrer_id FROM users WHERE telegram_id = ?",
+                    (telegram_id,)
                 )
+                row = cursor.fetchone()
+                if not row:
+                    return False
                 
-                conn.commit()
-                logger.debug(f"Баланс пользователя {telegram_id} изменен на {amount_change}")
-                return True
+                cursor.execute(
+                    "UPDATE users SET last_active = ? WHERE telegram_id = ?",
+                    (now, telegram_id)
+                )
                 
+                # Реферал переходит в корзину сегодняшнего дня только при первом заходе за день
+                previous_day = str(row['last_active'])[:10] if row['last_active'] else None
+                if row['referrer_id'] and previous_day != now[:10]:
+                    self._move_referral_activity(cursor, row['referrer_id'], previous_day, now[:10])
+                
+                conn.commit()
+            
+            # Свою версию пользователь не меняет: last_active не выводится в кэшируемых
+            # отображениях, иначе кэш сбрасывался бы на каждом входе в меню
+            if row['referrer_id'] and previous_day != now[:10]:
+                self._bump_user_version(row['referrer_id'])
+            return True
+            
         except Exception as e:
-            logger.error(f"Ошибка обновления баланса пользователя {telegram_id}: {e}")
+            logger.error(f"Ошибка обновления активности пользователя {telegram_id}: {e}")
             return False
     
-    def update_user_last_active(self, telegram_id: int) -> bool:
-        """Обновление времени последней активности"""
-        return self.update_user_field(telegram_id, 'last_active', datetime.now().isoformat())
-    
     def delete_user(self, telegram_id: int) -> bool:
         """Удаление пользователя"""
         try:
@@ -422,6 +701,7 @@ class Database:
                 cursor.execute("DELETE FROM users WHERE telegram_id = ?", (telegram_id,))
                 conn.commit()
                 
+                self._bump_user_version(telegram_id)
                 logger.info(f"Удален пользователь {telegram_id}")
                 return cursor.rowcount > 0
                 
@@ -474,8 +754,157 @@ class Database:
             logger.error(f"Ошибка получения топа по полю {field}: {e}")
             return []
     
+    # ==================== МЕТОДЫ ОПЫТА И УРОВНЕЙ ====================
+    
+    def _add_experience(self, cursor: sqlite3.Cursor, user_id: int, amount: int) -> Optional[Dict[str, Any]]:
+        """
+        Начисление опыта с пересчетом уровня (в транзакции вызывающего)
+        
+        Returns:
+            {'user_id', 'old_level', 'level', 'experience'} при повышении уровня, иначе None
+        """
+        cursor.execute(
+            "UPDATE users SET experience = experience + ? WHERE telegram_id = ?",
+            (amount, user_id)
+        )
+        cursor.execute("SELECT level, experience FROM users WHERE telegram_id = ?", (user_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        
+        # Уровень только растет (в том числе если был выставлен вручную)
+        level = level_for(row['experience'])
+        if level <= row['level']:
+            return None
+        
+        cursor.execute("UPDATE users SET level = ? WHERE telegram_id = ?", (level, user_id))
+        return {'user_id': user_id, 'old_level': row['level'], 'level': level, 'experience': row['experience']}
+    
+    def _publish_level_up(self, level_up: Optional[Dict[str, Any]]) -> None:
+        """Событие повышения уровня (после фиксации транзакции), подписчики пишут в эту же БД"""
+        if level_up:
+            logger.info(f"Пользователь {level_up['user_id']} достиг уровня {level_up['level']}")
+            events.publish(LEVEL_UP, db=self, **level_up)
+    
+    def add_experience(self, user_id: int, amount: int) -> bool:
+        """Начисление опыта пользователю"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                level_up = self._add_experience(cursor, user_id, amount)
+                conn.commit()
+            
+            self._bump_user_version(user_id)
+            self._publish_level_up(level_up)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка начисления опыта пользователю {user_id}: {e}")
+            return False
+    
     # ==================== МЕТОДЫ РЕФЕРАЛЬНОЙ СИСТЕМЫ ====================
     
+    def _add_referral_edge(self, cursor: sqlite3.Cursor, referrer_id: int, referred_id: int,
+                           bonus: float = 0.0, description: str = "") -> List[int]:
+        """
+        Реферальная связь с обновлением графа (в транзакции вызывающего)
+        
+        Returns:
+            Предки нового реферала (реферер и выше) или пустой список, если связь
+            невозможна (уже есть реферер, приглашение самого себя или цикл)
+        """
+        if referrer_id == referred_id:
+            return []
+        
+        cursor.execute("SELECT 1 FROM users WHERE telegram_id = ?", (referrer_id,))
+        if not cursor.fetchone():
+            logger.warning(f"Реферальная связь {referrer_id} -> {referred_id}: реферер не найден")
+            return []
+        
+        cursor.execute(
+            "SELECT 1 FROM referral_closure WHERE descendant_id = ? AND depth = 1",
+            (referred_id,)
+        )
+        if cursor.fetchone():
+            return []
+        
+        cursor.execute(
+            "SELECT 1 FROM referral_closure WHERE ancestor_id = ? AND descendant_id = ?",
+            (referred_id, referrer_id)
+        )
+        if cursor.fetchone():
+            logger.warning(f"Реферальная связь {referrer_id} -> {referred_id} образует цикл")
+            return []
+        
+        # В граф и связь бонус записывается, только если проводка прошла
+        if bonus > 0 and self._post(
+            cursor, 'referral_bonus', credit(referrer_id, REWARDS, bonus),
+            description or f'Бонус за приглашение пользователя {referred_id}',
+            {'referred_id': referred_id}
+        ) is None:
+            bonus = 0.0
+        
+        cursor.execute(
+            "INSERT INTO referral_connections (referrer_id, referred_id, bonus_paid) VALUES (?, ?, ?)",
+            (referrer_id, referred_id, 1 if bonus > 0 else 0)
+        )
+        
+        # Все предки реферера (и он сам) становятся предками реферала и его поддерева
+        cursor.execute(
+            """
+            INSERT INTO referral_closure (ancestor_id, descendant_id, depth, bonus)
+            SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1,
+                   CASE WHEN a.depth = 0 AND d.depth = 0 THEN ? ELSE 0 END
+            FROM (
+                SELECT ancestor_id, depth FROM referral_closure WHERE descendant_id = ?
+                UNION ALL SELECT ?, 0
+            ) a
+            CROSS JOIN (
+                SELECT descendant_id, depth FROM referral_closure WHERE ancestor_id = ?
+                UNION ALL SELECT ?, 0
+            ) d
+            """,
+            (bonus, referrer_id, referrer_id, referred_id, referred_id)
+        )
+        
+        cursor.execute(
+            "UPDATE users SET referrals_count = referrals_count + 1 WHERE telegram_id = ?",
+            (referrer_id,)
+        )
+        cursor.execute(
+            "UPDATE users SET referrer_id = ? WHERE telegram_id = ?",
+            (referrer_id, referred_id)
+        )
+        cursor.execute("SELECT last_active FROM users WHERE telegram_id = ?", (referred_id,))
+        row = cursor.fetchone()
+        if row and row['last_active']:
+            self._move_referral_activity(cursor, referrer_id, None, str(row['last_active'])[:10])
+        
+        cursor.execute(
+            "SELECT ancestor_id FROM referral_closure WHERE descendant_id = ? ORDER BY depth",
+            (referred_id,)
+        )
+        return [row['ancestor_id'] for row in cursor.fetchall()]
+    
+    def add_referral(self, referrer_id: int, referred_id: int, bonus: float = 0.0,
+                     description: str = "") -> bool:
+        """Добавление реферальной связи (с бонусом рефереру, если задан)"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                ancestors = self._add_referral_edge(cursor, referrer_id, referred_id, bonus, description)
+                if not ancestors:
+                    return False
+                
+                conn.commit()
+                self._bump_user_version(referred_id, *ancestors)
+                logger.info(f"Создана реферальная связь: {referrer_id} -> {referred_id}")
+                return True
+                
+        except Exception as e:
+            logger.error(f"Ошибка создания реферальной связи {referrer_id} -> {referred_id}: {e}")
+            return False
+    
     def create_referral_connection(self, connection_data: Dict[str, Any]) -> bool:
         """Создание реферальной связи"""
         required_fields = ['referrer_id', 'referred_id']
@@ -484,34 +913,167 @@ class Database:
             logger.error(f"Отсутствуют обязательные поля реферальной связи: {required_fields}")
             return False
         
+        return self.add_referral(connection_data['referrer_id'], connection_data['referred_id'])
+    
+    def _move_referral_activity(self, cursor: sqlite3.Cursor, referrer_id: int,
+                                old_day: Optional[str], new_day: str) -> None:
+        """Перенос реферала между днями активности реферера (в транзакции вызывающего)"""
+        if old_day:
+            cursor.execute(
+                """
+                UPDATE referral_activity SET active_count = active_count - 1
+                WHERE referrer_id = ? AND day = ?
+                """,
+                (referrer_id, old_day)
+            )
+            cursor.execute(
+                "DELETE FROM referral_activity WHERE referrer_id = ? AND day = ? AND active_count <= 0",
+                (referrer_id, old_day)
+            )
+        
+        cursor.execute(
+            """
+            INSERT INTO referral_activity (referrer_id, day, active_count) VALUES (?, ?, 1)
+            ON CONFLICT(referrer_id, day) DO UPDATE SET active_count = active_count + 1
+            """,
+            (referrer_id, new_day)
+        )
+    
+    def _backfill_referral_activity(self):
+        """Однократное заполнение дней активности рефералов по users.last_active"""
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
+                cursor.execute("SELECT 1 FROM referral_activity LIMIT 1")
+                if cursor.fetchone():
+                    return
+                
                 cursor.execute(
                     """
-                    INSERT INTO referral_connections (referrer_id, referred_id)
-                    VALUES (?, ?)
-                    """,
-                    (connection_data['referrer_id'], connection_data['referred_id'])
+                    INSERT INTO referral_activity (referrer_id, day, active_count)
+                    SELECT referrer_id, substr(last_active, 1, 10), COUNT(*)
+                    FROM users
+                    WHERE referrer_id IS NOT NULL AND last_active IS NOT NULL
+                    GROUP BY referrer_id, substr(last_active, 1, 10)
+                    """
                 )
+                conn.commit()
                 
-                # Обновляем счетчик рефералов у реферера
+        except Exception as e:
+            logger.error(f"Ошибка заполнения активности рефералов: {e}")
+    
+    def get_referral_activity(self, referrer_id: int) -> Dict[str, int]:
+        """
+        Число прямых рефералов, заходивших в бота сегодня, за 7 и за 30 дней
+        (не более 30 строк по индексу)
+        """
+        today = date.today()
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT COALESCE(SUM(CASE WHEN day >= ? THEN active_count END), 0) AS today,
+                           COALESCE(SUM(CASE WHEN day >= ? THEN active_count END), 0) AS week,
+                           COALESCE(SUM(active_count), 0) AS month
+                    FROM referral_activity
+                    WHERE referrer_id = ? AND day >= ?
+                    """,
+                    (
+                        today.isoformat(),
+                        (today - timedelta(days=6)).isoformat(),
+                        referrer_id,
+                        (today - timedelta(days=29)).isoformat()
+                    )
+                )
+                return dict(cursor.fetchone())
+        except Exception as e:
+            logger.error(f"Ошибка получения активности рефералов пользователя {referrer_id}: {e}")
+            return {'today': 0, 'week': 0, 'month': 0}
+    
+    def get_referrals_by_activity(self, referrer_id: int, active: bool = True,
+                                  days: int = 7, limit: int = 10) -> List[Dict[str, Any]]:
+        """Прямые рефералы, заходившие (или не заходившие) в бота за последние days дней"""
+        cutoff = (date.today() - timedelta(days=days - 1)).isoformat()
+        condition = "last_active >= ?" if active else "(last_active < ? OR last_active IS NULL)"
+        order = "last_active DESC" if active else "created_at DESC"
+        
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
                 cursor.execute(
-                    "UPDATE users SET referrals_count = referrals_count + 1 WHERE telegram_id = ?",
-                    (connection_data['referrer_id'],)
+                    f"""
+                    SELECT telegram_id, nickname, created_at, last_active FROM users
+                    WHERE referrer_id = ? AND {condition}
+                    ORDER BY {order} LIMIT ?
+                    """,
+                    (referrer_id, cutoff, limit)
                 )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения рефералов пользователя {referrer_id}: {e}")
+            return []
+    
+    def _backfill_referral_closure(self):
+        """Однократное построение графа по старым связям и полю users.referrer_id"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
                 
+                cursor.execute("SELECT 1 FROM referral_closure LIMIT 1")
+                if cursor.fetchone():
+                    return
+                
+                parents = {}
+                bonuses = {}
+                
+                def can_link(referrer_id: int, referred_id: int) -> bool:
+                    """Как в _add_referral_edge: один реферер, без самоприглашения и циклов"""
+                    if referred_id in parents:
+                        return False
+                    ancestor = referrer_id
+                    while ancestor is not None:
+                        if ancestor == referred_id:
+                            return False
+                        ancestor = parents.get(ancestor)
+                    return True
+                
+                # Связи из таблицы и приписанные рефереры без связи
+                cursor.execute("SELECT referrer_id, referred_id, bonus_paid FROM referral_connections ORDER BY id")
+                for row in cursor.fetchall():
+                    if can_link(row['referrer_id'], row['referred_id']):
+                        parents[row['referred_id']] = row['referrer_id']
+                        bonuses[row['referred_id']] = REFERRAL_BONUS if row['bonus_paid'] else 0
+                
+                cursor.execute("SELECT telegram_id, referrer_id FROM users WHERE referrer_id IS NOT NULL")
+                for row in cursor.fetchall():
+                    if can_link(row['referrer_id'], row['telegram_id']):
+                        parents[row['telegram_id']] = row['referrer_id']
+                    elif parents.get(row['telegram_id']) != row['referrer_id']:
+                        logger.warning(f"Реферальная связь {row['referrer_id']} -> {row['telegram_id']} пропущена")
+                
+                if not parents:
+                    return
+                
+                # Принятые связи не образуют циклов, путь до корня конечен
+                rows = []
+                for referred_id, referrer_id in parents.items():
+                    depth, ancestor = 1, referrer_id
+                    while ancestor is not None:
+                        rows.append((ancestor, referred_id, depth, bonuses.get(referred_id, 0) if depth == 1 else 0))
+                        ancestor = parents.get(ancestor)
+                        depth += 1
+                
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO referral_closure (ancestor_id, descendant_id, depth, bonus) VALUES (?, ?, ?, ?)",
+                    rows
+                )
                 conn.commit()
-                logger.info(f"Создана реферальная связь: {connection_data['referrer_id']} -> {connection_data['referred_id']}")
-                return True
+                logger.info(f"Реферальный граф построен: связей {len(parents)}, записей {len(rows)}")
                 
-        except sqlite3.IntegrityError:
-            logger.warning(f"Реферальная связь уже существует: {connection_data['referrer_id']} -> {connection_data['referred_id']}")
-            return False
         except Exception as e:
-            logger.error(f"Ошибка создания реферальной связи: {e}")
-            return False
+            logger.error(f"Ошибка построения реферального графа: {e}")
     
     def get_referrals(self, referrer_id: int) -> List[Dict[str, Any]]:
         """Получение списка рефералов пользователя"""
@@ -532,6 +1094,55 @@ class Database:
             logger.error(f"Ошибка получения рефералов пользователя {referrer_id}: {e}")
             return []
     
+    def get_referral_summary(self, user_id: int) -> Dict[str, Any]:
+        """
+        Сводка реферальной сети по графу
+        
+        Returns:
+            {'levels': {глубина: число рефералов}, 'network_size': размер поддерева,
+             'earned': заработанные бонусы}
+        """
+        summary = {'levels': {}, 'network_size': 0, 'earned': 0.0}
+        
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT depth, COUNT(*) AS referrals, COALESCE(SUM(bonus), 0) AS earned
+                    FROM referral_closure WHERE ancestor_id = ?
+                    GROUP BY depth ORDER BY depth
+                    """,
+                    (user_id,)
+                )
+                for row in cursor.fetchall():
+                    summary['levels'][row['depth']] = row['referrals']
+                    summary['network_size'] += row['referrals']
+                    summary['earned'] += row['earned']
+                return summary
+        except Exception as e:
+            logger.error(f"Ошибка получения реферальной сети пользователя {user_id}: {e}")
+            return summary
+    
+    def get_referral_network(self, user_id: int, max_depth: int = 1) -> List[Dict[str, Any]]:
+        """Рефералы пользователя до глубины max_depth (с полем depth)"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT u.*, c.depth FROM referral_closure c
+                    JOIN users u ON u.telegram_id = c.descendant_id
+                    WHERE c.ancestor_id = ? AND c.depth <= ?
+                    ORDER BY c.depth, u.created_at DESC
+                    """,
+                    (user_id, max_depth)
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения реферальной сети пользователя {user_id}: {e}")
+            return []
+    
     def get_referral_count(self, referrer_id: int) -> int:
         """Получение количества рефералов пользователя"""
         try:
@@ -586,102 +1197,421 @@ class Database:
             logger.error(f"Ошибка получения топ рефереров: {e}")
             return []
     
-    # ==================== МЕТОДЫ ТРАНЗАКЦИЙ ====================
+    # ==================== МЕТОДЫ ДВОЙНОЙ ЗАПИСИ ====================
     
-    def add_transaction(self, user_id: int, transaction_type: str, amount: float, 
-                       description: str = "", metadata: Dict = None) -> bool:
-        """Добавление транзакции"""
-        try:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                
-                metadata_json = json.dumps(metadata or {})
-                
-                cursor.execute(
-                    """
-                    INSERT INTO transactions (user_id, transaction_type, amount, description, metadata)
-                    VALUES (?, ?, ?, ?, ?)
-                    """,
-                    (user_id, transaction_type, amount, description, metadata_json)
-                )
-                
-                conn.commit()
-                logger.debug(f"Добавлена транзакция: {user_id}, {transaction_type}, {amount}")
-                return True
-                
-        except Exception as e:
-            logger.error(f"Ошибка добавления транзакции: {e}")
+    def _find_ledger_account(self, cursor: sqlite3.Cursor, account: Union[int, str],
+                             currency: str) -> Optional[sqlite3.Row]:
+        """Счет по ID пользователя (кошелек) или коду системного счета"""
+        owner_id, code = (account, WALLET) if isinstance(account, int) else (0, account)
+        cursor.execute(
+            "SELECT id, owner_id, balance FROM ledger_accounts WHERE owner_id = ? AND code = ? AND currency = ?",
+            (owner_id, code, currency)
+        )
+        return cursor.fetchone()
+    
+    def _open_ledger_accounts(self, cursor: sqlite3.Cursor, telegram_id: int,
+                              description: str = 'Начальный баланс') -> bool:
+        """
+        Кошельки пользователя во всех валютах (в транзакции вызывающего);
+        текущий баланс из users переносится проводкой со счета opening
+        
+        Returns:
+            False, если пользователь не найден
+        """
+        cursor.execute(
+            "SELECT balance_tokens, balance_diamonds FROM users WHERE telegram_id = ?",
+            (telegram_id,)
+        )
+        user = cursor.fetchone()
+        if not user:
             return False
+        
+        legs = []
+        for currency, column in BALANCE_COLUMNS.items():
+            if self._find_ledger_account(cursor, telegram_id, currency):
+                continue
+            cursor.execute(
+                "INSERT INTO ledger_accounts (owner_id, code, currency) VALUES (?, ?, ?)",
+                (telegram_id, WALLET, currency)
+            )
+            legs += credit(telegram_id, OPENING, round(float(user[column] or 0), 2), currency)
+        
+        if legs:
+            self._post(cursor, 'opening_balance', legs, description)
+        return True
     
-    def get_user_transactions(self, user_id: int, limit: int = 20, 
-                             offset: int = 0) -> List[Dict[str, Any]]:
-        """Получение транзакций пользователя"""
-        try:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
+    def _post(self, cursor: sqlite3.Cursor, posting_type: str, legs: List[Leg],
+              description: str = "", metadata: Dict = None) -> Optional[int]:
+        """
+        Проводка двойной записи (в транзакции вызывающего)
+        
+        Записи по одному счету складываются, сумма по каждой валюте должна быть
+        нулевой. Балансы счетов, их копии в users и контрольные точки обновляются
+        здесь же, поэтому денежная операция - это один вызов
+        
+        Returns:
+            ID проводки или None, если пользователь не найден или у него
+            недостаточно средств (проводка при этом ничего не записывает)
+        """
+        amounts: Dict[Tuple[Union[int, str], str], float] = {}
+        for leg in legs:
+            key = (leg.account, leg.currency)
+            amounts[key] = round(amounts.get(key, 0.0) + leg.amount, 2)
+        amounts = {key: amount for key, amount in amounts.items() if amount}
+        
+        if not amounts or not is_balanced(legs):
+            raise ValueError(f"Несбалансированная проводка {posting_type}: {legs}")
+        
+        accounts = {}
+        for account, currency in amounts:
+            row = self._find_ledger_account(cursor, account, currency)
+            
+            if row is None and isinstance(account, int):
+                if not self._open_ledger_accounts(cursor, account):
+                    logger.warning(f"Проводка {posting_type}: пользователь {account} не найден")
+                    return None
+                row = self._find_ledger_account(cursor, account, currency)
+            elif row is None:
                 cursor.execute(
-                    """
-                    SELECT * FROM transactions 
-                    WHERE user_id = ?
-                    ORDER BY created_at DESC
-                    LIMIT ? OFFSET ?
-                    """,
-                    (user_id, limit, offset)
+                    "INSERT INTO ledger_accounts (owner_id, code, currency) VALUES (0, ?, ?)",
+                    (account, currency)
                 )
-                return [dict(row) for row in cursor.fetchall()]
+                row = {'id': cursor.lastrowid, 'owner_id': 0, 'balance': 0.0}
+            
+            # Системные счета уходят в минус, кошельки пользователей - нет
+            if row['owner_id'] and row['balance'] + amounts[(account, currency)] < -0.005:
+                return None
+            accounts[(account, currency)] = row
+        
+        cursor.execute(
+            "INSERT INTO ledger_postings (posting_type, description, metadata) VALUES (?, ?, ?)",
+            (posting_type, description, json.dumps(metadata or {}))
+        )
+        posting_id = cursor.lastrowid
+        
+        for (account, currency), amount in amounts.items():
+            account_id = accounts[(account, currency)]['id']
+            cursor.execute(
+                """
+                UPDATE ledger_accounts
+                SET balance = ROUND(balance + ?, 2),
+                    credited = credited + ?,
+                    debited = debited + ?,
+                    entries_count = entries_count + 1
+                WHERE id = ? AND (owner_id = 0 OR balance + ? >= -0.005)
+                """,
+                (amount, max(amount, 0), max(-amount, 0), account_id, amount)
+            )
+            if cursor.rowcount == 0:
+                raise ValueError(f"Недостаточно средств на счете {account} ({currency}) при проводке {posting_type}")
+            
+            cursor.execute("SELECT balance, entries_count FROM ledger_accounts WHERE id = ?", (account_id,))
+            state = cursor.fetchone()
+            cursor.execute(
+                "INSERT INTO ledger_entries (posting_id, account_id, amount, balance_after) VALUES (?, ?, ?, ?)",
+                (posting_id, account_id, amount, state['balance'])
+            )
+            
+            if state['entries_count'] % CHECKPOINT_INTERVAL == 0:
+                cursor.execute(
+                    "INSERT INTO ledger_checkpoints (account_id, entry_id, balance) VALUES (?, ?, ?)",
+                    (account_id, cursor.lastrowid, state['balance'])
+                )
+            
+            if isinstance(account, int):
+                cursor.execute(
+                    f"UPDATE users SET {BALANCE_COLUMNS[currency]} = ? WHERE telegram_id = ?",
+                    (state['balance'], account)
+                )
+        
+        return posting_id
+    
+    def post(self, posting_type: str, legs: List[Leg], description: str = "",
+             metadata: Dict = None) -> Optional[int]:
+        """Проводка отдельной транзакцией БД (ID проводки или None)"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                posting_id = self._post(cursor, posting_type, legs, description, metadata)
+                if posting_id is None:
+                    return None
+                
+                conn.commit()
+                self._bump_user_version(*{leg.account for leg in legs if isinstance(leg.account, int)})
+                logger.debug(f"Проводка {posting_id} ({posting_type}): {legs}")
+                return posting_id
+        
         except Exception as e:
-            logger.error(f"Ошибка получения транзакций пользователя {user_id}: {e}")
-            return []
+            logger.error(f"Ошибка проводки {posting_type}: {e}")
+            return None
     
-    def get_transaction_summary(self, user_id: int, days: int = 30) -> Dict[str, Any]:
-        """Получение сводки по транзакциям"""
+    def update_user_balance(self, telegram_id: int, amount_change: float) -> bool:
+        """Корректировка баланса токенов пользователя (проводка со счета opening)"""
+        if not amount_change:
+            return True
+        return self.post(
+            'balance_adjustment', credit(telegram_id, OPENING, amount_change), 'Корректировка баланса'
+        ) is not None
+    
+    def add_transaction(self, user_id: int, transaction_type: str, amount: float,
+                       description: str = "", metadata: Dict = None) -> bool:
+        """Начисление (amount > 0) или списание токенов с системным счетом по типу операции"""
+        if not amount:
+            return True
+        return self.post(
+            transaction_type, credit(user_id, counterparty_for(transaction_type), amount),
+            description, metadata
+        ) is not None
+    
+    def _backfill_ledger(self):
+        """
+        Однократный перенос денег в двойную запись: начальные балансы (текущий
+        баланс минус старая история) и старые транзакции токенов по порядку
+        """
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Общий доход
+                cursor.execute("SELECT 1 FROM ledger_accounts LIMIT 1")
+                if cursor.fetchone():
+                    return
+                
+                cursor.execute("SELECT telegram_id, balance_tokens, balance_diamonds, created_at FROM users")
+                users = cursor.fetchall()
+                if not users:
+                    return
+                
                 cursor.execute(
                     """
-                    SELECT COALESCE(SUM(amount), 0) as total_income
+                    SELECT user_id, transaction_type, amount, description, metadata, created_at
                     FROM transactions
-                    WHERE user_id = ? AND amount > 0
-                    AND created_at >= datetime('now', '-' || ? || ' days')
+                    WHERE amount != 0
+                    ORDER BY id
+                    """
+                )
+                known_users = {user['telegram_id'] for user in users}
+                legacy = [row for row in cursor.fetchall() if row['user_id'] in known_users]
+                
+                legacy_totals: Dict[int, float] = {}
+                for row in legacy:
+                    legacy_totals[row['user_id']] = legacy_totals.get(row['user_id'], 0.0) + float(row['amount'])
+                
+                # (тип, описание, метаданные, дата, записи) в хронологическом порядке
+                postings = []
+                for user in users:
+                    legs = credit(
+                        user['telegram_id'], OPENING,
+                        round(float(user['balance_tokens'] or 0) - legacy_totals.get(user['telegram_id'], 0.0), 2)
+                    ) + credit(user['telegram_id'], OPENING, round(float(user['balance_diamonds'] or 0), 2), DIAMONDS)
+                    postings.append(('opening_balance', 'Начальный баланс', '{}', user['created_at'], legs))
+                
+                for row in legacy:
+                    postings.append((
+                        row['transaction_type'], row['description'], row['metadata'] or '{}', row['created_at'],
+                        credit(row['user_id'], counterparty_for(row['transaction_type']), round(float(row['amount']), 2))
+                    ))
+                
+                # Состояние счетов: [ID, баланс, приход, расход, записей]
+                accounts: Dict[Tuple[int, str, str], List] = {}
+                checkpoints = []
+                for user in users:
+                    for currency in BALANCE_COLUMNS:
+                        cursor.execute(
+                            "INSERT INTO ledger_accounts (owner_id, code, currency) VALUES (?, ?, ?)",
+                            (user['telegram_id'], WALLET, currency)
+                        )
+                        accounts[(user['telegram_id'], WALLET, currency)] = [cursor.lastrowid, 0.0, 0.0, 0.0, 0]
+                
+                for posting_type, description, metadata, created_at, legs in postings:
+                    if not legs:
+                        continue
+                    
+                    cursor.execute(
+                        """
+                        INSERT INTO ledger_postings (posting_type, description, metadata, created_at)
+                        VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                        """,
+                        (posting_type, description, metadata, created_at)
+                    )
+                    posting_id = cursor.lastrowid
+                    
+                    for leg in legs:
+                        key = (leg.account, WALLET, leg.currency) if isinstance(leg.account, int) else (0, leg.account, leg.currency)
+                        if key not in accounts:
+                            cursor.execute(
+                                "INSERT INTO ledger_accounts (owner_id, code, currency) VALUES (?, ?, ?)", key
+                            )
+                            accounts[key] = [cursor.lastrowid, 0.0, 0.0, 0.0, 0]
+                        
+                        state = accounts[key]
+                        state[1] = round(state[1] + leg.amount, 2)
+                        state[2 if leg.amount > 0 else 3] += abs(leg.amount)
+                        state[4] += 1
+                        cursor.execute(
+                            "INSERT INTO ledger_entries (posting_id, account_id, amount, balance_after) VALUES (?, ?, ?, ?)",
+                            (posting_id, state[0], leg.amount, state[1])
+                        )
+                        if state[4] % CHECKPOINT_INTERVAL == 0:
+                            checkpoints.append((state[0], cursor.lastrowid, state[1]))
+                
+                cursor.executemany(
+                    """
+                    UPDATE ledger_accounts
+                    SET balance = ?, credited = ?, debited = ?, entries_count = ?
+                    WHERE id = ?
                     """,
-                    (user_id, days)
+                    [(balance, credited, debited, count, account_id)
+                     for account_id, balance, credited, debited, count in accounts.values()]
+                )
+                cursor.executemany(
+                    "INSERT INTO ledger_checkpoints (account_id, entry_id, balance) VALUES (?, ?, ?)",
+                    checkpoints
                 )
-                total_income = cursor.fetchone()[0] or 0
                 
-                # Общие расходы
+                conn.commit()
+                logger.info(f"Двойная запись заполнена: пользователей {len(users)}, старых транзакций {len(legacy)}")
+        
+        except Exception as e:
+            logger.error(f"Ошибка переноса балансов в двойную запись: {e}")
+    
+    def get_ledger_account(self, user_id: int, currency: str = TOKENS) -> Dict[str, Any]:
+        """Кошелек пользователя: баланс, всего получено и потрачено (одна строка по ключу)"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
                 cursor.execute(
                     """
-                    SELECT COALESCE(SUM(amount), 0) as total_expense
-                    FROM transactions
-                    WHERE user_id = ? AND amount < 0
-                    AND created_at >= datetime('now', '-' || ? || ' days')
+                    SELECT balance, credited, debited, entries_count FROM ledger_accounts
+                    WHERE owner_id = ? AND code = ? AND currency = ?
                     """,
-                    (user_id, days)
+                    (user_id, WALLET, currency)
                 )
-                total_expense = cursor.fetchone()[0] or 0
+                row = cursor.fetchone()
+                if row:
+                    return dict(row)
+        except Exception as e:
+            logger.error(f"Ошибка получения счета пользователя {user_id} ({currency}): {e}")
+        
+        return {'balance': 0.0, 'credited': 0.0, 'debited': 0.0, 'entries_count': 0}
+    
+    def get_balance(self, user_id: int, currency: str = TOKENS) -> float:
+        """Текущий баланс пользователя в валюте"""
+        return float(self.get_ledger_account(user_id, currency)['balance'])
+    
+    def verify_ledger_account(self, user_id: int, currency: str = TOKENS) -> bool:
+        """
+        Сверка кошелька: последняя контрольная точка плюс записи после нее
+        должны дать текущий баланс счета и его копию в users
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
                 
-                # Количество транзакций
                 cursor.execute(
                     """
-                    SELECT COUNT(*) as transaction_count
-                    FROM transactions
-                    WHERE user_id = ?
-                    AND created_at >= datetime('now', '-' || ? || ' days')
+                    SELECT a.id, a.balance, u.{column} AS user_balance
+                    FROM ledger_accounts a
+                    LEFT JOIN users u ON u.telegram_id = a.owner_id
+                    WHERE a.owner_id = ? AND a.code = ? AND a.currency = ?
+                    """.format(column=BALANCE_COLUMNS[currency]),
+                    (user_id, WALLET, currency)
+                )
+                account = cursor.fetchone()
+                if not account:
+                    return False
+                
+                cursor.execute(
+                    "SELECT entry_id, balance FROM ledger_checkpoints WHERE account_id = ? ORDER BY entry_id DESC LIMIT 1",
+                    (account['id'],)
+                )
+                checkpoint = cursor.fetchone()
+                entry_id, balance = (checkpoint['entry_id'], checkpoint['balance']) if checkpoint else (0, 0.0)
+                
+                cursor.execute(
+                    "SELECT COALESCE(SUM(amount), 0) FROM ledger_entries WHERE account_id = ? AND id > ?",
+                    (account['id'], entry_id)
+                )
+                expected = round(balance + cursor.fetchone()[0], 2)
+                
+                consistent = abs(expected - account['balance']) < 0.005
+                if account['user_balance'] is not None:
+                    consistent = consistent and abs(float(account['user_balance']) - account['balance']) < 0.005
+                
+                if not consistent:
+                    logger.warning(
+                        f"Баланс пользователя {user_id} ({currency}) не сходится: счет {account['balance']}, "
+                        f"по записям {expected}, в профиле {account['user_balance']}"
+                    )
+                return consistent
+        
+        except Exception as e:
+            logger.error(f"Ошибка сверки счета пользователя {user_id} ({currency}): {e}")
+            return False
+    
+    def get_user_transactions(self, user_id: int, limit: int = 20,
+                             offset: int = 0, transaction_type: Optional[str] = None,
+                             currency: str = TOKENS, before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        История кошелька пользователя, новые записи первыми (при transaction_type -
+        только этого типа; before_id - страница после записи с этим ID)
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                filters, params = "", [user_id, user_id, WALLET, currency]
+                if transaction_type:
+                    filters += " AND p.posting_type = ?"
+                    params.append(transaction_type)
+                if before_id:
+                    filters += " AND e.id < ?"
+                    params.append(before_id)
+                
+                cursor.execute(
+                    f"""
+                    SELECT e.id, e.posting_id, ? AS user_id, p.posting_type AS transaction_type,
+                           e.amount, e.balance_after - e.amount AS balance_before, e.balance_after,
+                           p.description, p.metadata, p.created_at, a.currency
+                    FROM ledger_accounts a
+                    JOIN ledger_entries e ON e.account_id = a.id
+                    JOIN ledger_postings p ON p.id = e.posting_id
+                    WHERE a.owner_id = ? AND a.code = ? AND a.currency = ? {filters}
+                    ORDER BY e.id DESC
+                    LIMIT ? OFFSET ?
                     """,
-                    (user_id, days)
+                    params + [limit, offset]
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения транзакций пользователя {user_id}: {e}")
+            return []
+    
+    def get_transaction_summary(self, user_id: int, days: int = 30) -> Dict[str, Any]:
+        """Получение сводки по транзакциям токенов"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT COALESCE(SUM(CASE WHEN e.amount > 0 THEN e.amount END), 0) AS total_income,
+                           COALESCE(SUM(CASE WHEN e.amount < 0 THEN e.amount END), 0) AS total_expense,
+                           COUNT(*) AS transaction_count
+                    FROM ledger_accounts a
+                    JOIN ledger_entries e ON e.account_id = a.id
+                    JOIN ledger_postings p ON p.id = e.posting_id
+                    WHERE a.owner_id = ? AND a.code = ? AND a.currency = ?
+                    AND p.created_at >= datetime('now', '-' || ? || ' days')
+                    """,
+                    (user_id, WALLET, TOKENS, days)
                 )
-                transaction_count = cursor.fetchone()[0] or 0
+                row = cursor.fetchone()
                 
                 return {
-                    'total_income': total_income,
-                    'total_expense': total_expense,
-                    'transaction_count': transaction_count,
-                    'net_change': total_income + total_expense  # expense отрицательный
+                    'total_income': row['total_income'],
+                    'total_expense': row['total_expense'],
+                    'transaction_count': row['transaction_count'],
+                    'net_change': row['total_income'] + row['total_expense']  # expense отрицательный
                 }
-                
+        
         except Exception as e:
             logger.error(f"Ошибка получения сводки транзакций пользователя {user_id}: {e}")
             return {'total_income': 0, 'total_expense': 0, 'transaction_count': 0, 'net_change': 0}
@@ -741,19 +1671,19 @@ class Database:
                 )
                 
                 # Начисляем награду если есть
-                reward_tokens = achievement_data.get('reward_tokens', 0)
-                reward_diamonds = achievement_data.get('reward_diamonds', 0)
-                
-                if reward_tokens > 0:
-                    self.update_user_balance(user_id, reward_tokens)
-                    self.add_transaction(
-                        user_id=user_id,
-                        transaction_type='achievement_reward',
-                        amount=reward_tokens,
-                        description=f'Награда за достижение: {achievement_data["title"]}'
+                reward_legs = (
+                    credit(user_id, REWARDS, achievement_data.get('reward_tokens', 0))
+                    + credit(user_id, REWARDS, achievement_data.get('reward_diamonds', 0), DIAMONDS)
+                )
+                if reward_legs:
+                    self._post(
+                        cursor, 'achievement_reward', reward_legs,
+                        f'Награда за достижение: {achievement_data["title"]}',
+                        {'achievement_id': achievement_data['achievement_id']}
                     )
                 
                 conn.commit()
+                self._bump_user_version(user_id)
                 logger.info(f"Добавлено достижение {achievement_data['achievement_id']} пользователю {user_id}")
                 return True
                 
@@ -840,6 +1770,140 @@ class Database:
             logger.error(f"Ошибка обновления прогресса достижения: {e}")
             return False
     
+    def _seed_achievement_counters(self):
+        """Начальные значения счетчиков достижений по уже накопленной статистике"""
+        seeds = [
+            "SELECT telegram_id, 'registrations', 1 FROM users",
+            "SELECT telegram_id, 'workouts', total_trainings FROM users WHERE total_trainings > 0",
+            "SELECT telegram_id, 'referrals', referrals_count FROM users WHERE referrals_count > 0",
+            "SELECT telegram_id, 'duel_wins', duels_won FROM users WHERE duels_won > 0",
+            "SELECT user_id, 'workout_volume', SUM(volume) FROM workout_exercises GROUP BY user_id",
+            "SELECT user_id, 'bonus_days', SUM(count) FROM bonus_monthly GROUP BY user_id",
+            "SELECT user_id, 'bonus_streak', MAX(length) FROM bonus_streaks GROUP BY user_id",
+            "SELECT user_id, 'purchases', COUNT(*) FROM purchases GROUP BY user_id",
+            "SELECT user_id, 'tokens_spent', SUM(price_tokens) FROM purchases GROUP BY user_id"
+        ]
+        
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("SELECT 1 FROM achievement_counters LIMIT 1")
+                if cursor.fetchone():
+                    return
+                
+                for seed_sql in seeds:
+                    cursor.execute(f"INSERT OR IGNORE INTO achievement_counters (user_id, counter, value) {seed_sql}")
+                
+                conn.commit()
+                
+        except Exception as e:
+            logger.error(f"Ошибка заполнения счетчиков достижений: {e}")
+    
+    def apply_achievement_counters(self, user_id: int, increments: Dict[str, float],
+                                   maxima: Dict[str, float],
+                                   rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Обновление счетчиков достижений и выдача достигнутых одной транзакцией
+        
+        Args:
+            increments: счетчики-суммы и их приращения
+            maxima: счетчики-максимумы и новые значения
+            rules: правила-кандидаты (achievement_id, counter, threshold, title, ...)
+            
+        Returns:
+            Список новых достижений пользователя
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.executemany(
+                    """
+                    INSERT INTO achievement_counters (user_id, counter, value) VALUES (?, ?, ?)
+                    ON CONFLICT(user_id, counter) DO UPDATE SET value = value + excluded.value
+                    """,
+                    [(user_id, counter, value) for counter, value in increments.items()]
+                )
+                cursor.executemany(
+                    """
+                    INSERT INTO achievement_counters (user_id, counter, value) VALUES (?, ?, ?)
+                    ON CONFLICT(user_id, counter) DO UPDATE SET value = MAX(value, excluded.value)
+                    """,
+                    [(user_id, counter, value) for counter, value in maxima.items()]
+                )
+                
+                counter_names = list({rule['counter'] for rule in rules})
+                if not counter_names:
+                    conn.commit()
+                    return []
+                
+                placeholders = ', '.join('?' * len(counter_names))
+                cursor.execute(
+                    f"SELECT counter, value FROM achievement_counters WHERE user_id = ? AND counter IN ({placeholders})",
+                    [user_id] + counter_names
+                )
+                counters = {row['counter']: row['value'] for row in cursor.fetchall()}
+                
+                reached = [rule for rule in rules if counters.get(rule['counter'], 0) >= rule['threshold']]
+                if reached:
+                    placeholders = ', '.join('?' * len(reached))
+                    cursor.execute(
+                        f"SELECT achievement_id FROM achievements WHERE user_id = ? AND achievement_id IN ({placeholders})",
+                        [user_id] + [rule['achievement_id'] for rule in reached]
+                    )
+                    unlocked_ids = {row['achievement_id'] for row in cursor.fetchall()}
+                    reached = [rule for rule in reached if rule['achievement_id'] not in unlocked_ids]
+                
+                if reached:
+                    cursor.executemany(
+                        """
+                        INSERT INTO achievements (
+                            user_id, achievement_id, title, description, icon,
+                            category, reward_tokens, reward_diamonds
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        [
+                            (user_id, rule['achievement_id'], rule['title'], rule['description'], rule['icon'],
+                             rule['category'], rule['reward_tokens'], rule['reward_diamonds'])
+                            for rule in reached
+                        ]
+                    )
+                    
+                    # Счетчик достижений и награды (проводка на каждое достижение)
+                    cursor.execute(
+                        "UPDATE users SET achievements_count = achievements_count + ? WHERE telegram_id = ?",
+                        (len(reached), user_id)
+                    )
+                    for rule in reached:
+                        reward_legs = (
+                            credit(user_id, REWARDS, rule['reward_tokens'])
+                            + credit(user_id, REWARDS, rule['reward_diamonds'], DIAMONDS)
+                        )
+                        if reward_legs:
+                            self._post(
+                                cursor, 'achievement_reward', reward_legs,
+                                f"Награда за достижение: {rule['title']}",
+                                {'achievement_id': rule['achievement_id']}
+                            )
+                    level_up = self._add_experience(cursor, user_id, XP_REWARDS['achievement'] * len(reached))
+                
+                conn.commit()
+                
+                if reached:
+                    self._bump_user_version(user_id)
+                    logger.info(
+                        f"Пользователь {user_id} получил достижения: "
+                        f"{', '.join(rule['achievement_id'] for rule in reached)}"
+                    )
+                    self._publish_level_up(level_up)
+                
+                return reached
+                
+        except Exception as e:
+            logger.error(f"Ошибка обновления счетчиков достижений пользователя {user_id}: {e}")
+            return []
+    
     # ==================== МЕТОДЫ МАГАЗИНА ====================
     
     def add_shop_item(self, item_data: Dict[str, Any]) -> bool:
@@ -937,6 +2001,18 @@ class Database:
             logger.error(f"Ошибка получения товара {item_id}: {e}")
             return None
     
+    def get_shop_item_by_id(self, row_id: int) -> Optional[Dict[str, Any]]:
+        """Получение товара по числовому ID записи (используется в callback_data)"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM shop_items WHERE id = ?", (row_id,))
+                row = cursor.fetchone()
+                return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Ошибка получения товара #{row_id}: {e}")
+            return None
+    
     def purchase_item(self, user_id: int, item_id: str, quantity: int = 1) -> Dict[str, Any]:
         """Покупка товара"""
         try:
@@ -968,16 +2044,17 @@ class Database:
                     return {'success': False, 'error': 'Недостаточно алмазов'}
                 
                 # Выполняем покупку
-                # 1. Обновляем баланс пользователя
-                cursor.execute(
-                    """
-                    UPDATE users 
-                    SET balance_tokens = balance_tokens - ?,
-                        balance_diamonds = balance_diamonds - ?
-                    WHERE telegram_id = ?
-                    """,
-                    (total_price_tokens, total_price_diamonds, user_id)
+                # 1. Списываем оплату одной проводкой (до остальных записей: при нехватке
+                # средств проводка ничего не пишет)
+                payment_legs = (
+                    debit(user_id, SHOP, total_price_tokens)
+                    + debit(user_id, SHOP, total_price_diamonds, DIAMONDS)
                 )
+                if payment_legs and self._post(
+                    cursor, 'purchase', payment_legs, f'Покупка: {item["name"]} x{quantity}',
+                    {'item_id': item_id, 'quantity': quantity}
+                ) is None:
+                    return {'success': False, 'error': 'Недостаточно средств'}
                 
                 # 2. Добавляем запись о покупке
                 cursor.execute(
@@ -1009,16 +2086,9 @@ class Database:
                         (quantity, item_id)
                     )
                 
-                # 4. Добавляем транзакцию
-                self.add_transaction(
-                    user_id=user_id,
-                    transaction_type='purchase',
-                    amount=-total_price_tokens,
-                    description=f'Покупка: {item["name"]} x{quantity}'
-                )
-                
                 conn.commit()
                 
+                self._bump_user_version(user_id)
                 logger.info(f"Пользователь {user_id} купил товар {item_id} x{quantity}")
                 
                 return {
@@ -1085,6 +2155,7 @@ class Database:
                 streak_multiplier = 1.2
                 
                 # Проверяем серию дней
+                streak_continues = False
                 if last_streak_date:
                     last_streak = datetime.fromisoformat(last_streak_date.replace('Z', '+00:00')).date()
                     days_diff = (date.today() - last_streak).days
@@ -1092,6 +2163,7 @@ class Database:
                     if days_diff == 1:
                         # Серия продолжается
                         daily_streak += 1
+                        streak_continues = True
                     elif days_diff == 0:
                         # Уже получал сегодня
                         return {'success': False, 'error': 'Бонус уже получен сегодня'}
@@ -1110,26 +2182,29 @@ class Database:
                 cursor.execute(
                     """
                     UPDATE users 
-                    SET balance_tokens = balance_tokens + ?,
-                        last_bonus_claim = ?,
+                    SET last_bonus_claim = ?,
                         daily_streak = ?,
                         last_streak_date = ?
                     WHERE telegram_id = ?
                     """,
-                    (bonus_amount, datetime.now().isoformat(), daily_streak, current_date, user_id)
+                    (datetime.now().isoformat(), daily_streak, current_date, user_id)
                 )
                 
-                # Добавляем транзакцию
-                self.add_transaction(
-                    user_id=user_id,
-                    transaction_type='daily_bonus',
-                    amount=bonus_amount,
-                    description=f'Ежедневный бонус (серия: {daily_streak} дней)'
+                # Начисляем бонус (в той же транзакции БД)
+                self._post(
+                    cursor, 'daily_bonus', credit(user_id, REWARDS, bonus_amount),
+                    f'Ежедневный бонус (серия: {daily_streak} дней)', {'daily_streak': daily_streak}
                 )
                 
+                # Серии и помесячные итоги для статистики и рекордов
+                self._record_bonus_history(cursor, user_id, date.today(), bonus_amount, streak_continues)
+                level_up = self._add_experience(cursor, user_id, XP_REWARDS['daily_bonus'])
+                
                 conn.commit()
                 
+                self._bump_user_version(user_id)
                 logger.info(f"Пользователь {user_id} получил ежедневный бонус: {bonus_amount} (серия: {daily_streak})")
+                self._publish_level_up(level_up)
                 
                 return {
                     'success': True,
@@ -1159,6 +2234,185 @@ class Database:
         except:
             return True
     
+    # ==================== МЕТОДЫ ИСТОРИИ БОНУСОВ ====================
+    
+    def _record_bonus_history(self, cursor: sqlite3.Cursor, user_id: int, bonus_date: date,
+                              amount: float, streak_continues: bool) -> None:
+        """Учет бонуса в сериях и помесячных итогах (в транзакции вызывающего)"""
+        day = bonus_date.isoformat()
+        
+        updated = 0
+        if streak_continues:
+            cursor.execute(
+                """
+                UPDATE bonus_streaks
+                SET end_date = ?, length = length + 1, total_bonus = total_bonus + ?
+                WHERE id = (
+                    SELECT id FROM bonus_streaks WHERE user_id = ?
+                    ORDER BY end_date DESC, id DESC LIMIT 1
+                )
+                """,
+                (day, amount, user_id)
+            )
+            updated = cursor.rowcount
+        
+        if not updated:
+            cursor.execute(
+                """
+                INSERT INTO bonus_streaks (user_id, start_date, end_date, length, total_bonus)
+                VALUES (?, ?, ?, 1, ?)
+                """,
+                (user_id, day, day, amount)
+            )
+        
+        cursor.execute(
+            """
+            INSERT INTO bonus_monthly (user_id, month, count, total,
+                                       max_bonus, max_bonus_date, min_bonus, min_bonus_date)
+            VALUES (?, ?, 1, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, month) DO UPDATE SET
+                count = count + 1,
+                total = total + excluded.total,
+                max_bonus_date = CASE WHEN excluded.max_bonus > max_bonus
+                                      THEN excluded.max_bonus_date ELSE max_bonus_date END,
+                max_bonus = MAX(max_bonus, excluded.max_bonus),
+                min_bonus_date = CASE WHEN excluded.min_bonus < min_bonus
+                                      THEN excluded.min_bonus_date ELSE min_bonus_date END,
+                min_bonus = MIN(min_bonus, excluded.min_bonus)
+            """,
+            (user_id, day[:7], amount, amount, day, amount, day)
+        )
+    
+    def _backfill_bonus_history(self):
+        """Однократное заполнение серий и помесячных итогов по старым транзакциям бонусов"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("SELECT 1 FROM bonus_streaks LIMIT 1")
+                if cursor.fetchone():
+                    return
+                
+                cursor.execute(
+                    """
+                    SELECT user_id, amount, created_at FROM transactions
+                    WHERE transaction_type = 'daily_bonus' AND created_at IS NOT NULL
+                    ORDER BY user_id, created_at, id
+                    """
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    return
+                
+                previous_user, previous_day = None, None
+                for row in rows:
+                    bonus_day = date.fromisoformat(str(row['created_at'])[:10])
+                    same_user = row['user_id'] == previous_user
+                    
+                    # Повторный бонус за тот же день не меняет серию
+                    if same_user and bonus_day == previous_day:
+                        continue
+                    
+                    continues = same_user and (bonus_day - previous_day).days == 1
+                    self._record_bonus_history(cursor, row['user_id'], bonus_day, row['amount'], continues)
+                    previous_user, previous_day = row['user_id'], bonus_day
+                
+                conn.commit()
+                logger.info(f"История бонусов заполнена по {len(rows)} транзакциям")
+                
+        except Exception as e:
+            logger.error(f"Ошибка заполнения истории бонусов: {e}")
+    
+    def get_bonus_history(self, user_id: int, months: int = 3) -> Dict[str, Any]:
+        """
+        Итоги ежедневных бонусов пользователя: суммы, крайние бонусы,
+        самая длинная серия и последние месяцы
+        """
+        history = {
+            'total_count': 0,
+            'total_amount': 0.0,
+            'max_bonus': None,
+            'min_bonus': None,
+            'longest_streak': None,
+            'months': []
+        }
+        
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(
+                    """
+                    SELECT COALESCE(SUM(count), 0) AS total_count,
+                           COALESCE(SUM(total), 0) AS total_amount
+                    FROM bonus_monthly WHERE user_id = ?
+                    """,
+                    (user_id,)
+                )
+                row = cursor.fetchone()
+                history['total_count'] = row['total_count']
+                history['total_amount'] = row['total_amount']
+                if not history['total_count']:
+                    return history
+                
+                cursor.execute(
+                    """
+                    SELECT max_bonus AS amount, max_bonus_date AS date FROM bonus_monthly
+                    WHERE user_id = ? ORDER BY max_bonus DESC, max_bonus_date LIMIT 1
+                    """,
+                    (user_id,)
+                )
+                history['max_bonus'] = dict(cursor.fetchone())
+                
+                cursor.execute(
+                    """
+                    SELECT min_bonus AS amount, min_bonus_date AS date FROM bonus_monthly
+                    WHERE user_id = ? ORDER BY min_bonus, min_bonus_date LIMIT 1
+                    """,
+                    (user_id,)
+                )
+                history['min_bonus'] = dict(cursor.fetchone())
+                
+                # День серии, на который пришелся максимальный бонус
+                cursor.execute(
+                    """
+                    SELECT start_date FROM bonus_streaks
+                    WHERE user_id = ? AND start_date <= ? AND end_date >= ?
+                    LIMIT 1
+                    """,
+                    (user_id, history['max_bonus']['date'], history['max_bonus']['date'])
+                )
+                row = cursor.fetchone()
+                history['max_bonus']['streak'] = (
+                    (date.fromisoformat(history['max_bonus']['date']) - date.fromisoformat(row['start_date'])).days + 1
+                    if row else 1
+                )
+                
+                cursor.execute(
+                    """
+                    SELECT start_date, end_date, length, total_bonus FROM bonus_streaks
+                    WHERE user_id = ? ORDER BY length DESC, end_date DESC LIMIT 1
+                    """,
+                    (user_id,)
+                )
+                row = cursor.fetchone()
+                history['longest_streak'] = dict(row) if row else None
+                
+                cursor.execute(
+                    """
+                    SELECT month, count, total, max_bonus FROM bonus_monthly
+                    WHERE user_id = ? ORDER BY month DESC LIMIT ?
+                    """,
+                    (user_id, months)
+                )
+                history['months'] = [dict(row) for row in reversed(cursor.fetchall())]
+                
+                return history
+                
+        except Exception as e:
+            logger.error(f"Ошибка получения истории бонусов пользователя {user_id}: {e}")
+            return history
+    
     # ==================== МЕТОДЫ ТРЕНИРОВОК ====================
     
     def add_training(self, user_id: int, training_data: Dict[str, Any]) -> bool:
@@ -1207,6 +2461,7 @@ class Database:
                 )
                 
                 conn.commit()
+                self._bump_user_version(user_id)
                 logger.info(f"Добавлена тренировка пользователя {user_id}: {training_data['training_type']}")
                 return True
                 
@@ -1214,6 +2469,96 @@ class Database:
             logger.error(f"Ошибка добавления тренировки пользователя {user_id}: {e}")
             return False
     
+    def add_workout_log(self, user_id: int, entries: List[Tuple], 
+                        training_type: str = 'Силовая', notes: str = '') -> Optional[Dict[str, Any]]:
+        """
+        Сохранение всей тренировки и личных рекордов одной транзакцией
+        
+        Args:
+            entries: Упражнения (ID упражнения, вес, подходы, повторения, длительность в сек, объем)
+        
+        Returns:
+            {'training_id': ID тренировки, 'records': побитые рекорды,
+             'standing': регион и очки в рейтинге} или None
+        """
+        if not entries:
+            return None
+        
+        duration_minutes = sum(entry[4] for entry in entries) // 60
+        
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(
+                    """
+                    INSERT INTO trainings (
+                        user_id, training_type, duration_minutes, exercises_count, notes
+                    ) VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (user_id, training_type, duration_minutes, len(entries), notes)
+                )
+                training_id = cursor.lastrowid
+                
+                # Все упражнения - одним executemany
+                cursor.executemany(
+                    """
+                    INSERT INTO workout_exercises (
+                        training_id, user_id, position, exercise_id,
+                        weight, sets, reps, duration_seconds, volume
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    [
+                        (training_id, user_id, position, exercise_id, weight, sets, reps, duration, volume)
+                        for position, (exercise_id, weight, sets, reps, duration, volume) in enumerate(entries, 1)
+                    ]
+                )
+                
+                records = self._update_personal_records(cursor, user_id, entries)
+                standing = self._add_region_score(cursor, user_id, sum(entry[5] for entry in entries))
+                
+                cursor.execute(
+                    """
+                    UPDATE users 
+                    SET total_trainings = total_trainings + 1,
+                        last_training_date = ?,
+                        total_points = total_points + 10
+                    WHERE telegram_id = ?
+                    """,
+                    (datetime.now().isoformat(), user_id)
+                )
+                level_up = self._add_experience(cursor, user_id, XP_REWARDS['workout'])
+                
+                conn.commit()
+                self._bump_user_version(user_id)
+                logger.info(f"Добавлена тренировка пользователя {user_id}: упражнений {len(entries)}")
+                self._publish_level_up(level_up)
+                return {'training_id': training_id, 'records': records, 'standing': standing}
+                
+        except Exception as e:
+            logger.error(f"Ошибка сохранения тренировки пользователя {user_id}: {e}")
+            return None
+    
+    def get_training_exercises(self, training_id: int) -> List[Dict[str, Any]]:
+        """Упражнения тренировки по порядку"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT we.*, e.name AS exercise
+                    FROM workout_exercises we
+                    JOIN exercises e ON e.id = we.exercise_id
+                    WHERE we.training_id = ?
+                    ORDER BY we.position
+                    """,
+                    (training_id,)
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения упражнений тренировки {training_id}: {e}")
+            return []
+    
     def get_user_trainings(self, user_id: int, limit: int = 20, 
                           offset: int = 0) -> List[Dict[str, Any]]:
         """Получение тренировок пользователя"""
@@ -1295,6 +2640,389 @@ class Database:
                 'favorite_type_count': 0
             }
     
+    def get_workout_totals(self, user_id: int) -> Dict[str, Any]:
+        """Итоги тренировок пользователя по накопленным счетчикам упражнений"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT (SELECT total_trainings FROM users WHERE telegram_id = ?) AS total_workouts,
+                           SUM(total_volume) AS total_volume,
+                           SUM(total_duration) AS total_duration,
+                           COUNT(*) AS exercises_count
+                    FROM personal_records
+                    WHERE user_id = ?
+                    """,
+                    (user_id, user_id)
+                )
+                return dict(cursor.fetchone())
+        except Exception as e:
+            logger.error(f"Ошибка получения итогов тренировок пользователя {user_id}: {e}")
+            return {'total_workouts': 0, 'total_volume': 0, 'total_duration': 0, 'exercises_count': 0}
+    
+    def get_top_exercises(self, user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
+        """Упражнения пользователя с наибольшим поднятым объемом"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT e.name AS exercise,
+                           pr.sessions AS workouts_count,
+                           pr.total_volume,
+                           pr.max_weight
+                    FROM personal_records pr
+                    JOIN exercises e ON e.id = pr.exercise_id
+                    WHERE pr.user_id = ?
+                    ORDER BY pr.total_volume DESC
+                    LIMIT ?
+                    """,
+                    (user_id, limit)
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения топа упражнений пользователя {user_id}: {e}")
+            return []
+    
+    def get_daily_volume(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        """Поднятый объем по дням тренировок за период"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT DATE(t.training_date) AS date,
+                           SUM(we.volume) AS daily_volume
+                    FROM trainings t
+                    JOIN workout_exercises we ON we.training_id = t.id
+                    WHERE t.user_id = ?
+                    AND t.training_date >= DATE('now', '-' || ? || ' days')
+                    GROUP BY DATE(t.training_date)
+                    ORDER BY date
+                    """,
+                    (user_id, days)
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения объема по дням пользователя {user_id}: {e}")
+            return []
+    
+    def get_volume_leaders(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Пользователи с наибольшим поднятым объемом (по общему рейтингу region_standings)"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT u.nickname, u.username,
+                           rs.trainings AS workouts_count,
+                           rs.score AS total_volume,
+                           ROUND(rs.score / rs.trainings) AS avg_volume
+                    FROM region_standings rs
+                    JOIN users u ON u.telegram_id = rs.user_id
+                    WHERE rs.score > 0
+                    ORDER BY rs.score DESC
+                    LIMIT ?
+                    """,
+                    (limit,)
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения лидеров по объему: {e}")
+            return []
+    
+    # ==================== МЕТОДЫ КАТАЛОГА УПРАЖНЕНИЙ ====================
+    
+    def get_exercises(self) -> List[Dict[str, Any]]:
+        """Все упражнения каталога"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT id, name, normalized FROM exercises ORDER BY id")
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения каталога упражнений: {e}")
+            return []
+    
+    def add_exercise(self, name: str, normalized: str) -> Optional[int]:
+        """Добавление упражнения в каталог (или ID уже существующего)"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "INSERT OR IGNORE INTO exercises (name, normalized) VALUES (?, ?)",
+                    (name, normalized)
+                )
+                cursor.execute("SELECT id FROM exercises WHERE normalized = ?", (normalized,))
+                row = cursor.fetchone()
+                conn.commit()
+                return row['id'] if row else None
+        except Exception as e:
+            logger.error(f"Ошибка добавления упражнения {name}: {e}")
+            return None
+    
+    # ==================== МЕТОДЫ ЛИЧНЫХ РЕКОРДОВ ====================
+    
+    @staticmethod
+    def estimate_one_rep_max(weight: float, reps: int) -> float:
+        """Оценка разового максимума по формуле Эпли (надежна до 12 повторений)"""
+        if weight <= 0 or reps <= 0 or reps > 12:
+            return 0.0
+        if reps == 1:
+            return weight
+        return round(weight * (1 + reps / 30), 1)
+    
+    def _update_personal_records(self, cursor: sqlite3.Cursor, user_id: int, 
+                                 entries: List[Tuple]) -> List[Dict[str, Any]]:
+        """
+        Обновление рекордов по упражнениям тренировки (в транзакции вызывающего)
+        
+        Каждое упражнение сравнивается только со своей строкой рекордов,
+        история тренировок не перечитывается.
+        
+        Здесь же копятся итоги упражнения (объем, время, число тренировок), по
+        которым строится статистика без агрегации всей истории.
+        
+        Returns:
+            Побитые рекорды: ID упражнения, новые и прежние значения, список побитых показателей
+        """
+        if not entries:
+            return []
+        
+        exercise_ids = list(dict.fromkeys(entry[0] for entry in entries))
+        placeholders = ', '.join('?' * len(exercise_ids))
+        cursor.execute(
+            f"""
+            SELECT exercise_id, max_weight, best_set_volume, best_e1rm
+            FROM personal_records
+            WHERE user_id = ? AND exercise_id IN ({placeholders})
+            """,
+            [user_id] + exercise_ids
+        )
+        previous = {row['exercise_id']: dict(row) for row in cursor.fetchall()}
+        current = {exercise_id: dict(record) for exercise_id, record in previous.items()}
+        
+        totals = {exercise_id: [0.0, 0] for exercise_id in exercise_ids}
+        
+        for exercise_id, weight, sets, reps, duration, volume in entries:
+            record = current.setdefault(
+                exercise_id, {'exercise_id': exercise_id, 'max_weight': 0.0, 'best_set_volume': 0.0, 'best_e1rm': 0.0}
+            )
+            totals[exercise_id][0] += volume
+            totals[exercise_id][1] += duration
+            if weight <= 0 or reps <= 0:
+                continue
+            
+            record['max_weight'] = max(record['max_weight'], weight)
+            record['best_set_volume'] = max(record['best_set_volume'], weight * reps)
+            record['best_e1rm'] = max(record['best_e1rm'], self.estimate_one_rep_max(weight, reps))
+        
+        now = datetime.now().isoformat()
+        broken_records = []
+        
+        for exercise_id in exercise_ids:
+            record = current[exercise_id]
+            before = previous.get(exercise_id)
+            broken = [
+                field for field in ('max_weight', 'best_set_volume', 'best_e1rm')
+                if record[field] > (before[field] if before else 0)
+            ]
+            if broken:
+                broken_records.append({
+                    **record,
+                    'broken': broken,
+                    'previous': before if before and before['max_weight'] else None,
+                    'is_first': not (before and before['max_weight'])
+                })
+        
+        cursor.executemany(
+            """
+            INSERT INTO personal_records (
+                user_id, exercise_id, max_weight, best_set_volume, best_e1rm,
+                total_volume, total_duration, sessions, last_date, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+            ON CONFLICT(user_id, exercise_id) DO UPDATE SET
+                max_weight = excluded.max_weight,
+                best_set_volume = excluded.best_set_volume,
+                best_e1rm = excluded.best_e1rm,
+                total_volume = personal_records.total_volume + excluded.total_volume,
+                total_duration = personal_records.total_duration + excluded.total_duration,
+                sessions = personal_records.sessions + 1,
+                last_date = excluded.last_date,
+                updated_at = CASE WHEN personal_records.max_weight < excluded.max_weight
+                                    OR personal_records.best_set_volume < excluded.best_set_volume
+                                    OR personal_records.best_e1rm < excluded.best_e1rm
+                             THEN excluded.updated_at ELSE personal_records.updated_at END
+            """,
+            [
+                (user_id, exercise_id, current[exercise_id]['max_weight'],
+                 current[exercise_id]['best_set_volume'], current[exercise_id]['best_e1rm'],
+                 totals[exercise_id][0], totals[exercise_id][1], now, now)
+                for exercise_id in exercise_ids
+            ]
+        )
+        
+        return broken_records
+    
+    def get_personal_records(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """Личные рекорды пользователя по убыванию разового максимума"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT pr.*, e.name AS exercise
+                    FROM personal_records pr
+                    JOIN exercises e ON e.id = pr.exercise_id
+                    WHERE pr.user_id = ? AND pr.max_weight > 0
+                    ORDER BY pr.best_e1rm DESC, pr.max_weight DESC
+                    LIMIT ?
+                    """,
+                    (user_id, limit)
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения рекордов пользователя {user_id}: {e}")
+            return []
+    
+    def get_personal_record(self, user_id: int, exercise_id: int) -> Optional[Dict[str, Any]]:
+        """Рекорд пользователя в упражнении"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT * FROM personal_records WHERE user_id = ? AND exercise_id = ?",
+                    (user_id, exercise_id)
+                )
+                row = cursor.fetchone()
+                return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Ошибка получения рекорда пользователя {user_id}: {e}")
+            return None
+    
+    def _backfill_exercise_totals(self):
+        """Однократное заполнение итогов упражнений в personal_records по истории тренировок"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                
+                # Колонки итогов появились позже таблицы рекордов
+                cursor.execute("PRAGMA table_info(personal_records)")
+                columns = {row['name'] for row in cursor.fetchall()}
+                for column, definition in (('total_volume', 'REAL DEFAULT 0'),
+                                           ('total_duration', 'INTEGER DEFAULT 0'),
+                                           ('sessions', 'INTEGER DEFAULT 0')):
+                    if column not in columns:
+                        cursor.execute(f"ALTER TABLE personal_records ADD COLUMN {column} {definition}")
+                conn.commit()
+                
+                cursor.execute("SELECT 1 FROM personal_records WHERE sessions > 0 LIMIT 1")
+                if cursor.fetchone():
+                    return
+                
+                cursor.execute(
+                    """
+                    SELECT user_id, exercise_id, training_id, weight, reps, duration_seconds, volume, created_at
+                    FROM workout_exercises ORDER BY id
+                    """
+                )
+                totals: Dict[Tuple[int, int], Dict[str, Any]] = {}
+                for row in cursor.fetchall():
+                    item = totals.setdefault((row['user_id'], row['exercise_id']), {
+                        'max_weight': 0.0, 'best_set_volume': 0.0, 'best_e1rm': 0.0,
+                        'total_volume': 0.0, 'total_duration': 0, 'trainings': set(), 'last_date': None
+                    })
+                    item['total_volume'] += row['volume'] or 0
+                    item['total_duration'] += row['duration_seconds'] or 0
+                    item['trainings'].add(row['training_id'])
+                    item['last_date'] = row['created_at']
+                    if (row['weight'] or 0) > 0 and (row['reps'] or 0) > 0:
+                        item['max_weight'] = max(item['max_weight'], row['weight'])
+                        item['best_set_volume'] = max(item['best_set_volume'], row['weight'] * row['reps'])
+                        item['best_e1rm'] = max(item['best_e1rm'], self.estimate_one_rep_max(row['weight'], row['reps']))
+                
+                if not totals:
+                    return
+                
+                cursor.executemany(
+                    """
+                    INSERT INTO personal_records (
+                        user_id, exercise_id, max_weight, best_set_volume, best_e1rm,
+                        total_volume, total_duration, sessions, last_date
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(user_id, exercise_id) DO UPDATE SET
+                        max_weight = MAX(personal_records.max_weight, excluded.max_weight),
+                        best_set_volume = MAX(personal_records.best_set_volume, excluded.best_set_volume),
+                        best_e1rm = MAX(personal_records.best_e1rm, excluded.best_e1rm),
+                        total_volume = excluded.total_volume,
+                        total_duration = excluded.total_duration,
+                        sessions = excluded.sessions
+                    """,
+                    [
+                        (user_id, exercise_id, item['max_weight'], item['best_set_volume'], item['best_e1rm'],
+                         item['total_volume'], item['total_duration'], len(item['trainings']), item['last_date'])
+                        for (user_id, exercise_id), item in totals.items()
+                    ]
+                )
+                conn.commit()
+                logger.info(f"Итоги упражнений перенесены из истории тренировок: записей {len(totals)}")
+                
+        except Exception as e:
+            logger.error(f"Ошибка заполнения итогов упражнений: {e}")
+    
+    # ==================== МЕТОДЫ РЕГИОНАЛЬНЫХ РЕЙТИНГОВ ====================
+    
+    def _add_region_score(self, cursor: sqlite3.Cursor, user_id: int, score: float) -> Optional[Dict[str, Any]]:
+        """Начисление очков тренировки в рейтинг (в транзакции вызывающего)"""
+        cursor.execute(
+            """
+            INSERT INTO region_standings (user_id, region, score, trainings, updated_at)
+            SELECT telegram_id, COALESCE(region, 'Не указан'), ?, 1, ?
+            FROM users WHERE telegram_id = ?
+            ON CONFLICT(user_id) DO UPDATE SET
+                score = score + excluded.score,
+                trainings = trainings + 1,
+                updated_at = excluded.updated_at
+            """,
+            (score, datetime.now().isoformat(), user_id)
+        )
+        cursor.execute(
+            "SELECT user_id, region, score FROM region_standings WHERE user_id = ?",
+            (user_id,)
+        )
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    
+    def get_region_standings(self) -> List[Dict[str, Any]]:
+        """Очки и регионы всех участников рейтинга"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT user_id, region, score FROM region_standings")
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения региональных рейтингов: {e}")
+            return []
+    
+    def get_nicknames(self, telegram_ids: List[int]) -> Dict[int, str]:
+        """Никнеймы пользователей одним запросом"""
+        if not telegram_ids:
+            return {}
+        
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                placeholders = ', '.join('?' * len(telegram_ids))
+                cursor.execute(
+                    f"SELECT telegram_id, nickname FROM users WHERE telegram_id IN ({placeholders})",
+                    list(telegram_ids)
+                )
+                return {row['telegram_id']: row['nickname'] for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"Ошибка получения никнеймов: {e}")
+            return {}
+    
     # ==================== МЕТОДЫ ДУЭЛЕЙ ====================
     
     def create_duel(self, duel_data: Dict[str, Any]) -> bool:
@@ -1389,47 +3117,26 @@ class Database:
                     (winner_id,)
                 )
                 
-                # Обрабатываем ставки
+                # Обрабатываем ставки: проигравший отдает ставку, победитель получает
+                # двойную ставку (вторую половину доплачивает счет дуэлей)
                 wager = duel.get('wager_tokens', 0)
                 if wager > 0:
-                    # Переводим ставки победителю
                     loser_id = duel['challenger_id'] if winner_id == duel['opponent_id'] else duel['opponent_id']
                     
-                    cursor.execute(
-                        """
-                        UPDATE users 
-                        SET balance_tokens = balance_tokens + ?
-                        WHERE telegram_id = ?
-                        """,
-                        (wager * 2, winner_id)
-                    )
-                    
-                    cursor.execute(
-                        """
-                        UPDATE users 
-                        SET balance_tokens = balance_tokens - ?
-                        WHERE telegram_id = ?
-                        """,
-                        (wager, loser_id)
-                    )
-                    
-                    # Добавляем транзакции
-                    self.add_transaction(
-                        user_id=winner_id,
-                        transaction_type='duel_win',
-                        amount=wager * 2,
-                        description=f'Победа в дуэли {duel_id}'
-                    )
-                    
-                    self.add_transaction(
-                        user_id=loser_id,
-                        transaction_type='duel_loss',
-                        amount=-wager,
-                        description=f'Проигрыш в дуэли {duel_id}'
+                    settled = self._post(
+                        cursor, 'duel_settlement',
+                        debit(loser_id, DUELS, wager) + credit(winner_id, DUELS, wager * 2),
+                        f'Итог дуэли {duel_id}', {'duel_id': duel_id, 'winner_id': winner_id}
                     )
+                    if settled is None:
+                        raise ValueError(f"Недостаточно токенов для ставки у пользователя {loser_id}")
                 
                 conn.commit()
+                self._bump_user_version(duel['challenger_id'], duel['opponent_id'])
                 logger.info(f"Обновлен результат дуэли {duel_id}: победитель {winner_id}")
+                
+                # Результат дуэли записывается только здесь - отсюда и событие победы
+                events.publish(DUEL_WON, user_id=winner_id, duel_id=duel_id, db=self)
                 return True
                 
         except Exception as e:
@@ -1584,6 +3291,202 @@ class Database:
             logger.error(f"Ошибка получения количества непрочитанных уведомлений пользователя {user_id}: {e}")
             return 0
     
+    # ==================== МЕТОДЫ ОТЛОЖЕННЫХ УДАЛЕНИЙ ====================
+    
+    def add_scheduled_deletion(self, chat_id: int, message_id: int, delete_at: float) -> Optional[int]:
+        """Сохранение отложенного удаления сообщения"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "INSERT INTO scheduled_deletions (chat_id, message_id, delete_at) VALUES (?, ?, ?)",
+                    (chat_id, message_id, delete_at)
+                )
+                conn.commit()
+                return cursor.lastrowid
+        except Exception as e:
+            logger.error(f"Ошибка сохранения отложенного удаления сообщения {message_id}: {e}")
+            return None
+    
+    def get_scheduled_deletions(self) -> List[Dict[str, Any]]:
+        """Получение всех ожидающих удалений сообщений"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT id, chat_id, message_id, delete_at FROM scheduled_deletions ORDER BY delete_at"
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения отложенных удалений: {e}")
+            return []
+    
+    def remove_scheduled_deletions(self, deletion_ids: List[int]) -> bool:
+        """Удаление выполненных записей отложенных удалений"""
+        if not deletion_ids:
+            return True
+        
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    "DELETE FROM scheduled_deletions WHERE id = ?",
+                    [(deletion_id,) for deletion_id in deletion_ids]
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка удаления записей отложенных удалений: {e}")
+            return False
+    
+    def remove_scheduled_deletion(self, chat_id: int, message_id: int) -> bool:
+        """Удаление отмененного отложенного удаления сообщения"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "DELETE FROM scheduled_deletions WHERE chat_id = ? AND message_id = ?",
+                    (chat_id, message_id)
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка отмены отложенного удаления сообщения {message_id}: {e}")
+            return False
+    
+    # ==================== МЕТОДЫ СОСТОЯНИЙ FSM ====================
+    
+    def enable_wal(self) -> bool:
+        """Включение журнала WAL (чтение не блокируется записью из других процессов)"""
+        try:
+            with self._get_connection() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка включения WAL: {e}")
+            return False
+    
+    def get_fsm_record(self, storage_key: str) -> Optional[Dict[str, Any]]:
+        """Получение состояния и данных FSM по ключу"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT state, data, updated_at FROM fsm_states WHERE storage_key = ?",
+                    (storage_key,)
+                )
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                
+                return {
+                    'state': row['state'],
+                    'data': json.loads(row['data']),
+                    'updated_at': row['updated_at']
+                }
+        except Exception as e:
+            logger.error(f"Ошибка получения состояния FSM {storage_key}: {e}")
+            return None
+    
+    def set_fsm_state(self, storage_key: str, state: Optional[str], updated_at: float) -> bool:
+        """Запись состояния FSM (данные не затрагиваются)"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO fsm_states (storage_key, state, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(storage_key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at
+                """, (storage_key, state, updated_at))
+                cursor.execute(
+                    "DELETE FROM fsm_states WHERE storage_key = ? AND state IS NULL AND data = '{}'",
+                    (storage_key,)
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка записи состояния FSM {storage_key}: {e}")
+            return False
+    
+    def set_fsm_data(self, storage_key: str, data: Dict[str, Any], updated_at: float) -> bool:
+        """Запись данных FSM (состояние не затрагивается)"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO fsm_states (storage_key, data, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(storage_key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+                """, (storage_key, json.dumps(data, ensure_ascii=False), updated_at))
+                cursor.execute(
+                    "DELETE FROM fsm_states WHERE storage_key = ? AND state IS NULL AND data = '{}'",
+                    (storage_key,)
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка записи данных FSM {storage_key}: {e}")
+            return False
+    
+    def delete_expired_fsm_states(self, before: float) -> int:
+        """Удаление состояний FSM, не обновлявшихся с указанного момента"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM fsm_states WHERE updated_at < ?", (before,))
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Ошибка удаления устаревших состояний FSM: {e}")
+            return 0
+    
+    # ==================== МЕТОДЫ ОЖИДАЮЩИХ РЕФЕРАЛОВ ====================
+    
+    def save_pending_referral(self, telegram_id: int, referrer_id: int, created_at: float) -> bool:
+        """Сохранение реферального перехода до завершения регистрации"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "INSERT OR REPLACE INTO pending_referrals (telegram_id, referrer_id, created_at) VALUES (?, ?, ?)",
+                    (telegram_id, referrer_id, created_at)
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка сохранения реферального перехода {telegram_id}: {e}")
+            return False
+    
+    def pop_pending_referral(self, telegram_id: int, created_after: float) -> Optional[int]:
+        """Получение и удаление реферального перехода (устаревший не возвращается)"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT referrer_id, created_at FROM pending_referrals WHERE telegram_id = ?",
+                    (telegram_id,)
+                )
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                
+                cursor.execute("DELETE FROM pending_referrals WHERE telegram_id = ?", (telegram_id,))
+                conn.commit()
+                return row['referrer_id'] if row['created_at'] >= created_after else None
+        except Exception as e:
+            logger.error(f"Ошибка получения реферального перехода {telegram_id}: {e}")
+            return None
+    
+    def delete_expired_pending_referrals(self, before: float) -> int:
+        """Удаление устаревших реферальных переходов"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM pending_referrals WHERE created_at < ?", (before,))
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Ошибка удаления устаревших реферальных переходов: {e}")
+            return 0
+    
     # ==================== АДМИНИСТРАТИВНЫЕ МЕТОДЫ ====================
     
     def backup_database(self, backup_path: str) -> bool:
@@ -1626,7 +3529,7 @@ class Database:
                 stats['database_size'] = cursor.fetchone()[0]
                 
                 # Количество записей в таблицах
-                tables = ['users', 'referral_connections', 'transactions', 'achievements', 
+                tables = ['users', 'referral_connections', 'transactions', 'ledger_postings', 'achievements', 
                          'shop_items', 'purchases', 'trainings', 'duels', 'notifications']
                 
                 for table in tables:
@@ -1637,7 +3540,7 @@ class Database:
                 cursor.execute("SELECT MAX(created_at) FROM users")
                 stats['last_user_registration'] = cursor.fetchone()[0]
                 
-                cursor.execute("SELECT MAX(created_at) FROM transactions")
+                cursor.execute("SELECT MAX(created_at) FROM ledger_postings")
                 stats['last_transaction'] = cursor.fetchone()[0]
                 
                 return stats
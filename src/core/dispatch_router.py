@@ -0,0 +1,135 @@
+"""
+Роутер с таблицами диспетчеризации GromFitBot
+Кнопки нижнего меню (точный текст) и callback-и (точные данные, префиксы и
+действия кодека callback_data) выбираются поиском в словаре вместо перебора
+фильтров F.text == ... по одному
+"""
+
+import logging
+from typing import Optional, Dict, Any, Callable, Union
+
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.types import Message, CallbackQuery
+
+from core.callback_codec import CallbackAction, callback_codec
+
+logger = logging.getLogger(__name__)
+
+class DispatchRouter(Router):
+    """
+    Router с таблицами обработчиков:
+    - text: точный текст сообщения
+    - callback: точные данные callback-запроса
+    - callback_prefix: префикс данных callback-запроса
+    - action: действие закодированных callback_data (поля передаются в аргументе payload)
+    """
+
+    def __init__(self, *, name: Optional[str] = None):
+        super().__init__(name=name)
+
+        self._texts: Dict[str, CallableObject] = {}
+        self._callbacks: Dict[str, CallableObject] = {}
+        self._prefixes: Dict[str, CallableObject] = {}
+        self._actions: Dict[int, CallableObject] = {}
+        # Различные длины префиксов (от длинных к коротким) - проверка по срезу данных
+        self._prefix_lengths: tuple = ()
+
+        # Обработчики таблиц регистрируются при первом использовании,
+        # чтобы сохранить порядок относительно остальных обработчиков роутера
+        self._message_table_registered = False
+        self._callback_table_registered = False
+
+    # ==================== РЕГИСТРАЦИЯ ====================
+
+    def _register_message_table(self) -> None:
+        if not self._message_table_registered:
+            self.message.register(self._dispatch, self._match_text)
+            self._message_table_registered = True
+
+    def _register_callback_table(self) -> None:
+        if not self._callback_table_registered:
+            self.callback_query.register(self._dispatch, self._match_callback)
+            self._callback_table_registered = True
+
+    @staticmethod
+    def _add(table: Dict[str, CallableObject], key: str, handler: Callable) -> None:
+        if key in table:
+            raise ValueError(f"Обработчик для '{key}' уже зарегистрирован")
+        table[key] = CallableObject(handler)
+
+    def text(self, *texts: str) -> Callable:
+        """Декоратор обработчика кнопки с точным текстом"""
+        def decorator(handler: Callable) -> Callable:
+            for text in texts:
+                self._add(self._texts, text, handler)
+            self._register_message_table()
+            return handler
+
+        return decorator
+
+    def callback(self, *values: str) -> Callable:
+        """Декоратор обработчика callback-запроса с точными данными"""
+        def decorator(handler: Callable) -> Callable:
+            for value in values:
+                self._add(self._callbacks, value, handler)
+            self._register_callback_table()
+            return handler
+
+        return decorator
+
+    def callback_prefix(self, *prefixes: str) -> Callable:
+        """Декоратор обработчика callback-запросов с префиксом данных"""
+        def decorator(handler: Callable) -> Callable:
+            for prefix in prefixes:
+                self._add(self._prefixes, prefix, handler)
+            self._prefix_lengths = tuple(sorted({len(p) for p in self._prefixes}, reverse=True))
+            self._register_callback_table()
+            return handler
+
+        return decorator
+
+    def action(self, *actions: CallbackAction) -> Callable:
+        """Декоратор обработчика действия кодека callback_data"""
+        def decorator(handler: Callable) -> Callable:
+            for action in actions:
+                if action.id in self._actions:
+                    raise ValueError(f"Обработчик для действия '{action.name}' уже зарегистрирован")
+                self._actions[action.id] = CallableObject(handler)
+            self._register_callback_table()
+            return handler
+
+        return decorator
+
+    # ==================== ДИСПЕТЧЕРИЗАЦИЯ ====================
+
+    def _match_text(self, message: Message) -> Union[bool, Dict[str, Any]]:
+        """Фильтр: обработчик по точному тексту"""
+        handler = self._texts.get(message.text) if message.text else None
+        return {'dispatch_target': handler} if handler else False
+
+    def _match_callback(self, callback: CallbackQuery) -> Union[bool, Dict[str, Any]]:
+        """Фильтр: обработчик действия кодека, по точным данным или по самому длинному префиксу"""
+        data = callback.data
+        if not data:
+            return False
+
+        action = callback_codec.peek(data)
+        if action is not None:
+            handler = self._actions.get(action.id)
+            decoded = callback_codec.decode(data) if handler else None
+            return {'dispatch_target': handler, 'payload': decoded[1]} if decoded else False
+
+        handler = self._callbacks.get(data)
+        if handler is None:
+            for length in self._prefix_lengths:
+                handler = self._prefixes.get(data[:length])
+                if handler is not None:
+                    break
+
+        return {'dispatch_target': handler} if handler else False
+
+    @staticmethod
+    async def _dispatch(event: Union[Message, CallbackQuery], dispatch_target: CallableObject, **data: Any) -> Any:
+        """Вызов найденного обработчика с нужными ему аргументами (state, bot, ...)"""
+        return await dispatch_target.call(event, **data)
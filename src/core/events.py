@@ -0,0 +1,57 @@
+"""
+Шина событий GromFitBot
+Модули публикуют доменные события (личный рекорд, сохранена тренировка),
+а достижения и уведомления подписываются на них, не перечитывая историю
+"""
+
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Типы событий
+USER_REGISTERED = 'user_registered'
+WORKOUT_SAVED = 'workout_saved'
+PERSONAL_RECORD = 'personal_record'
+BONUS_CLAIMED = 'bonus_claimed'
+REFERRAL_ADDED = 'referral_added'
+DUEL_WON = 'duel_won'
+PURCHASE = 'purchase'
+ACHIEVEMENT_UNLOCKED = 'achievement_unlocked'
+LEVEL_UP = 'level_up'
+
+EventHandler = Callable[..., Any]
+
+class EventBus:
+    """Синхронная шина событий: обработчики вызываются по порядку подписки"""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[EventHandler]] = defaultdict(list)
+
+    def subscribe(self, event_type: str, handler: EventHandler) -> None:
+        """Подписка обработчика на событие (повторная подписка игнорируется)"""
+        if handler not in self._handlers[event_type]:
+            self._handlers[event_type].append(handler)
+
+    def unsubscribe(self, event_type: str, handler: EventHandler) -> None:
+        if handler in self._handlers.get(event_type, []):
+            self._handlers[event_type].remove(handler)
+
+    def on(self, event_type: str) -> Callable[[EventHandler], EventHandler]:
+        """Декоратор подписки"""
+        def decorator(handler: EventHandler) -> EventHandler:
+            self.subscribe(event_type, handler)
+            return handler
+        return decorator
+
+    def publish(self, event_type: str, **payload: Any) -> None:
+        """Публикация события; ошибка одного обработчика не мешает остальным"""
+        for handler in list(self._handlers.get(event_type, [])):
+            try:
+                handler(**payload)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика события {event_type}: {e}")
+
+# Общая шина событий
+events = EventBus()
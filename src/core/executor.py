@@ -0,0 +1,199 @@
+"""
+Исполнитель обновлений GromFitBot
+Обновления одного пользователя обрабатываются строго по порядку,
+обновления разных пользователей - параллельно в нескольких дорожках
+"""
+
+import asyncio
+import contextvars
+import logging
+from typing import Optional, Dict, List, Any, Callable, Awaitable, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+# Признак выполнения внутри дорожки (повторная постановка в очередь не нужна)
+_inside_lane: contextvars.ContextVar[bool] = contextvars.ContextVar('inside_lane', default=False)
+
+def get_update_key(update: Update) -> int:
+    """Ключ распределения обновления: ID пользователя, иначе ID чата, иначе ID обновления"""
+    event = update.event
+
+    from_user = getattr(event, 'from_user', None)
+    if from_user is not None:
+        return from_user.id
+
+    chat = getattr(event, 'chat', None)
+    if chat is not None:
+        return chat.id
+
+    return update.update_id
+
+class UpdateExecutor:
+    """Исполнитель с дорожками: порядок внутри пользователя, параллельность между пользователями"""
+
+    def __init__(self, lanes: int = 20, max_in_flight: int = 1000):
+        self.lanes_count = max(lanes, 1)
+        self.max_in_flight = max(max_in_flight, 1)
+
+        self._lanes: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._capacity: Optional[asyncio.Event] = None
+        self._in_flight = 0
+
+        # Счетчики для мониторинга
+        self.stats: Dict[str, int] = {
+            'submitted': 0,
+            'processed': 0,
+            'failed': 0,
+            'rejected': 0
+        }
+
+    @property
+    def in_flight(self) -> int:
+        """Количество принятых, но не завершенных обновлений"""
+        return self._in_flight
+
+    def start(self) -> None:
+        """Запуск обработчиков дорожек"""
+        if self._workers:
+            return
+
+        self._capacity = asyncio.Event()
+        self._capacity.set()
+        self._lanes = [asyncio.Queue() for _ in range(self.lanes_count)]
+        self._workers = [
+            asyncio.create_task(self._lane_worker(i))
+            for i in range(self.lanes_count)
+        ]
+
+        logger.info(f"✅ Исполнитель обновлений запущен (дорожек: {self.lanes_count}, лимит: {self.max_in_flight})")
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Остановка с дообработкой принятых обновлений"""
+        if not self._workers:
+            return
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(lane.join() for lane in self._lanes)),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Не обработано обновлений при остановке: {self._in_flight}")
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._lanes = []
+
+        logger.info("✅ Исполнитель обновлений остановлен")
+
+    def _lane_index(self, key: int) -> int:
+        """Номер дорожки для ключа"""
+        return hash(key) % self.lanes_count
+
+    def _enqueue(self, key: int, job: Callable[[], Awaitable[Any]]) -> None:
+        """Постановка задачи в дорожку"""
+        self._in_flight += 1
+        self.stats['submitted'] += 1
+        self._lanes[self._lane_index(key)].put_nowait(job)
+
+    async def submit(self, key: int, job: Callable[[], Awaitable[Any]]) -> None:
+        """
+        Постановка задачи в дорожку с ожиданием свободного слота
+
+        Args:
+            key: Ключ распределения (обычно ID пользователя)
+            job: Фабрика корутины обработки
+        """
+        self.start()
+        while self._in_flight >= self.max_in_flight:
+            self._capacity.clear()
+            await self._capacity.wait()
+
+        self._enqueue(key, job)
+
+    def try_submit(self, key: int, job: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        Постановка задачи без ожидания
+
+        Returns:
+            False если достигнут лимит одновременно обрабатываемых обновлений
+        """
+        self.start()
+        if self._in_flight >= self.max_in_flight:
+            self.stats['rejected'] += 1
+            return False
+
+        self._enqueue(key, job)
+        return True
+
+    async def _lane_worker(self, lane_id: int) -> None:
+        """Последовательная обработка задач одной дорожки"""
+        _inside_lane.set(True)
+        lane = self._lanes[lane_id]
+
+        while True:
+            job = await lane.get()
+            try:
+                await job()
+                self.stats['processed'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"Ошибка обработки в дорожке {lane_id}: {e}")
+            finally:
+                self._in_flight -= 1
+                self._capacity.set()
+                lane.task_done()
+
+    def lane_depths(self) -> List[int]:
+        """Глубина очереди каждой дорожки"""
+        return [lane.qsize() for lane in self._lanes]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Метрики исполнителя"""
+        depths = self.lane_depths()
+        return {
+            'lanes': self.lanes_count,
+            'max_in_flight': self.max_in_flight,
+            'in_flight': self._in_flight,
+            'max_lane_depth': max(depths) if depths else 0,
+            'lane_depths': depths,
+            **self.stats
+        }
+
+class LaneDispatcher(Dispatcher):
+    """Диспетчер, передающий обновления через исполнитель с дорожками"""
+
+    def __init__(self, *args: Any, executor: Optional[UpdateExecutor] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.executor = executor
+
+    def _make_job(self, bot: Bot, update: Update, kwargs: Dict[str, Any]) -> Tuple[int, Callable[[], Awaitable[Any]]]:
+        """Ключ и задача обработки обновления"""
+        async def job():
+            return await Dispatcher.feed_update(self, bot, update, **kwargs)
+
+        return get_update_key(update), job
+
+    async def feed_update(self, bot: Bot, update: Update, **kwargs: Any) -> Any:
+        """Постановка обновления в дорожку пользователя (ждет только свободного слота)"""
+        if self.executor is None or _inside_lane.get():
+            return await super().feed_update(bot, update, **kwargs)
+
+        key, job = self._make_job(bot, update, kwargs)
+        await self.executor.submit(key, job)
+        return None
+
+    def try_feed_update(self, bot: Bot, update: Update, **kwargs: Any) -> bool:
+        """Постановка обновления без ожидания; False при переполнении"""
+        if self.executor is None:
+            asyncio.create_task(super().feed_update(bot, update, **kwargs))
+            return True
+
+        key, job = self._make_job(bot, update, kwargs)
+        return self.executor.try_submit(key, job)
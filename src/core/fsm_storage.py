@@ -0,0 +1,160 @@
+"""
+Хранилище состояний FSM GromFitBot на SQLite
+Состояния и данные пишутся сразу в БД (общую для всех процессов бота) и в
+небольшой LRU-кэш в памяти; устаревшие состояния удаляет фоновая очистка
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Mapping, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+
+from core.database import Database
+
+logger = logging.getLogger(__name__)
+
+# Запись кэша: (состояние, данные, момент устаревания записи кэша)
+CacheEntry = Tuple[Optional[str], Dict[str, Any], float]
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище на SQLite с кэшем в памяти и TTL состояний"""
+
+    def __init__(
+        self,
+        db: Database,
+        state_ttl: float = 86400,
+        cache_size: int = 10000,
+        cache_ttl: float = 2,
+        sweep_interval: float = 600
+    ):
+        """
+        Args:
+            db: База данных бота
+            state_ttl: Время жизни необновляемого состояния (сек)
+            cache_size: Максимум записей в кэше памяти
+            cache_ttl: Время доверия кэшу (сек) - ограничивает рассинхронизацию между процессами
+            sweep_interval: Период фоновой очистки устаревших состояний (сек)
+        """
+        self.db = db
+        self.state_ttl = state_ttl
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.sweep_interval = sweep_interval
+
+        self._cache: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._sweeper: Optional[asyncio.Task] = None
+
+        # Несколько процессов пишут в одну БД - читатели не должны ждать писателей
+        self.db.enable_wal()
+
+    @staticmethod
+    def _make_key(key: StorageKey) -> str:
+        """Строковый ключ записи в БД"""
+        return (
+            f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:"
+            f"{key.business_connection_id or ''}:{key.destiny}"
+        )
+
+    def _remember(self, storage_key: str, state: Optional[str], data: Dict[str, Any]) -> None:
+        """Запись в кэш с вытеснением самых старых записей"""
+        if self.cache_size <= 0:
+            return
+
+        self._cache[storage_key] = (state, data, time.monotonic() + self.cache_ttl)
+        self._cache.move_to_end(storage_key)
+
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _load(self, key: StorageKey) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Состояние и данные: из кэша, если он свежий, иначе из БД"""
+        storage_key = self._make_key(key)
+
+        entry = self._cache.get(storage_key)
+        if entry is not None and entry[2] > time.monotonic():
+            self._cache.move_to_end(storage_key)
+            return entry[0], entry[1]
+
+        record = self.db.get_fsm_record(storage_key)
+        if record is None or record['updated_at'] < time.time() - self.state_ttl:
+            state, data = None, {}
+        else:
+            state, data = record['state'], record['data']
+
+        self._remember(storage_key, state, data)
+        return state, data
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        """Установка состояния"""
+        storage_key = self._make_key(key)
+        state_name = state.state if isinstance(state, State) else state
+
+        _, data = self._load(key)
+        self.db.set_fsm_state(storage_key, state_name, time.time())
+        self._remember(storage_key, state_name, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        """Получение состояния"""
+        return self._load(key)[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        """Замена данных"""
+        storage_key = self._make_key(key)
+        data = dict(data)
+
+        state, _ = self._load(key)
+        self.db.set_fsm_data(storage_key, data, time.time())
+        self._remember(storage_key, state, data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        """Получение копии данных"""
+        return dict(self._load(key)[1])
+
+    # ==================== ФОНОВАЯ ОЧИСТКА ====================
+
+    def start(self) -> None:
+        """Запуск периодической очистки устаревших состояний"""
+        if self._sweeper and not self._sweeper.done():
+            return
+
+        self._sweeper = asyncio.create_task(self._sweep_loop())
+        logger.debug("Очистка состояний FSM запущена")
+
+    def sweep(self) -> int:
+        """Удаление устаревших состояний из БД и кэша"""
+        removed = self.db.delete_expired_fsm_states(time.time() - self.state_ttl)
+
+        now = time.monotonic()
+        for storage_key in [k for k, entry in self._cache.items() if entry[2] <= now]:
+            del self._cache[storage_key]
+
+        if removed:
+            logger.info(f"Удалено устаревших состояний FSM: {removed}")
+
+        return removed
+
+    async def _sweep_loop(self) -> None:
+        """Цикл периодической очистки"""
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Ошибка очистки состояний FSM: {e}")
+
+            await asyncio.sleep(self.sweep_interval)
+
+    async def close(self) -> None:
+        """Остановка очистки и сброс кэша (данные остаются в БД)"""
+        if self._sweeper and not self._sweeper.done():
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+
+        self._sweeper = None
+        self._cache.clear()
@@ -0,0 +1,119 @@
+"""
+Защита от повторных нажатий инлайн-кнопок GromFitBot
+Повторный callback с тем же (user_id, callback_data, message_id) не запускает
+обработчик повторно: одновременные дубли ждут первый вызов, последующие
+в пределах TTL получают сохраненный результат
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable, Awaitable, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import CallbackQuery
+
+from core.callback_codec import callback_codec
+
+logger = logging.getLogger(__name__)
+
+# Строковые callback-и с побочными эффектами (списания, начисления), которые нельзя
+# выполнять дважды; действия кодека защищаются флагом protected при регистрации
+DEFAULT_PROTECTED_PREFIXES = (
+    "bonus_claim_daily",
+)
+
+CallbackKey = Tuple[int, str, int]
+
+class CallbackIdempotencyMiddleware(BaseMiddleware):
+    """Middleware идемпотентности callback-запросов с коротким TTL"""
+
+    def __init__(self, ttl: float = 5.0, prefixes: Tuple[str, ...] = DEFAULT_PROTECTED_PREFIXES):
+        self.ttl = ttl
+        self.prefixes = prefixes
+
+        # Выполняющиеся обработчики и готовые результаты (в порядке завершения)
+        self._in_flight: Dict[CallbackKey, asyncio.Future] = {}
+        self._results: "OrderedDict[CallbackKey, Tuple[float, Any]]" = OrderedDict()
+
+        self.stats: Dict[str, int] = {
+            'executed': 0,
+            'coalesced': 0,
+            'replayed': 0
+        }
+
+    def _get_key(self, callback: CallbackQuery) -> Optional[CallbackKey]:
+        """Ключ идемпотентности или None, если callback не защищается"""
+        data = callback.data or ""
+        if not data.startswith(self.prefixes) and not callback_codec.is_protected(data):
+            return None
+
+        message_id = callback.message.message_id if callback.message else 0
+        return (callback.from_user.id, data, message_id)
+
+    def _purge_expired(self, now: float) -> None:
+        """Удаление устаревших результатов (самые старые - в начале)"""
+        while self._results:
+            key, (expires_at, _) = next(iter(self._results.items()))
+            if expires_at > now:
+                break
+            self._results.popitem(last=False)
+
+    @staticmethod
+    async def _answer_duplicate(callback: CallbackQuery) -> None:
+        """Ответ на дубль, чтобы у клиента не висели "часики" (без обращения к БД)"""
+        try:
+            await callback.answer()
+        except TelegramAPIError as e:
+            logger.debug(f"Не удалось ответить на повторный callback {callback.id}: {e}")
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        key = self._get_key(event)
+        if key is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        self._purge_expired(now)
+
+        # Повтор в пределах TTL - возвращаем сохраненный результат без обращения к БД и API
+        cached = self._results.get(key)
+        if cached is not None:
+            self.stats['replayed'] += 1
+            logger.debug(f"Повторный callback {key[1]} от {key[0]} - возвращен сохраненный результат")
+            await self._answer_duplicate(event)
+            return cached[1]
+
+        # Такой же callback еще выполняется - ждем его результат
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.stats['coalesced'] += 1
+            logger.debug(f"Повторный callback {key[1]} от {key[0]} объединен с выполняющимся")
+            await self._answer_duplicate(event)
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        self.stats['executed'] += 1
+
+        try:
+            result = await handler(event, data)
+        except Exception as e:
+            # Ошибку не кэшируем: повтор должен иметь шанс выполниться
+            future.set_exception(e)
+            future.exception()  # помечаем исключение как обработанное
+            raise
+        else:
+            future.set_result(result)
+            self._results[key] = (time.monotonic() + self.ttl, result)
+            return result
+        finally:
+            if not future.done():
+                future.cancel()
+            del self._in_flight[key]
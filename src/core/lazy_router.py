@@ -0,0 +1,81 @@
+"""
+Отложенная загрузка модулей GromFitBot
+Роутер-заглушка импортирует модуль и подключает его роутер при первом дошедшем
+до него обновлении или при фоновом прогреве после запуска
+"""
+
+import asyncio
+import importlib
+import logging
+from types import ModuleType
+from typing import Optional, Any, Callable
+
+from aiogram import Router
+from aiogram.types import TelegramObject
+
+from core.profiler import startup_profiler
+
+logger = logging.getLogger(__name__)
+
+class LazyRouter(Router):
+    """Роутер, загружающий модуль с настоящим роутером по требованию"""
+
+    def __init__(
+        self,
+        module_path: str,
+        attr: str = 'router',
+        on_load: Optional[Callable[[ModuleType], None]] = None
+    ):
+        """
+        Args:
+            module_path: Путь модуля ('modules.shop.handlers')
+            attr: Имя роутера в модуле
+            on_load: Вызов после импорта (инициализация модуля)
+        """
+        super().__init__(name=f"lazy:{module_path}")
+        self.module_path = module_path
+        self.attr = attr
+        self.on_load = on_load
+
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def _attach(self, module: ModuleType) -> None:
+        """Инициализация модуля и подключение его роутера"""
+        if self.on_load:
+            self.on_load(module)
+
+        self.include_router(getattr(module, self.attr))
+        self._loaded = True
+
+    def load_sync(self) -> None:
+        """Загрузка модуля в текущем потоке (при старте без отложенной загрузки)"""
+        if self._loaded:
+            return
+
+        with startup_profiler.measure(self.module_path):
+            self._attach(importlib.import_module(self.module_path))
+
+    async def load(self) -> None:
+        """Загрузка модуля: импорт в отдельном потоке, цикл событий не блокируется"""
+        if self._loaded:
+            return
+
+        async with self._lock:
+            if self._loaded:
+                return
+
+            with startup_profiler.measure(self.module_path):
+                module = await asyncio.to_thread(importlib.import_module, self.module_path)
+                self._attach(module)
+
+            logger.info(f"Модуль {self.module_path} загружен")
+
+    async def propagate_event(self, update_type: str, event: TelegramObject, **kwargs: Any) -> Any:
+        if not self._loaded:
+            await self.load()
+        return await super().propagate_event(update_type, event, **kwargs)
@@ -0,0 +1,177 @@
+"""
+Региональные рейтинги GromFitBot
+Таблица region_standings в БД хранит очки (поднятый объем, кг) каждого
+пользователя и его регион; в памяти процесса для каждого региона и общего
+рейтинга держится отсортированный список, поэтому место пользователя - бинарный
+поиск, а топ - срез, без сортировки всех участников на каждый запрос.
+Тренировки, записанные другими процессами бота, попадают в рейтинг при
+периодическом перечитывании таблицы (refresh_interval)
+"""
+
+import bisect
+import logging
+import time
+from typing import Optional, Dict, List, Any, Tuple
+
+from core.database import Database
+from core.events import events, WORKOUT_SAVED
+
+logger = logging.getLogger(__name__)
+
+class SortedStandings:
+    """Участники по убыванию очков (при равенстве - по ID пользователя)"""
+
+    def __init__(self):
+        self._keys: List[Tuple[float, int]] = []
+        self._scores: Dict[int, float] = {}
+        self.total = 0.0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._scores
+
+    def set(self, user_id: int, score: float) -> None:
+        """
+        Установка очков участника
+
+        Место ищется бинарным поиском, но вставка и удаление в списке сдвигают
+        элементы - O(n) на обновление (сдвиг памяти, быстрый на практике)
+        """
+        self.remove(user_id)
+        bisect.insort(self._keys, (-score, user_id))
+        self._scores[user_id] = score
+        self.total += score
+
+    def remove(self, user_id: int) -> None:
+        score = self._scores.pop(user_id, None)
+        if score is None:
+            return
+
+        index = bisect.bisect_left(self._keys, (-score, user_id))
+        del self._keys[index]
+        self.total -= score
+
+    def score(self, user_id: int) -> Optional[float]:
+        return self._scores.get(user_id)
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """Место участника (с 1) бинарным поиском"""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return bisect.bisect_left(self._keys, (-score, user_id)) + 1
+
+    def top(self, limit: int) -> List[Tuple[int, float]]:
+        """Первые участники: (ID пользователя, очки)"""
+        return [(user_id, -negative) for negative, user_id in self._keys[:limit]]
+
+class RegionLeaderboards:
+    """Рейтинги по регионам и общий рейтинг с инкрементальным обновлением"""
+
+    def __init__(self, db: Optional[Database] = None, refresh_interval: float = 60):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self._loaded_at: Optional[float] = None
+        self._regions: Dict[str, SortedStandings] = {}
+        self._global = SortedStandings()
+        self._user_region: Dict[int, str] = {}
+
+    def bind(self, db: Database, refresh_interval: Optional[float] = None) -> None:
+        """Подключение к базе данных бота"""
+        self.db = db
+        if refresh_interval is not None:
+            self.refresh_interval = refresh_interval
+        self._loaded_at = None
+
+    def _get_db(self) -> Database:
+        """База данных, подключенная через bind()"""
+        if self.db is None:
+            raise RuntimeError("Рейтинги не подключены к базе данных")
+        return self.db
+
+    def _ensure_loaded(self) -> None:
+        """Загрузка рейтингов из БД при первом обращении и по истечении refresh_interval"""
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < self.refresh_interval:
+            return
+
+        self._regions.clear()
+        self._global = SortedStandings()
+        self._user_region.clear()
+
+        rows = self._get_db().get_region_standings()
+        for row in rows:
+            self._set(row['user_id'], row['region'], row['score'])
+
+        self._loaded_at = now
+        logger.debug(f"Региональные рейтинги загружены: участников {len(rows)}, регионов {len(self._regions)}")
+
+    def _set(self, user_id: int, region: str, score: float) -> None:
+        previous_region = self._user_region.get(user_id)
+        if previous_region is not None and previous_region != region:
+            self._regions[previous_region].remove(user_id)
+            if not self._regions[previous_region]:
+                del self._regions[previous_region]
+
+        self._regions.setdefault(region, SortedStandings()).set(user_id, score)
+        self._global.set(user_id, score)
+        self._user_region[user_id] = region
+
+    def update(self, user_id: int, region: str, score: float) -> None:
+        """Новые очки пользователя после записи в БД"""
+        self._ensure_loaded()
+        self._set(user_id, region, score)
+
+    def on_workout_saved(self, user_id: int, standing: Optional[Dict[str, Any]] = None, **payload: Any) -> None:
+        """Подписчик события сохранения тренировки"""
+        if standing:
+            self.update(user_id, standing['region'], standing['score'])
+
+    def move(self, user_id: int, region: str) -> None:
+        """Смена региона пользователя"""
+        self._ensure_loaded()
+        score = self._global.score(user_id)
+        if score is not None:
+            self._set(user_id, region, score)
+
+    def top(self, region: Optional[str] = None, limit: int = 10) -> List[Tuple[int, float]]:
+        """Топ региона (или общий при region=None)"""
+        self._ensure_loaded()
+        standings = self._global if region is None else self._regions.get(region)
+        return standings.top(limit) if standings else []
+
+    def rank(self, user_id: int) -> Dict[str, Any]:
+        """Место пользователя в своем регионе и в общем рейтинге"""
+        self._ensure_loaded()
+        region = self._user_region.get(user_id)
+        standings = self._regions.get(region) if region else None
+
+        return {
+            'region': region,
+            'score': self._global.score(user_id),
+            'regional_rank': standings.rank(user_id) if standings else None,
+            'regional_total': len(standings) if standings else 0,
+            'global_rank': self._global.rank(user_id),
+            'global_total': len(self._global)
+        }
+
+    def regions_summary(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Сводка по регионам: участники, суммарные очки и лидер"""
+        self._ensure_loaded()
+        summary = [
+            {
+                'region': region,
+                'participants': len(standings),
+                'total_score': standings.total,
+                'leader_id': standings.top(1)[0][0]
+            }
+            for region, standings in self._regions.items()
+        ]
+        summary.sort(key=lambda item: item['total_score'], reverse=True)
+        return summary[:limit]
+
+# Общие рейтинги процесса
+leaderboards = RegionLeaderboards()
+events.subscribe(WORKOUT_SAVED, leaderboards.on_workout_saved)
@@ -0,0 +1,80 @@
+"""
+Двойная запись для валют GromFitBot
+Каждая операция с токенами и алмазами - проводка из записей по счетам, сумма
+которых в каждой валюте равна нулю: валюта пользователя всегда приходит с
+системного счета (награды, магазин, дуэли, обмен) или уходит на него. Проводка
+выполняется одним вызовом Database.post в одной транзакции; у счета хранится
+текущий баланс, у записи - баланс после нее, а контрольные точки позволяют
+сверить баланс без суммирования всей истории
+"""
+
+from typing import Dict, List, Union, NamedTuple
+
+# Валюты и колонки users с копией баланса счета пользователя
+TOKENS = 'tokens'
+DIAMONDS = 'diamonds'
+
+BALANCE_COLUMNS = {
+    TOKENS: 'balance_tokens',
+    DIAMONDS: 'balance_diamonds'
+}
+
+# Системные счета (могут уходить в минус: это источники и получатели валюты)
+OPENING = 'opening'      # стартовые балансы и перенос старых балансов
+REWARDS = 'rewards'      # ежедневные бонусы, награды за достижения и рефералов
+SHOP = 'shop'            # покупки в магазине
+DUELS = 'duels'          # ставки и выигрыши дуэлей
+EXCHANGE = 'exchange'    # пополнение и вывод алмазов (звезды Telegram)
+FEES = 'fees'            # комиссии
+
+# Счет пользователя в проводке
+WALLET = 'wallet'
+
+# Контрольная точка баланса - после каждой N-й записи счета
+CHECKPOINT_INTERVAL = 100
+
+# Системный счет по типу проводки (для старых транзакций и универсальных начислений)
+COUNTERPARTIES = {
+    'daily_bonus': REWARDS,
+    'welcome_bonus': REWARDS,
+    'referral_bonus': REWARDS,
+    'achievement': REWARDS,
+    'achievement_reward': REWARDS,
+    'purchase': SHOP,
+    'shop_purchase': SHOP,
+    'duel_win': DUELS,
+    'duel_loss': DUELS,
+    'duel_entry': DUELS,
+    'withdrawal_fee': FEES
+}
+
+class Leg(NamedTuple):
+    """Запись проводки: счет (ID пользователя или код системного счета), валюта и сумма"""
+    account: Union[int, str]
+    currency: str
+    amount: float
+
+def counterparty_for(posting_type: str) -> str:
+    """Системный счет для типа проводки"""
+    if posting_type.startswith(('deposit', 'withdrawal_')) and posting_type != 'withdrawal_fee':
+        return EXCHANGE
+    return COUNTERPARTIES.get(posting_type, OPENING)
+
+def credit(user_id: int, source: str, amount: float, currency: str = TOKENS) -> List[Leg]:
+    """Начисление пользователю с системного счета (пусто при нулевой сумме)"""
+    if not amount:
+        return []
+    return [Leg(user_id, currency, amount), Leg(source, currency, -amount)]
+
+def debit(user_id: int, target: str, amount: float, currency: str = TOKENS) -> List[Leg]:
+    """Списание у пользователя на системный счет (пусто при нулевой сумме)"""
+    if not amount:
+        return []
+    return [Leg(user_id, currency, -amount), Leg(target, currency, amount)]
+
+def is_balanced(legs: List[Leg]) -> bool:
+    """Сумма записей в каждой валюте равна нулю"""
+    totals: Dict[str, float] = {}
+    for leg in legs:
+        totals[leg.currency] = totals.get(leg.currency, 0.0) + leg.amount
+    return all(abs(total) < 0.005 for total in totals.values())
@@ -17,6 +17,8 @@ from aiogram.exceptions import TelegramBadRequest, TelegramAPIError
 import logging
 import asyncio
 
+from core.render_cache import displayed_messages
+
 logger = logging.getLogger(__name__)
 
 class MessageManager:
@@ -51,6 +53,7 @@ class MessageManager:
         try:
             # Пытаемся удалить старое сообщение
             try:
+                displayed_messages.forget(message.chat.id, message.message_id)
                 await message.delete()
             except TelegramBadRequest as e:
                 if "message can't be deleted" not in str(e):
@@ -78,6 +81,12 @@ class MessageManager:
                     protect_content=protect_content
                 )
             
+            displayed_messages.remember(
+                new_message.chat.id,
+                new_message.message_id,
+                displayed_messages.fingerprint(text, keyboard, parse_mode)
+            )
+            
             logger.debug(f"Сообщение заменено: {message.message_id} -> {new_message.message_id}")
             return new_message
             
@@ -109,9 +118,15 @@ class MessageManager:
         Returns:
             True если успешно, False если ошибка
         """
+        message = callback_query.message
+        fingerprint = displayed_messages.fingerprint(text, keyboard, parse_mode)
+        
+        # Сообщение уже показывает этот текст и клавиатуру - запрос к API не нужен
+        if displayed_messages.is_displayed(message.chat.id, message.message_id, fingerprint):
+            logger.debug(f"Сообщение не изменилось, редактирование пропущено: {message.message_id}")
+            return True
+        
         try:
-            message = callback_query.message
-            
             if keyboard:
                 await message.edit_text(
                     text,
@@ -126,11 +141,13 @@ class MessageManager:
                     disable_web_page_preview=disable_web_page_preview
                 )
             
+            displayed_messages.remember(message.chat.id, message.message_id, fingerprint)
             logger.debug(f"Сообщение отредактировано: {message.message_id}")
             return True
             
         except TelegramBadRequest as e:
             if "message is not modified" in str(e):
+                displayed_messages.remember(message.chat.id, message.message_id, fingerprint)
                 logger.debug(f"Сообщение не изменилось: {message.message_id}")
                 return True
             else:
@@ -239,9 +256,10 @@ class MessageManager:
         try:
             temp_message = await message.answer(text, parse_mode=parse_mode)
             
-            # Запланировать удаление
+            # Запланировать удаление через общий планировщик
             if delete_after > 0:
-                asyncio.create_task(self._delete_after(temp_message, delete_after))
+                from core.scheduler import message_scheduler
+                message_scheduler.schedule_delete(temp_message, delete_after)
             
             return temp_message
             
@@ -249,15 +267,6 @@ class MessageManager:
             logger.error(f"Ошибка отправки временного сообщения: {e}")
             return None
     
-    async def _delete_after(
-        self,
-        message: Message,
-        seconds: int
-    ) -> None:
-        """Удаление сообщения через указанное время"""
-        await asyncio.sleep(seconds)
-        await self.delete_message_safe(message.chat.id, message.message_id)
-    
     async def answer_callback_with_notification(
         self,
         callback_query: CallbackQuery,
@@ -0,0 +1,63 @@
+"""
+Хранилище реферальных переходов GromFitBot
+Реферер из ссылки /start ref<ID> сохраняется в БД до завершения регистрации:
+запись доступна всем процессам бота, переживает перезапуск и устаревает по TTL
+"""
+
+import logging
+import time
+from typing import Optional
+
+from core.database import Database
+
+logger = logging.getLogger(__name__)
+
+class PendingReferralStore:
+    """Реферальные переходы незарегистрированных пользователей с ограниченным временем жизни"""
+
+    # Период удаления устаревших записей (сек)
+    PURGE_INTERVAL = 600
+
+    def __init__(self, db: Optional[Database] = None, ttl: float = 86400):
+        self.db = db
+        self.ttl = ttl
+        self._last_purge = 0.0
+
+    def bind(self, db: Database, ttl: Optional[float] = None) -> None:
+        """Подключение к базе данных бота"""
+        self.db = db
+        if ttl is not None:
+            self.ttl = ttl
+
+    def _get_db(self) -> Database:
+        """База данных, подключенная через bind()"""
+        if self.db is None:
+            raise RuntimeError("Хранилище реферальных переходов не подключено к базе данных")
+        return self.db
+
+    def _purge_expired(self, now: float) -> None:
+        """Периодическое удаление устаревших переходов"""
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+
+        self._last_purge = now
+        removed = self._get_db().delete_expired_pending_referrals(now - self.ttl)
+        if removed:
+            logger.debug(f"Удалено устаревших реферальных переходов: {removed}")
+
+    def put(self, user_id: int, referrer_id: int) -> bool:
+        """Сохранение реферера для пользователя, проходящего регистрацию"""
+        if referrer_id == user_id:
+            logger.warning(f"Пользователь {user_id} перешел по собственной реферальной ссылке")
+            return False
+
+        now = time.time()
+        self._purge_expired(now)
+        return self._get_db().save_pending_referral(user_id, referrer_id, now)
+
+    def pop(self, user_id: int) -> Optional[int]:
+        """Получение и удаление реферера пользователя (None, если нет или устарел)"""
+        return self._get_db().pop_pending_referral(user_id, time.time() - self.ttl)
+
+# Общий экземпляр для бота и модуля регистрации
+pending_referrals = PendingReferralStore()
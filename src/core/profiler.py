@@ -0,0 +1,95 @@
+"""
+Профилировщик запуска GromFitBot
+Импортируется первым (без тяжелых зависимостей), чтобы отсчет шел от старта процесса.
+Замеряет время (и при включении - память) импорта модулей и этапов запуска,
+а также время от старта процесса до первого ответа пользователю
+"""
+
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Any, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+class StartupProfiler:
+    """Замеры импорта модулей и этапов запуска"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.records: List[Dict[str, Any]] = []
+        self.marks: Dict[str, float] = {}
+
+    @property
+    def memory_enabled(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def enable_memory(self) -> None:
+        """Включение замеров памяти (tracemalloc замедляет выделение памяти)"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop_memory(self) -> None:
+        """Выключение замеров памяти после запуска"""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def measure(self, name: str):
+        """Замер времени и прироста памяти блока кода"""
+        memory_before = tracemalloc.get_traced_memory()[0] if self.memory_enabled else None
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {'name': name, 'ms': (time.perf_counter() - started) * 1000, 'kb': None}
+            if memory_before is not None and self.memory_enabled:
+                record['kb'] = (tracemalloc.get_traced_memory()[0] - memory_before) / 1024
+            self.records.append(record)
+            logger.debug(f"Загрузка {name}: {record['ms']:.0f} мс")
+
+    def mark(self, name: str) -> Optional[float]:
+        """Отметка этапа запуска (секунды от старта, только первая)"""
+        if name in self.marks:
+            return None
+
+        elapsed = time.perf_counter() - self.started
+        self.marks[name] = elapsed
+        return elapsed
+
+    def report(self) -> str:
+        """Текстовый отчет: этапы и модули по убыванию времени загрузки"""
+        lines = ["📊 Профиль запуска:"]
+
+        for name, elapsed in sorted(self.marks.items(), key=lambda item: item[1]):
+            lines.append(f"  {name}: {elapsed * 1000:.0f} мс от старта")
+
+        for record in sorted(self.records, key=lambda r: r['ms'], reverse=True):
+            memory = f", {record['kb']:.0f} КБ" if record['kb'] is not None else ""
+            lines.append(f"  {record['name']}: {record['ms']:.0f} мс{memory}")
+
+        return "\n".join(lines)
+
+    def log_report(self) -> None:
+        logger.info(self.report())
+
+    async def first_response_middleware(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        """Outer-middleware обновлений: отметка обработки первого обновления"""
+        if 'first_response' in self.marks:
+            return await handler(event, data)
+
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = self.mark('first_response')
+            if elapsed is not None:
+                logger.info(f"⏱️ Первое обновление обработано через {elapsed * 1000:.0f} мс после старта")
+
+# Общий профилировщик процесса
+startup_profiler = StartupProfiler()
@@ -0,0 +1,151 @@
+"""
+Уровни и опыт GromFitBot
+Кривая опыта рассчитывается один раз при импорте: таблица суммарного опыта
+на входе в каждый уровень, уровень по опыту - бинарный поиск. Снимок прогресса
+пользователя (уровень и сводка достижений) кэшируется по версии данных
+пользователя и пересчитывается только после записи
+"""
+
+import bisect
+import logging
+from collections import OrderedDict, Counter
+from typing import Dict, Any, Tuple, NamedTuple, Optional
+
+from core.events import events, LEVEL_UP
+
+logger = logging.getLogger(__name__)
+
+# Параметры кривой: переход с уровня L на L+1 стоит XP_BASE * L^XP_EXPONENT опыта
+XP_BASE = 1000
+XP_EXPONENT = 1.5
+MAX_LEVEL = 100
+
+# Опыт за действия (начисляется при записи в БД)
+XP_REWARDS = {
+    'workout': 50,
+    'daily_bonus': 10,
+    'achievement': 100
+}
+
+def _build_thresholds() -> Tuple[int, ...]:
+    """Суммарный опыт на входе в уровни 1..MAX_LEVEL"""
+    thresholds = [0]
+    for level in range(1, MAX_LEVEL):
+        thresholds.append(thresholds[-1] + round(XP_BASE * level ** XP_EXPONENT))
+    return tuple(thresholds)
+
+LEVEL_THRESHOLDS = _build_thresholds()
+
+class LevelProgress(NamedTuple):
+    """Положение пользователя на кривой опыта"""
+    level: int
+    experience: int
+    current: int
+    required: int
+
+    @property
+    def is_max(self) -> bool:
+        return self.level >= MAX_LEVEL
+
+    @property
+    def percent(self) -> float:
+        return 100.0 if self.is_max else self.current / self.required * 100
+
+def level_for(experience: int) -> int:
+    """Уровень по суммарному опыту"""
+    return bisect.bisect_right(LEVEL_THRESHOLDS, max(experience, 0))
+
+def format_experience(progress: LevelProgress) -> str:
+    """Опыт внутри уровня для экранов профиля и статистики"""
+    if progress.is_max:
+        return f"{progress.experience} (максимальный уровень)"
+    return f"{progress.current}/{progress.required}"
+
+def level_progress(experience: int, stored_level: Optional[int] = None) -> LevelProgress:
+    """
+    Уровень, опыт внутри уровня и опыт до следующего уровня
+
+    stored_level - значение users.level: уровень только растет и может быть
+    выставлен вручную выше рассчитанного по опыту, тогда показывается он, а опыт
+    внутри уровня считается от его порога (как в топе по уровню)
+    """
+    experience = max(int(experience or 0), 0)
+    level = max(level_for(experience), int(stored_level or 0))
+    start = LEVEL_THRESHOLDS[min(level, MAX_LEVEL) - 1]
+    current = max(experience - start, 0)
+
+    if level >= MAX_LEVEL:
+        return LevelProgress(level, experience, current, 0)
+
+    return LevelProgress(level, experience, current, LEVEL_THRESHOLDS[level] - start)
+
+class ProgressSnapshots:
+    """Кэш снимков прогресса пользователей по версии данных"""
+
+    def __init__(self, db=None, maxsize: int = 2048):
+        self.db = db
+        self.maxsize = maxsize
+        self._items: "OrderedDict[int, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+
+    def bind(self, db) -> None:
+        """Подключение к базе данных бота"""
+        self.db = db
+        self._items.clear()
+
+    def _get_db(self):
+        """База данных, подключенная через bind()"""
+        if self.db is None:
+            raise RuntimeError("Снимки прогресса не подключены к базе данных")
+        return self.db
+
+    def get(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Снимок прогресса пользователя
+
+        Returns:
+            {'level': LevelProgress, 'achievements_total', 'achievements_completed',
+             'achievements_by_category', 'recent_achievements'}
+        """
+        db = self._get_db()
+        user_id = user['telegram_id']
+        version = db.get_user_version(user_id)
+
+        cached = self._items.get(user_id)
+        if cached and cached[0] == version:
+            self._items.move_to_end(user_id)
+            return cached[1]
+
+        achievements = db.get_user_achievements(user_id)
+        snapshot = {
+            'level': level_progress(user.get('experience', 0), user.get('level')),
+            'achievements_total': len(achievements),
+            'achievements_completed': sum(1 for a in achievements if a.get('progress', 0) >= 100),
+            'achievements_by_category': dict(Counter(a.get('category', 'general') for a in achievements)),
+            'recent_achievements': achievements[:5]
+        }
+
+        self._items[user_id] = (version, snapshot)
+        self._items.move_to_end(user_id)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+        return snapshot
+
+    def invalidate(self, user_id: int) -> None:
+        self._items.pop(user_id, None)
+
+# Общий кэш снимков прогресса
+progress_snapshots = ProgressSnapshots()
+
+@events.on(LEVEL_UP)
+def notify_level_up(user_id: int, old_level: int, level: int, db=None, **payload: Any):
+    """Уведомление о новом уровне (в БД, опубликовавшую событие)"""
+    progress_snapshots.invalidate(user_id)
+    if db is None:
+        db = progress_snapshots._get_db()
+    db.add_notification(user_id, {
+        'notification_type': 'level_up',
+        'title': '⭐️ Новый уровень',
+        'message': f"Вы достигли уровня {level}!",
+        'metadata': {'old_level': old_level, 'level': level}
+    })
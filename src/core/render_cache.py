@@ -0,0 +1,102 @@
+"""
+Кэш отрисованных экранов GromFitBot
+Текст и клавиатура экрана хранятся по ключу (экран, пользователь, версия данных);
+отдельно запоминается, что уже показано в каждом сообщении, чтобы не
+отправлять в Bot API редактирование без изменений
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional, Any, Tuple, Hashable
+
+from modules.keyboards.cache import get_keyboard_json
+
+Rendered = Tuple[str, Any]
+
+class RenderCache:
+    """LRU-кэш отрисованных экранов с проверкой версии пользователя и TTL"""
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 300):
+        self.maxsize = maxsize
+        # TTL ограничивает устаревание частей экрана, не зависящих от версии (даты, чужие данные)
+        self.ttl = ttl
+        self._items: "OrderedDict[Tuple[str, int], Tuple[int, float, Rendered]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, view: str, user_id: int, user_version: int) -> Optional[Rendered]:
+        """
+        Получение отрисованного экрана
+
+        Args:
+            view: Имя экрана ('main_menu', 'profile', ...)
+            user_id: ID пользователя
+            user_version: Текущая версия данных пользователя
+
+        Returns:
+            (текст, клавиатура) или None, если экран устарел или не отрисован
+        """
+        key = (view, user_id)
+        entry = self._items.get(key)
+
+        if entry is None or entry[0] != user_version or entry[1] < time.monotonic():
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, view: str, user_id: int, user_version: int, text: str, keyboard: Any = None) -> Rendered:
+        """Сохранение отрисованного экрана (старая версия того же экрана заменяется)"""
+        key = (view, user_id)
+        rendered = (text, keyboard)
+
+        self._items[key] = (user_version, time.monotonic() + self.ttl, rendered)
+        self._items.move_to_end(key)
+
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+        return rendered
+
+    def invalidate(self, user_id: int) -> None:
+        """Сброс всех экранов пользователя"""
+        for key in [key for key in self._items if key[1] == user_id]:
+            del self._items[key]
+
+class DisplayedMessages:
+    """Отпечатки содержимого, показанного в сообщениях (chat_id, message_id)"""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Hashable, str]" = OrderedDict()
+
+    @staticmethod
+    def fingerprint(text: str, keyboard: Any = None, parse_mode: Optional[str] = None) -> str:
+        """Отпечаток текста и клавиатуры сообщения"""
+        payload = f"{parse_mode}\x00{text}\x00{get_keyboard_json(keyboard)}"
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+    def is_displayed(self, chat_id: int, message_id: int, fingerprint: str) -> bool:
+        """Показано ли уже это содержимое в сообщении"""
+        return self._items.get((chat_id, message_id)) == fingerprint
+
+    def remember(self, chat_id: int, message_id: int, fingerprint: str) -> None:
+        """Запоминание содержимого сообщения"""
+        key = (chat_id, message_id)
+        self._items[key] = fingerprint
+        self._items.move_to_end(key)
+
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def forget(self, chat_id: int, message_id: int) -> None:
+        """Удаление сведений о сообщении"""
+        self._items.pop((chat_id, message_id), None)
+
+# Общие экземпляры для всех модулей
+render_cache = RenderCache()
+displayed_messages = DisplayedMessages()
@@ -0,0 +1,283 @@
+"""
+Планировщик отложенных действий с сообщениями GromFitBot
+Хранит задачи в куче по времени выполнения и обрабатывает их одной фоновой задачей.
+Удаления сообщений сохраняются в SQLite и восстанавливаются после перезапуска
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Optional, Dict, List, Any, Tuple
+
+from aiogram import Bot
+from aiogram.types import Message, InlineKeyboardMarkup
+from aiogram.exceptions import TelegramBadRequest
+
+from core.database import Database
+from core.render_cache import displayed_messages
+
+logger = logging.getLogger(__name__)
+
+class MessageScheduler:
+    """Планировщик отложенного редактирования и удаления сообщений"""
+
+    # Максимум сообщений в одном запросе deleteMessages
+    DELETE_BATCH_SIZE = 100
+
+    def __init__(self, bot: Optional[Bot] = None, db: Optional[Database] = None):
+        self.bot = bot
+        self.db = db
+
+        # Куча задач: (время выполнения, порядковый номер, задача)
+        self._heap: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._counter = itertools.count()
+        # Удаления, находящиеся в куче: (чат, сообщение) -> задача
+        self._deletions: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self._restored = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self, bot: Optional[Bot] = None, db: Optional[Database] = None) -> None:
+        """Запуск фоновой обработки задач и восстановление сохраненных удалений"""
+        if bot is not None:
+            self.bot = bot
+        if db is not None:
+            self.db = db
+
+        self._restore()
+
+        if self._worker and not self._worker.done():
+            if self._heap:
+                self._wakeup.set()
+            return
+
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.create_task(self._run())
+        logger.debug("Планировщик сообщений запущен")
+
+    async def stop(self) -> None:
+        """Остановка фоновой обработки задач (сохраненные удаления остаются в БД)"""
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+        self._worker = None
+        logger.debug("Планировщик сообщений остановлен")
+
+    def pending_count(self) -> int:
+        """Количество ожидающих задач"""
+        return len(self._heap)
+
+    def _restore(self) -> None:
+        """Однократная загрузка незавершенных удалений после перезапуска"""
+        if self.db is None or self._restored:
+            return
+        self._restored = True
+
+        rows = self.db.get_scheduled_deletions()
+        for row in rows:
+            self._push_delete(row['delete_at'], {
+                'action': 'delete',
+                'chat_id': row['chat_id'],
+                'message_id': row['message_id'],
+                'db_id': row['id']
+            })
+
+        if rows:
+            logger.info(f"Восстановлено отложенных удалений: {len(rows)}")
+
+    def _push(self, due: float, job: Dict[str, Any]) -> None:
+        """Добавление задачи в кучу"""
+        heapq.heappush(self._heap, (due, next(self._counter), job))
+
+    def _push_delete(self, due: float, job: Dict[str, Any]) -> None:
+        """Добавление удаления в кучу; прежнее удаление того же сообщения помечается отмененным"""
+        previous = self._deletions.get((job['chat_id'], job['message_id']))
+        if previous is not None:
+            previous['cancelled'] = True
+
+        self._deletions[(job['chat_id'], job['message_id'])] = job
+        self._push(due, job)
+
+    def schedule(self, delay: float, job: Dict[str, Any]) -> None:
+        """
+        Регистрация задачи на выполнение через delay секунд
+
+        Args:
+            delay: Задержка в секундах
+            job: Описание действия ('action', 'chat_id', 'message_id', ...)
+        """
+        if job['action'] == 'delete':
+            self._push_delete(time.time() + max(delay, 0), job)
+        else:
+            self._push(time.time() + max(delay, 0), job)
+
+        # Запускаем обработчик при первой задаче и будим его, если задача раньше текущей
+        self.start()
+        if self._heap[0][2] is job:
+            self._wakeup.set()
+
+    def schedule_edit(
+        self,
+        message: Message,
+        text: str,
+        delay: float,
+        keyboard: Optional[InlineKeyboardMarkup] = None,
+        parse_mode: str = "HTML"
+    ) -> None:
+        """
+        Отложенное редактирование сообщения
+
+        Args:
+            message: Сообщение для редактирования
+            text: Новый текст
+            delay: Через сколько секунд отредактировать
+            keyboard: Новая инлайн-клавиатура
+            parse_mode: Режим парсинга текста
+        """
+        if self.bot is None:
+            self.bot = message.bot
+
+        self.schedule(delay, {
+            'action': 'edit',
+            'chat_id': message.chat.id,
+            'message_id': message.message_id,
+            'text': text,
+            'keyboard': keyboard,
+            'parse_mode': parse_mode
+        })
+
+    def schedule_delete(self, message: Message, delay: float) -> None:
+        """
+        Отложенное удаление сообщения (сохраняется в БД и переживает перезапуск)
+
+        Args:
+            message: Сообщение для удаления
+            delay: Через сколько секунд удалить
+        """
+        if self.bot is None:
+            self.bot = message.bot
+
+        chat_id = message.chat.id
+        message_id = message.message_id
+
+        # Сохраненные ранее удаления загружаются до записи нового, иначе оно попадет в кучу дважды
+        self._restore()
+
+        db_id = None
+        if self.db is not None:
+            db_id = self.db.add_scheduled_deletion(chat_id, message_id, time.time() + max(delay, 0))
+
+        self.schedule(delay, {
+            'action': 'delete',
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'db_id': db_id
+        })
+
+    def cancel_delete(self, chat_id: int, message_id: int) -> None:
+        """Отмена запланированного удаления сообщения (в куче и в БД)"""
+        job = self._deletions.pop((chat_id, message_id), None)
+        if job is not None:
+            job['cancelled'] = True
+
+        if self.db is not None:
+            self.db.remove_scheduled_deletion(chat_id, message_id)
+
+    async def _run(self) -> None:
+        """Основной цикл: ожидание ближайшей задачи и выполнение всех созревших"""
+        while True:
+            if not self._heap:
+                timeout = None
+            else:
+                timeout = max(self._heap[0][0] - time.time(), 0)
+
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.time()
+            due_jobs = []
+            while self._heap and self._heap[0][0] <= now:
+                due_jobs.append(heapq.heappop(self._heap)[2])
+
+            await self._execute_batch(due_jobs)
+
+    async def _execute_batch(self, jobs: List[Dict[str, Any]]) -> None:
+        """Выполнение созревших задач: удаления группируются по чатам"""
+        deletions: Dict[int, List[int]] = {}
+        done_ids: List[int] = []
+
+        for job in jobs:
+            if job['action'] == 'delete':
+                if job.get('db_id') is not None:
+                    done_ids.append(job['db_id'])
+
+                if job.get('cancelled'):
+                    continue
+
+                key = (job['chat_id'], job['message_id'])
+                if self._deletions.get(key) is job:
+                    del self._deletions[key]
+
+                deletions.setdefault(job['chat_id'], []).append(job['message_id'])
+            else:
+                await self._execute(job)
+
+        for chat_id, message_ids in deletions.items():
+            for i in range(0, len(message_ids), self.DELETE_BATCH_SIZE):
+                await self._delete_messages(chat_id, message_ids[i:i + self.DELETE_BATCH_SIZE])
+
+        if done_ids and self.db is not None:
+            self.db.remove_scheduled_deletions(done_ids)
+
+    async def _delete_messages(self, chat_id: int, message_ids: List[int]) -> None:
+        """Удаление пачки сообщений одного чата одним запросом"""
+        for message_id in message_ids:
+            displayed_messages.forget(chat_id, message_id)
+
+        try:
+            if len(message_ids) == 1:
+                await self.bot.delete_message(chat_id, message_ids[0])
+            else:
+                await self.bot.delete_messages(chat_id, message_ids)
+        except TelegramBadRequest as e:
+            logger.debug(f"Отложенное удаление сообщений {message_ids} не выполнено: {e}")
+        except Exception as e:
+            logger.error(f"Ошибка отложенного удаления сообщений в чате {chat_id}: {e}")
+
+    async def _execute(self, job: Dict[str, Any]) -> None:
+        """Выполнение одной задачи"""
+        try:
+            if job['action'] == 'edit':
+                await self.bot.edit_message_text(
+                    text=job['text'],
+                    chat_id=job['chat_id'],
+                    message_id=job['message_id'],
+                    reply_markup=job.get('keyboard'),
+                    parse_mode=job.get('parse_mode', "HTML")
+                )
+                displayed_messages.remember(
+                    job['chat_id'],
+                    job['message_id'],
+                    displayed_messages.fingerprint(job['text'], job.get('keyboard'), job.get('parse_mode', "HTML"))
+                )
+            else:
+                logger.warning(f"Неизвестное действие планировщика: {job['action']}")
+        except TelegramBadRequest as e:
+            displayed_messages.forget(job['chat_id'], job['message_id'])
+            logger.debug(f"Отложенное действие {job['action']} для {job['message_id']} не выполнено: {e}")
+        except Exception as e:
+            logger.error(f"Ошибка выполнения отложенного действия {job['action']}: {e}")
+
+# Общий планировщик для всех модулей
+message_scheduler = MessageScheduler()
@@ -0,0 +1,144 @@
+"""
+HTTP-сессия Bot API для GromFitBot
+Настраиваемый пул соединений, keep-alive, кэш DNS, таймауты по методам,
+прокси и гистограммы задержек запросов по каждому методу Bot API
+"""
+
+import bisect
+import logging
+import time
+from typing import Optional, Dict, List, Any
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import TelegramMethod
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы задержек (миллисекунды)
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Таймауты по умолчанию для медленных методов (секунды)
+DEFAULT_METHOD_TIMEOUTS = {
+    'sendPhoto': 120,
+    'sendDocument': 120,
+    'sendVideo': 180,
+    'sendMediaGroup': 180,
+}
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами"""
+
+    def __init__(self, buckets_ms: tuple = LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts: List[int] = [0] * (len(buckets_ms) + 1)
+        self.total = 0
+        self.errors = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, duration_ms: float, failed: bool = False) -> None:
+        """Учет одного запроса"""
+        self.counts[bisect.bisect_left(self.buckets_ms, duration_ms)] += 1
+        self.total += 1
+        self.sum_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        if failed:
+            self.errors += 1
+
+    def percentile(self, p: float) -> float:
+        """Оценка перцентиля по верхней границе корзины (мс)"""
+        if not self.total:
+            return 0.0
+
+        threshold = self.total * p / 100
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold:
+                bound = self.buckets_ms[i] if i < len(self.buckets_ms) else self.max_ms
+                return round(min(bound, self.max_ms), 1)
+
+        return self.max_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущее состояние гистограммы"""
+        labels = [f"<={b}ms" for b in self.buckets_ms] + [f">{self.buckets_ms[-1]}ms"]
+        return {
+            'count': self.total,
+            'errors': self.errors,
+            'avg_ms': round(self.sum_ms / self.total, 1) if self.total else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'max_ms': round(self.max_ms, 1),
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+class BotAPISession(AiohttpSession):
+    """Сессия Bot API с настройкой пула соединений и метриками по методам"""
+
+    def __init__(
+        self,
+        proxy: Optional[str] = None,
+        limit: int = 100,
+        limit_per_host: int = 100,
+        keepalive_timeout: float = 30,
+        dns_cache_ttl: int = 300,
+        timeout: float = 60,
+        method_timeouts: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            proxy: URL прокси (http/socks, для socks нужен aiohttp-socks)
+            limit: Общий лимит соединений
+            limit_per_host: Лимит соединений на один хост
+            keepalive_timeout: Время жизни простаивающего соединения (сек)
+            dns_cache_ttl: Время кэширования DNS (сек)
+            timeout: Таймаут запроса по умолчанию (сек)
+            method_timeouts: Таймауты для отдельных методов {'sendPhoto': 120}
+        """
+        super().__init__(proxy=proxy or None, limit=limit, timeout=timeout)
+
+        self._connector_init.update({
+            'limit_per_host': limit_per_host,
+            'keepalive_timeout': keepalive_timeout,
+            'ttl_dns_cache': dns_cache_ttl,
+            'use_dns_cache': True,
+        })
+
+        self.method_timeouts = {**DEFAULT_METHOD_TIMEOUTS, **(method_timeouts or {})}
+        self.histograms: Dict[str, LatencyHistogram] = {}
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        """Запрос к Bot API с учетом таймаута метода и замером задержки"""
+        method_name = method.__api_method__
+
+        if timeout is None:
+            timeout = self.method_timeouts.get(method_name)
+
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await super().make_request(bot, method, timeout)
+            failed = False
+            return result
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+
+            histogram = self.histograms.get(method_name)
+            if histogram is None:
+                histogram = self.histograms[method_name] = LatencyHistogram()
+            histogram.observe(duration_ms, failed)
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Гистограммы задержек по методам Bot API"""
+        return {name: histogram.snapshot() for name, histogram in sorted(self.histograms.items())}
+
+    def log_metrics(self) -> None:
+        """Вывод сводки задержек в лог"""
+        for name, stats in self.get_metrics().items():
+            logger.info(
+                f"Bot API {name}: {stats['count']} запросов, ошибок {stats['errors']}, "
+                f"avg {stats['avg_ms']} мс, p50 {stats['p50_ms']} мс, "
+                f"p95 {stats['p95_ms']} мс, max {stats['max_ms']} мс"
+            )
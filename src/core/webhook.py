@@ -0,0 +1,139 @@
+"""
+Сервер вебхука GromFitBot на aiohttp
+Принимает обновления от Telegram, проверяет секретный токен и передает их
+исполнителю с дорожками; при переполнении включается обратное давление
+"""
+
+import asyncio
+import hmac
+import logging
+from typing import Optional, List, Dict
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.types import Update
+
+from core.config import Config
+from core.executor import LaneDispatcher
+
+logger = logging.getLogger(__name__)
+
+# Заголовок, в котором Telegram передает секретный токен вебхука
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+class WebhookServer:
+    """Сервер приема обновлений Telegram через вебхук"""
+
+    def __init__(self, bot: Bot, dp: LaneDispatcher, config: Config):
+        self.bot = bot
+        self.dp = dp
+        self.config = config
+
+        self.path = config.WEBHOOK_PATH
+        self.secret = config.WEB_SECRET
+
+        self._runner: Optional[web.AppRunner] = None
+
+        # Счетчики для мониторинга
+        self.stats: Dict[str, int] = {
+            'received': 0,
+            'rejected': 0,
+            'unauthorized': 0
+        }
+
+    def create_app(self) -> web.Application:
+        """Создание aiohttp-приложения с маршрутами вебхука"""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_request)
+        app.router.add_get('/health', self.handle_health)
+        return app
+
+    def _check_secret(self, request: web.Request) -> bool:
+        """Проверка секретного токена запроса (без секрета запросы не принимаются)"""
+        if not self.secret:
+            return False
+
+        token = request.headers.get(SECRET_HEADER, '')
+        return hmac.compare_digest(token, self.secret)
+
+    async def handle_request(self, request: web.Request) -> web.Response:
+        """Прием обновления: проверка, разбор и постановка в очередь"""
+        if not self._check_secret(request):
+            self.stats['unauthorized'] += 1
+            logger.warning(f"Запрос вебхука с неверным секретом от {request.remote}")
+            return web.Response(status=401)
+
+        try:
+            data = await request.json()
+            update = Update.model_validate(data, context={"bot": self.bot})
+        except Exception as e:
+            logger.warning(f"Некорректное обновление в вебхуке: {e}")
+            return web.Response(status=400)
+
+        if not self.dp.try_feed_update(self.bot, update):
+            # Обратное давление: Telegram повторит доставку позже
+            self.stats['rejected'] += 1
+            logger.warning(f"Исполнитель переполнен, обновление {update.update_id} отклонено")
+            return web.Response(status=503)
+
+        self.stats['received'] += 1
+        return web.Response(status=200)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """Проверка состояния сервера"""
+        health = {'status': 'ok', **self.stats}
+        if self.dp.executor is not None:
+            health['executor'] = self.dp.executor.get_metrics()
+        if hasattr(self.bot.session, 'get_metrics'):
+            health['bot_api'] = self.bot.session.get_metrics()
+
+        return web.json_response(health)
+
+    async def start_server(self) -> None:
+        """Запуск HTTP-сервера без регистрации вебхука в Telegram"""
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+
+        site = web.TCPSite(self._runner, self.config.WEB_HOST, self.config.WEB_PORT)
+        await site.start()
+
+        logger.info(f"✅ Сервер вебхука запущен на {self.config.WEB_HOST}:{self.config.WEB_PORT}{self.path}")
+
+    async def stop_server(self) -> None:
+        """Остановка HTTP-сервера (принятые обновления дообрабатывает исполнитель)"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+        logger.info("✅ Сервер вебхука остановлен")
+
+    async def run(self, allowed_updates: Optional[List[str]] = None) -> None:
+        """Регистрация вебхука и работа до сигнала остановки"""
+        await self.dp.emit_startup(bot=self.bot)
+        await self.start_server()
+
+        webhook_url = self.config.WEBHOOK_URL.rstrip('/') + self.path
+        await self.bot.set_webhook(
+            url=webhook_url,
+            allowed_updates=allowed_updates,
+            secret_token=self.secret,
+            max_connections=min(self.config.UPDATE_LANES * 2, 100)
+        )
+        logger.info(f"✅ Вебхук установлен: {webhook_url}")
+
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        try:
+            import signal
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            # Сигналы недоступны (например, Windows) - остановка через KeyboardInterrupt
+            pass
+
+        try:
+            await stop_event.wait()
+            logger.info("🛑 Получен сигнал остановки")
+        finally:
+            await self.stop_server()
+            await self.dp.emit_shutdown(bot=self.bot)
@@ -14,6 +14,9 @@ current_dir = Path(__file__).parent
 project_root = current_dir.parent
 sys.path.insert(0, str(project_root))
 
+# Отсчет профиля запуска - до импорта тяжелых зависимостей
+from core.profiler import startup_profiler
+
 # Настройка логирования до импорта других модулей
 logging.basicConfig(
     level=logging.INFO,
@@ -94,11 +97,42 @@ REDIS_PORT=6379
 REDIS_PASSWORD=
 REDIS_DB=0
 
-# Веб-настройки (для будущего веб-интерфейса)
+# Веб-настройки (сервер вебхука)
 WEB_HOST=0.0.0.0
 WEB_PORT=8080
 WEB_SECRET=your_secret_key_here
 
+# Режим получения обновлений: polling или webhook
+BOT_MODE=polling
+WEBHOOK_URL=https://example.com
+WEBHOOK_PATH=/webhook
+
+# Параллельная обработка обновлений
+UPDATE_LANES=20
+UPDATE_MAX_IN_FLIGHT=1000
+CALLBACK_DEDUP_TTL=5
+
+# HTTP-сессия Bot API
+API_POOL_SIZE=100
+API_POOL_PER_HOST=100
+API_KEEPALIVE=30
+API_DNS_TTL=300
+API_TIMEOUT=60
+API_METHOD_TIMEOUTS=sendPhoto=120,sendDocument=120
+API_PROXY=
+
+# Состояния FSM (регистрация)
+FSM_STATE_TTL=86400
+FSM_CACHE_SIZE=10000
+FSM_CACHE_TTL=2
+FSM_SWEEP_INTERVAL=600
+PENDING_REFERRAL_TTL=86400
+
+# Загрузка модулей
+LAZY_MODULES=True
+MODULE_WARMUP_DELAY=1
+PROFILE_STARTUP=False
+
 # Настройки S3 для бэкапов (опционально)
 S3_ENDPOINT=
 S3_ACCESS_KEY=
@@ -142,32 +176,6 @@ MAX_PURCHASE_PER_DAY=10
     with open('.env.example', 'w', encoding='utf-8') as f:
         f.write(env_example_content)
 
-def init_message_manager_in_modules(bot):
-    """Инициализация менеджера сообщений во всех модулях"""
-    logger.info("Инициализация менеджера сообщений в модулях...")
-    
-    try:
-        # Импортируем функции инициализации из каждого модуля
-        from modules.referrals.handlers import init_message_manager as init_ref
-        from modules.profile.handlers import init_message_manager as init_prof
-        from modules.shop.handlers import init_message_manager as init_shop
-        from modules.bonus.handlers import init_message_manager as init_bonus
-        
-        # Инициализируем менеджер сообщений в каждом модуле
-        init_ref(bot)
-        init_prof(bot)
-        init_shop(bot)
-        init_bonus(bot)
-        
-        logger.info("✅ Менеджер сообщений инициализирован во всех модулях")
-        return True
-    except ImportError as e:
-        logger.error(f"❌ Ошибка импорта при инициализации модулей: {e}")
-        return False
-    except Exception as e:
-        logger.error(f"❌ Ошибка инициализации менеджера сообщений: {e}")
-        return False
-
 def check_database():
     """Проверка базы данных"""
     try:
@@ -200,18 +208,15 @@ async def main_async():
     if not check_database():
         logger.warning("⚠️ Проблемы с базой данных. Бот может работать некорректно.")
     
-    # Импортируем основной класс бота
-    from core.bot import GromFitBot
+    # Импортируем основной класс бота (модули загружаются отложенно)
+    with startup_profiler.measure('core.bot'):
+        from core.bot import GromFitBot
     
     try:
         # Создаем экземпляр бота
         bot_instance = GromFitBot()
         logger.info("✅ Экземпляр бота создан")
         
-        # Инициализируем менеджер сообщений в модулях
-        if not init_message_manager_in_modules(bot_instance.bot):
-            logger.warning("⚠️ Не удалось инициализировать менеджер сообщений в модулях")
-        
         # Запускаем бота
         logger.info("🚀 Запуск бота...")
         await bot_instance.start()
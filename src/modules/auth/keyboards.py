@@ -5,6 +5,8 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from modules.keyboards.callbacks import NICKNAME_FROM_TELEGRAM
+
 class AuthKeyboards:
     """Клавиатуры для процесса регистрации"""
     
@@ -19,7 +21,7 @@ class AuthKeyboards:
             builder.row(
                 InlineKeyboardButton(
                     text=f"👤 {full_name}",
-                    callback_data=f"nickname_{full_name}"
+                    callback_data=NICKNAME_FROM_TELEGRAM.pack()
                 )
             )
         
@@ -10,7 +10,6 @@ import logging
 from datetime import datetime
 from typing import Dict, Optional, Tuple, Any
 
-from aiogram import Router, F
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
@@ -18,10 +17,14 @@ from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove
 from aiogram.exceptions import TelegramBadRequest
 
 from core.database import Database
+from core.dispatch_router import DispatchRouter
+from core.events import events, USER_REGISTERED, REFERRAL_ADDED
 from core.message_manager import MessageManager
+from core.pending_referrals import pending_referrals
 from modules.keyboards.main_keyboards import MainKeyboards, AuthKeyboards
+from modules.keyboards.callbacks import NICKNAME_FROM_TELEGRAM
 
-router = Router()
+router = DispatchRouter()
 db = Database()
 message_manager = MessageManager(None)  # Будет инициализирован в main.py
 logger = logging.getLogger(__name__)
@@ -198,6 +201,31 @@ async def handle_nickname_input(message: Message, state: FSMContext):
     else:
         nickname = message.text.strip()
     
+    await accept_nickname(message, state, nickname)
+
+@router.action(NICKNAME_FROM_TELEGRAM)
+async def handle_nickname_from_telegram(callback: CallbackQuery, state: FSMContext, payload):
+    """Обработка инлайн-кнопки с именем из Telegram (имя берется из профиля, а не из callback_data)"""
+    if await state.get_state() != RegistrationStates.waiting_for_nickname.state:
+        await callback.answer("Регистрация не начата или уже пройдена")
+        return
+    
+    nickname = (callback.from_user.full_name or "").strip()
+    await callback.answer()
+    
+    if not nickname:
+        await message_manager.replace_message(
+            callback.message,
+            "❌ <b>Не удалось получить имя из Telegram</b>\n\n"
+            "Пожалуйста, введите никнейм вручную:",
+            reply_markup=ReplyKeyboardRemove()
+        )
+        return
+    
+    await accept_nickname(callback.message, state, nickname)
+
+async def accept_nickname(message: Message, state: FSMContext, nickname: str):
+    """Проверка выбранного никнейма и переход к выбору региона"""
     # Валидация никнейма
     is_valid, validation_result = RegistrationUtils.validate_nickname(nickname)
     
@@ -363,11 +391,9 @@ async def complete_registration(message: Message, state: FSMContext):
         'settings': '{}'
     }
     
-    # Проверяем, есть ли реферальный ID в состоянии
-    from core.bot import GromFitBot
-    bot_instance = GromFitBot()
-    if user_id in bot_instance.user_states and 'referral_id' in bot_instance.user_states[user_id]:
-        referral_id = bot_instance.user_states[user_id]['referral_id']
+    # Проверяем, пришел ли пользователь по реферальной ссылке
+    referral_id = pending_referrals.pop(user_id)
+    if referral_id:
         user_record['referrer_id'] = referral_id
     
     # Сохраняем пользователя в БД
@@ -384,15 +410,17 @@ async def complete_registration(message: Message, state: FSMContext):
         await state.clear()
         return
     
-    # Добавляем стартовые достижения
-    await add_starting_achievements(user_id)
+    # Получаем информацию о пользователе для приветствия
+    user = db.get_user(user_id)
+    
+    # Стартовые достижения и достижения реферера выдает движок достижений
+    events.publish(USER_REGISTERED, user_id=user_id)
+    if referral_id and user and user.get('referrer_id') == referral_id:
+        events.publish(REFERRAL_ADDED, user_id=referral_id, referred_id=user_id)
     
     # Очищаем состояние
     await state.clear()
     
-    # Получаем информацию о пользователе для приветствия
-    user = db.get_user(user_id)
-    
     # Формируем приветственное сообщение
     welcome_text = (
         f"🎉 <b>Поздравляем с успешной регистрацией, {nickname}!</b>\n\n"
@@ -419,34 +447,8 @@ async def complete_registration(message: Message, state: FSMContext):
     
     logger.info(f"Пользователь {user_id} успешно зарегистрирован как {nickname}")
 
-async def add_starting_achievements(user_id: int):
-    """Добавление стартовых достижений пользователю"""
-    starting_achievements = [
-        {
-            'achievement_id': 'welcome_to_gromfit',
-            'title': 'Добро пожаловать в GromFit!',
-            'description': 'Вы успешно зарегистрировались в системе',
-            'icon': '👋',
-            'reward_tokens': 5.00,
-            'category': 'registration'
-        },
-        {
-            'achievement_id': 'first_steps',
-            'title': 'Первые шаги',
-            'description': 'Завершили процесс регистрации',
-            'icon': '🚶',
-            'reward_tokens': 10.00,
-            'category': 'progress'
-        }
-    ]
-    
-    for achievement in starting_achievements:
-        db.add_achievement(user_id, achievement)
-    
-    logger.debug(f"Добавлены стартовые достижения пользователю {user_id}")
-
 # Обработчики отмены регистрации
-@router.message(F.text == "❌ Отмена")
+@router.text("❌ Отмена")
 async def handle_registration_cancel(message: Message, state: FSMContext):
     """Обработка отмены регистрации"""
     current_state = await state.get_state()
@@ -5,22 +5,26 @@
 
 import logging
 from datetime import datetime, date, timedelta
-from typing import Dict, List, Optional, Any
-import asyncio
+from typing import Dict, Optional, Any, Tuple
 
-from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
 from aiogram.filters import Command
 
 from core.database import Database
+from core.dispatch_router import DispatchRouter
+from core.events import events, BONUS_CLAIMED
 from core.message_manager import MessageManager
+from core.scheduler import message_scheduler
 from modules.keyboards.main_keyboards import MainKeyboards
 
-router = Router()
+router = DispatchRouter()
 db = Database()
 message_manager = MessageManager(None)
 logger = logging.getLogger(__name__)
 
+# Длительность показа анимации получения бонуса (секунды)
+BONUS_ANIMATION_DURATION = 2
+
 def init_message_manager(bot):
     """Инициализация менеджера сообщений"""
     global message_manager
@@ -28,7 +32,7 @@ def init_message_manager(bot):
 
 # ==================== ОСНОВНЫЕ ОБРАБОТЧИКИ БОНУСОВ ====================
 
-@router.message(F.text == "🎁 Бонусы")
+@router.text("🎁 Бонусы")
 async def handle_bonus(message: Message):
     """Основной обработчик кнопки 'Бонусы'"""
     user_id = message.from_user.id
@@ -145,7 +149,7 @@ def get_max_multiplier() -> float:
 
 # ==================== ОБРАБОТЧИКИ ПОЛУЧЕНИЯ БОНУСОВ ====================
 
-@router.callback_query(F.data == "bonus_claim_daily")
+@router.callback("bonus_claim_daily")
 async def handle_bonus_claim_daily(callback: CallbackQuery):
     """Обработчик получения ежедневного бонуса"""
     user_id = callback.from_user.id
@@ -179,16 +183,22 @@ async def handle_bonus_claim_daily(callback: CallbackQuery):
     bonus_amount = claim_result['bonus_amount']
     daily_streak = claim_result['daily_streak']
     new_balance = claim_result['new_balance']
+    events.publish(BONUS_CLAIMED, user_id=user_id, bonus_amount=bonus_amount, daily_streak=daily_streak)
     
     # Показываем анимацию получения бонуса
     await show_bonus_animation(callback, bonus_amount, daily_streak)
     
-    # Обновляем меню бонусов
-    await asyncio.sleep(2)  # Пауза для анимации
-    
-    # Обновляем информацию о пользователе
+    # Обновляем информацию о пользователе и планируем обновление меню после анимации
     user = db.get_user(user_id)
-    await show_bonus_menu_from_callback(callback, user)
+    bonus_text, keyboard = build_bonus_menu(user)
+    message_scheduler.schedule_edit(
+        callback.message,
+        bonus_text,
+        BONUS_ANIMATION_DURATION,
+        keyboard
+    )
+    
+    await message_manager.answer_callback_with_notification(callback)
 
 async def show_bonus_animation(callback: CallbackQuery, bonus_amount: float, streak: int):
     """Показ анимации получения бонуса"""
@@ -225,12 +235,11 @@ async def show_bonus_animation(callback: CallbackQuery, bonus_amount: float, str
     # Временное сообщение с анимацией
     temp_message = await callback.message.answer(animation_text)
     
-    # Удаляем временное сообщение через 2 секунды
-    await asyncio.sleep(2)
-    await temp_message.delete()
+    # Удаление временного сообщения выполнит планировщик, обработчик не ждет
+    message_scheduler.schedule_delete(temp_message, BONUS_ANIMATION_DURATION)
 
-async def show_bonus_menu_from_callback(callback: CallbackQuery, user: Dict[str, Any]):
-    """Отображение меню бонусов из callback"""
+def build_bonus_menu(user: Dict[str, Any]) -> Tuple[str, InlineKeyboardMarkup]:
+    """Формирование текста и клавиатуры меню бонусов"""
     user_id = user['telegram_id']
     
     # Проверяем, может ли пользователь получить бонус
@@ -265,13 +274,19 @@ async def show_bonus_menu_from_callback(callback: CallbackQuery, user: Dict[str,
         f"<i>Не пропускайте дни для максимальных бонусов!</i>"
     )
     
+    return bonus_text, MainKeyboards.get_bonus_keyboard(can_claim, daily_streak)
+
+async def show_bonus_menu_from_callback(callback: CallbackQuery, user: Dict[str, Any]):
+    """Отображение меню бонусов из callback"""
+    bonus_text, keyboard = build_bonus_menu(user)
+    
     await message_manager.edit_message_with_menu(
         callback,
         bonus_text,
-        MainKeyboards.get_bonus_keyboard(can_claim, daily_streak)
+        keyboard
     )
 
-@router.callback_query(F.data == "bonus_already_claimed")
+@router.callback("bonus_already_claimed")
 async def handle_bonus_already_claimed(callback: CallbackQuery):
     """Обработчик попытки получения уже полученного бонуса"""
     await message_manager.answer_callback_with_notification(
@@ -282,7 +297,7 @@ async def handle_bonus_already_claimed(callback: CallbackQuery):
 
 # ==================== ОБРАБОТЧИКИ СТАТИСТИКИ БОНУСОВ ====================
 
-@router.callback_query(F.data == "bonus_stats")
+@router.callback("bonus_stats")
 async def handle_bonus_stats(callback: CallbackQuery):
     """Обработчик кнопки 'Статистика бонусов'"""
     user_id = callback.from_user.id
@@ -296,26 +311,20 @@ async def handle_bonus_stats(callback: CallbackQuery):
         )
         return
     
-    # Получаем историю транзакций (только бонусы)
-    transactions = db.get_user_transactions(user_id, limit=50)
-    bonus_transactions = [t for t in transactions if t['transaction_type'] == 'daily_bonus']
+    # Итоги хранятся в БД и обновляются при получении бонуса
+    history = db.get_bonus_history(user_id, months=3)
     
-    # Анализируем статистику
-    total_bonuses = len(bonus_transactions)
-    total_tokens = sum(t['amount'] for t in bonus_transactions)
+    total_bonuses = history['total_count']
+    total_tokens = history['total_amount']
     
     # Вычисляем средний бонус
     avg_bonus = total_tokens / total_bonuses if total_bonuses > 0 else 0
     
-    # Находим максимальный бонус
-    max_bonus = max((t['amount'] for t in bonus_transactions), default=0)
-    
-    # Анализируем по месяцам
-    monthly_stats = analyze_monthly_bonuses(bonus_transactions)
+    max_bonus = history['max_bonus']['amount'] if history['max_bonus'] else 0
     
     # Текущая серия
     current_streak = user.get('daily_streak', 0)
-    max_streak = calculate_max_streak(bonus_transactions)
+    max_streak = history['longest_streak']['length'] if history['longest_streak'] else 0
     
     stats_text = (
         f"📊 <b>Статистика бонусов</b>\n\n"
@@ -331,20 +340,21 @@ async def handle_bonus_stats(callback: CallbackQuery):
         f"🏅 <b>Максимальная серия:</b> {max_streak} дней\n\n"
     )
     
-    # Статистика по месяцам
-    if monthly_stats:
+    # Статистика по месяцам (последние 3 месяца)
+    if history['months']:
         stats_text += "<b>Статистика по месяцам:</b>\n"
         
-        for month, data in list(monthly_stats.items())[-3:]:  # Последние 3 месяца
-            stats_text += f"• {month}: {data['count']} бонусов, {data['total']:.0f} токенов\n"
+        for month in history['months']:
+            stats_text += f"• {month['month']}: {month['count']} бонусов, {month['total']:.0f} токенов\n"
         
         stats_text += "\n"
     
     # Последние бонусы
+    bonus_transactions = db.get_user_transactions(user_id, limit=5, transaction_type='daily_bonus')
     if bonus_transactions:
         stats_text += "<b>Последние бонусы:</b>\n"
         
-        for i, transaction in enumerate(bonus_transactions[:5], 1):
+        for i, transaction in enumerate(bonus_transactions, 1):
             amount = transaction['amount']
             created_at = transaction['created_at']
             
@@ -373,97 +383,7 @@ async def handle_bonus_stats(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-def analyze_monthly_bonuses(transactions: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
-    """Анализ бонусов по месяцам"""
-    monthly_stats = {}
-    
-    for transaction in transactions:
-        created_at = transaction['created_at']
-        amount = transaction['amount']
-        
-        if not created_at:
-            continue
-        
-        try:
-            if isinstance(created_at, str):
-                date_obj = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-            else:
-                date_obj = created_at
-            
-            month_key = date_obj.strftime("%Y-%m")
-            
-            if month_key not in monthly_stats:
-                monthly_stats[month_key] = {
-                    'count': 0,
-                    'total': 0,
-                    'max': 0
-                }
-            
-            monthly_stats[month_key]['count'] += 1
-            monthly_stats[month_key]['total'] += amount
-            
-            if amount > monthly_stats[month_key]['max']:
-                monthly_stats[month_key]['max'] = amount
-        except:
-            continue
-    
-    return monthly_stats
-
-def calculate_max_streak(transactions: List[Dict[str, Any]]) -> int:
-    """Вычисление максимальной серии дней"""
-    if not transactions:
-        return 0
-    
-    # Сортируем транзакции по дате
-    sorted_transactions = sorted(
-        transactions,
-        key=lambda x: x.get('created_at', ''),
-        reverse=True
-    )
-    
-    max_streak = 0
-    current_streak = 0
-    prev_date = None
-    
-    for transaction in sorted_transactions:
-        created_at = transaction['created_at']
-        
-        if not created_at:
-            continue
-        
-        try:
-            if isinstance(created_at, str):
-                current_date = datetime.fromisoformat(created_at.replace('Z', '+00:00')).date()
-            else:
-                current_date = created_at.date()
-            
-            if prev_date is None:
-                current_streak = 1
-            else:
-                days_diff = (prev_date - current_date).days
-                
-                if days_diff == 1:
-                    current_streak += 1
-                elif days_diff > 1:
-                    # Проверяем, не является ли это началом новой серии
-                    if current_streak > max_streak:
-                        max_streak = current_streak
-                    current_streak = 1
-                else:
-                    # Тот же день - пропускаем
-                    continue
-            
-            prev_date = current_date
-        except:
-            continue
-    
-    # Проверяем последнюю серию
-    if current_streak > max_streak:
-        max_streak = current_streak
-    
-    return max_streak
-
-@router.callback_query(F.data == "bonus_records")
+@router.callback("bonus_records")
 async def handle_bonus_records(callback: CallbackQuery):
     """Обработчик кнопки 'Рекорды'"""
     user_id = callback.from_user.id
@@ -477,11 +397,10 @@ async def handle_bonus_records(callback: CallbackQuery):
         )
         return
     
-    # Получаем историю транзакций (только бонусы)
-    transactions = db.get_user_transactions(user_id, limit=100)
-    bonus_transactions = [t for t in transactions if t['transaction_type'] == 'daily_bonus']
+    # Рекорды хранятся в БД и обновляются при получении бонуса
+    history = db.get_bonus_history(user_id)
     
-    if not bonus_transactions:
+    if not history['total_count']:
         await message_manager.edit_message_with_menu(
             callback,
             "🏆 <b>Рекорды бонусов</b>\n\n"
@@ -493,7 +412,7 @@ async def handle_bonus_records(callback: CallbackQuery):
         return
     
     # Находим рекорды
-    records = calculate_bonus_records(bonus_transactions)
+    records = build_bonus_records(history)
     
     records_text = (
         f"🏆 <b>Рекорды бонусов</b>\n\n"
@@ -532,70 +451,31 @@ async def handle_bonus_records(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-def calculate_bonus_records(transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Вычисление рекордов бонусов"""
-    if not transactions:
-        return {}
-    
-    # Находим самый большой и маленький бонусы
-    max_bonus = max(transactions, key=lambda x: x['amount'])
-    min_bonus = min(transactions, key=lambda x: x['amount'])
-    
-    # Вычисляем максимальную серию
-    max_streak = calculate_max_streak(transactions)
+def format_bonus_date(value: Optional[str], date_format: str = "%d.%m.%Y") -> str:
+    """Дата бонуса из ISO-строки"""
+    if not value:
+        return "Неизвестно"
     
-    # Общая статистика
-    total_count = len(transactions)
-    total_amount = sum(t['amount'] for t in transactions)
+    try:
+        return date.fromisoformat(value).strftime(date_format)
+    except ValueError:
+        return "Неизвестно"
+
+def build_bonus_records(history: Dict[str, Any]) -> Dict[str, Any]:
+    """Рекорды бонусов по итогам из БД"""
+    total_count = history['total_count']
+    total_amount = history['total_amount']
     average_bonus = total_amount / total_count if total_count > 0 else 0
     
-    # Форматируем даты
-    def format_bonus_date(transaction):
-        created_at = transaction.get('created_at')
-        if not created_at:
-            return "Неизвестно"
-        
-        try:
-            if isinstance(created_at, str):
-                date_obj = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-            else:
-                date_obj = created_at
-            
-            return date_obj.strftime("%d.%m.%Y")
-        except:
-            return "Неизвестно"
+    longest_streak = history['longest_streak']
+    max_streak = longest_streak['length'] if longest_streak else 0
     
-    # Определяем период максимальной серии (упрощенно)
     max_streak_period = "Неизвестно"
-    if transactions:
-        try:
-            first_date = datetime.fromisoformat(transactions[0]['created_at'].replace('Z', '+00:00'))
-            last_date = datetime.fromisoformat(transactions[-1]['created_at'].replace('Z', '+00:00'))
-            
-            if (last_date - first_date).days >= max_streak:
-                max_streak_period = f"{first_date.strftime('%d.%m')}-{last_date.strftime('%d.%m.%Y')}"
-        except:
-            pass
-    
-    # Определяем серию для максимального бонуса (упрощенно)
-    max_bonus_streak = 1
-    for i, t in enumerate(transactions):
-        if t['id'] == max_bonus['id'] and i > 0:
-            # Проверяем предыдущие дни
-            current_date = datetime.fromisoformat(t['created_at'].replace('Z', '+00:00')).date()
-            streak_count = 1
-            
-            for j in range(i-1, -1, -1):
-                prev_date = datetime.fromisoformat(transactions[j]['created_at'].replace('Z', '+00:00')).date()
-                days_diff = (current_date - prev_date).days
-                
-                if days_diff == streak_count:
-                    streak_count += 1
-                else:
-                    break
-            
-            max_bonus_streak = streak_count
-            break
+    if longest_streak:
+        max_streak_period = (
+            f"{format_bonus_date(longest_streak['start_date'], '%d.%m')}-"
+            f"{format_bonus_date(longest_streak['end_date'])}"
+        )
     
     # Собираем недавние достижения
     recent_achievements = []
@@ -616,13 +496,13 @@ def calculate_bonus_records(transactions: List[Dict[str, Any]]) -> Dict[str, Any
     
     return {
         'max_bonus': {
-            'amount': max_bonus['amount'],
-            'date': format_bonus_date(max_bonus),
-            'streak': max_bonus_streak
+            'amount': history['max_bonus']['amount'],
+            'date': format_bonus_date(history['max_bonus']['date']),
+            'streak': history['max_bonus']['streak']
         },
         'min_bonus': {
-            'amount': min_bonus['amount'],
-            'date': format_bonus_date(min_bonus)
+            'amount': history['min_bonus']['amount'],
+            'date': format_bonus_date(history['min_bonus']['date'])
         },
         'max_streak': max_streak,
         'max_streak_period': max_streak_period,
@@ -632,7 +512,7 @@ def calculate_bonus_records(transactions: List[Dict[str, Any]]) -> Dict[str, Any
         'recent_achievements': recent_achievements
     }
 
-@router.callback_query(F.data == "bonus_streak_info")
+@router.callback("bonus_streak_info")
 async def handle_bonus_streak_info(callback: CallbackQuery):
     """Обработчик информации о серии дней"""
     user_id = callback.from_user.id
@@ -698,7 +578,7 @@ async def handle_bonus_streak_info(callback: CallbackQuery):
 
 # ==================== ОБРАБОТЧИКИ НАВИГАЦИИ ====================
 
-@router.callback_query(F.data == "back_to_bonus")
+@router.callback("back_to_bonus")
 async def handle_back_to_bonus(callback: CallbackQuery):
     """Возврат в меню бонусов"""
     user_id = callback.from_user.id
@@ -731,12 +611,12 @@ async def handle_back_to_bonus(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-@router.callback_query(F.data == "back_to_bonus_menu")
+@router.callback("back_to_bonus_menu")
 async def handle_back_to_bonus_menu(callback: CallbackQuery):
     """Возврат в меню бонусов (алиас)"""
     await handle_back_to_bonus(callback)
 
-@router.callback_query(F.data == "back_to_main")
+@router.callback("back_to_main")
 async def handle_back_to_main_from_bonus(callback: CallbackQuery):
     """Возврат в главное меню из бонусов"""
     user_id = callback.from_user.id
@@ -860,6 +740,7 @@ async def handle_daily_command(message: Message):
     bonus_amount = claim_result['bonus_amount']
     daily_streak = claim_result['daily_streak']
     new_balance = claim_result['new_balance']
+    events.publish(BONUS_CLAIMED, user_id=user_id, bonus_amount=bonus_amount, daily_streak=daily_streak)
     
     success_text = (
         f"🎉 <b>Ежедневный бонус получен!</b>\n\n"
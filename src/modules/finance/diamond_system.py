@@ -1,13 +1,15 @@
 """
 Система алмазов как внешней валюты (1 алмаз = 1 звезда Telegram)
+Все начисления и списания - проводки двойной записи в общей БД
 """
 
 import logging
-import sqlite3
-from datetime import datetime
 from typing import Dict, List, Optional
 
-from src.core.database import db
+from core.database import Database
+from core.ledger import DIAMONDS, EXCHANGE, FEES, Leg, credit, debit, counterparty_for
+
+db = Database()
 
 logger = logging.getLogger(__name__)
 
@@ -23,15 +25,16 @@ class DiamondSystem:
     
     def get_balance(self, telegram_id: int) -> Dict:
         """Получение полной информации о балансе алмазов"""
-        user = db.get_user(telegram_id)
+        user = self.db.get_user(telegram_id)
         
         if not user:
             return {"error": "Пользователь не найден"}
         
-        # Безопасное получение значений
-        balance = float(user['balance_diamonds']) if 'balance_diamonds' in user.keys() else 0.00
-        total_earned = float(user['total_earned_diamonds']) if 'total_earned_diamonds' in user.keys() else 0.00
-        total_spent = float(user['total_spent_diamonds']) if 'total_spent_diamonds' in user.keys() else 0.00
+        # Баланс и обороты кошелька
+        account = self.db.get_ledger_account(telegram_id, DIAMONDS)
+        balance = float(account['balance'])
+        total_earned = float(account['credited'])
+        total_spent = float(account['debited'])
         
         return {
             "balance": balance,
@@ -50,14 +53,14 @@ class DiamondSystem:
         if amount <= 0:
             return {"error": "Сумма должна быть положительной"}
         
-        success = self._add_diamonds(
+        posting_id = self._add_diamonds(
             telegram_id=telegram_id,
             amount=amount,
             transaction_type=f"deposit_{source}",
             description=description or f"Покупка алмазов за {source}"
         )
         
-        if not success:
+        if posting_id is None:
             return {"error": "Ошибка при пополнении алмазов"}
         
         # Получаем обновленный баланс
@@ -67,7 +70,7 @@ class DiamondSystem:
             "success": True,
             "amount": amount,
             "new_balance": new_balance,
-            "transaction_id": f"diamond_deposit_{int(datetime.now().timestamp())}",
+            "transaction_id": posting_id,
             "message": f"✅ Баланс алмазов пополнен на {self._format_diamonds(amount)}"
         }
     
@@ -90,23 +93,24 @@ class DiamondSystem:
         if balance_info["balance"] < amount:
             return {"error": f"Недостаточно алмазов. Доступно: {balance_info['formatted_balance']}"}
         
-        success = self._deduct_diamonds(
-            telegram_id=telegram_id,
-            amount=amount,
-            transaction_type=f"withdrawal_{method}",
-            description=description or f"Вывод алмазов в {method}"
+        # Комиссия 10%
+        fee = round(amount * self.WITHDRAWAL_FEE, 2)
+        net_amount = amount - fee
+        
+        # Одна проводка: к выводу уходит сумма за вычетом комиссии, комиссия - на счет комиссий
+        posting_id = self.db.post(
+            f"withdrawal_{method}",
+            [Leg(telegram_id, DIAMONDS, -amount), Leg(EXCHANGE, DIAMONDS, net_amount), Leg(FEES, DIAMONDS, fee)],
+            description or f"Вывод алмазов в {method}",
+            {'method': method, 'fee': fee}
         )
         
-        if not success:
+        if posting_id is None:
             return {"error": "Ошибка при выводе алмазов"}
         
         # Получаем обновленный баланс
         new_balance = self.get_balance(telegram_id)
         
-        # Комиссия 10%
-        fee = amount * self.WITHDRAWAL_FEE
-        net_amount = amount - fee
-        
         return {
             "success": True,
             "amount": amount,
@@ -114,7 +118,7 @@ class DiamondSystem:
             "fee": fee,
             "method": method,
             "new_balance": new_balance,
-            "transaction_id": f"diamond_withdraw_{int(datetime.now().timestamp())}",
+            "transaction_id": posting_id,
             "message": f"✅ Заявка на вывод {self._format_diamonds(amount)} алмазов принята\n"
                       f"💸 Комиссия (10%): {self._format_diamonds(fee)}\n"
                       f"💰 К зачислению: {net_amount} звезд"
@@ -141,105 +145,30 @@ class DiamondSystem:
         )
     
     def _add_diamonds(self, telegram_id: int, amount: float, 
-                     transaction_type: str, description: str = "") -> bool:
-        """Внутренний метод добавления алмазов"""
-        try:
-            # Получаем текущий баланс
-            cursor = self.db.execute(
-                "SELECT balance_diamonds, total_earned_diamonds FROM users WHERE telegram_id = ?",
-                (telegram_id,)
-            )
-            user = cursor.fetchone()
-            
-            if not user:
-                return False
-            
-            balance_before = float(user['balance_diamonds']) if user['balance_diamonds'] is not None else 0.00
-            balance_after = balance_before + amount
-            
-            # Обновляем баланс
-            self.db.execute('''
-                UPDATE users 
-                SET balance_diamonds = ?, 
-                    total_earned_diamonds = total_earned_diamonds + ?
-                WHERE telegram_id = ?
-            ''', (balance_after, amount, telegram_id))
-            
-            # Генерируем ID транзакции
-            transaction_id = f"dm_{int(datetime.now().timestamp())}_{telegram_id}"
-            
-            # Записываем транзакцию
-            self.db.execute('''
-                INSERT INTO diamond_transactions 
-                (transaction_id, user_id, amount, transaction_type, 
-                 balance_before, balance_after, description)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (transaction_id, telegram_id, amount, transaction_type,
-                  balance_before, balance_after, description))
-            
-            self.db.commit()
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error adding diamonds: {e}")
-            return False
+                     transaction_type: str, description: str = "") -> Optional[int]:
+        """Внутренний метод добавления алмазов (ID проводки с системного счета)"""
+        if amount <= 0:
+            return None
+        
+        legs = credit(telegram_id, counterparty_for(transaction_type), amount, DIAMONDS)
+        return self.db.post(transaction_type, legs, description)
     
     def _deduct_diamonds(self, telegram_id: int, amount: float, 
-                        transaction_type: str, description: str = "") -> bool:
-        """Внутренний метод списания алмазов"""
-        try:
-            # Получаем текущий баланс
-            cursor = self.db.execute(
-                "SELECT balance_diamonds, total_spent_diamonds FROM users WHERE telegram_id = ?",
-                (telegram_id,)
-            )
-            user = cursor.fetchone()
-            
-            if not user:
-                return False
-            
-            balance_before = float(user['balance_diamonds']) if user['balance_diamonds'] is not None else 0.00
-            
-            # Проверяем, достаточно ли средств
-            if balance_before < amount:
-                return False
-            
-            balance_after = balance_before - amount
-            
-            # Обновляем баланс
-            self.db.execute('''
-                UPDATE users 
-                SET balance_diamonds = ?, 
-                    total_spent_diamonds = total_spent_diamonds + ?
-                WHERE telegram_id = ?
-            ''', (balance_after, amount, telegram_id))
-            
-            # Генерируем ID транзакции
-            transaction_id = f"dm_{int(datetime.now().timestamp())}_{telegram_id}"
-            
-            # Записываем транзакцию
-            self.db.execute('''
-                INSERT INTO diamond_transactions 
-                (transaction_id, user_id, amount, transaction_type, 
-                 balance_before, balance_after, description)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (transaction_id, telegram_id, amount, transaction_type,
-                  balance_before, balance_after, description))
-            
-            self.db.commit()
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error deducting diamonds: {e}")
-            return False
+                        transaction_type: str, description: str = "") -> Optional[int]:
+        """Внутренний метод списания алмазов (None при нехватке средств)"""
+        if amount <= 0:
+            return None
+        
+        legs = debit(telegram_id, counterparty_for(transaction_type), amount, DIAMONDS)
+        return self.db.post(transaction_type, legs, description)
     
     def _add_diamonds_with_message(self, telegram_id: int, amount: float,
                                   transaction_type: str, description: str,
                                   success_message: str) -> Dict:
         """Добавление алмазов с возвратом сообщения"""
-        success = self._add_diamonds(telegram_id, amount, transaction_type, description)
+        posting_id = self._add_diamonds(telegram_id, amount, transaction_type, description)
         
-        if not success:
+        if posting_id is None:
             return {"error": "Ошибка начисления алмазов"}
         
         new_balance = self.get_balance(telegram_id)
@@ -255,9 +184,9 @@ class DiamondSystem:
                                      transaction_type: str, description: str,
                                      error_message: str) -> Dict:
         """Списание алмазов с возвратом сообщения"""
-        success = self._deduct_diamonds(telegram_id, amount, transaction_type, description)
+        posting_id = self._deduct_diamonds(telegram_id, amount, transaction_type, description)
         
-        if not success:
+        if posting_id is None:
             return {"error": error_message}
         
         new_balance = self.get_balance(telegram_id)
@@ -284,16 +213,7 @@ class DiamondSystem:
         """Получение истории транзакций алмазов"""
         
         try:
-            cursor = self.db.execute('''
-                SELECT transaction_id, amount, transaction_type, 
-                       balance_before, balance_after, description, created_at
-                FROM diamond_transactions
-                WHERE user_id = ?
-                ORDER BY created_at DESC
-                LIMIT ?
-            ''', (telegram_id, limit))
-            
-            transactions = cursor.fetchall()
+            transactions = self.db.get_user_transactions(telegram_id, limit, currency=DIAMONDS)
             
             formatted_transactions = []
             for tx in transactions:
@@ -313,7 +233,7 @@ class DiamondSystem:
                     icon = "🛒"
                 
                 formatted_transactions.append({
-                    "id": tx.get('transaction_id', 'unknown'),
+                    "id": tx['posting_id'],
                     "amount": amount,
                     "formatted_amount": f"{'+' if is_positive else ''}{self._format_diamonds(amount)}",
                     "type": tx_type,
@@ -3,20 +3,22 @@
 """
 
 import logging
-from aiogram import Router, F
+from aiogram import F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton
 
+from core.dispatch_router import DispatchRouter
+from modules.keyboards.callbacks import DIAMONDS_BUY, DIAMONDS_WITHDRAW
 from .token_system import token_system
 from .diamond_system import diamond_system
 from src.modules.auth.keyboards import MainKeyboards
 
 logger = logging.getLogger(__name__)
 
-router = Router()
+router = DispatchRouter()
 
 @router.callback_query(F.data == "menu_balance")
 @router.callback_query(F.data == "back_balance")
@@ -293,7 +295,7 @@ async def callback_diamonds_buy(callback: CallbackQuery):
         builder.row(
             InlineKeyboardButton(
                 text=label,
-                callback_data=f"diamonds_buy_{amount}"
+                callback_data=DIAMONDS_BUY.pack(amount)
             )
         )
     
@@ -310,16 +312,11 @@ async def callback_diamonds_buy(callback: CallbackQuery):
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data.startswith("diamonds_buy_"))
-async def callback_diamonds_buy_process(callback: CallbackQuery):
+@router.action(DIAMONDS_BUY)
+async def callback_diamonds_buy_process(callback: CallbackQuery, payload):
     """Обработка покупки алмазов"""
     
-    try:
-        amount = int(callback.data.replace("diamonds_buy_", ""))
-    except:
-        await callback.answer("Ошибка обработки запроса", show_alert=True)
-        return
-    
+    amount = payload.amount
     telegram_id = callback.from_user.id
     
     await callback.message.edit_text(
@@ -394,7 +391,7 @@ async def callback_diamonds_withdraw(callback: CallbackQuery):
             builder.row(
                 InlineKeyboardButton(
                     text=f"💎 Вывести {amount} алмазов → {int(net_amount)}⭐",
-                    callback_data=f"diamonds_withdraw_{amount}"
+                    callback_data=DIAMONDS_WITHDRAW.pack(amount)
                 )
             )
     
@@ -418,22 +415,16 @@ async def callback_diamonds_withdraw(callback: CallbackQuery):
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data.startswith("diamonds_withdraw_"))
-async def callback_diamonds_withdraw_process(callback: CallbackQuery):
+@router.callback_query(F.data == "diamonds_withdraw_custom")
+async def callback_diamonds_withdraw_custom(callback: CallbackQuery):
+    """Ввод своей суммы вывода"""
+    await callback.answer("Функция ввода своей суммы будет реализована позже", show_alert=True)
+
+@router.action(DIAMONDS_WITHDRAW)
+async def callback_diamonds_withdraw_process(callback: CallbackQuery, payload):
     """Обработка вывода алмазов"""
     
-    data = callback.data.replace("diamonds_withdraw_", "")
-    
-    if data == "custom":
-        await callback.answer("Функция ввода своей суммы будет реализована позже", show_alert=True)
-        return
-    
-    try:
-        amount = int(data)
-    except:
-        await callback.answer("Ошибка обработки запроса", show_alert=True)
-        return
-    
+    amount = payload.amount
     telegram_id = callback.from_user.id
     
     # Выполняем вывод
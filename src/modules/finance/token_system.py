@@ -1,13 +1,15 @@
 """
 Система токенов как внутренней валюты бота
+Все начисления и списания - проводки двойной записи в общей БД
 """
 
 import logging
-import sqlite3
-from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List
 
-from src.core.database import db
+from core.database import Database
+from core.ledger import TOKENS, credit, debit, counterparty_for
+
+db = Database()
 
 logger = logging.getLogger(__name__)
 
@@ -21,15 +23,16 @@ class TokenSystem:
     
     def get_balance(self, telegram_id: int) -> Dict:
         """Получение полной информации о балансе токенов"""
-        user = db.get_user(telegram_id)
+        user = self.db.get_user(telegram_id)
         
         if not user:
             return {"error": "Пользователь не найден"}
         
-        # Безопасное получение значений
-        balance = float(user['balance_tokens']) if 'balance_tokens' in user.keys() else 0.00
-        total_earned = float(user['total_earned_tokens']) if 'total_earned_tokens' in user.keys() else 0.00
-        total_spent = float(user['total_spent_tokens']) if 'total_spent_tokens' in user.keys() else 0.00
+        # Баланс и обороты кошелька
+        account = self.db.get_ledger_account(telegram_id, TOKENS)
+        balance = float(account['balance'])
+        total_earned = float(account['credited'])
+        total_spent = float(account['debited'])
         
         return {
             "balance": balance,
@@ -119,96 +122,21 @@ class TokenSystem:
     
     def _add_tokens(self, telegram_id: int, amount: float, 
                    transaction_type: str, description: str = "") -> bool:
-        """Внутренний метод добавления токенов"""
-        try:
-            # Получаем текущий баланс
-            cursor = self.db.execute(
-                "SELECT balance_tokens, total_earned_tokens FROM users WHERE telegram_id = ?",
-                (telegram_id,)
-            )
-            user = cursor.fetchone()
-            
-            if not user:
-                return False
-            
-            balance_before = float(user['balance_tokens']) if user['balance_tokens'] is not None else 0.00
-            balance_after = balance_before + amount
-            
-            # Обновляем баланс
-            self.db.execute('''
-                UPDATE users 
-                SET balance_tokens = ?, 
-                    total_earned_tokens = total_earned_tokens + ?
-                WHERE telegram_id = ?
-            ''', (balance_after, amount, telegram_id))
-            
-            # Генерируем ID транзакции
-            transaction_id = f"tk_{int(datetime.now().timestamp())}_{telegram_id}"
-            
-            # Записываем транзакцию
-            self.db.execute('''
-                INSERT INTO token_transactions 
-                (transaction_id, user_id, amount, transaction_type, 
-                 balance_before, balance_after, description)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (transaction_id, telegram_id, amount, transaction_type,
-                  balance_before, balance_after, description))
-            
-            self.db.commit()
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error adding tokens: {e}")
+        """Внутренний метод добавления токенов (проводка с системного счета)"""
+        if amount <= 0:
             return False
+        
+        legs = credit(telegram_id, counterparty_for(transaction_type), amount, TOKENS)
+        return self.db.post(transaction_type, legs, description) is not None
     
     def _deduct_tokens(self, telegram_id: int, amount: float, 
                       transaction_type: str, description: str = "") -> bool:
-        """Внутренний метод списания токенов"""
-        try:
-            # Получаем текущий баланс
-            cursor = self.db.execute(
-                "SELECT balance_tokens, total_spent_tokens FROM users WHERE telegram_id = ?",
-                (telegram_id,)
-            )
-            user = cursor.fetchone()
-            
-            if not user:
-                return False
-            
-            balance_before = float(user['balance_tokens']) if user['balance_tokens'] is not None else 0.00
-            
-            # Проверяем, достаточно ли средств
-            if balance_before < amount:
-                return False
-            
-            balance_after = balance_before - amount
-            
-            # Обновляем баланс
-            self.db.execute('''
-                UPDATE users 
-                SET balance_tokens = ?, 
-                    total_spent_tokens = total_spent_tokens + ?
-                WHERE telegram_id = ?
-            ''', (balance_after, amount, telegram_id))
-            
-            # Генерируем ID транзакции
-            transaction_id = f"tk_{int(datetime.now().timestamp())}_{telegram_id}"
-            
-            # Записываем транзакцию
-            self.db.execute('''
-                INSERT INTO token_transactions 
-                (transaction_id, user_id, amount, transaction_type, 
-                 balance_before, balance_after, description)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (transaction_id, telegram_id, amount, transaction_type,
-                  balance_before, balance_after, description))
-            
-            self.db.commit()
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error deducting tokens: {e}")
+        """Внутренний метод списания токенов (при нехватке средств проводка не выполняется)"""
+        if amount <= 0:
             return False
+        
+        legs = debit(telegram_id, counterparty_for(transaction_type), amount, TOKENS)
+        return self.db.post(transaction_type, legs, description) is not None
     
     def _add_tokens_with_message(self, telegram_id: int, amount: float,
                                 transaction_type: str, description: str,
@@ -261,7 +189,7 @@ class TokenSystem:
         """Получение истории транзакций токенов"""
         
         try:
-            transactions = self.db.get_transaction_history(telegram_id, limit)
+            transactions = self.db.get_user_transactions(telegram_id, limit, currency=TOKENS)
             
             formatted_transactions = []
             for tx in transactions:
@@ -281,7 +209,7 @@ class TokenSystem:
                     icon = "🛒"
                 
                 formatted_transactions.append({
-                    "id": tx.get('transaction_id', 'unknown'),
+                    "id": tx['posting_id'],
                     "amount": amount,
                     "formatted_amount": f"{'+' if is_positive else ''}{self._format_tokens(amount)}",
                     "type": tx_type,
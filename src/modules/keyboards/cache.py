@@ -0,0 +1,113 @@
+"""
+Кэш готовых клавиатур GromFitBot
+Статические клавиатуры строятся один раз, параметризованные запоминаются
+по входным данным с вытеснением давно неиспользуемых (LRU)
+"""
+
+import functools
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable, Hashable, Union
+
+from aiogram.types import InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+Markup = Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]
+
+# JSON всех клавиатур, находящихся в кэшах (по id объекта)
+_markup_json: Dict[int, str] = {}
+
+class KeyboardCache:
+    """LRU-кэш клавиатур с сериализованным JSON для каждой записи"""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Hashable, Markup]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Markup]:
+        """Получение клавиатуры из кэша"""
+        markup = self._items.get(key)
+        if markup is None:
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(key)
+        self.hits += 1
+        return markup
+
+    def put(self, key: Hashable, markup: Markup) -> None:
+        """Сохранение клавиатуры с вытеснением самой старой записи"""
+        self._items[key] = markup
+        _markup_json[id(markup)] = markup.model_dump_json(exclude_none=True)
+
+        while len(self._items) > self.maxsize:
+            _, evicted = self._items.popitem(last=False)
+            _markup_json.pop(id(evicted), None)
+
+    def clear(self) -> None:
+        """Очистка кэша"""
+        for markup in self._items.values():
+            _markup_json.pop(id(markup), None)
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+# Все кэши клавиатур (по имени функции) - для статистики и очистки
+_caches: Dict[str, KeyboardCache] = {}
+
+def cached_keyboard(maxsize: int = 1, key: Optional[Callable[..., Hashable]] = None):
+    """
+    Декоратор кэширования клавиатуры
+
+    Args:
+        maxsize: Размер кэша (1 - статическая клавиатура)
+        key: Функция построения ключа из аргументов (по умолчанию - сами аргументы)
+    """
+    def decorator(func: Callable[..., Markup]) -> Callable[..., Markup]:
+        cache = KeyboardCache(maxsize)
+        _caches[func.__qualname__] = cache
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Markup:
+            try:
+                cache_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+                markup = cache.get(cache_key)
+            except TypeError:
+                # Нехэшируемые аргументы - строим без кэша
+                return func(*args, **kwargs)
+
+            if markup is None:
+                markup = func(*args, **kwargs)
+                cache.put(cache_key, markup)
+
+            return markup
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+def get_keyboard_json(markup: Optional[Markup]) -> str:
+    """JSON клавиатуры: из кэша, если она там есть, иначе сериализация"""
+    if markup is None:
+        return ""
+
+    cached = _markup_json.get(id(markup))
+    if cached is not None:
+        return cached
+
+    return markup.model_dump_json(exclude_none=True)
+
+def get_cache_stats() -> Dict[str, Dict[str, int]]:
+    """Статистика попаданий по всем кэшам клавиатур"""
+    return {
+        name: {'size': len(cache), 'hits': cache.hits, 'misses': cache.misses}
+        for name, cache in _caches.items()
+    }
+
+def clear_keyboard_caches() -> None:
+    """Очистка всех кэшей клавиатур"""
+    for cache in _caches.values():
+        cache.clear()
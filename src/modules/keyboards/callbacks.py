@@ -0,0 +1,60 @@
+"""
+Действия инлайн-кнопок GromFitBot с параметрами
+Кнопки без параметров используют строковые callback_data ("profile_stats"),
+кнопки с параметрами - компактные данные кодека core.callback_codec
+"""
+
+from typing import Optional
+
+from core.callback_codec import callback_codec
+
+# Категории магазина: в callback_data передается индекс категории
+SHOP_CATEGORIES = ('all', 'premium', 'design', 'boosters', 'gifts', 'tools', 'emotions')
+SHOP_CATEGORY_INDEX = {category: index for index, category in enumerate(SHOP_CATEGORIES)}
+
+# ==================== МАГАЗИН ====================
+
+SHOP_CATEGORY = callback_codec.register(0x01, 'shop_category', ('category',))
+SHOP_PAGE = callback_codec.register(0x02, 'shop_page', ('category', 'page'))
+SHOP_ITEM = callback_codec.register(0x03, 'shop_item', ('item',))
+SHOP_BUY = callback_codec.register(0x04, 'shop_buy', ('item', 'quantity'), protected=True)
+SHOP_GIFT = callback_codec.register(0x05, 'shop_gift', ('item',))
+
+def shop_category_data(category: str) -> str:
+    """callback_data кнопки категории магазина"""
+    return SHOP_CATEGORY.pack(SHOP_CATEGORY_INDEX[category])
+
+def shop_category_id(index: int) -> str:
+    """Идентификатор категории по индексу из callback_data"""
+    return SHOP_CATEGORIES[index] if index < len(SHOP_CATEGORIES) else 'all'
+
+# ==================== РЕГИСТРАЦИЯ ====================
+
+# Имя читается из callback.from_user при нажатии: кириллическое имя в callback_data
+# быстро выходит за лимит в 64 байта
+NICKNAME_FROM_TELEGRAM = callback_codec.register(0x10, 'nickname_from_telegram')
+
+# ==================== РЕФЕРАЛЫ ====================
+
+REFERRAL_COPY = callback_codec.register(0x20, 'referral_copy', ('user',))
+
+# ==================== ФИНАНСЫ ====================
+
+DIAMONDS_WITHDRAW = callback_codec.register(0x30, 'diamonds_withdraw', ('amount',), protected=True)
+DIAMONDS_BUY = callback_codec.register(0x31, 'diamonds_buy', ('amount',))
+
+# ==================== АДМИНИСТРИРОВАНИЕ ====================
+
+# Команды управления пользователем: в callback_data передается индекс команды
+ADMIN_USER_COMMANDS = ('view', 'edit', 'edit_balance', 'reward', 'warn', 'ban', 'delete', 'stats')
+ADMIN_USER_COMMAND_INDEX = {command: index for index, command in enumerate(ADMIN_USER_COMMANDS)}
+
+ADMIN_USER = callback_codec.register(0x40, 'admin_user', ('command', 'user'))
+
+def admin_user_data(command: str, user_id: int) -> str:
+    """callback_data кнопки управления пользователем"""
+    return ADMIN_USER.pack(ADMIN_USER_COMMAND_INDEX[command], user_id)
+
+def admin_user_command(index: int) -> Optional[str]:
+    """Команда управления пользователем по индексу из callback_data"""
+    return ADMIN_USER_COMMANDS[index] if index < len(ADMIN_USER_COMMANDS) else None
@@ -13,12 +13,50 @@ from aiogram.types import (
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 from typing import Optional, List, Tuple, Dict, Any
 
+from core.callback_codec import CallbackAction
+from .cache import cached_keyboard
+from .callbacks import (
+    SHOP_CATEGORY_INDEX, SHOP_PAGE, SHOP_ITEM, SHOP_BUY, SHOP_GIFT, shop_category_data,
+    admin_user_data
+)
+
+# ==================== КЛЮЧИ КЭША ПАРАМЕТРИЗОВАННЫХ КЛАВИАТУР ====================
+
+def _navigation_key(back_target: str, extra_buttons: List[Tuple[str, str]] = None):
+    """Ключ клавиатуры навигации"""
+    return (back_target, tuple(map(tuple, extra_buttons or ())))
+
+def _shop_items_key(category: str, items: List[Dict[str, Any]],
+                    page: int = 0, items_per_page: int = 5):
+    """Ключ клавиатуры товаров: только поля, попадающие на текущую страницу"""
+    start_idx = page * items_per_page
+    page_items = tuple(
+        (item['id'], item['name'], item.get('icon', '🛒'), item['price_tokens'])
+        for item in items[start_idx:start_idx + items_per_page]
+    )
+    return (category, page, items_per_page, len(items), page_items)
+
+def _list_key(items: List[Tuple[str, str]], items_per_row: int = 2):
+    """Ключ клавиатуры списка"""
+    return (tuple(map(tuple, items)), items_per_row)
+
+def _pagination_key(current_page: int, total_pages: int, page_action: CallbackAction,
+                    extra_buttons: List[Tuple[str, str]] = None, page_args: Tuple[int, ...] = ()):
+    """Ключ клавиатуры пагинации"""
+    return (current_page, total_pages, page_action.id, tuple(page_args),
+            tuple(map(tuple, extra_buttons or ())))
+
+def _regions_key(regions: List[str]):
+    """Ключ клавиатуры выбора региона"""
+    return tuple(regions)
+
 class MainKeyboards:
     """Основные клавиатуры бота - полный набор"""
     
     # ==================== REPLY КЛАВИАТУРЫ (ОСНОВНЫЕ МЕНЮ) ====================
     
     @staticmethod
+    @cached_keyboard()
     def get_main_menu() -> ReplyKeyboardMarkup:
         """
         Главное меню - ПОКАЗЫВАЕТСЯ ПОД СООБЩЕНИЕМ
@@ -58,6 +96,7 @@ class MainKeyboards:
         )
     
     @staticmethod
+    @cached_keyboard()
     def get_bottom_keyboard() -> ReplyKeyboardMarkup:
         """
         Кнопки под чатом - ВСЕГДА ВИДНЫ
@@ -84,6 +123,7 @@ class MainKeyboards:
         )
     
     @staticmethod
+    @cached_keyboard()
     def get_registration_keyboard() -> ReplyKeyboardMarkup:
         """Клавиатура для процесса регистрации"""
         builder = ReplyKeyboardBuilder()
@@ -97,6 +137,7 @@ class MainKeyboards:
         )
     
     @staticmethod
+    @cached_keyboard()
     def get_cancel_keyboard() -> ReplyKeyboardMarkup:
         """Клавиатура с кнопкой отмены"""
         builder = ReplyKeyboardBuilder()
@@ -106,6 +147,7 @@ class MainKeyboards:
     # ==================== INLINE КЛАВИАТУРЫ (ПОДМЕНЮ И ДЕЙСТВИЯ) ====================
     
     @staticmethod
+    @cached_keyboard()
     def get_back_to_main_keyboard() -> InlineKeyboardMarkup:
         """Инлайн-кнопка для возврата в главное меню"""
         builder = InlineKeyboardBuilder()
@@ -113,6 +155,7 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard(maxsize=64)
     def get_back_keyboard(target: str) -> InlineKeyboardMarkup:
         """Инлайн-кнопка 'Назад' для указанной цели"""
         builder = InlineKeyboardBuilder()
@@ -121,6 +164,7 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard(maxsize=64, key=_navigation_key)
     def get_navigation_keyboard(back_target: str, extra_buttons: List[Tuple[str, str]] = None) -> InlineKeyboardMarkup:
         """
         Клавиатура навигации (Назад + Главное меню + дополнительные кнопки)
@@ -145,6 +189,7 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard()
     def get_profile_keyboard() -> InlineKeyboardMarkup:
         """Клавиатура для профиля пользователя"""
         builder = InlineKeyboardBuilder()
@@ -172,6 +217,7 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard()
     def get_referrals_keyboard() -> InlineKeyboardMarkup:
         """Клавиатура для реферальной системы"""
         builder = InlineKeyboardBuilder()
@@ -199,27 +245,28 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard()
     def get_shop_categories_keyboard() -> InlineKeyboardMarkup:
         """Клавиатура категорий магазина"""
         builder = InlineKeyboardBuilder()
         
         builder.row(
-            InlineKeyboardButton(text="💎 Премиум", callback_data="shop_category_premium"),
-            InlineKeyboardButton(text="🎨 Оформление", callback_data="shop_category_design")
+            InlineKeyboardButton(text="💎 Премиум", callback_data=shop_category_data("premium")),
+            InlineKeyboardButton(text="🎨 Оформление", callback_data=shop_category_data("design"))
         )
         
         builder.row(
-            InlineKeyboardButton(text="⚡️ Бустеры", callback_data="shop_category_boosters"),
-            InlineKeyboardButton(text="🎁 Подарки", callback_data="shop_category_gifts")
+            InlineKeyboardButton(text="⚡️ Бустеры", callback_data=shop_category_data("boosters")),
+            InlineKeyboardButton(text="🎁 Подарки", callback_data=shop_category_data("gifts"))
         )
         
         builder.row(
-            InlineKeyboardButton(text="🛠️ Инструменты", callback_data="shop_category_tools"),
-            InlineKeyboardButton(text="🎭 Эмоции", callback_data="shop_category_emotions")
+            InlineKeyboardButton(text="🛠️ Инструменты", callback_data=shop_category_data("tools")),
+            InlineKeyboardButton(text="🎭 Эмоции", callback_data=shop_category_data("emotions"))
         )
         
         builder.row(
-            InlineKeyboardButton(text="📦 Все товары", callback_data="shop_category_all"),
+            InlineKeyboardButton(text="📦 Все товары", callback_data=shop_category_data("all")),
             InlineKeyboardButton(text="🛒 Мои покупки", callback_data="shop_my_purchases")
         )
         
@@ -231,10 +278,12 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard(maxsize=256, key=_shop_items_key)
     def get_shop_items_keyboard(category: str, items: List[Dict[str, Any]], 
                                page: int = 0, items_per_page: int = 5) -> InlineKeyboardMarkup:
         """Клавиатура товаров магазина с пагинацией"""
         builder = InlineKeyboardBuilder()
+        category_index = SHOP_CATEGORY_INDEX.get(category, 0)
         
         # Вычисляем индексы для текущей страницы
         start_idx = page * items_per_page
@@ -246,7 +295,7 @@ class MainKeyboards:
             builder.row(
                 InlineKeyboardButton(
                     text=f"{item.get('icon', '🛒')} {item['name']} - {item['price_tokens']} токенов",
-                    callback_data=f"shop_item_{item['item_id']}"
+                    callback_data=SHOP_ITEM.pack(item['id'])
                 )
             )
         
@@ -258,7 +307,7 @@ class MainKeyboards:
             
             if page > 0:
                 pagination_buttons.append(
-                    InlineKeyboardButton(text="◀️", callback_data=f"shop_page_{category}_{page-1}")
+                    InlineKeyboardButton(text="◀️", callback_data=SHOP_PAGE.pack(category_index, page - 1))
                 )
             
             pagination_buttons.append(
@@ -267,7 +316,7 @@ class MainKeyboards:
             
             if page < total_pages - 1:
                 pagination_buttons.append(
-                    InlineKeyboardButton(text="▶️", callback_data=f"shop_page_{category}_{page+1}")
+                    InlineKeyboardButton(text="▶️", callback_data=SHOP_PAGE.pack(category_index, page + 1))
                 )
             
             builder.row(*pagination_buttons)
@@ -281,20 +330,21 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
-    def get_shop_item_detail_keyboard(item_id: str, price_tokens: float, 
+    @cached_keyboard(maxsize=512)
+    def get_shop_item_detail_keyboard(item_id: int, price_tokens: float, 
                                      user_balance: float) -> InlineKeyboardMarkup:
         """Клавиатура деталей товара"""
         builder = InlineKeyboardBuilder()
         
         # Основные действия
         builder.row(
-            InlineKeyboardButton(text="🛒 Купить", callback_data=f"shop_buy_{item_id}"),
-            InlineKeyboardButton(text="📦 Купить x3", callback_data=f"shop_buy3_{item_id}")
+            InlineKeyboardButton(text="🛒 Купить", callback_data=SHOP_BUY.pack(item_id, 1)),
+            InlineKeyboardButton(text="📦 Купить x3", callback_data=SHOP_BUY.pack(item_id, 3))
         )
         
         builder.row(
-            InlineKeyboardButton(text="📦 Купить x5", callback_data=f"shop_buy5_{item_id}"),
-            InlineKeyboardButton(text="🎁 Подарить", callback_data=f"shop_gift_{item_id}")
+            InlineKeyboardButton(text="📦 Купить x5", callback_data=SHOP_BUY.pack(item_id, 5)),
+            InlineKeyboardButton(text="🎁 Подарить", callback_data=SHOP_GIFT.pack(item_id))
         )
         
         # Информация о балансе
@@ -322,6 +372,7 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard(maxsize=64)
     def get_bonus_keyboard(can_claim: bool, streak: int = 0) -> InlineKeyboardMarkup:
         """Клавиатура для бонусов"""
         builder = InlineKeyboardBuilder()
@@ -362,6 +413,7 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard()
     def get_duels_keyboard() -> InlineKeyboardMarkup:
         """Клавиатура для дуэлей"""
         builder = InlineKeyboardBuilder()
@@ -394,6 +446,7 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard()
     def get_achievements_keyboard() -> InlineKeyboardMarkup:
         """Клавиатура для достижений"""
         builder = InlineKeyboardBuilder()
@@ -426,6 +479,7 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard()
     def get_tops_keyboard() -> InlineKeyboardMarkup:
         """Клавиатура для топов"""
         builder = InlineKeyboardBuilder()
@@ -463,6 +517,7 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard(maxsize=64)
     def get_confirmation_keyboard(action: str, confirm_text: str = "✅ Подтвердить", 
                                  cancel_text: str = "❌ Отменить") -> InlineKeyboardMarkup:
         """Клавиатура подтверждения действия"""
@@ -476,6 +531,7 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard()
     def get_settings_keyboard() -> InlineKeyboardMarkup:
         """Клавиатура настроек"""
         builder = InlineKeyboardBuilder()
@@ -513,6 +569,7 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard(maxsize=64)
     def get_yes_no_keyboard(yes_callback: str, no_callback: str, 
                            yes_text: str = "✅ Да", no_text: str = "❌ Нет") -> InlineKeyboardMarkup:
         """Клавиатура Да/Нет"""
@@ -526,6 +583,7 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard(maxsize=128, key=_list_key)
     def get_list_keyboard(items: List[Tuple[str, str]], 
                          items_per_row: int = 2) -> InlineKeyboardMarkup:
         """Клавиатура для списка элементов"""
@@ -542,9 +600,15 @@ class MainKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard(maxsize=256, key=_pagination_key)
     def get_pagination_keyboard(current_page: int, total_pages: int, 
-                               callback_prefix: str, extra_buttons: List[Tuple[str, str]] = None) -> InlineKeyboardMarkup:
-        """Клавиатура пагинации"""
+                               page_action: CallbackAction, extra_buttons: List[Tuple[str, str]] = None,
+                               page_args: Tuple[int, ...] = ()) -> InlineKeyboardMarkup:
+        """
+        Клавиатура пагинации
+        Номер страницы передается последним полем действия page_action,
+        перед ним - page_args (например, индекс категории)
+        """
         builder = InlineKeyboardBuilder()
         
         # Кнопки пагинации
@@ -552,16 +616,16 @@ class MainKeyboards:
         
         if current_page > 0:
             pagination_buttons.append(
-                InlineKeyboardButton(text="◀️", callback_data=f"{callback_prefix}_{current_page-1}")
+                InlineKeyboardButton(text="◀️", callback_data=page_action.pack(*page_args, current_page - 1))
             )
         
         pagination_buttons.append(
-            InlineKeyboardButton(text=f"{current_page+1}/{total_pages}", callback_data=f"{callback_prefix}_current")
+            InlineKeyboardButton(text=f"{current_page+1}/{total_pages}", callback_data="pagination_current")
         )
         
         if current_page < total_pages - 1:
             pagination_buttons.append(
-                InlineKeyboardButton(text="▶️", callback_data=f"{callback_prefix}_{current_page+1}")
+                InlineKeyboardButton(text="▶️", callback_data=page_action.pack(*page_args, current_page + 1))
             )
         
         builder.row(*pagination_buttons)
@@ -577,6 +641,7 @@ class AuthKeyboards:
     """Клавиатуры для авторизации и регистрации"""
     
     @staticmethod
+    @cached_keyboard()
     def get_username_keyboard() -> ReplyKeyboardMarkup:
         """Клавиатура с кнопкой имени пользователя Telegram"""
         builder = ReplyKeyboardBuilder()
@@ -590,6 +655,7 @@ class AuthKeyboards:
         return builder.as_markup(resize_keyboard=True, one_time_keyboard=True)
     
     @staticmethod
+    @cached_keyboard(maxsize=16, key=_regions_key)
     def get_region_selection_keyboard(regions: List[str]) -> ReplyKeyboardMarkup:
         """Клавиатура для выбора региона"""
         builder = ReplyKeyboardBuilder()
@@ -606,6 +672,7 @@ class AuthKeyboards:
         return builder.as_markup(resize_keyboard=True, one_time_keyboard=True)
     
     @staticmethod
+    @cached_keyboard()
     def get_registration_complete_keyboard() -> ReplyKeyboardMarkup:
         """Клавиатура после завершения регистрации"""
         builder = ReplyKeyboardBuilder()
@@ -618,6 +685,7 @@ class AdminKeyboards:
     """Клавиатуры для администраторов"""
     
     @staticmethod
+    @cached_keyboard()
     def get_admin_main_menu() -> InlineKeyboardMarkup:
         """Главное меню администратора"""
         builder = InlineKeyboardBuilder()
@@ -650,28 +718,29 @@ class AdminKeyboards:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard(maxsize=128)
     def get_user_management_keyboard(user_id: int) -> InlineKeyboardMarkup:
         """Клавиатура управления пользователем"""
         builder = InlineKeyboardBuilder()
         
         builder.row(
-            InlineKeyboardButton(text="👁️ Просмотр", callback_data=f"admin_view_user_{user_id}"),
-            InlineKeyboardButton(text="✏️ Редактировать", callback_data=f"admin_edit_user_{user_id}")
+            InlineKeyboardButton(text="👁️ Просмотр", callback_data=admin_user_data('view', user_id)),
+            InlineKeyboardButton(text="✏️ Редактировать", callback_data=admin_user_data('edit', user_id))
         )
         
         builder.row(
-            InlineKeyboardButton(text="💰 Изменить баланс", callback_data=f"admin_edit_balance_{user_id}"),
-            InlineKeyboardButton(text="🎁 Наградить", callback_data=f"admin_reward_user_{user_id}")
+            InlineKeyboardButton(text="💰 Изменить баланс", callback_data=admin_user_data('edit_balance', user_id)),
+            InlineKeyboardButton(text="🎁 Наградить", callback_data=admin_user_data('reward', user_id))
         )
         
         builder.row(
-            InlineKeyboardButton(text="⚠️ Предупредить", callback_data=f"admin_warn_user_{user_id}"),
-            InlineKeyboardButton(text="🚫 Заблокировать", callback_data=f"admin_ban_user_{user_id}")
+            InlineKeyboardButton(text="⚠️ Предупредить", callback_data=admin_user_data('warn', user_id)),
+            InlineKeyboardButton(text="🚫 Заблокировать", callback_data=admin_user_data('ban', user_id))
         )
         
         builder.row(
-            InlineKeyboardButton(text="🗑️ Удалить", callback_data=f"admin_delete_user_{user_id}"),
-            InlineKeyboardButton(text="📊 Статистика", callback_data=f"admin_user_stats_{user_id}")
+            InlineKeyboardButton(text="🗑️ Удалить", callback_data=admin_user_data('delete', user_id)),
+            InlineKeyboardButton(text="📊 Статистика", callback_data=admin_user_data('stats', user_id))
         )
         
         builder.row(
@@ -5,22 +5,28 @@
 
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import json
 
-from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
 from aiogram.filters import Command
 
 from core.database import Database
+from core.dispatch_router import DispatchRouter
+from core.leaderboards import leaderboards
 from core.message_manager import MessageManager
+from core.progression import progress_snapshots, format_experience
+from core.render_cache import render_cache
 from modules.keyboards.main_keyboards import MainKeyboards
+from modules.auth.registration import RegistrationUtils
 
-router = Router()
+router = DispatchRouter()
 db = Database()
 message_manager = MessageManager(None)
 logger = logging.getLogger(__name__)
 
+progress_snapshots.bind(db)
+
 def init_message_manager(bot):
     """Инициализация менеджера сообщений"""
     global message_manager
@@ -28,7 +34,7 @@ def init_message_manager(bot):
 
 # ==================== ОСНОВНЫЕ ОБРАБОТЧИКИ ПРОФИЛЯ ====================
 
-@router.message(F.text == "👤 Профиль")
+@router.text("👤 Профиль")
 async def handle_profile(message: Message):
     """Основной обработчик кнопки 'Профиль'"""
     user_id = message.from_user.id
@@ -49,6 +55,23 @@ async def handle_profile(message: Message):
 async def show_profile(message: Message, user: Dict[str, Any]):
     """Отображение профиля пользователя"""
     user_id = user['telegram_id']
+    user_version = db.get_user_version(user_id)
+    
+    rendered = render_cache.get('profile', user_id, user_version)
+    if rendered is None:
+        rendered = render_cache.put('profile', user_id, user_version, *render_profile(user))
+    
+    profile_text, keyboard = rendered
+    
+    await message_manager.replace_message(
+        message,
+        profile_text,
+        keyboard
+    )
+
+def render_profile(user: Dict[str, Any]) -> Tuple[str, InlineKeyboardMarkup]:
+    """Формирование текста и клавиатуры профиля"""
+    user_id = user['telegram_id']
     
     # Форматируем дату регистрации
     created_at = user.get('created_at')
@@ -64,6 +87,7 @@ async def show_profile(message: Message, user: Dict[str, Any]):
     # Получаем дополнительные данные
     referrals_count = user.get('referrals_count', 0)
     achievements_count = user.get('achievements_count', 0)
+    progress = progress_snapshots.get(user)['level']
     
     # Получаем тренировки за последние 7 дней
     trainings_stats = db.get_training_stats(user_id, days=7)
@@ -96,20 +120,16 @@ async def show_profile(message: Message, user: Dict[str, Any]):
         f"📈 <b>Очки:</b> {user.get('total_points', 0)}\n\n"
         
         f"<b>Прогресс:</b>\n"
-        f"⭐️ <b>Уровень:</b> {user.get('level', 1)}\n"
-        f"📊 <b>Опыт:</b> {user.get('experience', 0)}/1000\n"
+        f"⭐️ <b>Уровень:</b> {progress.level}\n"
+        f"📊 <b>Опыт:</b> {format_experience(progress)}\n"
         f"🔥 <b>Серия дней:</b> {user.get('daily_streak', 0)}\n\n"
         
         f"<i>Используйте кнопки ниже для управления профилем</i>"
     )
     
-    await message_manager.replace_message(
-        message,
-        profile_text,
-        MainKeyboards.get_profile_keyboard()
-    )
+    return profile_text, MainKeyboards.get_profile_keyboard()
 
-@router.callback_query(F.data == "profile_stats")
+@router.callback("profile_stats")
 async def handle_profile_stats(callback: CallbackQuery):
     """Обработчик кнопки 'Статистика' в профиле"""
     user_id = callback.from_user.id
@@ -127,7 +147,7 @@ async def handle_profile_stats(callback: CallbackQuery):
     trainings_stats = db.get_training_stats(user_id, days=30)
     transaction_stats = db.get_transaction_summary(user_id, days=30)
     referrals_count = db.get_referral_count(user_id)
-    achievements = db.get_user_achievements(user_id)
+    snapshot = progress_snapshots.get(user)
     
     # Вычисляем процент побед в дуэлях
     total_duels = user.get('total_duels', 0)
@@ -159,11 +179,11 @@ async def handle_profile_stats(callback: CallbackQuery):
         
         f"<b>🤝 Социальное:</b>\n"
         f"• Приглашено друзей: {referrals_count}\n"
-        f"• Достижений: {len(achievements)}/200\n\n"
+        f"• Достижений: {snapshot['achievements_total']}/200\n\n"
         
         f"<b>📈 Активность:</b>\n"
-        f"• Уровень: {user.get('level', 1)}\n"
-        f"• Опыт: {user.get('experience', 0)}/1000\n"
+        f"• Уровень: {snapshot['level'].level}\n"
+        f"• Опыт: {format_experience(snapshot['level'])}\n"
         f"• Серия дней: {user.get('daily_streak', 0)}\n"
         f"• Всего очков: {user.get('total_points', 0)}\n\n"
         
@@ -189,7 +209,7 @@ async def handle_profile_stats(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-@router.callback_query(F.data == "profile_achievements")
+@router.callback("profile_achievements")
 async def handle_profile_achievements(callback: CallbackQuery):
     """Обработчик кнопки 'Достижения' в профиле"""
     user_id = callback.from_user.id
@@ -203,9 +223,9 @@ async def handle_profile_achievements(callback: CallbackQuery):
         )
         return
     
-    achievements = db.get_user_achievements(user_id)
+    snapshot = progress_snapshots.get(user)
     
-    if not achievements:
+    if not snapshot['achievements_total']:
         await message_manager.edit_message_with_menu(
             callback,
             "🎯 <b>Ваши достижения</b>\n\n"
@@ -216,27 +236,17 @@ async def handle_profile_achievements(callback: CallbackQuery):
         await message_manager.answer_callback_with_notification(callback)
         return
     
-    # Группируем достижения по категориям
-    categories = {}
-    for achievement in achievements:
-        category = achievement.get('category', 'general')
-        if category not in categories:
-            categories[category] = []
-        categories[category].append(achievement)
-    
-    # Формируем текст
+    # Формируем текст (сводка по категориям - из снимка прогресса)
     achievements_text = "🎯 <b>Ваши достижения</b>\n\n"
     
-    for category, category_achievements in categories.items():
-        achievements_text += f"<b>{category.capitalize()}:</b> {len(category_achievements)}\n"
+    for category, count in snapshot['achievements_by_category'].items():
+        achievements_text += f"<b>{category.capitalize()}:</b> {count}\n"
     
-    achievements_text += f"\n<b>Всего достижений:</b> {len(achievements)}/200\n\n"
+    achievements_text += f"\n<b>Всего достижений:</b> {snapshot['achievements_total']}/200\n\n"
     
     # Показываем последние 5 достижений
-    recent_achievements = sorted(achievements, key=lambda x: x.get('unlocked_at', ''), reverse=True)[:5]
-    
     achievements_text += "<b>Последние достижения:</b>\n"
-    for achievement in recent_achievements:
+    for achievement in snapshot['recent_achievements']:
         icon = achievement.get('icon', '🏆')
         title = achievement.get('title', 'Без названия')
         unlocked_at = achievement.get('unlocked_at', '')
@@ -262,7 +272,7 @@ async def handle_profile_achievements(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-@router.callback_query(F.data == "profile_balance")
+@router.callback("profile_balance")
 async def handle_profile_balance(callback: CallbackQuery):
     """Обработчик кнопки 'Баланс' в профиле"""
     user_id = callback.from_user.id
@@ -326,7 +336,7 @@ async def handle_profile_balance(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-@router.callback_query(F.data == "profile_settings")
+@router.callback("profile_settings")
 async def handle_profile_settings(callback: CallbackQuery):
     """Обработчик кнопки 'Настройки' в профиле"""
     user_id = callback.from_user.id
@@ -376,7 +386,7 @@ async def handle_profile_settings(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-@router.callback_query(F.data == "profile_trainings")
+@router.callback("profile_trainings")
 async def handle_profile_trainings(callback: CallbackQuery):
     """Обработчик кнопки 'Тренировки' в профиле"""
     user_id = callback.from_user.id
@@ -445,7 +455,7 @@ async def handle_profile_trainings(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-@router.callback_query(F.data == "profile_duels")
+@router.callback("profile_duels")
 async def handle_profile_duels(callback: CallbackQuery):
     """Обработчик кнопки 'Дуэли' в профиле"""
     user_id = callback.from_user.id
@@ -523,7 +533,7 @@ async def handle_profile_duels(callback: CallbackQuery):
 
 # ==================== ОБРАБОТЧИКИ НАСТРОЕК ====================
 
-@router.callback_query(F.data == "settings_notifications")
+@router.callback("settings_notifications")
 async def handle_settings_notifications(callback: CallbackQuery):
     """Обработчик настройки уведомлений"""
     user_id = callback.from_user.id
@@ -559,7 +569,7 @@ async def handle_settings_notifications(callback: CallbackQuery):
         show_alert=False
     )
 
-@router.callback_query(F.data == "settings_theme")
+@router.callback("settings_theme")
 async def handle_settings_theme(callback: CallbackQuery):
     """Обработчик смены темы"""
     user_id = callback.from_user.id
@@ -595,7 +605,7 @@ async def handle_settings_theme(callback: CallbackQuery):
         show_alert=False
     )
 
-@router.callback_query(F.data == "settings_language")
+@router.callback("settings_language")
 async def handle_settings_language(callback: CallbackQuery):
     """Обработчик смены языка"""
     await message_manager.edit_message_with_menu(
@@ -608,7 +618,7 @@ async def handle_settings_language(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-@router.callback_query(F.data == "settings_about")
+@router.callback("settings_about")
 async def handle_settings_about(callback: CallbackQuery):
     """Обработчик информации о боте"""
     about_text = (
@@ -647,7 +657,7 @@ async def handle_settings_about(callback: CallbackQuery):
 
 # ==================== ОБРАБОТЧИКИ НАВИГАЦИИ ====================
 
-@router.callback_query(F.data == "back_to_profile")
+@router.callback("back_to_profile")
 async def handle_back_to_profile(callback: CallbackQuery):
     """Возврат в профиль"""
     user_id = callback.from_user.id
@@ -680,12 +690,12 @@ async def handle_back_to_profile(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-@router.callback_query(F.data == "back_to_profile_menu")
+@router.callback("back_to_profile_menu")
 async def handle_back_to_profile_menu(callback: CallbackQuery):
     """Возврат в меню профиля"""
     await handle_back_to_profile(callback)
 
-@router.callback_query(F.data == "back_to_settings")
+@router.callback("back_to_settings")
 async def handle_back_to_settings(callback: CallbackQuery):
     """Возврат в настройки"""
     user_id = callback.from_user.id
@@ -708,7 +718,7 @@ async def handle_back_to_settings(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-@router.callback_query(F.data == "back_to_main")
+@router.callback("back_to_main")
 async def handle_back_to_main_from_profile(callback: CallbackQuery):
     """Возврат в главное меню из профиля"""
     user_id = callback.from_user.id
@@ -826,6 +836,57 @@ async def handle_settings_command(message: Message):
         MainKeyboards.get_settings_keyboard()
     )
 
+@router.message(Command("region"))
+async def handle_region_command(message: Message):
+    """Обработчик команды /region - смена региона (/region Москва)"""
+    user_id = message.from_user.id
+    user = db.get_user(user_id)
+    
+    if not user:
+        await message_manager.replace_message(
+            message,
+            "❌ <b>Вы не зарегистрированы</b>\n\n"
+            "Используйте команду /start для регистрации."
+        )
+        return
+    
+    parts = message.text.split(maxsplit=1)
+    new_region = parts[1].strip() if len(parts) > 1 else ''
+    
+    if not new_region or len(new_region) > 50:
+        await message_manager.replace_message(
+            message,
+            f"📍 <b>Ваш регион:</b> {user.get('region', 'Не указан')}\n\n"
+            f"Чтобы сменить регион, отправьте:\n"
+            f"<code>/region Название города</code>\n\n"
+            f"<i>Название - не длиннее 50 символов</i>",
+            MainKeyboards.get_back_to_main_keyboard()
+        )
+        return
+    
+    # Известные регионы - в каноническом написании
+    regions = RegistrationUtils.get_default_regions()
+    new_region = RegistrationUtils.find_region_match(new_region, regions) or new_region
+    
+    if not db.update_user_field(user_id, 'region', new_region):
+        await message_manager.replace_message(
+            message,
+            "❌ Не удалось сменить регион. Попробуйте позже.",
+            MainKeyboards.get_back_to_main_keyboard()
+        )
+        return
+    
+    leaderboards.move(user_id, new_region)
+    logger.info(f"Пользователь {user_id} сменил регион: {user.get('region')} -> {new_region}")
+    
+    await message_manager.replace_message(
+        message,
+        f"✅ <b>Регион изменен</b>\n\n"
+        f"📍 Новый регион: <b>{new_region}</b>\n"
+        f"<i>Ваши очки перенесены в рейтинг нового региона</i>",
+        MainKeyboards.get_back_to_main_keyboard()
+    )
+
 # ==================== УТИЛИТЫ ДЛЯ ПРОФИЛЯ ====================
 
 def format_date(date_str: str) -> str:
@@ -843,29 +904,12 @@ def format_date(date_str: str) -> str:
     except:
         return "Неизвестно"
 
-def calculate_level(experience: int) -> Tuple[int, int, int]:
-    """Расчет уровня на основе опыта"""
-    base_exp = 1000
-    level = (experience // base_exp) + 1
-    current_exp = experience % base_exp
-    next_level_exp = base_exp - current_exp
-    
-    return level, current_exp, next_level_exp
-
-def get_achievement_progress(user_id: int) -> Dict[str, Any]:
+def get_achievement_progress(user: Dict[str, Any]) -> Dict[str, Any]:
     """Получение прогресса по достижениям"""
-    achievements = db.get_user_achievements(user_id)
-    
-    if not achievements:
-        return {
-            'total': 0,
-            'completed': 0,
-            'in_progress': 0,
-            'progress_percentage': 0
-        }
-    
-    total = len(achievements)
-    completed = sum(1 for a in achievements if a.get('progress', 0) >= 100)
+    snapshot = progress_snapshots.get(user)
+    
+    total = snapshot['achievements_total']
+    completed = snapshot['achievements_completed']
     in_progress = total - completed
     
     return {
@@ -4,20 +4,22 @@
 """
 
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
 import urllib.parse
 
-from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.filters import Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from core.database import Database
+from core.dispatch_router import DispatchRouter
 from core.message_manager import MessageManager
+from core.render_cache import render_cache
 from modules.keyboards.main_keyboards import MainKeyboards
+from modules.keyboards.callbacks import REFERRAL_COPY
 
-router = Router()
+router = DispatchRouter()
 db = Database()
 message_manager = MessageManager(None)
 logger = logging.getLogger(__name__)
@@ -29,7 +31,7 @@ def init_message_manager(bot):
 
 # ==================== ОСНОВНЫЕ ОБРАБОТЧИКИ РЕФЕРАЛОВ ====================
 
-@router.message(F.text == "🤝 Рефералы")
+@router.text("🤝 Рефералы")
 async def handle_referrals(message: Message):
     """Основной обработчик кнопки 'Рефералы'"""
     user_id = message.from_user.id
@@ -50,10 +52,31 @@ async def handle_referrals(message: Message):
 async def show_referrals_menu(message: Message, user: Dict[str, Any]):
     """Отображение меню рефералов"""
     user_id = user['telegram_id']
+    user_version = db.get_user_version(user_id)
+    
+    rendered = render_cache.get('referrals_menu', user_id, user_version)
+    if rendered is None:
+        rendered = render_cache.put(
+            'referrals_menu', user_id, user_version,
+            *await render_referrals_menu(message, user)
+        )
+    
+    referrals_text, keyboard = rendered
+    
+    await message_manager.replace_message(
+        message,
+        referrals_text,
+        keyboard
+    )
+
+async def render_referrals_menu(message: Message, user: Dict[str, Any]) -> Tuple[str, InlineKeyboardMarkup]:
+    """Формирование текста и клавиатуры меню рефералов"""
+    user_id = user['telegram_id']
     
     # Получаем реферальную статистику
     referrals_count = user.get('referrals_count', 0)
-    referrals_list = db.get_referrals(user_id)
+    activity = db.get_referral_activity(user_id)
+    network = db.get_referral_summary(user_id)
     
     # Получаем реферера
     referrer = db.get_referrer(user_id)
@@ -71,8 +94,8 @@ async def show_referrals_menu(message: Message, user: Dict[str, Any]):
         
         f"<b>Статистика:</b>\n"
         f"👥 <b>Приглашено пользователей:</b> {referrals_count}\n"
-        f"🎯 <b>Активных рефералов:</b> {len([r for r in referrals_list if is_user_active(r)])}\n"
-        f"💰 <b>Заработано с рефералов:</b> {referrals_count * 10} токенов\n\n"
+        f"🎯 <b>Активных рефералов:</b> {activity['week']}\n"
+        f"💰 <b>Заработано с рефералов:</b> {network['earned']:.0f} токенов\n\n"
     )
     
     # Информация о реферере
@@ -107,28 +130,7 @@ async def show_referrals_menu(message: Message, user: Dict[str, Any]):
     
     referrals_text += "<i>Приглашайте друзей и получайте бонусы!</i>"
     
-    await message_manager.replace_message(
-        message,
-        referrals_text,
-        MainKeyboards.get_referrals_keyboard()
-    )
-
-def is_user_active(user: Dict[str, Any], days_threshold: int = 7) -> bool:
-    """Проверка активности пользователя"""
-    last_active = user.get('last_active')
-    if not last_active:
-        return False
-    
-    try:
-        if isinstance(last_active, str):
-            last_active_date = datetime.fromisoformat(last_active.replace('Z', '+00:00'))
-        else:
-            last_active_date = last_active
-        
-        days_inactive = (datetime.now() - last_active_date).days
-        return days_inactive <= days_threshold
-    except:
-        return False
+    return referrals_text, MainKeyboards.get_referrals_keyboard()
 
 def get_referral_rank(referrals_count: int) -> Dict[str, Any]:
     """Определение ранга по количеству рефералов"""
@@ -186,7 +188,7 @@ def format_date(date_str: str) -> str:
 
 # ==================== ОБРАБОТЧИКИ ПОДМЕНЮ РЕФЕРАЛОВ ====================
 
-@router.callback_query(F.data == "referral_stats")
+@router.callback("referral_stats")
 async def handle_referral_stats(callback: CallbackQuery):
     """Обработчик кнопки 'Статистика' в рефералах"""
     user_id = callback.from_user.id
@@ -200,66 +202,67 @@ async def handle_referral_stats(callback: CallbackQuery):
         )
         return
     
-    # Получаем расширенную статистику
-    referrals_list = db.get_referrals(user_id)
-    referrals_count = len(referrals_list)
+    user_version = db.get_user_version(user_id)
     
-    # Анализируем активность рефералов
-    active_referrals = []
-    inactive_referrals = []
-    today = datetime.now().date()
+    rendered = render_cache.get('referral_stats', user_id, user_version)
+    if rendered is None:
+        rendered = render_cache.put(
+            'referral_stats', user_id, user_version,
+            render_referral_stats(user_id),
+            MainKeyboards.get_back_keyboard("referrals")
+        )
     
-    for referral in referrals_list:
-        last_active = referral.get('last_active')
-        if last_active:
-            try:
-                if isinstance(last_active, str):
-                    last_active_date = datetime.fromisoformat(last_active.replace('Z', '+00:00')).date()
-                else:
-                    last_active_date = last_active.date()
-                
-                days_inactive = (today - last_active_date).days
-                if days_inactive <= 7:
-                    active_referrals.append(referral)
-                else:
-                    inactive_referrals.append(referral)
-            except:
-                inactive_referrals.append(referral)
-        else:
-            inactive_referrals.append(referral)
+    stats_text, keyboard = rendered
+    
+    await message_manager.edit_message_with_menu(
+        callback,
+        stats_text,
+        keyboard
+    )
+    
+    await message_manager.answer_callback_with_notification(callback)
+
+def render_referral_stats(user_id: int) -> str:
+    """Формирование текста подробной статистики рефералов"""
+    # Получаем расширенную статистику: счетчики активности ведутся при записи last_active
+    referrals_count = db.get_referral_count(user_id)
+    activity = db.get_referral_activity(user_id)
+    active_count = activity['week']
     
     # Конверсия (если были приглашения)
     conversion_rate = 0
     if referrals_count > 0:
-        conversion_rate = (len(active_referrals) / referrals_count) * 100
+        conversion_rate = (active_count / referrals_count) * 100
     
-    # Доход от рефералов
-    total_income = referrals_count * 10  # По 10 токенов за каждого
+    # Доход и многоуровневая сеть - из графа рефералов
+    network = db.get_referral_summary(user_id)
+    total_income = network['earned']
     
     stats_text = (
         f"📊 <b>Подробная статистика рефералов</b>\n\n"
         
         f"<b>Основные метрики:</b>\n"
         f"👥 <b>Всего приглашено:</b> {referrals_count}\n"
-        f"✅ <b>Активных:</b> {len(active_referrals)} ({conversion_rate:.1f}%)\n"
-        f"❌ <b>Неактивных:</b> {len(inactive_referrals)}\n"
-        f"💰 <b>Общий доход:</b> {total_income} токенов\n\n"
+        f"✅ <b>Активных:</b> {active_count} ({conversion_rate:.1f}%)\n"
+        f"❌ <b>Неактивных:</b> {referrals_count - active_count}\n"
+        f"💰 <b>Общий доход:</b> {total_income:.0f} токенов\n\n"
         
         f"<b>Активность за периоды:</b>\n"
-        f"• За последние 24 часа: {count_active_by_period(referrals_list, 1)}\n"
-        f"• За последние 7 дней: {count_active_by_period(referrals_list, 7)}\n"
-        f"• За последние 30 дней: {count_active_by_period(referrals_list, 30)}\n\n"
+        f"• Сегодня: {activity['today']}\n"
+        f"• За последние 7 дней: {activity['week']}\n"
+        f"• За последние 30 дней: {activity['month']}\n\n"
     )
     
-    # Топ рефералов по активности
-    if referrals_list:
-        # Сортируем по последней активности
-        sorted_referrals = sorted(
-            referrals_list,
-            key=lambda x: x.get('last_active', ''),
-            reverse=True
-        )[:5]
-        
+    # Сеть рефералов по уровням (рефералы рефералов и т.д.)
+    if network['network_size'] > referrals_count:
+        stats_text += "<b>Сеть рефералов:</b>\n"
+        for depth, count in sorted(network['levels'].items())[:3]:
+            stats_text += f"• {depth}-й уровень: {count}\n"
+        stats_text += f"• Всего в сети: {network['network_size']}\n\n"
+    
+    # Топ рефералов по последней активности (по индексу referrer_id, last_active)
+    sorted_referrals = db.get_referrals_by_activity(user_id, days=30, limit=5)
+    if sorted_referrals:
         stats_text += "<b>Самые активные рефералы:</b>\n"
         for i, referral in enumerate(sorted_referrals, 1):
             nickname = referral.get('nickname', 'Без имени')
@@ -274,50 +277,23 @@ async def handle_referral_stats(callback: CallbackQuery):
                     
                     days_ago = (datetime.now() - last_active_date).days
                     if days_ago == 0:
-                        activity = "сегодня"
+                        last_seen = "сегодня"
                     elif days_ago == 1:
-                        activity = "вчера"
+                        last_seen = "вчера"
                     else:
-                        activity = f"{days_ago} дн. назад"
+                        last_seen = f"{days_ago} дн. назад"
                 except:
-                    activity = "давно"
+                    last_seen = "давно"
             else:
-                activity = "никогда"
+                last_seen = "никогда"
             
-            stats_text += f"{i}. {nickname} - был {activity}\n"
+            stats_text += f"{i}. {nickname} - был {last_seen}\n"
     
     stats_text += "\n<i>Статистика обновляется в реальном времени</i>"
     
-    await message_manager.edit_message_with_menu(
-        callback,
-        stats_text,
-        MainKeyboards.get_back_keyboard("referrals")
-    )
-    
-    await message_manager.answer_callback_with_notification(callback)
+    return stats_text
 
-def count_active_by_period(referrals: List[Dict[str, Any]], days: int) -> int:
-    """Подсчет активных рефералов за период"""
-    count = 0
-    cutoff_date = datetime.now() - timedelta(days=days)
-    
-    for referral in referrals:
-        last_active = referral.get('last_active')
-        if last_active:
-            try:
-                if isinstance(last_active, str):
-                    last_active_date = datetime.fromisoformat(last_active.replace('Z', '+00:00'))
-                else:
-                    last_active_date = last_active
-                
-                if last_active_date >= cutoff_date:
-                    count += 1
-            except:
-                continue
-    
-    return count
-
-@router.callback_query(F.data == "referral_leaders")
+@router.callback("referral_leaders")
 async def handle_referral_leaders(callback: CallbackQuery):
     """Обработчик кнопки 'Лидеры' в рефералах"""
     user_id = callback.from_user.id
@@ -394,7 +370,7 @@ def get_user_leaderboard_position(user_id: int, leaders: List[Dict[str, Any]]) -
     
     return -1
 
-@router.callback_query(F.data == "referral_list")
+@router.callback("referral_list")
 async def handle_referral_list(callback: CallbackQuery):
     """Обработчик кнопки 'Список рефералов'"""
     user_id = callback.from_user.id
@@ -408,10 +384,10 @@ async def handle_referral_list(callback: CallbackQuery):
         )
         return
     
-    # Получаем список рефералов
-    referrals = db.get_referrals(user_id)
+    # Счетчики активности и короткие списки - без загрузки всех рефералов
+    referrals_count = db.get_referral_count(user_id)
     
-    if not referrals:
+    if not referrals_count:
         await message_manager.edit_message_with_menu(
             callback,
             "📋 <b>Список ваших рефералов</b>\n\n"
@@ -422,38 +398,17 @@ async def handle_referral_list(callback: CallbackQuery):
         await message_manager.answer_callback_with_notification(callback)
         return
     
-    # Группируем по активности
-    active_referrals = []
-    inactive_referrals = []
-    today = datetime.now().date()
-    
-    for referral in referrals:
-        last_active = referral.get('last_active')
-        is_active = False
-        
-        if last_active:
-            try:
-                if isinstance(last_active, str):
-                    last_active_date = datetime.fromisoformat(last_active.replace('Z', '+00:00')).date()
-                else:
-                    last_active_date = last_active.date()
-                
-                days_inactive = (today - last_active_date).days
-                is_active = days_inactive <= 7
-            except:
-                pass
-        
-        if is_active:
-            active_referrals.append(referral)
-        else:
-            inactive_referrals.append(referral)
+    active_count = db.get_referral_activity(user_id)['week']
+    inactive_count = referrals_count - active_count
+    active_referrals = db.get_referrals_by_activity(user_id, active=True, limit=10)
+    inactive_referrals = db.get_referrals_by_activity(user_id, active=False, limit=5)
     
     # Формируем текст
     referrals_text = "📋 <b>Список ваших рефералов</b>\n\n"
     
-    referrals_text += f"<b>Всего рефералов:</b> {len(referrals)}\n"
-    referrals_text += f"<b>Активных:</b> {len(active_referrals)}\n"
-    referrals_text += f"<b>Неактивных:</b> {len(inactive_referrals)}\n\n"
+    referrals_text += f"<b>Всего рефералов:</b> {referrals_count}\n"
+    referrals_text += f"<b>Активных:</b> {active_count}\n"
+    referrals_text += f"<b>Неактивных:</b> {inactive_count}\n\n"
     
     # Показываем активных рефералов
     if active_referrals:
@@ -477,8 +432,8 @@ async def handle_referral_list(callback: CallbackQuery):
             
             referrals_text += f"{i}. {nickname} (с {date_str})\n"
         
-        if len(active_referrals) > 10:
-            referrals_text += f"... и еще {len(active_referrals) - 10}\n"
+        if active_count > 10:
+            referrals_text += f"... и еще {active_count - 10}\n"
         
         referrals_text += "\n"
     
@@ -489,8 +444,8 @@ async def handle_referral_list(callback: CallbackQuery):
             nickname = referral.get('nickname', 'Без имени')
             referrals_text += f"{i}. {nickname}\n"
         
-        if len(inactive_referrals) > 5:
-            referrals_text += f"... и еще {len(inactive_referrals) - 5}\n"
+        if inactive_count > 5:
+            referrals_text += f"... и еще {inactive_count - 5}\n"
     
     referrals_text += "\n<i>Активным считается пользователь, заходивший в бота за последние 7 дней</i>"
     
@@ -502,7 +457,7 @@ async def handle_referral_list(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-@router.callback_query(F.data == "referral_bonuses")
+@router.callback("referral_bonuses")
 async def handle_referral_bonuses(callback: CallbackQuery):
     """Обработчик кнопки 'Бонусы' в рефералах"""
     user_id = callback.from_user.id
@@ -518,7 +473,7 @@ async def handle_referral_bonuses(callback: CallbackQuery):
     
     # Получаем информацию о бонусах
     referrals_count = user.get('referrals_count', 0)
-    total_bonus = referrals_count * 10
+    total_bonus = db.get_referral_summary(user_id)['earned']
     
     bonuses_text = (
         f"🎁 <b>Реферальные бонусы</b>\n\n"
@@ -526,7 +481,7 @@ async def handle_referral_bonuses(callback: CallbackQuery):
         f"<b>Текущие начисления:</b>\n"
         f"💰 <b>За каждого реферала:</b> 10 токенов\n"
         f"👥 <b>Ваших рефералов:</b> {referrals_count}\n"
-        f"💵 <b>Всего заработано:</b> {total_bonus} токенов\n\n"
+        f"💵 <b>Всего заработано:</b> {total_bonus:.0f} токенов\n\n"
         
         f"<b>Уровни бонусов:</b>\n"
         f"🥉 <b>Новичок (0-2 реф.):</b> 10 токенов за каждого\n"
@@ -585,7 +540,7 @@ def get_bonus_per_referral(rank_name: str) -> int:
     }
     return bonuses.get(rank_name, 10)
 
-@router.callback_query(F.data == "referral_share")
+@router.callback("referral_share")
 async def handle_referral_share(callback: CallbackQuery):
     """Обработчик кнопки 'Поделиться' в рефералах"""
     user_id = callback.from_user.id
@@ -633,7 +588,7 @@ async def handle_referral_share(callback: CallbackQuery):
     builder = InlineKeyboardBuilder()
     
     # Кнопка для копирования ссылки
-    builder.button(text="📋 Скопировать ссылку", callback_data=f"copy_referral_{user_id}")
+    builder.button(text="📋 Скопировать ссылку", callback_data=REFERRAL_COPY.pack(user_id))
     
     # Кнопка для шаринга в Telegram
     share_url = f"https://t.me/share/url?url={urllib.parse.quote(referral_link)}&text={urllib.parse.quote('Присоединяйся ко мне в GromFit Bot! 🏋️‍♂️')}"
@@ -653,8 +608,8 @@ async def handle_referral_share(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-@router.callback_query(F.data.startswith("copy_referral_"))
-async def handle_copy_referral(callback: CallbackQuery):
+@router.action(REFERRAL_COPY)
+async def handle_copy_referral(callback: CallbackQuery, payload):
     """Обработчик копирования реферальной ссылки"""
     # В Telegram нельзя программно копировать в буфер обмена,
     # поэтому просто показываем уведомление
@@ -664,7 +619,7 @@ async def handle_copy_referral(callback: CallbackQuery):
         show_alert=True
     )
 
-@router.callback_query(F.data == "referral_rules")
+@router.callback("referral_rules")
 async def handle_referral_rules(callback: CallbackQuery):
     """Обработчик кнопки 'Правила' в рефералах"""
     rules_text = (
@@ -710,7 +665,7 @@ async def handle_referral_rules(callback: CallbackQuery):
 
 # ==================== ОБРАБОТЧИКИ НАВИГАЦИИ ====================
 
-@router.callback_query(F.data == "back_to_referrals")
+@router.callback("back_to_referrals")
 async def handle_back_to_referrals(callback: CallbackQuery):
     """Возврат в меню рефералов"""
     user_id = callback.from_user.id
@@ -743,12 +698,12 @@ async def handle_back_to_referrals(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-@router.callback_query(F.data == "back_to_referrals_menu")
+@router.callback("back_to_referrals_menu")
 async def handle_back_to_referrals_menu(callback: CallbackQuery):
     """Возврат в меню рефералов (алиас)"""
     await handle_back_to_referrals(callback)
 
-@router.callback_query(F.data == "back_to_main")
+@router.callback("back_to_main")
 async def handle_back_to_main_from_referrals(callback: CallbackQuery):
     """Возврат в главное меню из рефералов"""
     user_id = callback.from_user.id
@@ -820,7 +775,7 @@ async def handle_myref_command(message: Message):
         f"<code>{referral_link}</code>\n\n"
         f"<b>Статистика:</b>\n"
         f"• Приглашено: {user.get('referrals_count', 0)} пользователей\n"
-        f"• Заработано: {user.get('referrals_count', 0) * 10} токенов\n\n"
+        f"• Заработано: {db.get_referral_summary(user_id)['earned']:.0f} токенов\n\n"
         f"<i>Делитесь ссылкой с друзьями и получайте бонусы!</i>",
         MainKeyboards.get_back_to_main_keyboard()
     )
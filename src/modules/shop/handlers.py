@@ -7,15 +7,18 @@ import logging
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
-from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
 from aiogram.filters import Command
 
 from core.database import Database
+from core.dispatch_router import DispatchRouter
+from core.events import events, PURCHASE
 from core.message_manager import MessageManager
+from core.render_cache import render_cache
 from modules.keyboards.main_keyboards import MainKeyboards
+from modules.keyboards.callbacks import SHOP_CATEGORY, SHOP_PAGE, SHOP_ITEM, SHOP_BUY, SHOP_GIFT, shop_category_id
 
-router = Router()
+router = DispatchRouter()
 db = Database()
 message_manager = MessageManager(None)
 logger = logging.getLogger(__name__)
@@ -27,7 +30,7 @@ def init_message_manager(bot):
 
 # ==================== ОСНОВНЫЕ ОБРАБОТЧИКИ МАГАЗИНА ====================
 
-@router.message(F.text == "🛒 Магазин")
+@router.text("🛒 Магазин")
 async def handle_shop(message: Message):
     """Основной обработчик кнопки 'Магазин'"""
     user_id = message.from_user.id
@@ -47,8 +50,27 @@ async def handle_shop(message: Message):
 
 async def show_shop_categories(message: Message, user: Dict[str, Any]):
     """Отображение категорий магазина"""
+    shop_text, keyboard = get_rendered_shop_categories(user)
+    
+    await message_manager.replace_message(
+        message,
+        shop_text,
+        keyboard
+    )
+
+def get_rendered_shop_categories(user: Dict[str, Any]) -> Tuple[str, InlineKeyboardMarkup]:
+    """Экран категорий магазина из кэша отрисовки"""
     user_id = user['telegram_id']
+    user_version = db.get_user_version(user_id)
+    
+    rendered = render_cache.get('shop_categories', user_id, user_version)
+    if rendered is None:
+        rendered = render_cache.put('shop_categories', user_id, user_version, *render_shop_categories(user))
     
+    return rendered
+
+def render_shop_categories(user: Dict[str, Any]) -> Tuple[str, InlineKeyboardMarkup]:
+    """Формирование текста и клавиатуры категорий магазина"""
     # Получаем баланс пользователя
     balance_tokens = user.get('balance_tokens', 0)
     balance_diamonds = user.get('balance_diamonds', 0)
@@ -72,11 +94,7 @@ async def show_shop_categories(message: Message, user: Dict[str, Any]):
     
     shop_text += "\n<i>Выберите категорию для просмотра товаров</i>"
     
-    await message_manager.replace_message(
-        message,
-        shop_text,
-        MainKeyboards.get_shop_categories_keyboard()
-    )
+    return shop_text, MainKeyboards.get_shop_categories_keyboard()
 
 def get_shop_categories() -> List[Dict[str, str]]:
     """Получение списка категорий магазина"""
@@ -127,8 +145,8 @@ def get_shop_categories() -> List[Dict[str, str]]:
 
 # ==================== ОБРАБОТЧИКИ КАТЕГОРИЙ ====================
 
-@router.callback_query(F.data.startswith("shop_category_"))
-async def handle_shop_category(callback: CallbackQuery):
+@router.action(SHOP_CATEGORY)
+async def handle_shop_category(callback: CallbackQuery, payload):
     """Обработчик выбора категории магазина"""
     user_id = callback.from_user.id
     user = db.get_user(user_id)
@@ -141,7 +159,7 @@ async def handle_shop_category(callback: CallbackQuery):
         )
         return
     
-    category_id = callback.data.replace("shop_category_", "")
+    category_id = shop_category_id(payload.category)
     
     if category_id == "all":
         # Показать все товары
@@ -230,8 +248,13 @@ async def show_shop_items(callback: CallbackQuery, user: Dict[str, Any],
     
     await message_manager.answer_callback_with_notification(callback)
 
-@router.callback_query(F.data.startswith("shop_page_"))
-async def handle_shop_page(callback: CallbackQuery):
+@router.callback("shop_page_current")
+async def handle_shop_page_current(callback: CallbackQuery):
+    """Обработчик кнопки текущей страницы"""
+    await message_manager.answer_callback_with_notification(callback)
+
+@router.action(SHOP_PAGE)
+async def handle_shop_page(callback: CallbackQuery, payload):
     """Обработчик пагинации в магазине"""
     user_id = callback.from_user.id
     user = db.get_user(user_id)
@@ -244,27 +267,8 @@ async def handle_shop_page(callback: CallbackQuery):
         )
         return
     
-    data_parts = callback.data.split("_")
-    
-    if len(data_parts) < 4:
-        await message_manager.answer_callback_with_notification(
-            callback,
-            "❌ Ошибка пагинации",
-            show_alert=True
-        )
-        return
-    
-    category_id = data_parts[2]
-    page = int(data_parts[3])
-    
-    if category_id == "current":
-        # Остаемся на текущей странице
-        await message_manager.answer_callback_with_notification(
-            callback,
-            f"Страница {page + 1}",
-            show_alert=False
-        )
-        return
+    category_id = shop_category_id(payload.category)
+    page = payload.page
     
     # Получаем товары категории
     if category_id == "all":
@@ -276,8 +280,8 @@ async def handle_shop_page(callback: CallbackQuery):
 
 # ==================== ОБРАБОТЧИКИ ТОВАРОВ ====================
 
-@router.callback_query(F.data.startswith("shop_item_"))
-async def handle_shop_item(callback: CallbackQuery):
+@router.action(SHOP_ITEM)
+async def handle_shop_item(callback: CallbackQuery, payload):
     """Обработчик выбора товара"""
     user_id = callback.from_user.id
     user = db.get_user(user_id)
@@ -290,10 +294,8 @@ async def handle_shop_item(callback: CallbackQuery):
         )
         return
     
-    item_id = callback.data.replace("shop_item_", "")
-    
     # Получаем информацию о товаре
-    item = db.get_shop_item(item_id)
+    item = db.get_shop_item_by_id(payload.item)
     
     if not item:
         await message_manager.edit_message_with_menu(
@@ -366,7 +368,7 @@ async def show_item_details(callback: CallbackQuery, user: Dict[str, Any], item:
     
     # Создаем клавиатуру
     keyboard = MainKeyboards.get_shop_item_detail_keyboard(
-        item['item_id'], 
+        item['id'], 
         item_price_tokens, 
         user_balance_tokens
     )
@@ -381,8 +383,8 @@ async def show_item_details(callback: CallbackQuery, user: Dict[str, Any], item:
 
 # ==================== ОБРАБОТЧИКИ ПОКУПОК ====================
 
-@router.callback_query(F.data.startswith("shop_buy"))
-async def handle_shop_buy(callback: CallbackQuery):
+@router.action(SHOP_BUY)
+async def handle_shop_buy(callback: CallbackQuery, payload):
     """Обработчик покупки товара"""
     user_id = callback.from_user.id
     user = db.get_user(user_id)
@@ -395,30 +397,10 @@ async def handle_shop_buy(callback: CallbackQuery):
         )
         return
     
-    data_parts = callback.data.split("_")
-    
-    if len(data_parts) < 3:
-        await message_manager.answer_callback_with_notification(
-            callback,
-            "❌ Ошибка покупки",
-            show_alert=True
-        )
-        return
-    
-    item_id = data_parts[2]
-    quantity = 1
-    
-    # Проверяем количество
-    if len(data_parts) > 3:
-        quantity_str = data_parts[3]
-        if quantity_str.startswith("x"):
-            try:
-                quantity = int(quantity_str[1:])
-            except:
-                quantity = 1
+    quantity = max(payload.quantity, 1)
     
     # Получаем информацию о товаре
-    item = db.get_shop_item(item_id)
+    item = db.get_shop_item_by_id(payload.item)
     
     if not item:
         await message_manager.edit_message_with_menu(
@@ -444,7 +426,7 @@ async def handle_shop_buy(callback: CallbackQuery):
         return
     
     # Выполняем покупку
-    purchase_result = db.purchase_item(user_id, item_id, quantity)
+    purchase_result = db.purchase_item(user_id, item['item_id'], quantity)
     
     if not purchase_result['success']:
         error_message = purchase_result.get('error', 'Неизвестная ошибка')
@@ -467,6 +449,7 @@ async def handle_shop_buy(callback: CallbackQuery):
     # Покупка успешна
     item_name = item.get('name', 'Без названия')
     total_tokens = purchase_result['total_tokens']
+    events.publish(PURCHASE, user_id=user_id, item_id=item['item_id'], quantity=quantity, total_tokens=total_tokens)
     total_diamonds = purchase_result['total_diamonds']
     new_balance_tokens = purchase_result['new_balance_tokens']
     new_balance_diamonds = purchase_result['new_balance_diamonds']
@@ -507,7 +490,7 @@ async def handle_shop_buy(callback: CallbackQuery):
         show_alert=True
     )
 
-@router.callback_query(F.data == "shop_insufficient_funds")
+@router.callback("shop_insufficient_funds")
 async def handle_insufficient_funds(callback: CallbackQuery):
     """Обработчик недостатка средств"""
     await message_manager.answer_callback_with_notification(
@@ -516,7 +499,7 @@ async def handle_insufficient_funds(callback: CallbackQuery):
         show_alert=True
     )
 
-@router.callback_query(F.data == "shop_sufficient_funds")
+@router.callback("shop_sufficient_funds")
 async def handle_sufficient_funds(callback: CallbackQuery):
     """Обработчик достаточности средств"""
     await message_manager.answer_callback_with_notification(
@@ -525,7 +508,7 @@ async def handle_sufficient_funds(callback: CallbackQuery):
         show_alert=False
     )
 
-@router.callback_query(F.data == "shop_gift_")
+@router.action(SHOP_GIFT)
 async def handle_shop_gift(callback: CallbackQuery):
     """Обработчик подарка товара"""
     # Временная заглушка - функция в разработке
@@ -537,7 +520,7 @@ async def handle_shop_gift(callback: CallbackQuery):
 
 # ==================== ОБРАБОТЧИКИ ДРУГИХ ФУНКЦИЙ МАГАЗИНА ====================
 
-@router.callback_query(F.data == "shop_my_purchases")
+@router.callback("shop_my_purchases")
 async def handle_shop_my_purchases(callback: CallbackQuery):
     """Обработчик кнопки 'Мои покупки'"""
     user_id = callback.from_user.id
@@ -623,7 +606,7 @@ async def handle_shop_my_purchases(callback: CallbackQuery):
 
 # ==================== ОБРАБОТЧИКИ НАВИГАЦИИ ====================
 
-@router.callback_query(F.data == "back_to_shop")
+@router.callback("back_to_shop")
 async def handle_back_to_shop(callback: CallbackQuery):
     """Возврат в магазин"""
     user_id = callback.from_user.id
@@ -656,12 +639,12 @@ async def handle_back_to_shop(callback: CallbackQuery):
     
     await message_manager.answer_callback_with_notification(callback)
 
-@router.callback_query(F.data == "back_to_shop_menu")
+@router.callback("back_to_shop_menu")
 async def handle_back_to_shop_menu(callback: CallbackQuery):
     """Возврат в меню магазина (алиас)"""
     await handle_back_to_shop(callback)
 
-@router.callback_query(F.data == "back_to_shop_categories")
+@router.callback("back_to_shop_categories")
 async def handle_back_to_shop_categories(callback: CallbackQuery):
     """Возврат к категориям магазина"""
     user_id = callback.from_user.id
@@ -679,38 +662,15 @@ async def handle_back_to_shop_categories(callback: CallbackQuery):
 
 async def show_shop_categories_from_callback(callback: CallbackQuery, user: Dict[str, Any]):
     """Отображение категорий магазина из callback"""
-    user_id = user['telegram_id']
-    
-    # Получаем баланс пользователя
-    balance_tokens = user.get('balance_tokens', 0)
-    balance_diamonds = user.get('balance_diamonds', 0)
-    
-    # Получаем категории товаров
-    categories = get_shop_categories()
-    
-    shop_text = (
-        f"🛒 <b>Магазин GromFit</b>\n\n"
-        
-        f"<b>Ваш баланс:</b>\n"
-        f"💰 <b>Токены:</b> {balance_tokens:.0f}\n"
-        f"💎 <b>Алмазы:</b> {balance_diamonds:.0f}\n\n"
-        
-        f"<b>Категории товаров:</b>\n"
-    )
-    
-    # Описание категорий
-    for category in categories:
-        shop_text += f"{category['icon']} <b>{category['name']}</b> - {category['description']}\n"
-    
-    shop_text += "\n<i>Выберите категорию для просмотра товаров</i>"
+    shop_text, keyboard = get_rendered_shop_categories(user)
     
     await message_manager.edit_message_with_menu(
         callback,
         shop_text,
-        MainKeyboards.get_shop_categories_keyboard()
+        keyboard
     )
 
-@router.callback_query(F.data == "back_to_shop_items")
+@router.callback("back_to_shop_items")
 async def handle_back_to_shop_items(callback: CallbackQuery):
     """Возврат к списку товаров"""
     user_id = callback.from_user.id
@@ -728,7 +688,7 @@ async def handle_back_to_shop_items(callback: CallbackQuery):
     # Для простоты возвращаем в категории
     await show_shop_categories_from_callback(callback, user)
 
-@router.callback_query(F.data == "back_to_main")
+@router.callback("back_to_main")
 async def handle_back_to_main_from_shop(callback: CallbackQuery):
     """Возврат в главное меню из магазина"""
     user_id = callback.from_user.id
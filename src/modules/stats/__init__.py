@@ -1,120 +1,37 @@
 from aiogram import Router, F
-from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
+from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, BufferedInputFile
 from aiogram.filters import Command
 import logging
-from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-import io
 
-from core.database import db
+from core.database import Database
+from modules.workouts.handlers import handle_record_result
+from .charts import chart_cache, chart_renderer, make_chart_key, render_progress_chart
 
 router = Router()
+db = Database()
 logger = logging.getLogger(__name__)
 
 @router.message(F.text == "🏋️‍♂️ Добавить тренировку")
 @router.message(Command("add_workout"))
 async def add_workout(message: Message):
-    """Добавить тренировку"""
-    
-    workout_text = """
-🏋️‍♂️ **ДОБАВЛЕНИЕ ТРЕНИРОВКИ**
-
-📝 **Формат:**
-упражнение вес подходы повторения
-
-💡 **Примеры:**
-`жим лежа 80 3 10`
-`приседания 100 4 8`
-`подтягивания 0 3 15`
-`бег 0 1 30` (30 минут)
-
-📊 **Или используй подробный формат:**
-`упражнение:жим лежа,вес:80,подходы:3,повторения:10,заметки:хорошая тренировка`
-
-👇 **Отправь свою тренировку в чат:**
-    """
-    
-    await message.answer(workout_text)
-
-@router.message(F.text.regexp(r'^[а-яА-Яa-zA-Z\s]+\s+\d+\s+\d+\s+\d+$'))
-async def handle_simple_workout(message: Message):
-    """Обработка простого формата тренировки"""
-    try:
-        parts = message.text.split()
-        exercise = ' '.join(parts[:-3])
-        weight = float(parts[-3])
-        sets = int(parts[-2])
-        reps = int(parts[-1])
-        
-        # Получаем ID пользователя
-        user = db.fetch_one(
-            "SELECT id FROM users WHERE telegram_id = ?",
-            (message.from_user.id,)
-        )
-        
-        if user:
-            db.execute('''
-                INSERT INTO workouts (user_id, exercise, weight, sets, reps)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user['id'], exercise, weight, sets, reps))
-            
-            volume = weight * sets * reps
-            
-            await message.answer(
-                f"✅ **Тренировка сохранена!**\n\n"
-                f"🏋️‍♂️ **Упражнение:** {exercise}\n"
-                f"⚖️ **Вес:** {weight} кг\n"
-                f"🔄 **Подходы/повторения:** {sets}x{reps}\n"
-                f"📦 **Объем:** {volume:,.0f} кг\n\n"
-                f"💪 Так держать!",
-                parse_mode="Markdown"
-            )
-        else:
-            await message.answer("❌ Сначала зарегистрируйтесь через /start")
-            
-    except Exception as e:
-        await message.answer(f"❌ Ошибка формата: {e}")
+    """Добавить тренировку (запись разбирает модуль тренировок)"""
+    await handle_record_result(message)
 
 @router.message(F.text == "📊 Статистика")
 @router.message(Command("stats"))
 async def show_stats(message: Message):
     """Показать статистику тренировок"""
+    user_id = message.from_user.id
     
-    user = db.fetch_one(
-        "SELECT id FROM users WHERE telegram_id = ?",
-        (message.from_user.id,)
-    )
-    
-    if not user:
+    if not db.get_user(user_id):
         await message.answer("Сначала зарегистрируйтесь через /start")
         return
     
-    db_user_id = user['id']
-    
     # Получаем общую статистику
-    total_stats = db.fetch_one('''
-        SELECT 
-            COUNT(*) as total_workouts,
-            SUM(weight * sets * reps) as total_volume,
-            SUM(duration) as total_duration,
-            COUNT(DISTINCT exercise) as exercises_count
-        FROM workouts 
-        WHERE user_id = ?
-    ''', (db_user_id,))
+    total_stats = db.get_workout_totals(user_id)
     
     # Получаем топ упражнений
-    top_exercises = db.fetch_all('''
-        SELECT 
-            exercise,
-            COUNT(*) as workouts_count,
-            SUM(weight * sets * reps) as total_volume,
-            MAX(weight) as max_weight
-        FROM workouts 
-        WHERE user_id = ?
-        GROUP BY exercise
-        ORDER BY total_volume DESC
-        LIMIT 5
-    ''', (db_user_id,))
+    top_exercises = db.get_top_exercises(user_id, limit=5)
     
     if not total_stats['total_workouts']:
         await message.answer("📭 У вас пока нет тренировок. Добавьте первую!")
@@ -127,7 +44,7 @@ async def show_stats(message: Message):
 📈 **ОБЩАЯ:**
 🏋️‍♂️ **Тренировок:** {total_stats['total_workouts'] or 0}
 📦 **Общий объем:** {total_stats['total_volume'] or 0:,.0f} кг
-⏱️ **Время тренировок:** {total_stats['total_duration'] or 0 // 60} мин
+⏱️ **Время тренировок:** {(total_stats['total_duration'] or 0) // 60} мин
 💪 **Упражнений:** {total_stats['exercises_count'] or 0}
 
 🏆 **ТОП-5 УПРАЖНЕНИЙ:**
@@ -149,29 +66,14 @@ async def show_stats(message: Message):
 @router.message(Command("graph"))
 async def show_graph(message: Message):
     """Показать график прогресса"""
+    user_id = message.from_user.id
     
-    user = db.fetch_one(
-        "SELECT id FROM users WHERE telegram_id = ?",
-        (message.from_user.id,)
-    )
-    
-    if not user:
+    if not db.get_user(user_id):
         await message.answer("Сначала зарегистрируйтесь через /start")
         return
     
-    db_user_id = user['id']
-    
     # Получаем данные для графика
-    workouts_data = db.fetch_all('''
-        SELECT 
-            DATE(workout_date) as date,
-            SUM(weight * sets * reps) as daily_volume
-        FROM workouts 
-        WHERE user_id = ? 
-        AND workout_date >= DATE('now', '-30 days')
-        GROUP BY DATE(workout_date)
-        ORDER BY date
-    ''', (db_user_id,))
+    workouts_data = db.get_daily_volume(user_id, days=30)
     
     if not workouts_data or len(workouts_data) < 2:
         await message.answer(
@@ -181,29 +83,8 @@ async def show_graph(message: Message):
         return
     
     # Подготавливаем данные
-    dates = [datetime.strptime(w['date'], '%Y-%m-%d') for w in workouts_data]
-    volumes = [w['daily_volume'] or 0 for w in workouts_data]
-    
-    # Создаем график
-    plt.figure(figsize=(10, 6))
-    plt.plot(dates, volumes, 'o-', linewidth=2, markersize=8, color='#4CAF50')
-    plt.fill_between(dates, volumes, alpha=0.3, color='#4CAF50')
-    
-    plt.title('📈 ПРОГРЕСС ТРЕНИРОВОК (30 ДНЕЙ)', fontsize=16, fontweight='bold')
-    plt.xlabel('Дата', fontsize=12)
-    plt.ylabel('Объем (кг)', fontsize=12)
-    plt.grid(True, alpha=0.3)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    
-    # Сохраняем в буфер
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-    buf.seek(0)
-    plt.close()
-    
-    # Отправляем график
-    from aiogram.types import InputFile
+    rows = [(w['date'], w['daily_volume'] or 0) for w in workouts_data]
+    volumes = [volume for _, volume in rows]
     
     caption = f"""
 📈 **ВАШ ПРОГРЕСС**
@@ -216,30 +97,39 @@ async def show_graph(message: Message):
 💪 **Так держать! Продолжай прогрессировать!**
 """
     
-    await message.answer_photo(
-        InputFile(buf, filename="progress_graph.png"),
+    # Тот же график уже отправлялся - повторно используем загруженное фото
+    chart_key = make_chart_key(message.from_user.id, rows)
+    cached = chart_cache.get(chart_key)
+    
+    if cached and cached.get('file_id'):
+        await message.answer_photo(cached['file_id'], caption=caption)
+        return
+    
+    png = cached.get('png') if cached else None
+    if png is None:
+        # Отрисовка в пуле процессов, цикл событий не блокируется
+        png = await chart_renderer.render(render_progress_chart, [d for d, _ in rows], volumes)
+        
+        if png is None:
+            await message.answer("⏳ Сейчас строится много графиков. Попробуйте через минуту.")
+            return
+        
+        chart_cache.put_png(chart_key, png)
+    
+    # Отправляем график
+    sent = await message.answer_photo(
+        BufferedInputFile(png, filename="progress_graph.png"),
         caption=caption
     )
+    
+    if sent.photo:
+        chart_cache.set_file_id(chart_key, sent.photo[-1].file_id)
 
 @router.message(Command("leaderboard"))
 async def show_leaderboard(message: Message):
     """Таблица лидеров"""
     
-    leaders = db.fetch_all('''
-        SELECT 
-            u.full_name,
-            u.username,
-            COUNT(w.id) as workouts_count,
-            SUM(w.weight * w.sets * w.reps) as total_volume,
-            ROUND(AVG(w.weight), 1) as avg_weight
-        FROM users u
-        LEFT JOIN workouts w ON u.id = w.user_id
-        WHERE u.is_active = 1
-        GROUP BY u.id
-        HAVING workouts_count > 0
-        ORDER BY total_volume DESC
-        LIMIT 10
-    ''')
+    leaders = db.get_volume_leaders(limit=10)
     
     if not leaders:
         await message.answer("🏆 Таблица лидеров пуста. Будьте первым!")
@@ -248,10 +138,10 @@ async def show_leaderboard(message: Message):
     leaderboard_text = "🏆 **ТАБЛИЦА ЛИДЕРОВ**\n\n"
     
     for i, leader in enumerate(leaders, 1):
-        name = leader['username'] or leader['full_name']
+        name = leader['username'] or leader['nickname']
         workouts = leader['workouts_count'] or 0
         volume = leader['total_volume'] or 0
-        avg_weight = leader['avg_weight'] or 0
+        avg_volume = leader['avg_volume'] or 0
         
         medals = ["🥇", "🥈", "🥉", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
         medal = medals[i-1] if i <= len(medals) else f"{i}."
@@ -259,7 +149,7 @@ async def show_leaderboard(message: Message):
         leaderboard_text += f"{medal} **{name}**\n"
         leaderboard_text += f"   🏋️‍♂️ {workouts} тренировок\n"
         leaderboard_text += f"   📦 {volume:,.0f} кг объем\n"
-        leaderboard_text += f"   ⚖️ Ср. вес: {avg_weight} кг\n\n"
+        leaderboard_text += f"   ⚖️ Ср. объем тренировки: {avg_volume:,.0f} кг\n\n"
     
     leaderboard_text += "💪 **Присоединяйся к лидерам!**"
     
@@ -0,0 +1,104 @@
+"""
+Построение графиков статистики GromFitBot
+Графики рисуются встроенным построителем plot в отдельных процессах
+с ограниченной очередью; готовые PNG и file_id отправленных фото кэшируются
+по (user_id, дата, хэш данных)
+"""
+
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Optional, Dict, List, Any, Tuple
+
+from .plot import render_png
+
+logger = logging.getLogger(__name__)
+
+ChartKey = Tuple[int, str, str]
+
+def render_progress_chart(dates: List[str], volumes: List[float]) -> bytes:
+    """Площадной график объема по дням в PNG встроенным построителем"""
+    labels = [d[5:] for d in dates]  # 2024-10-18 -> 10-18
+    return render_png('area', volumes, labels)
+
+def make_chart_key(user_id: int, rows: List[Tuple[str, float]]) -> ChartKey:
+    """Ключ графика: пользователь, текущая дата и хэш данных"""
+    payload = ';'.join(f"{d}={v}" for d, v in rows)
+    data_hash = hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+    return (user_id, date.today().isoformat(), data_hash)
+
+class ChartCache:
+    """LRU-кэш графиков: PNG до первой отправки, затем только file_id Telegram"""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[ChartKey, Dict[str, Any]]" = OrderedDict()
+
+    def get(self, key: ChartKey) -> Optional[Dict[str, Any]]:
+        """Запись кэша {'png': bytes | None, 'file_id': str | None}"""
+        entry = self._items.get(key)
+        if entry is not None:
+            self._items.move_to_end(key)
+        return entry
+
+    def put_png(self, key: ChartKey, png: bytes) -> None:
+        """Сохранение отрисованного PNG"""
+        self._items[key] = {'png': png, 'file_id': None}
+        self._items.move_to_end(key)
+
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def set_file_id(self, key: ChartKey, file_id: str) -> None:
+        """Сохранение file_id загруженного фото (PNG больше не нужен)"""
+        entry = self._items.get(key)
+        if entry is None:
+            entry = self._items[key] = {}
+        entry['file_id'] = file_id
+        entry['png'] = None
+
+class ChartRenderer:
+    """Пул процессов для отрисовки графиков с ограниченной очередью"""
+
+    def __init__(self, workers: int = 2, max_pending: int = 8):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Пул создается при первом графике"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def render(self, func, *args: Any) -> Optional[bytes]:
+        """
+        Отрисовка в пуле процессов
+
+        Returns:
+            PNG или None, если очередь переполнена
+        """
+        if self._pending >= self.max_pending:
+            logger.warning(f"Очередь отрисовки графиков переполнена ({self._pending})")
+            return None
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), func, *args)
+        finally:
+            self._pending -= 1
+
+    def shutdown(self) -> None:
+        """Остановка пула процессов"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+# Общие экземпляры модуля статистики
+chart_cache = ChartCache()
+chart_renderer = ChartRenderer()
@@ -0,0 +1,304 @@
+"""
+Легкий построитель графиков GromFitBot без matplotlib
+Линейные, площадные и столбчатые графики по дням в PNG (растр + zlib)
+или SVG; подписи осей выводятся встроенным пиксельным шрифтом
+"""
+
+import math
+import struct
+import zlib
+from html import escape
+from typing import Optional, List, Tuple, Sequence
+
+Color = Tuple[int, int, int]
+
+CHART_KINDS = ('line', 'area', 'bar')
+
+BACKGROUND: Color = (255, 255, 255)
+GRID: Color = (225, 225, 225)
+AXIS: Color = (120, 120, 120)
+TEXT: Color = (60, 60, 60)
+
+# Отступы области графика: слева (подписи значений), сверху, справа, снизу (даты)
+MARGINS = (56, 16, 16, 28)
+
+# Пиксельный шрифт 3x5 для подписей осей
+_FONT = {
+    '0': ("###", "#.#", "#.#", "#.#", "###"),
+    '1': (".#.", "##.", ".#.", ".#.", "###"),
+    '2': ("###", "..#", "###", "#..", "###"),
+    '3': ("###", "..#", "###", "..#", "###"),
+    '4': ("#.#", "#.#", "###", "..#", "..#"),
+    '5': ("###", "#..", "###", "..#", "###"),
+    '6': ("###", "#..", "###", "#.#", "###"),
+    '7': ("###", "..#", ".#.", ".#.", ".#."),
+    '8': ("###", "#.#", "###", "#.#", "###"),
+    '9': ("###", "#.#", "###", "..#", "###"),
+    '.': ("...", "...", "...", "...", ".#."),
+    '-': ("...", "...", "###", "...", "..."),
+    '/': ("..#", "..#", ".#.", "#..", "#.."),
+    'k': ("#..", "#.#", "##.", "#.#", "#.#"),
+    'M': ("#.#", "###", "###", "#.#", "#.#"),
+    ' ': ("...", "...", "...", "...", "..."),
+}
+FONT_SCALE = 2
+
+def parse_color(value: str) -> Color:
+    """Цвет из строки вида #4CAF50"""
+    value = value.lstrip('#')
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+def mix(color: Color, background: Color, alpha: float) -> Color:
+    """Полупрозрачный цвет поверх фона"""
+    return tuple(round(c * alpha + b * (1 - alpha)) for c, b in zip(color, background))
+
+def format_value(value: float) -> str:
+    """Короткая подпись значения оси (1.5k, 2M)"""
+    for limit, suffix in ((1_000_000, 'M'), (1_000, 'k')):
+        if abs(value) >= limit:
+            scaled = value / limit
+            return f"{scaled:.1f}".rstrip('0').rstrip('.') + suffix
+    return f"{value:.1f}".rstrip('0').rstrip('.')
+
+def nice_ceiling(value: float) -> float:
+    """Округление максимума шкалы вверх до 1, 2 или 5 x 10^n"""
+    if value <= 0:
+        return 1.0
+
+    exponent = 10 ** math.floor(math.log10(value))
+    for step in (1, 2, 5, 10):
+        if value <= step * exponent:
+            return step * exponent
+    return 10 * exponent
+
+class Canvas:
+    """RGB-растр в bytearray с простыми примитивами"""
+
+    def __init__(self, width: int, height: int, background: Color = BACKGROUND):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(bytes(background) * (width * height))
+
+    def hline(self, x0: int, x1: int, y: int, color: Color) -> None:
+        """Горизонтальный отрезок [x0, x1]"""
+        if not 0 <= y < self.height:
+            return
+        x0, x1 = max(min(x0, x1), 0), min(max(x0, x1), self.width - 1)
+        if x0 > x1:
+            return
+        start = (y * self.width + x0) * 3
+        self.pixels[start:start + (x1 - x0 + 1) * 3] = bytes(color) * (x1 - x0 + 1)
+
+    def vline(self, x: int, y0: int, y1: int, color: Color) -> None:
+        """Вертикальный отрезок [y0, y1] (срез с шагом по каждому каналу)"""
+        if not 0 <= x < self.width:
+            return
+        y0, y1 = max(min(y0, y1), 0), min(max(y0, y1), self.height - 1)
+        if y0 > y1:
+            return
+        stride = self.width * 3
+        start = (y0 * self.width + x) * 3
+        count = y1 - y0 + 1
+        for channel in range(3):
+            self.pixels[start + channel:start + channel + stride * count:stride] = bytes((color[channel],)) * count
+
+    def rect(self, x0: int, y0: int, x1: int, y1: int, color: Color) -> None:
+        """Закрашенный прямоугольник"""
+        for y in range(max(min(y0, y1), 0), min(max(y0, y1), self.height - 1) + 1):
+            self.hline(x0, x1, y, color)
+
+    def dot(self, x: int, y: int, radius: int, color: Color) -> None:
+        """Закрашенный круг"""
+        for dy in range(-radius, radius + 1):
+            dx = int(math.sqrt(radius * radius - dy * dy))
+            self.hline(x - dx, x + dx, y + dy, color)
+
+    def line(self, x0: int, y0: int, x1: int, y1: int, color: Color, width: int = 1) -> None:
+        """Отрезок заданной толщины"""
+        steps = max(abs(x1 - x0), abs(y1 - y0), 1)
+        half = width // 2
+        for i in range(steps + 1):
+            x = round(x0 + (x1 - x0) * i / steps)
+            y = round(y0 + (y1 - y0) * i / steps)
+            self.rect(x - half, y - half, x + width - half - 1, y + width - half - 1, color)
+
+    def text(self, x: int, y: int, text: str, color: Color = TEXT) -> None:
+        """Подпись пиксельным шрифтом (левый верхний угол в x, y)"""
+        for char in text:
+            glyph = _FONT.get(char, _FONT[' '])
+            for row, bits in enumerate(glyph):
+                for col, bit in enumerate(bits):
+                    if bit == '#':
+                        self.rect(
+                            x + col * FONT_SCALE, y + row * FONT_SCALE,
+                            x + (col + 1) * FONT_SCALE - 1, y + (row + 1) * FONT_SCALE - 1,
+                            color
+                        )
+            x += 4 * FONT_SCALE
+
+    def to_png(self) -> bytes:
+        """Кодирование в PNG (RGB, 8 бит)"""
+        row_size = self.width * 3
+        raw = b''.join(
+            b'\x00' + bytes(self.pixels[y * row_size:(y + 1) * row_size])
+            for y in range(self.height)
+        )
+
+        def chunk(kind: bytes, data: bytes) -> bytes:
+            return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+        header = struct.pack('>IIBBBBB', self.width, self.height, 8, 2, 0, 0, 0)
+        return (
+            b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(raw, 6))
+            + chunk(b'IEND', b'')
+        )
+
+def text_width(text: str) -> int:
+    """Ширина подписи в пикселях"""
+    return len(text) * 4 * FONT_SCALE - FONT_SCALE
+
+def _layout(values: Sequence[float], width: int, height: int, kind: str):
+    """Координаты точек и шкала: (точки, y основания, максимум шкалы, область графика)"""
+    left, top, right, bottom = MARGINS
+    plot = (left, top, width - right, height - bottom)
+    y_max = nice_ceiling(max(values) if values else 0)
+
+    count = len(values)
+    plot_width = plot[2] - plot[0]
+    if kind == 'bar':
+        step = plot_width / max(count, 1)
+        xs = [plot[0] + step * (i + 0.5) for i in range(count)]
+    else:
+        step = plot_width / max(count - 1, 1)
+        xs = [plot[0] + step * i for i in range(count)]
+
+    base_y = plot[3]
+    scale = (plot[3] - plot[1]) / y_max
+    points = [(round(x), round(base_y - max(v, 0) * scale)) for x, v in zip(xs, values)]
+    return points, base_y, y_max, plot
+
+def _label_indexes(count: int, max_labels: int = 6) -> List[int]:
+    """Индексы точек, под которыми выводятся подписи"""
+    if count <= max_labels:
+        return list(range(count))
+    step = (count - 1) / (max_labels - 1)
+    return sorted({round(i * step) for i in range(max_labels)})
+
+def render_png(
+    kind: str,
+    values: Sequence[float],
+    labels: Optional[Sequence[str]] = None,
+    width: int = 800,
+    height: int = 400,
+    color: str = '#4CAF50',
+    grid_lines: int = 4
+) -> bytes:
+    """
+    График в PNG
+
+    Args:
+        kind: 'line', 'area' или 'bar'
+        values: Значения по дням
+        labels: Подписи точек по оси X (например, '10-18')
+        width, height: Размер изображения
+        color: Цвет графика
+        grid_lines: Количество линий сетки
+    """
+    if kind not in CHART_KINDS:
+        raise ValueError(f"Неизвестный тип графика: {kind}")
+
+    rgb = parse_color(color)
+    canvas = Canvas(width, height)
+    points, base_y, y_max, plot = _layout(values, width, height, kind)
+
+    # Сетка и подписи значений
+    for i in range(grid_lines + 1):
+        y = round(plot[3] - (plot[3] - plot[1]) * i / grid_lines)
+        canvas.hline(plot[0], plot[2], y, GRID if i else AXIS)
+        label = format_value(y_max * i / grid_lines)
+        canvas.text(plot[0] - 8 - text_width(label), y - 5, label)
+
+    if kind == 'bar':
+        bar_half = max(int((plot[2] - plot[0]) / max(len(points), 1) * 0.35), 1)
+        for x, y in points:
+            if y < base_y:
+                canvas.rect(x - bar_half, y, x + bar_half, base_y - 1, rgb)
+    else:
+        if kind == 'area':
+            fill = mix(rgb, BACKGROUND, 0.3)
+            for (x0, y0), (x1, y1) in zip(points, points[1:]):
+                for x in range(x0, x1 + 1):
+                    y = round(y0 + (y1 - y0) * (x - x0) / max(x1 - x0, 1))
+                    canvas.vline(x, y, base_y - 1, fill)
+
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            canvas.line(x0, y0, x1, y1, rgb, width=3)
+        for x, y in points:
+            canvas.dot(x, y, 4, rgb)
+
+    # Подписи оси X
+    if labels:
+        for i in _label_indexes(len(points)):
+            label = labels[i]
+            x = min(max(points[i][0] - text_width(label) // 2, 0), width - text_width(label))
+            canvas.text(x, plot[3] + 8, label)
+
+    return canvas.to_png()
+
+def render_svg(
+    kind: str,
+    values: Sequence[float],
+    labels: Optional[Sequence[str]] = None,
+    width: int = 800,
+    height: int = 400,
+    color: str = '#4CAF50',
+    grid_lines: int = 4
+) -> str:
+    """График в SVG (параметры как у render_png)"""
+    if kind not in CHART_KINDS:
+        raise ValueError(f"Неизвестный тип графика: {kind}")
+
+    points, base_y, y_max, plot = _layout(values, width, height, kind)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="sans-serif" font-size="11">',
+        f'<rect width="{width}" height="{height}" fill="#fff"/>'
+    ]
+
+    for i in range(grid_lines + 1):
+        y = round(plot[3] - (plot[3] - plot[1]) * i / grid_lines)
+        stroke = '#e1e1e1' if i else '#787878'
+        parts.append(f'<line x1="{plot[0]}" y1="{y}" x2="{plot[2]}" y2="{y}" stroke="{stroke}"/>')
+        parts.append(
+            f'<text x="{plot[0] - 8}" y="{y + 4}" text-anchor="end" fill="#3c3c3c">'
+            f'{format_value(y_max * i / grid_lines)}</text>'
+        )
+
+    if kind == 'bar':
+        bar_width = max(int((plot[2] - plot[0]) / max(len(points), 1) * 0.7), 1)
+        for x, y in points:
+            parts.append(
+                f'<rect x="{x - bar_width // 2}" y="{y}" width="{bar_width}" '
+                f'height="{base_y - y}" fill="{color}"/>'
+            )
+    elif points:
+        path = ' '.join(f"{x},{y}" for x, y in points)
+        if kind == 'area':
+            parts.append(
+                f'<polygon points="{points[0][0]},{base_y} {path} {points[-1][0]},{base_y}" '
+                f'fill="{color}" fill-opacity="0.3"/>'
+            )
+        parts.append(f'<polyline points="{path}" fill="none" stroke="{color}" stroke-width="3"/>')
+        parts.extend(f'<circle cx="{x}" cy="{y}" r="4" fill="{color}"/>' for x, y in points)
+
+    if labels:
+        for i in _label_indexes(len(points)):
+            parts.append(
+                f'<text x="{points[i][0]}" y="{plot[3] + 18}" text-anchor="middle" '
+                f'fill="#3c3c3c">{escape(labels[i])}</text>'
+            )
+
+    parts.append('</svg>')
+    return ''.join(parts)
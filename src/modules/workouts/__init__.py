@@ -0,0 +1,7 @@
+"""
+Модуль записи тренировок
+"""
+
+from .handlers import router
+
+__all__ = ['router']
@@ -0,0 +1,206 @@
+"""
+Каталог упражнений GromFitBot
+Свободный ввод ("Жим лёжа", "жим  лежа") приводится к каноническому упражнению
+с целочисленным ID: нормализация, точное совпадение, затем нечеткий поиск.
+Кандидаты подбираются по общим триграммам, но совпадением считается только
+опечатка: то же число слов и малое расстояние редактирования. Иначе ("Жим
+гантелей лежа" при "Жим гантелей" в каталоге) создается новое упражнение,
+чтобы рекорды и объемы разных упражнений не смешивались. Результаты разбора
+вводов кэшируются (LRU)
+"""
+
+import logging
+import re
+from collections import OrderedDict, defaultdict
+from typing import Optional, Dict, Set
+
+from core.database import Database
+
+logger = logging.getLogger(__name__)
+
+# Начальный каталог - чтобы опечатки в частых упражнениях сводились к ним с первых тренировок
+DEFAULT_EXERCISES = (
+    'Жим лежа', 'Жим стоя', 'Жим гантелей', 'Французский жим',
+    'Приседания', 'Становая тяга', 'Выпады', 'Тяга штанги в наклоне',
+    'Подтягивания', 'Отжимания', 'Брусья', 'Подъем штанги на бицепс',
+    'Бег', 'Планка', 'Скакалка', 'Велосипед'
+)
+
+# Допустимые опечатки: расстояние Левенштейна по длине нормализованного названия
+# (короткие названия - только точное совпадение)
+MIN_FUZZY_LENGTH = 4
+SHORT_NAME_LENGTH = 10
+MAX_TYPOS_SHORT = 1
+MAX_TYPOS_LONG = 2
+
+_PUNCTUATION = re.compile(r'[^\w\s]+')
+
+def normalize_exercise_name(name: str) -> str:
+    """Регистр, ё→е, пунктуация и лишние пробелы"""
+    text = name.casefold().replace('ё', 'е')
+    text = _PUNCTUATION.sub(' ', text)
+    return ' '.join(text.split())
+
+def trigrams(text: str) -> Set[str]:
+    """Триграммы строки с границами слова"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def max_typos(text: str) -> int:
+    """Сколько опечаток допускается в названии такой длины"""
+    if len(text) < MIN_FUZZY_LENGTH:
+        return 0
+    return MAX_TYPOS_SHORT if len(text) <= SHORT_NAME_LENGTH else MAX_TYPOS_LONG
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Расстояние Левенштейна с отсечением: при превышении limit возвращает limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+
+    return min(previous[-1], limit + 1)
+
+class ExerciseCatalog:
+    """Канонические упражнения с индексом триграмм и LRU-кэшем разобранных вводов"""
+
+    def __init__(self, db: Optional[Database] = None, cache_size: int = 4096):
+        self.db = db
+        self.cache_size = cache_size
+
+        self._loaded = False
+        self._names: Dict[int, str] = {}
+        self._normalized: Dict[int, str] = {}
+        self._by_normalized: Dict[str, int] = {}
+        self._trigrams: Dict[int, Set[str]] = {}
+        self._index: Dict[str, Set[int]] = defaultdict(set)
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+
+    def bind(self, db: Database) -> None:
+        """Подключение к базе данных бота"""
+        self.db = db
+        self._loaded = False
+
+    def _get_db(self) -> Database:
+        """База данных, подключенная через bind()"""
+        if self.db is None:
+            raise RuntimeError("Каталог упражнений не подключен к базе данных")
+        return self.db
+
+    def _add(self, exercise_id: int, name: str, normalized: str) -> None:
+        """Добавление упражнения в индексы"""
+        self._names[exercise_id] = name
+        self._normalized[exercise_id] = normalized
+        self._by_normalized[normalized] = exercise_id
+
+        grams = trigrams(normalized)
+        self._trigrams[exercise_id] = grams
+        for gram in grams:
+            self._index[gram].add(exercise_id)
+
+    def _ensure_loaded(self) -> None:
+        """Загрузка каталога из БД при первом обращении"""
+        if self._loaded:
+            return
+
+        db = self._get_db()
+        rows = db.get_exercises()
+        if not rows:
+            for name in DEFAULT_EXERCISES:
+                db.add_exercise(name, normalize_exercise_name(name))
+            rows = db.get_exercises()
+
+        for row in rows:
+            self._add(row['id'], row['name'], row['normalized'])
+
+        self._loaded = True
+        logger.info(f"Каталог упражнений загружен: {len(rows)}")
+
+    def _fuzzy_match(self, normalized: str) -> Optional[int]:
+        """
+        Упражнение, от которого ввод отличается только опечатками: то же число
+        слов и расстояние редактирования в пределах max_typos (из кандидатов
+        с общими триграммами - ближайшее, при равенстве - с большим сходством)
+        """
+        limit = max_typos(normalized)
+        if not limit:
+            return None
+
+        grams = trigrams(normalized)
+        shared: Dict[int, int] = defaultdict(int)
+
+        for gram in grams:
+            for exercise_id in self._index.get(gram, ()):
+                shared[exercise_id] += 1
+
+        words = len(normalized.split())
+        best_id, best_key = None, None
+        for exercise_id, common in shared.items():
+            candidate = self._normalized[exercise_id]
+            if len(candidate.split()) != words:
+                continue
+
+            distance = edit_distance(normalized, candidate, min(limit, max_typos(candidate)))
+            if distance > min(limit, max_typos(candidate)):
+                continue
+
+            key = (distance, -2 * common / (len(grams) + len(self._trigrams[exercise_id])))
+            if best_key is None or key < best_key:
+                best_id, best_key = exercise_id, key
+
+        return best_id
+
+    def resolve(self, name: str) -> Optional[int]:
+        """
+        ID упражнения по свободному вводу; неизвестное упражнение добавляется в каталог
+
+        Returns:
+            ID упражнения или None при пустом вводе или ошибке БД
+        """
+        cached = self._cache.get(name)
+        if cached is not None:
+            self._cache.move_to_end(name)
+            return cached
+
+        normalized = normalize_exercise_name(name)
+        if not normalized:
+            return None
+
+        self._ensure_loaded()
+
+        exercise_id = self._by_normalized.get(normalized) or self._fuzzy_match(normalized)
+        if exercise_id is None:
+            display_name = ' '.join(name.split())
+            display_name = display_name[:1].upper() + display_name[1:]
+
+            exercise_id = self._get_db().add_exercise(display_name, normalized)
+            if exercise_id is None:
+                return None
+
+            self._add(exercise_id, display_name, normalized)
+            logger.info(f"Новое упражнение в каталоге: {display_name} ({exercise_id})")
+
+        self._cache[name] = exercise_id
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+        return exercise_id
+
+    def name(self, exercise_id: int) -> str:
+        """Каноническое название упражнения"""
+        self._ensure_loaded()
+        return self._names.get(exercise_id, f"Упражнение #{exercise_id}")
+
+# Общий каталог упражнений
+exercise_catalog = ExerciseCatalog()
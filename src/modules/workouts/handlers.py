@@ -0,0 +1,188 @@
+"""
+Обработчики записи тренировок GromFitBot
+Пользователь присылает всю тренировку одним сообщением, она разбирается
+и сохраняется одной транзакцией
+"""
+
+import html
+import logging
+from typing import Dict, Any, List, Union
+
+from aiogram.filters import BaseFilter, Command, StateFilter
+from aiogram.types import Message
+
+from core.database import Database
+from core.dispatch_router import DispatchRouter
+from core.events import events, WORKOUT_SAVED, PERSONAL_RECORD
+from core.message_manager import MessageManager
+from .catalog import exercise_catalog
+from .parser import parse_workout_log, WorkoutLog
+
+router = DispatchRouter()
+db = Database()
+message_manager = MessageManager(None)
+logger = logging.getLogger(__name__)
+
+exercise_catalog.bind(db)
+
+WORKOUT_HELP_TEXT = (
+    "📝 <b>Запись результата тренировки</b>\n\n"
+    "Отправьте всю тренировку одним сообщением, по упражнению на строку:\n\n"
+    "<code>1. Жим лежа 3x10 50кг</code>\n"
+    "<code>приседания 100 4 8</code>\n"
+    "<code>подтягивания 3x15</code>\n"
+    "<code>бег 30 мин</code>\n\n"
+    "<i>Форматы: «упражнение вес подходы повторения», «упражнение подходы x повторения вес» "
+    "и «упражнение время» (ч, мин, сек)</i>"
+)
+
+def init_message_manager(bot):
+    """Инициализация менеджера сообщений"""
+    global message_manager
+    message_manager = MessageManager(bot)
+
+class WorkoutLogFilter(BaseFilter):
+    """Фильтр сообщений-тренировок: передает обработчику разобранный журнал"""
+
+    async def __call__(self, message: Message) -> Union[bool, Dict[str, Any]]:
+        text = message.text
+        if not text or text.startswith('/') or not any(ch.isdigit() for ch in text):
+            return False
+
+        workout_log = parse_workout_log(text)
+        if not workout_log.entries:
+            return False
+
+        return {'workout_log': workout_log}
+
+# ==================== ОБРАБОТЧИКИ ТРЕНИРОВОК ====================
+
+async def handle_record_result(message: Message):
+    """Подсказка по формату записи тренировки"""
+    user_id = message.from_user.id
+
+    if not db.get_user(user_id):
+        await message_manager.replace_message(
+            message,
+            "❌ <b>Вы не зарегистрированы</b>\n\n"
+            "Используйте команду /start для регистрации."
+        )
+        return
+
+    await message_manager.replace_message(message, WORKOUT_HELP_TEXT)
+    logger.info(f"Пользователь {user_id} запросил запись результата")
+
+@router.message(Command("workout"))
+async def handle_workout_command(message: Message):
+    """Команда /workout: тренировка в том же сообщении или подсказка"""
+    parts = message.text.split(maxsplit=1)
+
+    if len(parts) < 2:
+        await handle_record_result(message)
+        return
+
+    await save_workout_log(message, parse_workout_log(parts[1]))
+
+@router.message(StateFilter(None), WorkoutLogFilter())
+async def handle_workout_log(message: Message, workout_log: WorkoutLog):
+    """Сообщение с тренировкой"""
+    await save_workout_log(message, workout_log)
+
+async def save_workout_log(message: Message, workout_log: WorkoutLog):
+    """Сохранение разобранной тренировки и отчет пользователю"""
+    user_id = message.from_user.id
+
+    if not workout_log.entries:
+        await message.answer(WORKOUT_HELP_TEXT, parse_mode="HTML")
+        return
+
+    if not db.get_user(user_id):
+        await message.answer("❌ Сначала зарегистрируйтесь через /start")
+        return
+
+    # Названия упражнений - в ID каталога
+    exercise_ids = [exercise_catalog.resolve(entry.name) for entry in workout_log.entries]
+    if None in exercise_ids:
+        await message.answer("❌ Не удалось сохранить тренировку. Попробуйте позже.")
+        return
+
+    result = db.add_workout_log(
+        user_id,
+        [(exercise_id,) + tuple(entry[1:]) for exercise_id, entry in zip(exercise_ids, workout_log.entries)]
+    )
+    if result is None:
+        await message.answer("❌ Не удалось сохранить тренировку. Попробуйте позже.")
+        return
+
+    events.publish(
+        WORKOUT_SAVED,
+        user_id=user_id,
+        training_id=result['training_id'],
+        workout_log=workout_log,
+        standing=result['standing']
+    )
+    for record in result['records']:
+        events.publish(PERSONAL_RECORD, user_id=user_id, record=record)
+
+    await message.answer(render_workout_summary(workout_log, exercise_ids, result['records']), parse_mode="HTML")
+
+def render_workout_summary(workout_log: WorkoutLog, exercise_ids: List[int],
+                           records: List[Dict[str, Any]]) -> str:
+    """Текст отчета о сохраненной тренировке"""
+    lines = [f"✅ <b>Тренировка сохранена!</b> Упражнений: {len(workout_log.entries)}\n"]
+
+    for exercise_id, entry in zip(exercise_ids, workout_log.entries):
+        name = html.escape(exercise_catalog.name(exercise_id))
+        if entry.duration_seconds:
+            minutes, seconds = divmod(entry.duration_seconds, 60)
+            duration = f"{minutes} мин" + (f" {seconds} сек" if seconds else "")
+            lines.append(f"⏱️ {name}: {duration}")
+        elif entry.weight:
+            lines.append(f"🏋️ {name}: {entry.sets}x{entry.reps} по {entry.weight:g} кг")
+        else:
+            lines.append(f"🤸 {name}: {entry.sets}x{entry.reps}")
+
+    lines.append("")
+    if workout_log.total_volume:
+        lines.append(f"📦 <b>Общий объем:</b> {workout_log.total_volume:,.0f} кг")
+    if workout_log.total_duration_seconds:
+        lines.append(f"⏱️ <b>Общее время:</b> {workout_log.total_duration_seconds // 60} мин")
+
+    # Первая запись упражнения - еще не рекорд
+    broken_records = [record for record in records if not record['is_first']]
+    if broken_records:
+        lines.append("\n🏆 <b>Новые личные рекорды:</b>")
+        for record in broken_records:
+            name = html.escape(exercise_catalog.name(record['exercise_id']))
+            lines.append(f"• {name}: {format_record(record)}")
+
+    if workout_log.invalid_lines:
+        numbers = ', '.join(str(number) for number in workout_log.invalid_lines)
+        lines.append(f"⚠️ Не распознаны строки: {numbers}")
+
+    lines.append("\n💪 Так держать!")
+    return "\n".join(lines)
+
+def format_record(record: Dict[str, Any]) -> str:
+    """Побитые показатели рекорда"""
+    labels = {
+        'max_weight': ('вес', record['max_weight']),
+        'best_set_volume': ('подход', record['best_set_volume']),
+        'best_e1rm': ('1ПМ', record['best_e1rm'])
+    }
+    return ", ".join(f"{labels[field][0]} {labels[field][1]:g} кг" for field in record['broken'])
+
+# ==================== ПОДПИСКИ НА СОБЫТИЯ ====================
+
+@events.on(PERSONAL_RECORD)
+def notify_personal_record(user_id: int, record: Dict[str, Any]):
+    """Уведомление о побитом личном рекорде"""
+    if record['is_first']:
+        return
+
+    db.add_notification(user_id, {
+        'notification_type': 'personal_record',
+        'title': '🏆 Новый личный рекорд',
+        'message': f"{exercise_catalog.name(record['exercise_id'])}: {format_record(record)}",
+        'metadata': {'exercise_id': record['exercise_id'], 'broken': record['broken']}
+    })
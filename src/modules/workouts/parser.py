@@ -0,0 +1,114 @@
+"""
+Разбор журнала тренировки GromFitBot
+Одно сообщение - вся тренировка, по упражнению на строку в любом из форматов:
+    жим лежа 80 3 10          (упражнение вес подходы повторения)
+    1. Жим лежа 3x10 50кг     (подходы x повторения, вес необязателен)
+    бег 30 мин / планка 90 сек (упражнение на время)
+"""
+
+import re
+from typing import List, NamedTuple, Optional
+
+# Ограничения одной тренировки
+MAX_LOG_LINES = 50
+MAX_SETS = 100
+MAX_REPS = 1000
+MAX_WEIGHT = 1000
+MAX_DURATION_SECONDS = 24 * 3600
+
+_NUMBER = r'\d+(?:[.,]\d+)?'
+_KG = r'(?:кг|kg)\.?'
+
+# Одно скомпилированное выражение на все форматы строки
+LINE_PATTERN = re.compile(
+    rf"""
+    ^(?:\d+\s*[.)]\s*)?                                     # номер строки: "1." или "1)"
+    (?P<name>[^\W\d_][^\d]*?)\s*[:—–-]?\s+                  # название упражнения
+    (?:
+        (?:(?P<weight_before>{_NUMBER})\s*{_KG}\s+)?        # "50кг 3x10"
+        (?P<sets>\d+)\s*[xх×*]\s*(?P<reps>\d+)              # "3x10"
+        (?:\s*(?:по\s+)?(?P<weight_after>{_NUMBER})\s*(?:{_KG})?)?   # "50кг", "по 50"
+      |
+        (?P<duration>{_NUMBER})\s*
+        (?P<unit>часа|часов|час|ч|h|минут[аы]?|мин|м|min|m|секунд[аы]?|сек|с|sec|s)\.?
+      |
+        (?P<weight>{_NUMBER})\s*(?:{_KG})?\s+(?P<plain_sets>\d+)\s+(?P<plain_reps>\d+)
+    )
+    \s*$
+    """,
+    re.IGNORECASE | re.VERBOSE
+)
+
+_UNIT_SECONDS = {'ч': 3600, 'h': 3600, 'м': 60, 'm': 60, 'с': 1, 's': 1}
+
+class WorkoutEntry(NamedTuple):
+    """Одно упражнение тренировки"""
+    name: str
+    weight: float
+    sets: int
+    reps: int
+    duration_seconds: int
+    volume: float
+
+class WorkoutLog(NamedTuple):
+    """Результат разбора сообщения"""
+    entries: List[WorkoutEntry]
+    invalid_lines: List[int]
+    total_volume: float
+    total_duration_seconds: int
+
+def _to_float(value: Optional[str]) -> float:
+    return float(value.replace(',', '.')) if value else 0.0
+
+def parse_line(line: str) -> Optional[WorkoutEntry]:
+    """Разбор одной строки; None, если строка не распознана или вне ограничений"""
+    match = LINE_PATTERN.match(line.strip())
+    if not match:
+        return None
+
+    name = ' '.join(match.group('name').split())
+    groups = match.groupdict()
+
+    if groups['duration']:
+        unit = groups['unit'].lower()
+        seconds = int(_to_float(groups['duration']) * _UNIT_SECONDS[unit[0]])
+        if not 0 < seconds <= MAX_DURATION_SECONDS:
+            return None
+        return WorkoutEntry(name, 0.0, 0, 0, seconds, 0.0)
+
+    if groups['sets']:
+        sets, reps = int(groups['sets']), int(groups['reps'])
+        weight = _to_float(groups['weight_before'] or groups['weight_after'])
+    else:
+        sets, reps = int(groups['plain_sets']), int(groups['plain_reps'])
+        weight = _to_float(groups['weight'])
+
+    if not (0 < sets <= MAX_SETS and 0 < reps <= MAX_REPS and weight <= MAX_WEIGHT):
+        return None
+
+    return WorkoutEntry(name, weight, sets, reps, 0, weight * sets * reps)
+
+def parse_workout_log(text: str) -> WorkoutLog:
+    """
+    Разбор всей тренировки
+
+    Returns:
+        Упражнения с посчитанным объемом, номера нераспознанных строк и итоги
+    """
+    entries: List[WorkoutEntry] = []
+    invalid_lines: List[int] = []
+
+    lines = [line for line in text.splitlines() if line.strip()][:MAX_LOG_LINES]
+    for number, line in enumerate(lines, 1):
+        entry = parse_line(line)
+        if entry is None:
+            invalid_lines.append(number)
+        else:
+            entries.append(entry)
+
+    return WorkoutLog(
+        entries=entries,
+        invalid_lines=invalid_lines,
+        total_volume=sum(entry.volume for entry in entries),
+        total_duration_seconds=sum(entry.duration_seconds for entry in entries)
+    )
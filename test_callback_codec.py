@@ -0,0 +1,109 @@
+"""
+Тесты кодека callback_data: разбор закодированных данных и лимит Telegram в 64 байта
+"""
+
+import pytest
+
+from core.callback_codec import CallbackCodec, MAX_CALLBACK_BYTES, callback_codec
+from modules.keyboards import callbacks
+
+@pytest.fixture
+def codec():
+    return CallbackCodec()
+
+@pytest.mark.parametrize("values", [(0, 0), (1, 127), (128, 300), (2 ** 31, 7), (10 ** 12, 2 ** 40)])
+def test_round_trip(codec, values):
+    action = codec.register(0x10, 'page', ('category', 'page'))
+
+    data = action.pack(*values)
+    decoded_action, payload = codec.decode(data)
+
+    assert decoded_action is action
+    assert tuple(payload) == values
+    assert payload.page == values[1]
+
+def test_keyword_arguments_and_no_fields(codec):
+    page = codec.register(0x10, 'page', ('category', 'page'))
+    ping = codec.register(0x11, 'ping')
+
+    assert codec.decode(page.pack(page=3, category=1))[1] == (1, 3)
+    assert codec.decode(ping.pack()) == (ping, ())
+
+def test_plain_and_corrupted_data_are_not_decoded(codec):
+    action = codec.register(0x10, 'item', ('item',))
+    data = action.pack(42)
+
+    assert codec.decode("shop_page_current") is None
+    assert codec.decode("") is None
+    assert codec.decode(None) is None
+    assert codec.decode(data) == (action, (42,))
+
+    # Неизвестное действие
+    assert codec.decode(CallbackCodec().register(0x20, 'other', ('x',)).pack(1)) is None
+
+    # Оборванный varint
+    wide = codec.register(0x11, 'wide', ('a', 'b'))
+    assert codec.decode(wide.pack(1, 200)[:-1]) is None
+
+    # Число полей не совпадает с регистрацией действия
+    assert codec.decode(CallbackCodec().register(0x10, 'item', ('item', 'quantity')).pack(42, 1)) is None
+
+def test_registration_errors(codec):
+    codec.register(0x10, 'item', ('item',))
+
+    with pytest.raises(ValueError):
+        codec.register(0x10, 'duplicate')
+    with pytest.raises(ValueError):
+        codec.register(0x100, 'out_of_range')
+    with pytest.raises(ValueError):
+        codec.register(0x11, 'negative', ('value',)).pack(-1)
+
+def test_pack_rejects_data_over_limit(codec):
+    fields = tuple(f"f{i}" for i in range(8))
+    action = codec.register(0x10, 'wide', fields)
+
+    # 1 + 8 * 5 байт -> 56 символов base64, в лимите
+    assert len(action.pack(*[2 ** 32] * 8)) <= MAX_CALLBACK_BYTES
+
+    with pytest.raises(ValueError):
+        action.pack(*[2 ** 63] * 8)
+
+def test_protected_actions(codec):
+    buy = codec.register(0x10, 'buy', ('item',), protected=True)
+    view = codec.register(0x11, 'view', ('item',))
+
+    assert codec.is_protected(buy.pack(1))
+    assert not codec.is_protected(view.pack(1))
+    assert not codec.is_protected("bonus_claim_daily")
+
+def test_registered_actions_fit_with_large_ids():
+    """Все действия бота укладываются в лимит с 64-битными ID пользователей"""
+    large = 2 ** 63 - 1
+    actions = [value for value in vars(callbacks).values() if hasattr(value, 'payload_type')]
+
+    assert actions
+    for action in actions:
+        data = action.pack(*[large] * len(action.fields))
+        assert len(data.encode('utf-8')) <= MAX_CALLBACK_BYTES
+        assert callback_codec.decode(data) == (action, tuple([large] * len(action.fields)))
+
+def test_index_helpers_round_trip():
+    action, payload = callback_codec.decode(callbacks.admin_user_data('edit_balance', 9876543210))
+    assert action is callbacks.ADMIN_USER
+    assert callbacks.admin_user_command(payload.command) == 'edit_balance'
+    assert payload.user == 9876543210
+    assert callbacks.admin_user_command(len(callbacks.ADMIN_USER_COMMANDS)) is None
+
+    action, payload = callback_codec.decode(callbacks.shop_category_data('gifts'))
+    assert callbacks.shop_category_id(payload.category) == 'gifts'
+    assert callbacks.shop_category_id(255) == 'all'
+
+def test_nickname_button_does_not_embed_name():
+    from modules.auth.keyboards import AuthKeyboards
+
+    long_name = "Александра-Виктория Константиновна"
+    keyboard = AuthKeyboards.get_nickname_keyboard(long_name, "Верховцева-Добрынина")
+    data = keyboard.inline_keyboard[0][0].callback_data
+
+    assert len(data.encode('utf-8')) <= MAX_CALLBACK_BYTES
+    assert callback_codec.decode(data) == (callbacks.NICKNAME_FROM_TELEGRAM, ())
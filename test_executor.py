@@ -0,0 +1,101 @@
+"""
+Тесты исполнителя обновлений: порядок внутри пользователя, параллельность
+между пользователями и обратное давление по лимиту max_in_flight
+"""
+
+import asyncio
+
+from core.executor import UpdateExecutor
+
+def test_updates_of_one_user_keep_order():
+    async def main():
+        executor = UpdateExecutor(lanes=4, max_in_flight=100)
+        handled = []
+
+        def job(user_id, n, delay):
+            async def run():
+                await asyncio.sleep(delay)
+                handled.append((user_id, n))
+            return run
+
+        # Ранние задачи медленнее поздних - порядок держит только дорожка
+        for n in range(5):
+            await executor.submit(1, job(1, n, 0.01 * (5 - n)))
+            await executor.submit(2, job(2, n, 0.01 * (5 - n)))
+        await executor.stop()
+        return handled
+
+    handled = asyncio.run(main())
+
+    assert [n for user_id, n in handled if user_id == 1] == [0, 1, 2, 3, 4]
+    assert [n for user_id, n in handled if user_id == 2] == [0, 1, 2, 3, 4]
+
+def test_different_lanes_run_in_parallel():
+    async def main():
+        executor = UpdateExecutor(lanes=2, max_in_flight=10)
+        second_started = asyncio.Event()
+
+        async def first():
+            # Завершится, только если задача другой дорожки идет одновременно
+            await asyncio.wait_for(second_started.wait(), 1)
+
+        async def second():
+            second_started.set()
+
+        await executor.submit(0, first)
+        await executor.submit(1, second)
+        await executor.stop()
+        return executor.stats
+
+    stats = asyncio.run(main())
+
+    assert (stats['processed'], stats['failed']) == (2, 0)
+
+def test_max_in_flight_backpressure():
+    async def main():
+        executor = UpdateExecutor(lanes=2, max_in_flight=2)
+        release = asyncio.Event()
+
+        async def blocked():
+            await release.wait()
+
+        await executor.submit(1, blocked)
+        await executor.submit(2, blocked)
+
+        # Лимит достигнут: без ожидания - отказ, с ожиданием - ждет свободного слота
+        rejected = not executor.try_submit(3, blocked)
+        waiting = asyncio.create_task(executor.submit(3, blocked))
+        await asyncio.sleep(0.05)
+        still_waiting = not waiting.done()
+
+        release.set()
+        await asyncio.wait_for(waiting, 1)
+        await executor.stop()
+        return rejected, still_waiting, executor.stats, executor.in_flight
+
+    rejected, still_waiting, stats, in_flight = asyncio.run(main())
+
+    assert rejected and still_waiting
+    assert (stats['submitted'], stats['processed'], stats['rejected']) == (3, 3, 1)
+    assert in_flight == 0
+
+def test_failed_job_does_not_stop_lane():
+    async def main():
+        executor = UpdateExecutor(lanes=1)
+        handled = []
+
+        async def broken():
+            raise RuntimeError("ошибка обработчика")
+
+        async def ok():
+            handled.append('ok')
+
+        await executor.submit(1, broken)
+        await executor.submit(1, ok)
+        await executor.stop()
+        return handled, executor.stats
+
+    handled, stats = asyncio.run(main())
+
+    assert handled == ['ok']
+    assert (stats['processed'], stats['failed']) == (1, 1)
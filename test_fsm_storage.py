@@ -0,0 +1,71 @@
+"""
+Тесты FSM-хранилища на SQLite: запись в БД для всех процессов, TTL состояний и очистка
+"""
+
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from core.fsm_storage import SQLiteStorage
+
+def make_key(user_id):
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+def test_write_through_is_visible_to_other_storage(db):
+    writer = SQLiteStorage(db)
+    reader = SQLiteStorage(db, cache_ttl=0)
+    key = make_key(1)
+
+    async def main():
+        await writer.set_state(key, "Registration:nickname")
+        await writer.set_data(key, {'region': 'Москва'})
+        first = (await reader.get_state(key), await reader.get_data(key))
+
+        await writer.set_state(key, None)
+        second = (await reader.get_state(key), await reader.get_data(key))
+        return first, second
+
+    first, second = asyncio.run(main())
+
+    assert first == ("Registration:nickname", {'region': 'Москва'})
+    # Сброс состояния не стирает данные
+    assert second == (None, {'region': 'Москва'})
+
+def test_get_data_returns_copy(db):
+    storage = SQLiteStorage(db)
+    key = make_key(1)
+
+    async def main():
+        await storage.set_data(key, {'step': 1})
+        data = await storage.get_data(key)
+        data['step'] = 2
+        return await storage.get_data(key)
+
+    assert asyncio.run(main()) == {'step': 1}
+
+def test_stale_state_expires(db):
+    storage = SQLiteStorage(db, state_ttl=0.05, cache_ttl=0)
+    key = make_key(1)
+
+    async def main():
+        await storage.set_state(key, "Registration:region")
+        fresh = await storage.get_state(key)
+        await asyncio.sleep(0.1)
+        return fresh, await storage.get_state(key), await storage.get_data(key)
+
+    assert asyncio.run(main()) == ("Registration:region", None, {})
+
+def test_sweep_removes_only_expired_states(db):
+    storage = SQLiteStorage(db, state_ttl=0.05, cache_ttl=0)
+    old, fresh = make_key(1), make_key(2)
+
+    async def main():
+        await storage.set_state(old, "Registration:nickname")
+        await asyncio.sleep(0.1)
+        await storage.set_state(fresh, "Registration:nickname")
+        return storage.sweep()
+
+    assert asyncio.run(main()) == 1
+    assert db.get_fsm_record(SQLiteStorage._make_key(old)) is None
+    assert db.get_fsm_record(SQLiteStorage._make_key(fresh))['state'] == "Registration:nickname"
+    assert storage.sweep() == 0
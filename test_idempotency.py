@@ -0,0 +1,116 @@
+"""
+Тесты идемпотентности callback-запросов: повтор в пределах TTL и объединение
+одновременных дублей
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from core.idempotency import CallbackIdempotencyMiddleware
+
+def make_callback(data="bonus_claim_daily", user_id=1, message_id=10):
+    callback = SimpleNamespace(
+        id=f"{user_id}:{data}",
+        data=data,
+        from_user=SimpleNamespace(id=user_id),
+        message=SimpleNamespace(message_id=message_id),
+        answers=0
+    )
+
+    async def answer():
+        callback.answers += 1
+
+    callback.answer = answer
+    return callback
+
+class CountingHandler:
+    """Обработчик, считающий вызовы (с необязательным ожиданием)"""
+
+    def __init__(self, release=None):
+        self.calls = 0
+        self.release = release
+
+    async def __call__(self, event, data):
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        return f"result-{self.calls}"
+
+def test_replay_within_ttl():
+    middleware = CallbackIdempotencyMiddleware(ttl=0.1)
+    handler = CountingHandler()
+
+    async def main():
+        first = await middleware(handler, make_callback(), {})
+        duplicate = make_callback()
+        replayed = await middleware(handler, duplicate, {})
+        await asyncio.sleep(0.15)
+        expired = await middleware(handler, make_callback(), {})
+        return first, replayed, duplicate.answers, expired
+
+    first, replayed, answers, expired = asyncio.run(main())
+
+    assert first == replayed == "result-1"
+    # Дубль получает пустой ответ, чтобы у клиента не висели "часики"
+    assert answers == 1
+    # После TTL обработчик выполняется снова
+    assert expired == "result-2"
+    assert (middleware.stats['executed'], middleware.stats['replayed']) == (2, 1)
+
+def test_in_flight_duplicate_is_coalesced():
+    release = asyncio.Event()
+    middleware = CallbackIdempotencyMiddleware(ttl=5)
+    handler = CountingHandler(release)
+
+    async def main():
+        duplicate = make_callback()
+        first = asyncio.create_task(middleware(handler, make_callback(), {}))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(middleware(handler, duplicate, {}))
+        await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.gather(first, second), duplicate.answers
+
+    results, answers = asyncio.run(main())
+
+    assert results == ["result-1", "result-1"]
+    assert handler.calls == 1
+    assert answers == 1
+    assert middleware.stats['coalesced'] == 1
+
+def test_keys_and_unprotected_callbacks():
+    middleware = CallbackIdempotencyMiddleware(ttl=5)
+    handler = CountingHandler()
+
+    async def main():
+        await middleware(handler, make_callback(), {})
+        # Другой пользователь и другое сообщение - разные ключи
+        await middleware(handler, make_callback(user_id=2), {})
+        await middleware(handler, make_callback(message_id=11), {})
+        # Незащищенные callback-и выполняются всегда
+        await middleware(handler, make_callback("profile_refresh"), {})
+        await middleware(handler, make_callback("profile_refresh"), {})
+
+    asyncio.run(main())
+
+    assert handler.calls == 5
+
+def test_failure_is_not_cached():
+    middleware = CallbackIdempotencyMiddleware(ttl=5)
+    calls = []
+
+    async def failing_once(event, data):
+        calls.append(event)
+        if len(calls) == 1:
+            raise RuntimeError("временная ошибка")
+        return "ok"
+
+    async def main():
+        try:
+            await middleware(failing_once, make_callback(), {})
+        except RuntimeError:
+            pass
+        return await middleware(failing_once, make_callback(), {})
+
+    assert asyncio.run(main()) == "ok"
+    assert len(calls) == 2
@@ -0,0 +1,60 @@
+"""
+Тесты региональных рейтингов: порядок участников, места и перечитывание из БД
+"""
+
+import pytest
+
+from core.leaderboards import SortedStandings, RegionLeaderboards
+
+def workout(db, user_id, exercise_id, volume):
+    """Тренировка из одного упражнения с заданным объемом"""
+    return db.add_workout_log(user_id, [(exercise_id, volume, 1, 1, 0, float(volume))])
+
+@pytest.fixture
+def bench(db):
+    return db.add_exercise("Жим лежа", "жим лежа")
+
+def test_sorted_standings_order_and_rank():
+    standings = SortedStandings()
+    standings.set(1, 100)
+    standings.set(2, 300)
+    standings.set(3, 100)
+    standings.set(1, 500)
+
+    assert standings.top(3) == [(1, 500), (2, 300), (3, 100)]
+    assert standings.rank(3) == 3
+    assert standings.total == 900
+
+    standings.remove(2)
+    assert standings.rank(3) == 2
+    assert standings.rank(2) is None
+
+def test_regional_and_global_ranks(db, make_user, bench):
+    make_user(1, region='Москва')
+    make_user(2, region='Москва')
+    make_user(3, region='Казань')
+    for user_id, volume in ((1, 100), (2, 200), (3, 300)):
+        workout(db, user_id, bench, volume)
+
+    boards = RegionLeaderboards(db)
+
+    assert boards.top() == [(3, 300), (2, 200), (1, 100)]
+    assert boards.top('Москва') == [(2, 200), (1, 100)]
+    assert boards.rank(1)['regional_rank'] == 2
+    assert boards.rank(1)['global_rank'] == 3
+    assert [row['region'] for row in boards.regions_summary()] == ['Казань', 'Москва']
+
+def test_writes_of_other_processes_appear_after_refresh(db, make_user, bench):
+    make_user(1, region='Москва')
+    make_user(2, region='Москва')
+    workout(db, 1, bench, 100)
+
+    cached = RegionLeaderboards(db, refresh_interval=3600)
+    refreshed = RegionLeaderboards(db, refresh_interval=0)
+    assert cached.top() == refreshed.top() == [(1, 100)]
+
+    # Тренировка записана мимо рейтингов этого процесса
+    workout(db, 2, bench, 200)
+
+    assert cached.top() == [(1, 100)]
+    assert refreshed.top() == [(2, 200), (1, 100)]
@@ -0,0 +1,198 @@
+"""
+Тесты двойной записи: проводки, запрет ухода в минус, контрольные точки,
+сверка счетов и перенос старых балансов
+"""
+
+import sqlite3
+
+import pytest
+
+from core.database import Database
+from core.ledger import (
+    Leg, credit, debit, TOKENS, DIAMONDS, OPENING, REWARDS, SHOP, DUELS, CHECKPOINT_INTERVAL
+)
+
+def query(db, sql, params=()):
+    conn = sqlite3.connect(db.db_path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+def currency_totals(db):
+    """Сумма всех записей по валютам (в двойной записи всегда ноль)"""
+    return {
+        currency: round(total, 2)
+        for currency, total in query(
+            db,
+            """
+            SELECT a.currency, SUM(e.amount) FROM ledger_entries e
+            JOIN ledger_accounts a ON a.id = e.account_id
+            GROUP BY a.currency
+            """
+        )
+    }
+
+def system_balance(db, code, currency=TOKENS):
+    rows = query(db, "SELECT balance FROM ledger_accounts WHERE owner_id = 0 AND code = ? AND currency = ?",
+                 (code, currency))
+    return rows[0][0] if rows else 0.0
+
+def postings_count(db):
+    return query(db, "SELECT COUNT(*) FROM ledger_postings")[0][0]
+
+def test_new_user_gets_opening_balance(db, make_user):
+    user_id = make_user(1)
+
+    assert db.get_balance(user_id) == 50.0
+    assert db.get_balance(user_id, DIAMONDS) == 0.0
+    assert system_balance(db, OPENING) == -50.0
+    assert currency_totals(db) == {TOKENS: 0.0}
+    assert db.verify_ledger_account(user_id)
+
+def test_post_moves_money_between_accounts(db, make_user):
+    user_id = make_user(1)
+
+    posting_id = db.post('daily_bonus', credit(user_id, REWARDS, 25), 'Бонус')
+    assert posting_id is not None
+    assert db.post('shop_purchase', debit(user_id, SHOP, 30), 'Покупка') is not None
+
+    assert db.get_balance(user_id) == 45.0
+    assert db.get_user(user_id)['balance_tokens'] == 45.0
+    assert system_balance(db, REWARDS) == -25.0
+    assert system_balance(db, SHOP) == 30.0
+    assert currency_totals(db) == {TOKENS: 0.0}
+
+    account = db.get_ledger_account(user_id)
+    assert (account['credited'], account['debited'], account['entries_count']) == (75.0, 30.0, 3)
+
+def test_overdraft_is_rejected_without_writes(db, make_user):
+    user_id = make_user(1)
+    postings = postings_count(db)
+
+    assert db.post('shop_purchase', debit(user_id, SHOP, 50.01)) is None
+    assert not db.add_transaction(user_id, 'purchase', -100)
+
+    assert db.get_balance(user_id) == 50.0
+    assert postings_count(db) == postings
+    assert system_balance(db, SHOP) == 0.0
+
+def test_multi_user_posting_is_all_or_nothing(db, make_user):
+    first, second = make_user(1), make_user(2)
+    db.add_transaction(first, 'daily_bonus', 100)
+    postings = postings_count(db)
+
+    # Ставка дуэли: второму не хватает средств - первый тоже ничего не теряет
+    legs = debit(first, DUELS, 100) + debit(second, DUELS, 100)
+    assert db.post('duel_entry', legs) is None
+
+    assert db.get_balance(first) == 150.0
+    assert db.get_balance(second) == 50.0
+    assert postings_count(db) == postings
+
+def test_unbalanced_and_empty_legs_raise(db, make_user):
+    user_id = make_user(1)
+
+    with db._get_connection() as conn:
+        cursor = conn.cursor()
+        with pytest.raises(ValueError):
+            db._post(cursor, 'broken', [Leg(user_id, TOKENS, 10)])
+        with pytest.raises(ValueError):
+            db._post(cursor, 'broken', credit(user_id, REWARDS, 10) + [Leg(REWARDS, DIAMONDS, 10)])
+        with pytest.raises(ValueError):
+            db._post(cursor, 'empty', [])
+        # Записи, взаимно погашающиеся на одном счете
+        with pytest.raises(ValueError):
+            db._post(cursor, 'noop', [Leg(user_id, TOKENS, 5), Leg(user_id, TOKENS, -5)])
+
+    # post() не пропускает исключение наружу и ничего не записывает
+    assert db.post('broken', [Leg(user_id, TOKENS, 10)]) is None
+    assert db.get_balance(user_id) == 50.0
+
+def test_unknown_user_is_not_posted(db):
+    assert db.post('daily_bonus', credit(999, REWARDS, 10)) is None
+    assert postings_count(db) == 0
+
+def test_balance_columns_are_not_updated_directly(db, make_user):
+    user_id = make_user(1)
+
+    assert not db.update_user(user_id, {'balance_tokens': 1000})
+    assert db.get_balance(user_id) == 50.0
+
+def test_checkpoints_and_verification(db, make_user):
+    user_id = make_user(1)
+    for _ in range(2 * CHECKPOINT_INTERVAL + 10):
+        assert db.add_transaction(user_id, 'daily_bonus', 1)
+
+    [(account_id,)] = query(
+        db, "SELECT id FROM ledger_accounts WHERE owner_id = ? AND currency = ?", (user_id, TOKENS)
+    )
+    checkpoints = query(db, "SELECT balance FROM ledger_checkpoints WHERE account_id = ? ORDER BY entry_id",
+                        (account_id,))
+
+    # Первая запись счета - стартовый баланс
+    assert [balance for (balance,) in checkpoints] == [50.0 + CHECKPOINT_INTERVAL - 1,
+                                                       50.0 + 2 * CHECKPOINT_INTERVAL - 1]
+    assert db.get_balance(user_id) == 50.0 + 2 * CHECKPOINT_INTERVAL + 10
+    assert db.verify_ledger_account(user_id)
+
+def test_verification_detects_drift(db, make_user):
+    user_id = make_user(1)
+    db.add_transaction(user_id, 'daily_bonus', 10)
+
+    conn = sqlite3.connect(db.db_path)
+    conn.execute("UPDATE users SET balance_tokens = 999 WHERE telegram_id = ?", (user_id,))
+    conn.commit()
+    assert not db.verify_ledger_account(user_id)
+
+    # Счет и копия в users совпадают, но не сходятся с записями
+    conn.execute("UPDATE ledger_accounts SET balance = 999 WHERE owner_id = ? AND currency = ?", (user_id, TOKENS))
+    conn.commit()
+    conn.close()
+    assert not db.verify_ledger_account(user_id)
+    assert not db.verify_ledger_account(404)
+
+def test_backfill_opening_balance_from_legacy_history(tmp_path):
+    path = str(tmp_path / 'users.db')
+    Database(path)
+
+    # Старая база: балансы в users и история в transactions, двойной записи нет
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "INSERT INTO users (telegram_id, registration_number, nickname, balance_tokens, balance_diamonds) "
+        "VALUES (1, 'GF1', 'user1', 120, 7.5)"
+    )
+    conn.executemany(
+        "INSERT INTO transactions (user_id, transaction_type, amount, description) VALUES (?, ?, ?, ?)",
+        [(1, 'daily_bonus', 30, 'Бонус'), (1, 'purchase', -40, 'Покупка'), (2, 'daily_bonus', 5, 'Удален')]
+    )
+    conn.commit()
+    conn.close()
+
+    db = Database(path)
+
+    # Начальный баланс - текущий баланс минус старая история, затем история по порядку
+    entries = query(
+        db,
+        """
+        SELECT e.amount, e.balance_after, p.posting_type FROM ledger_entries e
+        JOIN ledger_accounts a ON a.id = e.account_id
+        JOIN ledger_postings p ON p.id = e.posting_id
+        WHERE a.owner_id = 1 AND a.currency = ?
+        ORDER BY e.id
+        """,
+        (TOKENS,)
+    )
+    assert entries == [(130.0, 130.0, 'opening_balance'), (30.0, 160.0, 'daily_bonus'), (-40.0, 120.0, 'purchase')]
+
+    assert db.get_balance(1) == 120.0
+    assert db.get_balance(1, DIAMONDS) == 7.5
+    assert system_balance(db, REWARDS) == -30.0
+    assert system_balance(db, SHOP) == 40.0
+    assert currency_totals(db) == {TOKENS: 0.0, DIAMONDS: 0.0}
+    assert db.verify_ledger_account(1) and db.verify_ledger_account(1, DIAMONDS)
+
+    # Повторный запуск ничего не переносит
+    postings = postings_count(db)
+    Database(path)
+    assert postings_count(db) == postings
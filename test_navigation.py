@@ -405,11 +405,31 @@ def test_module_imports():
         ('core.config', 'Config'),
         ('core.database', 'Database'),
         ('core.message_manager', 'MessageManager'),
+        ('core.scheduler', 'MessageScheduler'),
+        ('core.webhook', 'WebhookServer'),
+        ('core.executor', 'UpdateExecutor'),
+        ('core.idempotency', 'CallbackIdempotencyMiddleware'),
+        ('core.render_cache', 'RenderCache'),
+        ('core.session', 'BotAPISession'),
+        ('core.fsm_storage', 'SQLiteStorage'),
+        ('core.pending_referrals', 'PendingReferralStore'),
+        ('core.dispatch_router', 'DispatchRouter'),
+        ('core.callback_codec', 'CallbackCodec'),
+        ('core.profiler', 'StartupProfiler'),
+        ('core.lazy_router', 'LazyRouter'),
+        ('core.events', 'EventBus'),
+        ('core.leaderboards', 'RegionLeaderboards'),
+        ('core.achievements', 'AchievementEngine'),
+        ('core.progression', 'ProgressSnapshots'),
+        ('core.ledger', 'Leg'),
         ('modules.auth.registration', 'router'),
         ('modules.profile.handlers', 'router'),
         ('modules.referrals.handlers', 'router'),
         ('modules.shop.handlers', 'router'),
         ('modules.bonus.handlers', 'router'),
+        ('modules.workouts.handlers', 'router'),
+        ('modules.workouts.catalog', 'ExerciseCatalog'),
+        ('modules.stats', 'router'),
         ('modules.keyboards.main_keyboards', 'MainKeyboards'),
     ]
     
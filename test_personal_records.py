@@ -0,0 +1,151 @@
+"""
+Тесты инкрементального обновления личных рекордов и итогов упражнений при сохранении тренировки
+"""
+
+import sqlite3
+
+import pytest
+
+from core.database import Database
+
+def entry(exercise_id, weight, sets, reps):
+    """Упражнение в формате Database.add_workout_log"""
+    return (exercise_id, weight, sets, reps, 0, weight * sets * reps)
+
+@pytest.fixture
+def bench(db):
+    return db.add_exercise("Жим лежа", "жим лежа")
+
+@pytest.fixture
+def squat(db):
+    return db.add_exercise("Приседания", "приседания")
+
+@pytest.mark.parametrize("weight, reps, expected", [
+    (100, 1, 100),
+    (100, 10, 133.3),
+    (100, 13, 0.0),
+    (0, 10, 0.0),
+])
+def test_estimate_one_rep_max(weight, reps, expected):
+    assert Database.estimate_one_rep_max(weight, reps) == expected
+
+def test_first_workout_sets_records(db, make_user, bench):
+    user_id = make_user(1)
+
+    result = db.add_workout_log(user_id, [entry(bench, 80, 3, 10), entry(bench, 90, 1, 5)])
+
+    [record] = result['records']
+    assert record['is_first']
+    assert record['previous'] is None
+    assert set(record['broken']) == {'max_weight', 'best_set_volume', 'best_e1rm'}
+
+    stored = db.get_personal_record(user_id, bench)
+    assert stored['max_weight'] == 90
+    assert stored['best_set_volume'] == 800
+    assert stored['best_e1rm'] == 106.7
+
+def test_only_improved_fields_are_reported(db, make_user, bench):
+    user_id = make_user(1)
+    db.add_workout_log(user_id, [entry(bench, 80, 3, 10)])
+
+    # Вес больше, но объем подхода меньше
+    result = db.add_workout_log(user_id, [entry(bench, 85, 3, 5)])
+
+    [record] = result['records']
+    assert not record['is_first']
+    assert record['broken'] == ['max_weight']
+    assert record['previous']['max_weight'] == 80
+
+    stored = db.get_personal_record(user_id, bench)
+    assert stored['max_weight'] == 85
+    assert stored['best_set_volume'] == 800
+    assert stored['best_e1rm'] == 106.7
+
+def test_weaker_workout_keeps_records(db, make_user, bench):
+    user_id = make_user(1)
+    db.add_workout_log(user_id, [entry(bench, 80, 3, 10)])
+    before = db.get_personal_record(user_id, bench)
+
+    result = db.add_workout_log(user_id, [entry(bench, 60, 3, 10)])
+
+    assert result['records'] == []
+    after = db.get_personal_record(user_id, bench)
+    assert (after['max_weight'], after['best_set_volume'], after['best_e1rm']) == \
+        (before['max_weight'], before['best_set_volume'], before['best_e1rm'])
+    assert after['updated_at'] == before['updated_at']
+
+def test_records_are_per_user_and_exercise(db, make_user, bench, squat):
+    first, second = make_user(1), make_user(2)
+    db.add_workout_log(first, [entry(bench, 100, 1, 1), entry(squat, 140, 1, 1)])
+
+    result = db.add_workout_log(second, [entry(bench, 50, 1, 1)])
+
+    assert [record['is_first'] for record in result['records']] == [True]
+    assert db.get_personal_record(second, squat) is None
+    assert [row['exercise'] for row in db.get_personal_records(first)] == ["Приседания", "Жим лежа"]
+
+def test_exercises_without_weight_have_no_records(db, make_user, bench):
+    user_id = make_user(1)
+    run = db.add_exercise("Бег", "бег")
+
+    result = db.add_workout_log(user_id, [(run, 0.0, 0, 0, 1800, 0.0), entry(bench, 0, 3, 15)])
+
+    assert result['records'] == []
+    assert db.get_personal_records(user_id) == []
+
+def test_exercise_totals_accumulate(db, make_user, bench):
+    user_id = make_user(1)
+    run = db.add_exercise("Бег", "бег")
+
+    db.add_workout_log(user_id, [entry(bench, 80, 3, 10), entry(bench, 90, 1, 5), (run, 0.0, 0, 0, 1800, 0.0)])
+    db.add_workout_log(user_id, [entry(bench, 60, 2, 10)])
+
+    stored = db.get_personal_record(user_id, bench)
+    assert (stored['total_volume'], stored['sessions']) == (2400 + 450 + 1200, 2)
+
+    totals = db.get_workout_totals(user_id)
+    assert totals == {'total_workouts': 2, 'total_volume': 4050.0, 'total_duration': 1800, 'exercises_count': 2}
+
+    top = db.get_top_exercises(user_id)
+    assert [(row['exercise'], row['workouts_count'], row['max_weight']) for row in top] == [
+        ("Жим лежа", 2, 90), ("Бег", 1, 0)
+    ]
+
+def test_volume_leaders_come_from_standings(db, make_user, bench):
+    first, second = make_user(1), make_user(2)
+    db.add_workout_log(first, [entry(bench, 50, 1, 10)])
+    db.add_workout_log(second, [entry(bench, 100, 1, 10)])
+    db.add_workout_log(second, [entry(bench, 100, 1, 20)])
+
+    leaders = db.get_volume_leaders()
+
+    assert [(row['nickname'], row['workouts_count'], row['total_volume'], row['avg_volume'])
+            for row in leaders] == [("user2", 2, 3000.0, 1500.0), ("user1", 1, 500.0, 500.0)]
+
+def test_totals_backfilled_from_history(tmp_path):
+    path = str(tmp_path / 'users.db')
+    db = Database(path)
+    db.create_user({'telegram_id': 1, 'registration_number': 'GF1', 'nickname': 'user1'})
+    bench = db.add_exercise("Жим лежа", "жим лежа")
+
+    # Старая база: история тренировок есть, таблица рекордов без итогов и пуста
+    conn = sqlite3.connect(path)
+    conn.execute("DROP TABLE personal_records")
+    conn.execute(
+        "CREATE TABLE personal_records (user_id INTEGER, exercise_id INTEGER, max_weight REAL DEFAULT 0, "
+        "best_set_volume REAL DEFAULT 0, best_e1rm REAL DEFAULT 0, last_date TIMESTAMP, "
+        "updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (user_id, exercise_id))"
+    )
+    for training_id, weight, reps in ((1, 80, 10), (2, 100, 3)):
+        conn.execute(
+            "INSERT INTO workout_exercises (training_id, user_id, position, exercise_id, weight, sets, reps, volume) "
+            "VALUES (?, 1, 1, ?, ?, 3, ?, ?)",
+            (training_id, bench, weight, reps, weight * 3 * reps)
+        )
+    conn.commit()
+    conn.close()
+
+    stored = Database(path).get_personal_record(1, bench)
+
+    assert (stored['total_volume'], stored['sessions']) == (2400 + 900, 2)
+    assert (stored['max_weight'], stored['best_set_volume']) == (100, 800)
@@ -0,0 +1,29 @@
+"""
+Тесты кривой опыта и уведомления о новом уровне
+"""
+
+from core.progression import level_for, level_progress, LEVEL_THRESHOLDS, MAX_LEVEL
+
+def test_level_for_thresholds():
+    assert level_for(0) == 1
+    assert level_for(LEVEL_THRESHOLDS[1] - 1) == 1
+    assert level_for(LEVEL_THRESHOLDS[1]) == 2
+    assert level_for(LEVEL_THRESHOLDS[-1] * 2) == MAX_LEVEL
+
+def test_stored_level_is_displayed():
+    progress = level_progress(LEVEL_THRESHOLDS[1] + 10, stored_level=5)
+
+    assert progress.level == 5
+    assert progress.current == 0
+
+def test_level_up_notification_goes_to_emitting_database(db, make_user, tmp_path, monkeypatch):
+    user_id = make_user(1)
+    monkeypatch.chdir(tmp_path)
+
+    assert db.add_experience(user_id, LEVEL_THRESHOLDS[2])
+
+    assert db.get_user(user_id)['level'] == 3
+    [notification] = db.get_user_notifications(user_id)
+    assert notification['notification_type'] == 'level_up'
+    # Стандартная БД бота в рабочей директории не создается
+    assert not (tmp_path / 'data').exists()
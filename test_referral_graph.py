@@ -0,0 +1,115 @@
+"""
+Тесты реферального графа на таблице замыкания: глубины, циклы и перенос старых связей
+"""
+
+import sqlite3
+
+from core.database import Database, REFERRAL_BONUS
+
+def network(db, user_id, max_depth=10):
+    """Пары (реферал, глубина) в сети пользователя"""
+    return sorted((row['telegram_id'], row['depth']) for row in db.get_referral_network(user_id, max_depth))
+
+def test_chain_depths(db, make_user):
+    for user_id in (1, 2, 3, 4):
+        make_user(user_id)
+
+    assert db.add_referral(1, 2)
+    assert db.add_referral(2, 3)
+    assert db.add_referral(3, 4)
+
+    assert network(db, 1) == [(2, 1), (3, 2), (4, 3)]
+    assert network(db, 1, max_depth=2) == [(2, 1), (3, 2)]
+    assert network(db, 3) == [(4, 1)]
+    assert db.get_referral_summary(1)['levels'] == {1: 1, 2: 1, 3: 1}
+    assert db.get_referral_summary(1)['network_size'] == 3
+
+def test_attaching_subtree_updates_all_ancestors(db, make_user):
+    for user_id in (1, 2, 3, 4, 5):
+        make_user(user_id)
+
+    # Сначала нижняя часть дерева, затем его подключение к верхней
+    assert db.add_referral(3, 4)
+    assert db.add_referral(3, 5)
+    assert db.add_referral(1, 2)
+    assert db.add_referral(2, 3)
+
+    assert network(db, 1) == [(2, 1), (3, 2), (4, 3), (5, 3)]
+    assert network(db, 2) == [(3, 1), (4, 2), (5, 2)]
+    assert db.get_referral_summary(1)['levels'] == {1: 1, 2: 1, 3: 2}
+
+def test_self_referral_is_rejected(db, make_user):
+    make_user(1)
+
+    assert not db.add_referral(1, 1)
+    assert db.get_referral_summary(1)['network_size'] == 0
+    assert db.get_user(1)['referrals_count'] == 0
+
+def test_cycle_is_rejected(db, make_user):
+    for user_id in (1, 2, 3):
+        make_user(user_id)
+    db.add_referral(1, 2)
+    db.add_referral(2, 3)
+
+    assert not db.add_referral(3, 1)
+    assert db.get_user(1)['referrer_id'] is None
+    assert network(db, 3) == []
+
+def test_second_referrer_is_rejected(db, make_user):
+    for user_id in (1, 2, 3):
+        make_user(user_id)
+    db.add_referral(1, 3)
+
+    assert not db.add_referral(2, 3)
+    assert db.get_user(3)['referrer_id'] == 1
+    assert db.get_referral_count(2) == 0
+
+def test_bonus_only_for_direct_referrer(db, make_user):
+    for user_id in (1, 2):
+        make_user(user_id)
+    db.add_referral(1, 2)
+    start_balance = db.get_balance(1)
+
+    make_user(3, referrer_id=2)
+
+    assert db.get_balance(2) == db.get_balance(1) + REFERRAL_BONUS
+    assert db.get_balance(1) == start_balance
+    assert db.get_referral_summary(2)['earned'] == REFERRAL_BONUS
+    assert db.get_referral_summary(1)['earned'] == 0
+    assert network(db, 1) == [(2, 1), (3, 2)]
+
+def test_backfill_from_legacy_links(tmp_path):
+    path = str(tmp_path / 'users.db')
+    Database(path)
+
+    # Старая база: связи в referral_connections и users.referrer_id, граф пуст
+    conn = sqlite3.connect(path)
+    for user_id, referrer_id in ((1, 3), (2, 1), (3, 2), (4, None), (5, 4)):
+        conn.execute(
+            "INSERT INTO users (telegram_id, registration_number, nickname, referrer_id) VALUES (?, ?, ?, ?)",
+            (user_id, f"GF{user_id}", f"user{user_id}", referrer_id)
+        )
+    # Связь 4 -> 5 есть только в users.referrer_id; самоприглашение и цикл не должны попасть в граф
+    for referrer_id, referred_id, bonus_paid in ((1, 2, 1), (2, 3, 0), (4, 4, 0), (3, 1, 0)):
+        conn.execute(
+            "INSERT INTO referral_connections (referrer_id, referred_id, bonus_paid) VALUES (?, ?, ?)",
+            (referrer_id, referred_id, bonus_paid)
+        )
+    conn.commit()
+    conn.close()
+
+    db = Database(path)
+
+    # Связь 3 -> 1 замкнула бы цикл и не переносится
+    assert network(db, 1) == [(2, 1), (3, 2)]
+    assert network(db, 3) == []
+    assert network(db, 4) == [(5, 1)]
+    assert db.get_referral_summary(1)['earned'] == REFERRAL_BONUS
+
+def test_missing_referrer_is_rejected(db, make_user):
+    make_user(1, referrer_id=999)
+
+    assert db.get_user(1)['referrer_id'] is None
+    assert db.get_referral_summary(999)['levels'] == {}
+    assert db.get_referral_summary(999)['earned'] == 0
+    assert not db.add_referral(999, 1)
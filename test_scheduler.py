@@ -0,0 +1,129 @@
+"""
+Тесты планировщика отложенных удалений: сохранение в БД, восстановление и отмена
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+from core.scheduler import MessageScheduler
+
+class FakeBot:
+    """Бот, запоминающий запросы удаления"""
+
+    def __init__(self):
+        self.deleted = []
+
+    async def delete_message(self, chat_id, message_id):
+        self.deleted.append((chat_id, [message_id]))
+
+    async def delete_messages(self, chat_id, message_ids):
+        self.deleted.append((chat_id, list(message_ids)))
+
+def make_message(bot, chat_id, message_id):
+    return SimpleNamespace(bot=bot, chat=SimpleNamespace(id=chat_id), message_id=message_id)
+
+def test_schedule_delete_is_persisted(db):
+    bot = FakeBot()
+    scheduler = MessageScheduler(bot, db)
+
+    async def scenario():
+        scheduler.schedule_delete(make_message(bot, 1, 10), delay=60)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+    rows = db.get_scheduled_deletions()
+    assert [(row['chat_id'], row['message_id']) for row in rows] == [(1, 10)]
+    assert rows[0]['delete_at'] > time.time() + 50
+    assert bot.deleted == []
+
+def test_restored_deletions_run_after_restart(db):
+    # Удаления, сохраненные до перезапуска, уже просрочены
+    db.add_scheduled_deletion(1, 10, time.time() - 5)
+    db.add_scheduled_deletion(1, 11, time.time() - 5)
+    db.add_scheduled_deletion(2, 20, time.time() + 3600)
+
+    bot = FakeBot()
+    scheduler = MessageScheduler()
+
+    async def scenario():
+        scheduler.start(bot, db)
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+    # Сообщения одного чата удаляются одним запросом
+    assert bot.deleted == [(1, [10, 11])]
+    assert [(row['chat_id'], row['message_id']) for row in db.get_scheduled_deletions()] == [(2, 20)]
+    assert scheduler.pending_count() == 1
+
+def test_cancelled_deletion_is_skipped_and_removed(db):
+    bot = FakeBot()
+    scheduler = MessageScheduler(bot, db)
+
+    async def scenario():
+        scheduler.schedule_delete(make_message(bot, 1, 10), delay=0.01)
+        scheduler.schedule_delete(make_message(bot, 1, 11), delay=0.01)
+        scheduler.cancel_delete(1, 10)
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+    assert bot.deleted == [(1, [11])]
+    assert db.get_scheduled_deletions() == []
+
+def test_rescheduling_clears_cancellation(db):
+    bot = FakeBot()
+    scheduler = MessageScheduler(bot, db)
+
+    async def scenario():
+        scheduler.cancel_delete(1, 10)
+        scheduler.schedule_delete(make_message(bot, 1, 10), delay=0.01)
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+    assert bot.deleted == [(1, [10])]
+
+def test_cancellation_survives_restart(db):
+    bot = FakeBot()
+    scheduler = MessageScheduler(bot, db)
+
+    async def before_restart():
+        scheduler.schedule_delete(make_message(bot, 1, 10), delay=0.05)
+        scheduler.cancel_delete(1, 10)
+        await scheduler.stop()
+
+    asyncio.run(before_restart())
+    assert db.get_scheduled_deletions() == []
+
+    restarted = MessageScheduler()
+
+    async def after_restart():
+        restarted.start(bot, db)
+        await asyncio.sleep(0.1)
+        await restarted.stop()
+
+    asyncio.run(after_restart())
+
+    assert bot.deleted == []
+    assert restarted.pending_count() == 0
+
+def test_rescheduling_replaces_pending_deletion(db):
+    bot = FakeBot()
+    scheduler = MessageScheduler(bot, db)
+
+    async def scenario():
+        scheduler.schedule_delete(make_message(bot, 1, 10), delay=0.01)
+        scheduler.schedule_delete(make_message(bot, 1, 10), delay=0.02)
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+    assert bot.deleted == [(1, [10])]
+    assert db.get_scheduled_deletions() == []
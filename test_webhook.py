@@ -0,0 +1,94 @@
+"""
+Тесты сервера вебхука: секретный токен, разбор обновления и обратное давление
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from aiohttp.test_utils import TestServer, TestClient
+from aiogram import Bot
+
+from core.executor import LaneDispatcher, UpdateExecutor
+from core.webhook import WebhookServer, SECRET_HEADER
+
+SECRET = "test-secret"
+
+def make_update(update_id, user_id=5, text="привет"):
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'Тест'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': user,
+            'text': text
+        }
+    }
+
+def run_webhook(scenario, max_in_flight=10):
+    """Запуск сценария против тестового сервера вебхука с реальным диспетчером"""
+    async def main():
+        executor = UpdateExecutor(lanes=1, max_in_flight=max_in_flight)
+        dp = LaneDispatcher(executor=executor)
+        received = []
+        release = asyncio.Event()
+
+        @dp.message()
+        async def handler(message):
+            received.append(message.text)
+            await release.wait()
+
+        bot = Bot("123456:TEST-TOKEN")
+        config = SimpleNamespace(WEBHOOK_PATH='/webhook', WEB_SECRET=SECRET)
+        server = WebhookServer(bot, dp, config)
+
+        client = TestClient(TestServer(server.create_app()))
+        await client.start_server()
+        try:
+            return await scenario(client, server, received, release)
+        finally:
+            release.set()
+            await executor.stop(timeout=1)
+            await client.close()
+            await bot.session.close()
+
+    return asyncio.run(main())
+
+def test_wrong_or_missing_secret_is_unauthorized():
+    async def scenario(client, server, received, release):
+        missing = await client.post('/webhook', json=make_update(1))
+        wrong = await client.post('/webhook', json=make_update(2), headers={SECRET_HEADER: 'wrong'})
+        return missing.status, wrong.status, server.stats['unauthorized'], list(received)
+
+    assert run_webhook(scenario) == (401, 401, 2, [])
+
+def test_invalid_json_is_rejected():
+    async def scenario(client, server, received, release):
+        broken = await client.post('/webhook', data=b'{not json', headers={SECRET_HEADER: SECRET})
+        not_update = await client.post('/webhook', json={'message': 'x'}, headers={SECRET_HEADER: SECRET})
+        return broken.status, not_update.status
+
+    assert run_webhook(scenario) == (400, 400)
+
+def test_valid_update_is_fed_to_dispatcher():
+    async def scenario(client, server, received, release):
+        response = await client.post('/webhook', json=make_update(1, text="жим 80 3 10"),
+                                     headers={SECRET_HEADER: SECRET})
+        release.set()
+        for _ in range(50):
+            if received:
+                break
+            await asyncio.sleep(0.01)
+        return response.status, server.stats['received'], list(received)
+
+    assert run_webhook(scenario) == (200, 1, ["жим 80 3 10"])
+
+def test_full_executor_returns_service_unavailable():
+    async def scenario(client, server, received, release):
+        # Первое обновление занимает единственный слот, пока обработчик не отпущен
+        first = await client.post('/webhook', json=make_update(1), headers={SECRET_HEADER: SECRET})
+        second = await client.post('/webhook', json=make_update(2, user_id=6), headers={SECRET_HEADER: SECRET})
+        return first.status, second.status, server.stats['rejected']
+
+    assert run_webhook(scenario, max_in_flight=1) == (200, 503, 1)
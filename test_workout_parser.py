@@ -0,0 +1,88 @@
+"""
+Тесты разбора журнала тренировки и сохранения его одной транзакцией
+"""
+
+import pytest
+
+from modules.workouts.parser import (
+    parse_line, parse_workout_log, WorkoutEntry, MAX_LOG_LINES
+)
+
+@pytest.mark.parametrize("line, expected", [
+    # упражнение вес подходы повторения
+    ("жим лежа 80 3 10", WorkoutEntry("жим лежа", 80.0, 3, 10, 0, 2400.0)),
+    ("Приседания 102,5кг 4 8", WorkoutEntry("Приседания", 102.5, 4, 8, 0, 3280.0)),
+    # подходы x повторения, вес до или после, номер строки
+    ("1. Жим лежа 3x10 50кг", WorkoutEntry("Жим лежа", 50.0, 3, 10, 0, 1500.0)),
+    ("2) становая тяга: 5х5 по 120", WorkoutEntry("становая тяга", 120.0, 5, 5, 0, 3000.0)),
+    ("Тяга штанги 60 kg 4*12", WorkoutEntry("Тяга штанги", 60.0, 4, 12, 0, 2880.0)),
+    ("подтягивания 3×15", WorkoutEntry("подтягивания", 0.0, 3, 15, 0, 0.0)),
+    # упражнения на время
+    ("бег 30 мин", WorkoutEntry("бег", 0.0, 0, 0, 1800, 0.0)),
+    ("планка 90 сек", WorkoutEntry("планка", 0.0, 0, 0, 90, 0.0)),
+    ("велосипед 1,5 ч", WorkoutEntry("велосипед", 0.0, 0, 0, 5400, 0.0)),
+    ("Скакалка - 10 минут", WorkoutEntry("Скакалка", 0.0, 0, 0, 600, 0.0)),
+])
+def test_line_formats(line, expected):
+    assert parse_line(line) == expected
+
+@pytest.mark.parametrize("line", [
+    "просто текст",
+    "жим лежа",
+    "80 3 10",
+    "жим лежа 3x0",
+    "жим лежа 3x10 5000кг",
+    "жим лежа 101x10",
+    "бег 25 ч",
+])
+def test_invalid_lines(line):
+    assert parse_line(line) is None
+
+def test_workout_log_totals_and_invalid_lines():
+    log = parse_workout_log(
+        "1. Жим лежа 3x10 50кг\n"
+        "\n"
+        "что-то непонятное\n"
+        "приседания 100 4 8\n"
+        "бег 30 мин\n"
+    )
+
+    assert [entry.name for entry in log.entries] == ["Жим лежа", "приседания", "бег"]
+    # Пустые строки не нумеруются
+    assert log.invalid_lines == [2]
+    assert log.total_volume == 1500.0 + 3200.0
+    assert log.total_duration_seconds == 1800
+
+def test_workout_log_is_limited():
+    log = parse_workout_log("жим 50 3 10\n" * (MAX_LOG_LINES + 10))
+
+    assert len(log.entries) == MAX_LOG_LINES
+
+def test_workout_log_saved_in_one_training(db, make_user):
+    user_id = make_user(1)
+    log = parse_workout_log("жим лежа 80 3 10\nбег 30 мин")
+    bench = db.add_exercise("Жим лежа", "жим лежа")
+    run = db.add_exercise("Бег", "бег")
+
+    result = db.add_workout_log(
+        user_id,
+        [(exercise_id,) + tuple(entry[1:]) for exercise_id, entry in zip((bench, run), log.entries)]
+    )
+
+    assert result is not None
+    exercises = db.get_training_exercises(result['training_id'])
+    assert [(row['position'], row['exercise'], row['volume']) for row in exercises] == [
+        (1, "Жим лежа", 2400.0),
+        (2, "Бег", 0.0)
+    ]
+
+    training = db.get_user_trainings(user_id)[0]
+    assert training['exercises_count'] == 2
+    assert training['duration_minutes'] == 30
+    assert db.get_user(user_id)['total_trainings'] == 1
+
+def test_empty_workout_log_is_not_saved(db, make_user):
+    user_id = make_user(1)
+
+    assert db.add_workout_log(user_id, []) is None
+    assert db.get_user_trainings(user_id) == []